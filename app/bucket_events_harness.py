@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Bucket Notification Harness
+===========================
+
+Generates MinIO-shaped ``s3:ObjectCreated`` webhook payloads for exercising
+the notification pipeline (``services/bucket_events.py``) without MinIO.
+
+Modes:
+- offline  run ``BucketEventIngestor`` in-process against in-memory stand-ins
+           for the files collection, Redis and the Dramatiq actors, replaying
+           every event twice plus a few unknown objects, and check the result
+- post     POST the payloads to a running minio-worker ``/notifications``
+           endpoint (exercises batching and publishing to RabbitMQ)
+- backfill list a real bucket and send an ``ingest_bucket_events`` message
+           for objects whose files are still ``pending`` (e.g. uploaded
+           before notifications were wired up), so they are settled without
+           waiting for their first download
+
+Usage:
+  python bucket_events_harness.py offline --files 500
+  python bucket_events_harness.py post --url http://localhost:8730/notifications --files 20
+  python bucket_events_harness.py backfill --bucket public
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote_plus
+
+from services.bucket_events import BucketEventIngestor, parse_notifications
+
+
+def make_object_created_event(bucket: str, key: str, size: int,
+                              etag: Optional[str] = None,
+                              content_type: str = "application/octet-stream",
+                              event_name: str = "s3:ObjectCreated:Put") -> Dict[str, Any]:
+    """Build a webhook body in the shape MinIO posts to ``/notifications``."""
+    etag = etag or hashlib.md5(f"{bucket}/{key}/{size}".encode()).hexdigest()
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "EventName": event_name,
+        "Key": f"{bucket}/{key}",
+        "Records": [{
+            "eventVersion": "2.0",
+            "eventSource": "minio:s3",
+            "eventTime": now,
+            "eventName": event_name,
+            "s3": {
+                "bucket": {"name": bucket},
+                "object": {
+                    "key": quote_plus(key),
+                    "size": size,
+                    "eTag": etag,
+                    "contentType": content_type,
+                    "sequencer": uuid.uuid4().hex[:16].upper(),
+                },
+            },
+        }],
+    }
+
+
+# ---------------------------------------------------
+# In-memory stand-ins for the offline mode
+# ---------------------------------------------------
+class MemoryFiles:
+    """Just enough of a pymongo collection for BucketEventIngestor."""
+
+    class _BulkResult:
+        def __init__(self, modified: int):
+            self.modified_count = modified
+
+    def __init__(self, docs: List[Dict[str, Any]], fail_bulk_writes: int = 0):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.find_calls = 0
+        self.bulk_calls = 0
+        self.fail_bulk_writes = fail_bulk_writes
+
+    def find(self, query, projection=None):
+        self.find_calls += 1
+        names = set(query["object_name"]["$in"])
+        return [doc for doc in self.docs.values() if doc["object_name"] in names]
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_calls += 1
+        if self.fail_bulk_writes:
+            self.fail_bulk_writes -= 1
+            raise ConnectionError("simulated write failure")
+        modified = 0
+        for op in operations:
+            flt, update = op._filter, op._doc
+            doc = self.docs.get(flt["_id"])
+            if not doc or any(
+                doc.get(k) not in v["$in"] if isinstance(v, dict) else doc.get(k) != v
+                for k, v in flt.items() if k != "_id"
+            ):
+                continue
+            for path, value in update["$set"].items():
+                target = doc
+                *parents, leaf = path.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = value
+            modified += 1
+        return self._BulkResult(modified)
+
+
+class MemoryRedis:
+    def __init__(self):
+        self.store: Dict[str, Any] = {}
+
+    def pipeline(self, transaction=True):
+        return _MemoryPipeline(self)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+class _MemoryPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def set(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+    def execute(self):
+        return [self.redis.set(*args, **kwargs) for args, kwargs in self.calls]
+
+
+def run_offline(files: int, batch_size: int) -> int:
+    docs, payloads = [], []
+    for i in range(files):
+        file_id = str(uuid.uuid4())
+        audio = i % 5 == 0
+        name = f"{file_id}_sample {i}.{'mp3' if audio else 'bin'}"
+        mime = "audio/mpeg" if audio else "application/octet-stream"
+        docs.append({"_id": file_id, "object_name": name, "safe_status": "pending",
+                     "meta": {"mime_type": mime}})
+        payloads.append(make_object_created_event("public", name, 1024 * (i + 1), content_type=mime))
+
+    # a file from before safe_status existed
+    docs[-1].pop("safe_status")
+    unknown = [make_object_created_event("public", f"orphan_{i}.txt", 10) for i in range(3)]
+    # MinIO redelivers on webhook errors; replay everything once more
+    stream = payloads + unknown + payloads
+
+    # the first batch's status flip fails; Dramatiq retries the same batch
+    collection = MemoryFiles(docs, fail_bulk_writes=1)
+    redis = MemoryRedis()
+    queued = {"validate": [], "transcribe": []}
+    ingestor = BucketEventIngestor(
+        collection, redis,
+        enqueue_validate=lambda *a: queued["validate"].append(a),
+        enqueue_transcribe=lambda *a: queued["transcribe"].append(a),
+    )
+
+    totals: Dict[str, Any] = {}
+    start = time.perf_counter()
+    retried = 0
+    for i in range(0, len(stream), batch_size):
+        batch = parse_notifications(stream[i:i + batch_size])
+        try:
+            summary = ingestor.ingest(batch)
+        except ConnectionError:
+            retried += 1
+            summary = ingestor.ingest(batch)
+        for key, value in summary.items():
+            totals[key] = totals.get(key, 0 if not isinstance(value, list) else []) + value
+    elapsed = time.perf_counter() - start
+
+    stored = sum(1 for doc in collection.docs.values() if doc.get("safe_status") == "stored")
+    expected_audio = sum(1 for doc in docs if doc["meta"]["mime_type"].startswith("audio/"))
+    checks = {
+        "every file stored once": stored == files == totals["stored"],
+        "failed batch retried": retried == 1,
+        "one validation per file": len({a[2] for a in queued["validate"]}) == files,
+        "one transcription per audio file": len({a[2] for a in queued["transcribe"]}) == expected_audio,
+        "redeliveries dropped": totals["duplicates"] == files,
+        "unknown objects reported": len(totals["unknown_objects"]) >= len(unknown),
+    }
+
+    print(json.dumps({
+        "events": len(stream),
+        "batches": collection.find_calls,
+        "bulk_writes": collection.bulk_calls,
+        "seconds": round(elapsed, 4),
+        "summary": {k: (len(v) if isinstance(v, list) else v) for k, v in totals.items()},
+        "checks": checks,
+    }, indent=2))
+    return 0 if all(checks.values()) else 1
+
+
+def run_post(url: str, files: int, bucket: str) -> int:
+    import requests
+
+    ok = 0
+    for i in range(files):
+        payload = make_object_created_event(bucket, f"harness_{uuid.uuid4().hex}_{i}.bin", 1024)
+        resp = requests.post(url, json=payload, timeout=10)
+        ok += resp.status_code == 200
+    print(f"Posted {files} events to {url}: {ok} accepted")
+    return 0 if ok == files else 1
+
+
+def run_backfill(bucket: str, limit: Optional[int]) -> int:
+    from workers import db, minio_client
+    from workers.tasks import ingest_bucket_events
+
+    objects = {}
+    for obj in minio_client.list_objects(bucket, recursive=True):
+        objects[obj.object_name] = obj
+        if limit and len(objects) >= limit:
+            break
+
+    pending = db.files.find(
+        {"object_name": {"$in": list(objects)}, "safe_status": "pending"},
+        {"object_name": 1}
+    )
+    payloads = []
+    for doc in pending:
+        obj = objects[doc["object_name"]]
+        payloads.append(make_object_created_event(
+            bucket, obj.object_name, obj.size, etag=(obj.etag or "").strip('"') or None
+        ))
+
+    for i in range(0, len(payloads), 100):
+        ingest_bucket_events.send(payloads[i:i + 100])
+    print(f"Queued {len(payloads)} pending objects from {bucket}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake MinIO bucket notifications")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    offline = sub.add_parser("offline", help="Run the ingestor against in-memory stand-ins")
+    offline.add_argument("--files", type=int, default=200)
+    offline.add_argument("--batch-size", type=int, default=100)
+
+    post = sub.add_parser("post", help="POST fake events to a running /notifications endpoint")
+    post.add_argument("--url", default="http://localhost:8730/notifications")
+    post.add_argument("--files", type=int, default=10)
+    post.add_argument("--bucket", default="public")
+
+    backfill = sub.add_parser("backfill", help="Queue ingestion for pending files already in a bucket")
+    backfill.add_argument("--bucket", default="public")
+    backfill.add_argument("--limit", type=int, default=None)
+
+    args = parser.parse_args()
+    if args.mode == "offline":
+        return run_offline(args.files, args.batch_size)
+    if args.mode == "post":
+        return run_post(args.url, args.files, args.bucket)
+    return run_backfill(args.bucket, args.limit)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
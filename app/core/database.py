@@ -370,7 +370,9 @@ class AsyncDatabaseManager:
         Create indexes for collections
         
         Args:
-            indexes_config: Dictionary mapping collection names to index definitions
+            indexes_config: Dictionary mapping collection names to index definitions.
+                Definitions with ``"required": True`` re-raise when the build fails;
+                the others are logged and skipped.
             
         Example:
             await db_manager.create_indexes({
@@ -390,12 +392,16 @@ class AsyncDatabaseManager:
         for collection_name, indexes in indexes_config.items():
             collection = self._database[collection_name]
             for index_def in indexes:
+                # required indexes back correctness (e.g. unique upsert keys): fail startup without them
+                required = index_def.pop("required", False)
                 try:
                     keys = index_def.pop("keys")
                     await collection.create_index(keys, **index_def)
                     logger.info(f"✅ Created index on {collection_name}: {keys}")
                 except Exception as e:
                     logger.error(f"❌ Failed to create index on {collection_name}: {e}")
+                    if required:
+                        raise
     
     async def list_collections(self) -> list:
         """
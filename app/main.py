@@ -13,7 +13,7 @@ from metrics.metrics import get_metrics
 from middlewares.geoip import (
     GeoIPMiddleware
 )
-from core.database import AsyncDatabaseConfig,db_manager
+from core.database import AsyncDatabaseConfig,db_manager,ensure_indexes
 from services.lago_billing import LagoBillingService
 from services.tenant_service import TenantService
 from services.user_service import UserService
@@ -154,6 +154,105 @@ async def lifespan(app: FastAPI):
     db_config = AsyncDatabaseConfig.from_env()
     await db_manager.initialize(config=db_config)
     adb = db_manager.database
+    # collapse pre-upsert financial snapshot duplicates so the unique key below can build
+    from plugins.pms.snapshots.finance_properties import FinancialSnapshotService
+    migrated = await FinancialSnapshotService(adb).migrate_legacy_snapshots()
+    logger.info("legacy_financial_snapshots_migrated", **migrated)
+    await ensure_indexes({
+        "files": [
+            # bucket notifications resolve files by object name
+            {"keys": [("object_name", 1)]},
+            # content-addressed storage: per-user blob lookups and expiry sweeps
+            {"keys": [("blob_id", 1), ("user_token", 1)], "sparse": True},
+            {"keys": [("expiry_date", 1)]},
+            # upload listings walk (timestamp, _id) keyset pages per token
+            {"keys": [("user_token", 1), ("timestamp", -1), ("_id", -1)]},
+        ],
+        "billing_runs": [
+            # one unfinished run per month is picked up instead of starting another
+            {"keys": [("billing_month", 1), ("status", 1)]},
+        ],
+        "property_invoices": [
+            # bulk billing prefetches and run-id skips look invoices up per lease and month
+            {"keys": [("meta.lease_id", 1), ("meta.billing_period", 1)]},
+            # financial snapshots match invoices per property and issue date
+            {"keys": [("property_id", 1), ("date_issued", 1)]},
+            # invoices_summary walks (date_issued, _id) keyset pages, optionally per tenant or unit
+            {"keys": [("date_issued", -1), ("_id", -1)]},
+            {"keys": [("property_id", 1), ("date_issued", -1), ("_id", -1)]},
+            {"keys": [("tenant_id", 1), ("date_issued", -1)]},
+            {"keys": [("units_id", 1), ("date_issued", -1)]},
+            # rent-roll exports prefetch a property's invoices by lease
+            {"keys": [("lease_id", 1), ("date_issued", 1)]},
+        ],
+        "property_leases": [
+            # rent rolls load a property's signed leases once per property
+            {"keys": [("property_id", 1), ("status", 1)]},
+            # expiry passes read back the leases they moved by pass id
+            {"keys": [("status_pass_id", 1)], "sparse": True},
+        ],
+        "system_snapshots": [
+            # snapshot lookups by type and key, one document per key and time; cache entries expire via expires_at
+            {"keys": [("type", 1), ("period_key", 1), ("created_at", -1)], "unique": True},
+            # financial snapshots are upserted per key, so concurrent refreshes cannot both insert
+            {"keys": [("type", 1), ("period_key", 1)], "unique": True,
+             "partialFilterExpression": {"type": "property_financials"}, "required": True},
+            {"keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+            # the invalidation bus finds snapshots by the properties, units and property filters they hold
+            {"keys": [("type", 1), ("data.properties._id", 1)]},
+            {"keys": [("type", 1), ("data.properties.units._id", 1)]},
+            {"keys": [("type", 1), ("data.filters.property_ids", 1)]},
+        ],
+        "property_account_balances": [
+            # one running-balance row per property, tenant, account and day ($inc upserts)
+            {"keys": [("property_id", 1), ("tenant_id", 1), ("account", 1), ("day", 1)], "unique": True},
+            {"keys": [("tenant_id", 1), ("account", 1)]},
+            {"keys": [("property_id", 1), ("day", 1)]},
+        ],
+        "ledger_periods": [
+            # one closed month per property; reports look up the latest closed period before a day
+            {"keys": [("property_id", 1), ("period", 1)], "unique": True},
+            {"keys": [("property_id", 1), ("status", 1), ("period_end", -1)]},
+        ],
+        "units": [
+            # property listings batch units per property with $in
+            {"keys": [("propertyId", 1), ("unitNumber", 1)]},
+            {"keys": [("property_id", 1)]},
+        ],
+        "invoices": [
+            # property detail prefetches current and outstanding invoices per tenant
+            {"keys": [("tenant_id", 1), ("due_date", 1)]},
+        ],
+        "payments": [
+            {"keys": [("tenant_id", 1), ("payment_date", -1)]},
+        ],
+        "property_payments": [
+            # statement reconciliation skips rows whose reference was already posted
+            {"keys": [("reference", 1)]},
+            {"keys": [("statement_run_id", 1)], "sparse": True},
+        ],
+        "property_tenants": [
+            # statement reconciliation indexes a property's tenants by phone and name
+            {"keys": [("property_id", 1)]},
+        ],
+        "statement_reconciliations": [
+            # reconciliation run listings, newest first
+            {"keys": [("created_by", 1), ("created_at", -1)]},
+        ],
+        "property_tickets": [
+            # bulk meter readings load a property's open invoice-preparation tickets
+            {"keys": [("metadata.property_id", 1), ("status", 1), ("metadata.billing_month", 1)]},
+            # ticket listings walk (created_at, _id) keyset pages, optionally per property
+            {"keys": [("created_at", -1), ("_id", -1)]},
+            {"keys": [("metadata.property_id", 1), ("created_at", -1), ("_id", -1)]},
+        ],
+        "tickets": [
+            # support ticket listings page on (created_at, _id), filtered by status or assignee
+            {"keys": [("created_at", -1), ("_id", -1)]},
+            {"keys": [("status", 1), ("created_at", -1), ("_id", -1)]},
+            {"keys": [("assigned_to", 1), ("created_at", -1), ("_id", -1)]},
+        ],
+    })
     
     # Store in app state
     app.state.db=db #ToDo make it aasync with get_database from core
@@ -159,6 +159,40 @@ class MetricsCollector:
             "upload_bandwidth_bytes_per_sec",
             "Histogram of upload bandwidth"
         )
+
+        # Meter OCR (plugins/pms/services/meter_ocr.py)
+        self.meter_ocr_stage_seconds = Histogram(
+            "meter_ocr_stage_seconds",
+            "Meter OCR time per image and stage",
+            ["stage"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+        )
+
+        self.meter_ocr_batch_size = Histogram(
+            "meter_ocr_batch_size",
+            "Images per meter OCR predict call",
+            buckets=(1, 2, 4, 8, 16, 32, 64)
+        )
+
+        # PMS snapshot caches (plugins/pms/snapshots)
+        self.snapshot_cache_requests_total = Counter(
+            "snapshot_cache_requests_total",
+            "Snapshot cache lookups by snapshot type and result",
+            ["snapshot", "result"]
+        )
+
+        self.snapshot_recompute_seconds = Histogram(
+            "snapshot_recompute_seconds",
+            "Time to rebuild a snapshot after a cache miss",
+            ["snapshot"],
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+        )
+
+        self.snapshot_invalidations_total = Counter(
+            "snapshot_invalidations_total",
+            "Snapshot entries deleted or patched after writes",
+            ["snapshot", "action", "source"]
+        )
     
     def record_auth_request(self, method: str, status: str, endpoint: str, duration: float):
         """Record authentication request metrics"""
@@ -192,6 +226,34 @@ class MetricsCollector:
             tenant_id=tenant_id or "global"
         ).inc()
 
+    def record_meter_ocr_stage(self, stage: str, duration: float):
+        """Record one image's time in a meter OCR stage"""
+        self.meter_ocr_stage_seconds.labels(stage=stage).observe(duration)
+
+    def record_meter_ocr_batch(self, size: int):
+        """Record the size of a meter OCR batch"""
+        self.meter_ocr_batch_size.observe(size)
+
+    def record_snapshot_lookup(self, snapshot: str, hit: bool):
+        """Record a snapshot cache hit or miss"""
+        self.snapshot_cache_requests_total.labels(
+            snapshot=snapshot,
+            result="hit" if hit else "miss"
+        ).inc()
+
+    def record_snapshot_recompute(self, snapshot: str, duration: float):
+        """Record the time taken to rebuild a snapshot"""
+        self.snapshot_recompute_seconds.labels(snapshot=snapshot).observe(duration)
+
+    def record_snapshot_invalidation(self, snapshot: str, action: str, source: str, count: int = 1):
+        """Record snapshot entries invalidated or patched"""
+        if count:
+            self.snapshot_invalidations_total.labels(
+                snapshot=snapshot,
+                action=action,
+                source=source
+            ).inc(count)
+
 # Global metrics instance
 _metrics_collector = MetricsCollector()
 
@@ -0,0 +1,399 @@
+"""
+Materialized running balances for the PMS ledger.
+
+Every entry ``Ledger`` posts is also added, with ``$inc``, to one row of
+``property_account_balances`` per (property, tenant, account, day)::
+
+    {property_id, tenant_id, account, day,
+     debit, credit, entries,
+     excluded_debit, excluded_credit, excluded_entries}
+
+The ``excluded_*`` counters hold the part of an income account that the
+income statement does not treat as revenue (forwarded balances, deposits,
+credits - see ``is_excluded_revenue``), so reports can be answered from the
+rows alone.
+
+Reports load the rows they need into an ``AccountSeries``, which keeps
+per-account prefix sums over days: a balance as of a day or the activity
+between two days is two lookups instead of a scan over every entry.
+
+Closed months (accounting/periods.py) freeze the cumulative totals so a
+series can start from them; a back-dated posting reopens the months it
+lands in.
+
+Deleting ledger entries goes through ``AccountBalances.remove_entries`` so
+the rows are decremented. ``verify`` rebuilds the rows from the entries and
+reports (optionally repairs) any drift:
+
+    python -m plugins.pms.accounting.balances verify [--property ID] [--repair]
+"""
+import argparse
+import asyncio
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+BALANCES_COLL = "property_account_balances"
+LEDGER_PERIODS_COLL = "ledger_periods"
+LEDGER_ENTRIES_COLL = "property_ledger_entries"
+EXCLUDED_REVENUE_WORDS = ("balance", "forward", "deposit", "credit")
+TOLERANCE = 0.005
+
+BalanceKey = Tuple[Any, Any, str, datetime]
+
+
+def is_excluded_revenue(account: str, description: Optional[str]) -> bool:
+    """Income-account entries the income statement does not count as revenue."""
+    desc = (description or "").lower()
+    return "income" in account.lower() and any(word in desc for word in EXCLUDED_REVENUE_WORDS)
+
+
+def as_day(value) -> date:
+    """Calendar day (UTC) of a date or datetime."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+
+def _day_key(value) -> datetime:
+    day = as_day(value)
+    return datetime(day.year, day.month, day.day)
+
+
+@dataclass
+class AccountActivity:
+    """Debit/credit totals (and revenue exclusions) for an account over some days."""
+    debit: float = 0.0
+    credit: float = 0.0
+    entries: int = 0
+    excluded_debit: float = 0.0
+    excluded_credit: float = 0.0
+    excluded_entries: int = 0
+
+    def add_entry(self, debit: float, credit: float, excluded: bool) -> None:
+        self.debit += debit
+        self.credit += credit
+        self.entries += 1
+        if excluded:
+            self.excluded_debit += debit
+            self.excluded_credit += credit
+            self.excluded_entries += 1
+
+    def add(self, other: "AccountActivity", sign: int = 1) -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + sign * getattr(other, f.name))
+
+    def as_tuple(self) -> Tuple:
+        return tuple(getattr(self, f.name) for f in fields(self))
+
+    @classmethod
+    def from_doc(cls, doc: Dict) -> "AccountActivity":
+        return cls(**{f.name: doc.get(f.name, 0) for f in fields(cls)})
+
+    @property
+    def net(self) -> float:
+        """Debit minus credit."""
+        return self.debit - self.credit
+
+    @property
+    def has_revenue(self) -> bool:
+        return self.entries > self.excluded_entries
+
+    @property
+    def revenue(self) -> float:
+        """Credit minus debit, leaving out excluded entries."""
+        return (self.credit - self.excluded_credit) - (self.debit - self.excluded_debit)
+
+    def differs_from(self, other: "AccountActivity") -> bool:
+        return any(abs(a - b) > TOLERANCE for a, b in zip(self.as_tuple(), other.as_tuple()))
+
+
+def summarize_entries(documents: Iterable[Dict]) -> Dict[BalanceKey, AccountActivity]:
+    """Group ledger entry documents into balance rows."""
+    rows: Dict[BalanceKey, AccountActivity] = {}
+    for doc in documents:
+        key = (doc.get("property_id"), doc.get("tenant_id"), doc["account"], _day_key(doc["date"]))
+        rows.setdefault(key, AccountActivity()).add_entry(
+            doc.get("debit", 0.0) or 0.0,
+            doc.get("credit", 0.0) or 0.0,
+            is_excluded_revenue(doc["account"], doc.get("description"))
+        )
+    return rows
+
+
+def _key_filter(key: BalanceKey) -> Dict:
+    property_id, tenant_id, account, day = key
+    return {"property_id": property_id, "tenant_id": tenant_id, "account": account, "day": day}
+
+
+class AccountSeries:
+    """
+    Per-account daily activity with prefix sums, the input of ``ReportGenerator``.
+
+    Accounts keep the order they were first seen in. A series can start from
+    the cumulative totals of a closed period (``opening`` as of
+    ``opening_day``); it then only answers for days from ``opening_day`` on.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Tuple[str, Any, AccountActivity]],
+        opening: Optional[Dict[str, AccountActivity]] = None,
+        opening_day=None
+    ):
+        self._opening = opening or {}
+        self._opening_day = as_day(opening_day) if opening_day is not None else None
+        daily: Dict[str, Dict[date, AccountActivity]] = {account: {} for account in self._opening}
+        for account, day, activity in rows:
+            per_day = daily.setdefault(account, {})
+            per_day.setdefault(as_day(day), AccountActivity()).add(activity)
+
+        self._days: Dict[str, List[date]] = {}
+        self._prefix: Dict[str, List[AccountActivity]] = {}
+        for account, per_day in daily.items():
+            days = sorted(per_day)
+            running = AccountActivity(*self._opening[account].as_tuple()) if account in self._opening else AccountActivity()
+            prefix = []
+            for day in days:
+                running.add(per_day[day])
+                prefix.append(AccountActivity(*running.as_tuple()))
+            self._days[account] = days
+            self._prefix[account] = prefix
+
+    @classmethod
+    def from_entries(cls, entries) -> "AccountSeries":
+        """Build from ``LedgerEntry`` objects."""
+        rows = []
+        for e in entries:
+            activity = AccountActivity()
+            activity.add_entry(e.debit, e.credit, is_excluded_revenue(e.account, e.description))
+            rows.append((e.account, e.date, activity))
+        return cls(rows)
+
+    @property
+    def accounts(self) -> List[str]:
+        return list(self._days)
+
+    def _upto(self, account: str, day: date) -> AccountActivity:
+        if self._opening_day is not None and day < self._opening_day:
+            raise ValueError(f"Series starts at the period closed on {self._opening_day}; {day} is earlier")
+        index = bisect_right(self._days[account], day)
+        if index:
+            return self._prefix[account][index - 1]
+        return self._opening.get(account) or AccountActivity()
+
+    def balances(self, up_to) -> Dict[str, float]:
+        """Debit minus credit per account, for accounts with entries on or before ``up_to``."""
+        day = as_day(up_to)
+        result = {}
+        for account in self._days:
+            totals = self._upto(account, day)
+            if totals.entries:
+                result[account] = totals.net
+        return result
+
+    def activity(self, start, end) -> Dict[str, AccountActivity]:
+        """Activity per account for the days ``start`` to ``end`` inclusive."""
+        first, last = as_day(start), as_day(end)
+        result = {}
+        for account in self._days:
+            totals = AccountActivity(*self._upto(account, last).as_tuple())
+            totals.add(self._upto(account, first - timedelta(days=1)), sign=-1)
+            if totals.entries:
+                result[account] = totals
+        return result
+
+
+class AccountBalances:
+    """Maintains and reads ``property_account_balances``."""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db[BALANCES_COLL]
+
+    async def apply(self, documents: List[Dict], sign: int = 1, session=None) -> None:
+        """Add (or with ``sign=-1`` take back) ledger entry documents."""
+        rows = summarize_entries(documents)
+        operations = [
+            UpdateOne(
+                _key_filter(key),
+                {"$inc": {f.name: sign * getattr(activity, f.name) for f in fields(AccountActivity)}},
+                upsert=True
+            )
+            for key, activity in rows.items()
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False, session=session)
+            await self._reopen_periods(rows, session=session)
+
+    async def _reopen_periods(self, rows: Dict[BalanceKey, AccountActivity], session=None) -> None:
+        """Back-dated postings reopen the closed periods they land in (and every later one)."""
+        earliest: Dict[Any, datetime] = {}
+        for property_id, _, _, day in rows:
+            if property_id not in earliest or day < earliest[property_id]:
+                earliest[property_id] = day
+        for property_id, day in earliest.items():
+            await self.db[LEDGER_PERIODS_COLL].update_many(
+                {"property_id": property_id, "status": {"$in": ["closed", "closing"]}, "period_end": {"$gte": day}},
+                {"$set": {"status": "reopened", "reopened_at": datetime.utcnow()}},
+                session=session
+            )
+
+    async def remove_entries(self, query: Dict) -> int:
+        """Delete the ledger entries matching ``query`` and take them out of the balances."""
+        # snapshots.finance_properties imports this module through accounting.periods
+        from plugins.pms.snapshots.invalidation import snapshots_changed
+
+        documents = await self.db[LEDGER_ENTRIES_COLL].find(
+            query,
+            {"property_id": 1, "tenant_id": 1, "account": 1, "date": 1, "debit": 1, "credit": 1, "description": 1}
+        ).to_list(length=None)
+        if not documents:
+            return 0
+        await self.db[LEDGER_ENTRIES_COLL].delete_many({"_id": {"$in": [doc["_id"] for doc in documents]}})
+        await self.apply(documents, sign=-1)
+        await snapshots_changed(self.db, LEDGER_ENTRIES_COLL, documents)
+        return len(documents)
+
+    async def account_total(self, account: str, tenant_id=None, property_id=None) -> AccountActivity:
+        """All-time totals of one account, optionally for one tenant or property."""
+        match: Dict[str, Any] = {"account": account}
+        if tenant_id is not None:
+            match["tenant_id"] = ObjectId(tenant_id)
+        if property_id is not None:
+            match["property_id"] = property_id
+        docs = await self.collection.aggregate([
+            {"$match": match},
+            {"$group": {"_id": None, **{f.name: {"$sum": f"${f.name}"} for f in fields(AccountActivity)}}}
+        ]).to_list(length=1)
+        return AccountActivity.from_doc(docs[0]) if docs else AccountActivity()
+
+    async def series(
+        self,
+        property_id=None,
+        tenant_id=None,
+        up_to=None,
+        after=None,
+        opening: Optional[Dict[str, AccountActivity]] = None
+    ) -> AccountSeries:
+        """
+        Daily per-account rows (summed over tenants unless one is given) as an
+        ``AccountSeries``. With ``after``/``opening`` only the rows after that
+        day are read, on top of the totals it closed with.
+        """
+        match: Dict[str, Any] = {}
+        if property_id is not None:
+            match["property_id"] = property_id
+        if tenant_id is not None:
+            match["tenant_id"] = ObjectId(tenant_id)
+        if up_to is not None or after is not None:
+            match["day"] = {}
+            if up_to is not None:
+                match["day"]["$lte"] = _day_key(up_to)
+            if after is not None:
+                match["day"]["$gt"] = _day_key(after)
+        docs = await self.collection.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"account": "$account", "day": "$day"},
+                **{f.name: {"$sum": f"${f.name}"} for f in fields(AccountActivity)}
+            }},
+            {"$sort": {"_id.account": 1, "_id.day": 1}}
+        ]).to_list(length=None)
+        return AccountSeries(
+            ((doc["_id"]["account"], doc["_id"]["day"], AccountActivity.from_doc(doc)) for doc in docs),
+            opening=opening,
+            opening_day=after
+        )
+
+    async def verify(self, property_id=None, repair: bool = False) -> Dict:
+        """Rebuild balances from the ledger entries and diff them against the table."""
+        query = {} if property_id is None else {"property_id": property_id}
+        expected: Dict[BalanceKey, AccountActivity] = {}
+        cursor = self.db[LEDGER_ENTRIES_COLL].find(
+            query,
+            {"property_id": 1, "tenant_id": 1, "account": 1, "date": 1, "debit": 1, "credit": 1, "description": 1}
+        )
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= 10000:
+                for key, activity in summarize_entries(batch).items():
+                    expected.setdefault(key, AccountActivity()).add(activity)
+                batch = []
+        for key, activity in summarize_entries(batch).items():
+            expected.setdefault(key, AccountActivity()).add(activity)
+
+        actual: Dict[BalanceKey, AccountActivity] = {}
+        async for doc in self.collection.find(query):
+            key = (doc.get("property_id"), doc.get("tenant_id"), doc["account"], _day_key(doc["day"]))
+            actual[key] = AccountActivity.from_doc(doc)
+
+        differences = []
+        for key in expected.keys() | actual.keys():
+            want = expected.get(key, AccountActivity())
+            have = actual.get(key, AccountActivity())
+            if want.differs_from(have):
+                differences.append((key, want, have))
+
+        if repair and differences:
+            await self.collection.bulk_write([
+                UpdateOne(
+                    _key_filter(key),
+                    {"$set": {f.name: getattr(want, f.name) for f in fields(AccountActivity)}},
+                    upsert=True
+                )
+                for key, want, _ in differences
+            ], ordered=False)
+
+        return {
+            "rows_checked": len(expected.keys() | actual.keys()),
+            "mismatched": len(differences),
+            "repaired": bool(repair and differences),
+            "differences": [
+                {
+                    "property_id": str(key[0]) if key[0] is not None else None,
+                    "tenant_id": str(key[1]) if key[1] is not None else None,
+                    "account": key[2],
+                    "day": key[3].date().isoformat(),
+                    "expected": {"debit": round(want.debit, 2), "credit": round(want.credit, 2), "entries": want.entries},
+                    "actual": {"debit": round(have.debit, 2), "credit": round(have.credit, 2), "entries": have.entries}
+                }
+                for key, want, have in differences[:100]
+            ]
+        }
+
+
+async def _verify_command(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI", "mongodb://mongo:27017/fileq"))
+    try:
+        db = client[os.getenv("MONGO_DATABASE", "fq_db")]
+        property_id = ObjectId(args.property) if args.property and ObjectId.is_valid(args.property) else args.property
+        report = await AccountBalances(db).verify(property_id=property_id, repair=args.repair)
+    finally:
+        client.close()
+
+    print(f"🔎 Checked {report['rows_checked']} balance rows: {report['mismatched']} mismatched")
+    for diff in report["differences"]:
+        print(f"   ❌ {diff['day']} {diff['account']} property={diff['property_id']} tenant={diff['tenant_id']}: "
+              f"expected {diff['expected']} got {diff['actual']}")
+    if report["repaired"]:
+        print("🔧 Mismatched rows rewritten from the ledger")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify materialized ledger balances")
+    sub = parser.add_subparsers(dest="command", required=True)
+    verify = sub.add_parser("verify", help="rebuild balances from ledger entries and diff them against the table")
+    verify.add_argument("--property", help="only this property")
+    verify.add_argument("--repair", action="store_true", help="rewrite mismatched rows")
+    asyncio.run(_verify_command(parser.parse_args()))
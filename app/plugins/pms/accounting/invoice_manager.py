@@ -10,7 +10,9 @@ from plugins.pms.models.extra import Ticket, Task, TaskStatus, TicketStatus, Tic
 from plugins.pms.models.extra import Notification, NotificationType
 from plugins.pms.models.models import Payment
 from plugins.pms.models.extra import UtilityUsageRecord
-from plugins.pms.accounting.ledger import Ledger, LEDGER_COLL, INVOICE_COLL
+from plugins.pms.accounting.ledger import Ledger, INVOICE_COLL
+from plugins.pms.utils.dirty_tenants import mark_tenants_dirty
+from plugins.pms.snapshots.invalidation import snapshots_changed
 
 
 class AsyncLeaseInvoiceManager:
@@ -635,11 +637,13 @@ class AsyncLeaseInvoiceManager:
         
         # Delete invoice, tickets, and ledger entries
         await self.db.property_invoices.delete_one({"_id": ObjectId(invoice_id)})
+        if invoice:
+            await snapshots_changed(self.db, "property_invoices", [invoice])
         await self.db.property_tickets.delete_many({
             "metadata.billing_month": billing_month,
             "tasks.metadata.invoice_id": invoice_id
         })
-        await self.db[LEDGER_COLL].delete_many({
+        await self.ledger.balances.remove_entries({
             "invoice_id": ObjectId(invoice_id)
         })
     
@@ -1044,7 +1048,7 @@ class AsyncLeaseInvoiceManager:
                 
                 result["remaining_amount"] = remaining
             
-            # Overpayment is automatically handled by ledger.sync_invoice_payment_status
+            # Overpayment is automatically handled by ledger._record_payment
             # which creates tenant credit entries in the ledger
             if result["remaining_amount"] > 0:
                 result["overpayment_credited"] = result["remaining_amount"]
@@ -1558,6 +1562,8 @@ class AsyncLeaseInvoiceManager:
             "meta": invoice.meta
         }
         await self.db.property_invoices.insert_one(invoice_dict)
+        await mark_tenants_dirty(invoice.tenant_id)
+        await snapshots_changed(self.db, "property_invoices", [invoice_dict])
     
     async def _save_ticket(self, ticket: Ticket):
         """Save ticket to database."""
@@ -1598,6 +1604,7 @@ class AsyncLeaseInvoiceManager:
         payment_dict = payment.model_dump(by_alias=True)
         payment_dict["_id"] = ObjectId(payment_dict["_id"])
         await self.db.property_payments.insert_one(payment_dict)
+        await mark_tenants_dirty(payment.tenant_id)
     
     async def get_tenant_balance(self, tenant_id: str) -> float:
         """Get tenant's outstanding balance across all invoices."""
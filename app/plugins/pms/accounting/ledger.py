@@ -1,13 +1,20 @@
+from contextlib import asynccontextmanager
 from datetime import datetime, date, timezone
 from typing import List, Tuple, Optional, Literal
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.topology_description import TopologyDescription
 
 # Import external chart of accounts helper
 from plugins.pms.accounting.chart_of_accounts import resolve_account, CHART_OF_ACCOUNTS,_priority_rank,_resolve_ar_for_category
 from plugins.pms.models.ledger_entry import (
     LedgerEntry, Invoice, InvoiceLineItem
 )
+from plugins.pms.utils.dirty_tenants import mark_tenants_dirty
+from plugins.pms.snapshots.invalidation import snapshots_changed
+from plugins.pms.accounting.balances import AccountBalances
+from plugins.pms.accounting.payment_totals import payment_totals_update
 
 LEDGER_COLL = "property_ledger_entries"
 INVOICE_COLL = "property_invoices"
@@ -16,6 +23,33 @@ INVOICE_COLL = "property_invoices"
 class Ledger:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
+        self.balances = AccountBalances(db)
+
+    # 📝 Persist entries and roll them into the running balances
+    async def _insert_entries(self, entries: List["LedgerEntry"], session=None) -> List[dict]:
+        documents = [e.model_dump(by_alias=True) for e in entries]
+        await self.db[LEDGER_COLL].insert_many(documents, session=session)
+        await self.balances.apply(documents, session=session)
+        if session is None:
+            # inside a transaction the caller invalidates after the commit
+            await snapshots_changed(self.db, LEDGER_COLL, documents)
+        return documents
+
+    # 🔒 Transactions where the deployment has them (replica set or sharded)
+    def _transactions_supported(self) -> bool:
+        description = getattr(self.db.client, "topology_description", None)
+        return isinstance(description, TopologyDescription) and \
+            description.topology_type_name in ("ReplicaSetWithPrimary", "Sharded")
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """A session with an open transaction, or ``None`` on a standalone server."""
+        if not self._transactions_supported():
+            yield None
+            return
+        async with await self.db.client.start_session() as session:
+            async with session.start_transaction():
+                yield session
 
     # ✅ Validate double-entry integrity
     @staticmethod
@@ -34,6 +68,10 @@ class Ledger:
         """
         Synchronize invoice payment status with ledger entries.
         Handles overpayment by creating tenant credit entries.
+
+        Re-aggregates the invoice's Cash debits, so it is kept for changes to
+        ``total_amount`` (issuing, line item edits). Payments update the
+        totals incrementally through ``_record_payment``.
         """
         # ------------------------------------------------------
         # 1️⃣ Compute total paid and handle overpayment
@@ -65,7 +103,7 @@ class Ledger:
                 transaction_type="tenant_credit",
                 reference=f"CR-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
             )
-            await self.db[LEDGER_COLL].insert_one(credit_entry.model_dump(by_alias=True))
+            await self._insert_entries([credit_entry])
             entries.append(credit_entry)
             print(f"💳 Overpayment {overpaid:.2f} recorded as Tenant Credit")
 
@@ -84,9 +122,71 @@ class Ledger:
                 "payment_date": payment_date
             }}
         )
+        await mark_tenants_dirty(invoice.tenant_id)
+        await snapshots_changed(self.db, INVOICE_COLL, [{"_id": invoice.id, "property_id": invoice.property_id}])
         
         return (new_status, entries)
 
+    # 💵 Record a payment against the invoice totals
+    async def _record_payment(
+        self,
+        invoice: "Invoice",
+        amount: float,
+        entries: List[LedgerEntry],
+        overpay_credited: float,
+        payment_date: datetime
+    ) -> Tuple[str, List[LedgerEntry]]:
+        """
+        Insert a payment's entries and add ``amount`` to the invoice totals
+        with one atomic pipeline update (``payment_totals_update``), in a
+        single transaction where the deployment supports one.
+
+        Unlike ``sync_invoice_payment_status`` nothing is re-aggregated from
+        the ledger. Overpayment not already credited by the allocation (the
+        invoice was partly paid before) becomes tenant credit here.
+        """
+        amount = round(amount, 2)
+        extra: List[LedgerEntry] = []
+        async with self._transaction() as session:
+            documents = await self._insert_entries(entries, session=session)
+            updated = await self.db[INVOICE_COLL].find_one_and_update(
+                {"_id": invoice.id},
+                payment_totals_update(amount, payment_date),
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if updated is None:
+                raise Exception("Invoice must exist in DB")
+
+            total_amount = updated.get("total_amount", invoice.total_amount)
+            overpaid_before = max(0.0, updated["total_paid"] - amount - total_amount)
+            uncredited = round(updated["overpaid_amount"] - overpaid_before - overpay_credited, 2)
+            if uncredited > 0:
+                extra.append(self._overpayment_credit(invoice, uncredited, payment_date))
+                documents += await self._insert_entries(extra, session=session)
+
+        if session is not None:
+            await snapshots_changed(self.db, LEDGER_COLL, documents)
+        await mark_tenants_dirty(invoice.tenant_id)
+        return (updated["status"], extra)
+
+    @staticmethod
+    def _overpayment_credit(invoice: "Invoice", amount: float, payment_date: datetime) -> LedgerEntry:
+        """Tenant credit for overpayment the payment's allocation did not book."""
+        tc = CHART_OF_ACCOUNTS["tenant_credit"]
+        return LedgerEntry.create(
+            date=payment_date,
+            account=tc["account"],
+            account_code=tc["code"],
+            credit=amount,
+            category="overpayment",
+            description=f"Overpayment credit for tenant {invoice.tenant_id}",
+            property_id=invoice.property_id,
+            tenant_id=ObjectId(invoice.tenant_id),
+            transaction_type="tenant_credit",
+            reference=f"CR-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
+        )
+
     # 🧾 Post invoice issuance
     async def post_invoice_to_ledger_old(self, invoice: "Invoice") -> List["LedgerEntry"]:
         """Post invoice to ledger with double-entry accounting."""
@@ -134,7 +234,7 @@ class Ledger:
         ))
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
 
         await self.sync_invoice_payment_status(invoice, None)
         print(f"📘 Posted {len(entries)} ledger entries for invoice {invoice.id}")
@@ -271,7 +371,7 @@ class Ledger:
         # 4️⃣ Validate and persist
         # ----------------------------------------------------------------------
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
         await self.sync_invoice_payment_status(invoice, None)
 
         print(f"📘 Posted {len(entries)} ledger entries for invoice {invoice.id}")
@@ -388,7 +488,7 @@ class Ledger:
         # 4️⃣ Validate balance and insert entries
         # ------------------------------------------------------
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
         new_status, addition_entries = await self.sync_invoice_payment_status(invoice, payment_date)
         
         entries.extend(addition_entries)
@@ -397,34 +497,22 @@ class Ledger:
     # ======================================================================
     # 💰 Post payment
     # ======================================================================
-    async def post_payment_to_ledger(
-    self,
-    invoice: "Invoice",
-    amount: float,
-    payment_date: datetime | None = None
-) -> List["LedgerEntry"]:
+    def _payment_entries(
+        self,
+        invoice: "Invoice",
+        amount: float,
+        payment_date: datetime
+    ) -> Tuple[List["LedgerEntry"], float, int]:
         """
-        Record a tenant payment and allocate intelligently across line items.
-
-        Handles:
-        - Partial and proportional payments by priority (ALLOCATION_PRIORITY)
-        - Per-category AR subaccount mapping
-        - Overpayments → Tenant Credit (Liability)
-        - Full balance validation
+        Entries for a payment against ``invoice``: the cash receipt, A/R
+        credits per line item by priority and any overpayment as tenant credit.
+        Returns (entries, overpayment credited, line items allocated to).
         """
-        if amount <= 0:
-            raise ValueError("Payment amount must be positive.")
-
-        existing = await self.db[INVOICE_COLL].find_one({"_id": invoice.id})
-        if not existing:
-            raise Exception("Invoice must exist in DB")
-
         cash = CHART_OF_ACCOUNTS["cash"]
         tenant_credit_liab = CHART_OF_ACCOUNTS["tenant_credit"]
+        reference = f"RCPT-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
 
         entries: List[LedgerEntry] = []
-        if not payment_date:
-            payment_date = datetime.now(timezone.utc)
 
         # ------------------------------------------------------
         # 1️⃣ Cash receipt (Debit)
@@ -440,32 +528,13 @@ class Ledger:
             property_id=invoice.property_id,
             tenant_id=ObjectId(invoice.tenant_id),
             transaction_type="payment_received",
-            reference=f"RCPT-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
+            reference=reference
         ))
 
         # ------------------------------------------------------
         # 2️⃣ Allocation logic (priority-based)
         # ------------------------------------------------------
         items = [i for i in invoice.line_items if not getattr(i, "is_balance_forwarded", False)]
-        if not items:
-            # No allocatable lines → entire payment = overpayment
-            entries.append(LedgerEntry.create(
-                date=payment_date,
-                account=tenant_credit_liab["account"],
-                account_code=tenant_credit_liab["code"],
-                credit=round(amount, 2),
-                category="overpayment",
-                description="Overpayment → Tenant Credit",
-                invoice_id=ObjectId(invoice.id),
-                property_id=invoice.property_id,
-                tenant_id=ObjectId(invoice.tenant_id),
-                transaction_type="overpayment_credit",
-                reference=f"RCPT-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
-            ))
-            self._validate_balance(entries)
-            await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
-            await self.sync_invoice_payment_status(invoice, payment_date)
-            return entries
 
         # Sort items by priority rank
         sorted_items = sorted(
@@ -494,6 +563,7 @@ class Ledger:
                 allocations[-1] = (allocations[-1][0], round(allocations[-1][1] - diff, 2))
             allocated_total = round(sum(v for _, v in allocations), 2)
 
+        # Left over (all of it when no line is allocatable) → overpayment
         overpay = round(amount - allocated_total, 2)
 
         # ------------------------------------------------------
@@ -517,7 +587,7 @@ class Ledger:
                 property_id=invoice.property_id,
                 tenant_id=ObjectId(invoice.tenant_id),
                 transaction_type="payment_received",
-                reference=f"RCPT-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
+                reference=reference
             ))
 
         # ------------------------------------------------------
@@ -535,20 +605,97 @@ class Ledger:
                 property_id=invoice.property_id,
                 tenant_id=ObjectId(invoice.tenant_id),
                 transaction_type="overpayment_credit",
-                reference=f"RCPT-{payment_date.strftime('%y%m%d')}-{str(invoice.id)[-4:]}"
+                reference=reference
             ))
 
+        return entries, overpay, len(allocations)
+
+    async def post_payment_to_ledger(
+    self,
+    invoice: "Invoice",
+    amount: float,
+    payment_date: datetime | None = None
+) -> List["LedgerEntry"]:
+        """
+        Record a tenant payment and allocate intelligently across line items.
+
+        Handles:
+        - Partial and proportional payments by priority (ALLOCATION_PRIORITY)
+        - Per-category AR subaccount mapping
+        - Overpayments → Tenant Credit (Liability)
+        - Full balance validation
+        """
+        if amount <= 0:
+            raise ValueError("Payment amount must be positive.")
+
+        existing = await self.db[INVOICE_COLL].find_one({"_id": invoice.id})
+        if not existing:
+            raise Exception("Invoice must exist in DB")
+
+        if not payment_date:
+            payment_date = datetime.now(timezone.utc)
+
+        entries, overpay, allocated = self._payment_entries(invoice, amount, payment_date)
+
         # ------------------------------------------------------
         # 5️⃣ Validate and persist
         # ------------------------------------------------------
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
-
-        new_status, extra = await self.sync_invoice_payment_status(invoice, payment_date)
+        new_status, extra = await self._record_payment(invoice, amount, entries, overpay, payment_date)
         entries.extend(extra)
 
-        print(f"💰 Payment {amount:.2f} applied to {len(allocations)} items (overpay {overpay:.2f}) → {new_status}")
+        print(f"💰 Payment {amount:.2f} applied to {allocated} items (overpay {overpay:.2f}) → {new_status}")
         return entries
+
+    # 💰 Post a batch of payments
+    async def post_payments_bulk(
+        self,
+        payments: List[Tuple["Invoice", float, Optional[datetime]]]
+    ) -> List[dict]:
+        """
+        Post ``(invoice, amount, payment_date)`` payments with the same
+        allocation as ``post_payment_to_ledger`` but one ``insert_many`` for
+        all their entries and one ``bulk_write`` of ``payment_totals_update``
+        pipelines for the invoices, in a single transaction where supported.
+
+        ``invoice.total_paid`` must be the invoice's stored total before the
+        batch; overpayment not credited by the allocation is worked out from
+        it payment by payment, as ``_record_payment`` does from the update.
+        Returns the inserted ledger documents.
+        """
+        entries: List[LedgerEntry] = []
+        updates = []
+        paid = {}
+        for invoice, amount, payment_date in payments:
+            if amount <= 0:
+                raise ValueError("Payment amount must be positive.")
+            amount = round(amount, 2)
+            payment_date = payment_date or datetime.now(timezone.utc)
+            payment, overpay, _ = self._payment_entries(invoice, amount, payment_date)
+            self._validate_balance(payment)
+
+            before = paid.get(invoice.id, invoice.total_paid or 0.0)
+            after = paid[invoice.id] = round(before + amount, 2)
+            uncredited = round(
+                max(0.0, after - invoice.total_amount) - max(0.0, before - invoice.total_amount) - overpay, 2
+            )
+            if uncredited > 0:
+                payment.append(self._overpayment_credit(invoice, uncredited, payment_date))
+            entries.extend(payment)
+            updates.append(UpdateOne({"_id": invoice.id}, payment_totals_update(amount, payment_date)))
+
+        if not entries:
+            return []
+
+        async with self._transaction() as session:
+            documents = await self._insert_entries(entries, session=session)
+            await self.db[INVOICE_COLL].bulk_write(updates, ordered=True, session=session)
+
+        if session is not None:
+            await snapshots_changed(self.db, LEDGER_COLL, documents)
+        await mark_tenants_dirty(*{invoice.tenant_id for invoice, _, _ in payments})
+        return documents
+
     # 💳 Apply tenant credit
     async def apply_tenant_credit(
         self,
@@ -561,12 +708,8 @@ class Ledger:
         """Apply tenant credit to reduce invoice amount."""
         entries: List[LedgerEntry] = []
 
-        pipeline = [
-            {"$match": {"tenant_id": ObjectId(tenant_id), "account": "Tenant Credit / Prepaid Rent"}},
-            {"$group": {"_id": None, "credit": {"$sum": "$credit"}, "debit": {"$sum": "$debit"}}},
-        ]
-        docs = await self.db[LEDGER_COLL].aggregate(pipeline).to_list(length=1)
-        available = (docs[0]["credit"] - docs[0]["debit"]) if docs else 0.0
+        totals = await self.balances.account_total("Tenant Credit / Prepaid Rent", tenant_id=tenant_id)
+        available = totals.credit - totals.debit
 
         if available <= 0:
             print(f"⚠️ Tenant {tenant_id} has no credit to apply.")
@@ -597,7 +740,8 @@ class Ledger:
         ])
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
+        await mark_tenants_dirty(tenant_id)
         print(f"💳 Applied {to_apply:.2f} credit for {tenant_id}. Remaining to invoice {remaining:.2f}")
         return entries, remaining
 
@@ -648,7 +792,8 @@ class Ledger:
         ]
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
+        await mark_tenants_dirty(tenant_id)
         print(f"📘 Posted {len(entries)} ledger entries for refund_deposit_with_deduction {tenant_id}")
         return entries
 
@@ -682,7 +827,7 @@ class Ledger:
         ]
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
         print(f"📘 Posted capex entries for property {property_id}")
         return entries
 
@@ -716,7 +861,7 @@ class Ledger:
         ]
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
         print(f"📘 Posted depreciation entries for property {property_id}")
         return entries
 
@@ -784,7 +929,7 @@ class Ledger:
         ))
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
 
         # Update invoice document
         line_item_dict = line_item.model_dump(by_alias=True)
@@ -906,7 +1051,7 @@ class Ledger:
         ))
 
         self._validate_balance(entries)
-        await self.db[LEDGER_COLL].insert_many([e.model_dump(by_alias=True) for e in entries])
+        await self._insert_entries(entries)
 
         # Update invoice document
         new_total = invoice_doc["total_amount"] - line_item["amount"]
@@ -944,25 +1089,8 @@ class Ledger:
 
     # 🔍 Get tenant credit balance from ledger
     async def get_tenant_credit_balance(self, tenant_id: str) -> float:
-        """Get tenant's current credit balance from ledger entries."""
+        """Get tenant's current credit balance from the running account balances."""
         tc = CHART_OF_ACCOUNTS["tenant_credit"]
-        
-        pipeline = [
-            {
-                "$match": {
-                    "tenant_id": ObjectId(tenant_id),
-                    "account": tc["account"]
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "credit": {"$sum": "$credit"},
-                    "debit": {"$sum": "$debit"}
-                }
-            }
-        ]
-        
-        docs = await self.db[LEDGER_COLL].aggregate(pipeline).to_list(length=1)
-        available = (docs[0]["credit"] - docs[0]["debit"]) if docs else 0.0
+        totals = await self.balances.account_total(tc["account"], tenant_id=tenant_id)
+        available = totals.credit - totals.debit
         return round(available, 2)
\ No newline at end of file
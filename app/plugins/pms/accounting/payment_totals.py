@@ -0,0 +1,173 @@
+"""
+Invoice payment totals kept in step with the ledger.
+
+An invoice's ``total_paid`` is the sum of the Cash debits posted against it.
+Instead of re-aggregating the ledger after every payment, ``Ledger`` adds
+the payment to the invoice in one atomic ``find_one_and_update`` whose
+pipeline also derives ``effective_paid``, ``overpaid_amount``,
+``balance_amount`` and the paid/partial status from the new total::
+
+    invoice = await invoices.find_one_and_update(
+        {"_id": invoice_id}, payment_totals_update(amount, payment_date),
+        return_document=ReturnDocument.AFTER, session=session
+    )
+
+Concurrent payments to the same invoice therefore never overwrite each
+other's totals. ``charge_totals_update`` does the same for charges added to
+an invoice after it was issued (metered utilities). ``verify`` recomputes the totals from the ledger offline and
+reports (optionally repairs) any invoice that drifted:
+
+    python -m plugins.pms.accounting.payment_totals verify [--property ID] [--repair]
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from plugins.pms.accounting.chart_of_accounts import CHART_OF_ACCOUNTS
+
+LEDGER_COLL = "property_ledger_entries"
+INVOICE_COLL = "property_invoices"
+PAYMENT_STATUSES = ("paid", "partial")
+VERIFY_BATCH = 1000
+TOLERANCE = 0.005
+
+
+def _oid(value: Any) -> Any:
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def _round2(expression: Any) -> Dict:
+    """Round a pipeline expression half up to cents."""
+    return {"$divide": [{"$floor": {"$add": [{"$multiply": [expression, 100]}, 0.5]}}, 100]}
+
+
+def payment_totals_update(amount: float, payment_date: Optional[datetime]) -> List[Dict]:
+    """Update pipeline adding ``amount`` to an invoice's payment totals and moving its status."""
+    return [
+        {"$set": {"total_paid": _round2({"$add": [{"$ifNull": ["$total_paid", 0]}, amount]})}},
+        {"$set": {
+            "effective_paid": {"$min": ["$total_paid", "$total_amount"]},
+            "overpaid_amount": _round2({"$max": [0, {"$subtract": ["$total_paid", "$total_amount"]}]}),
+            "status": {"$cond": [{"$gte": ["$total_paid", "$total_amount"]}, "paid", "partial"]},
+            "payment_date": payment_date,
+        }},
+        {"$set": {"balance_amount": _round2({"$subtract": ["$total_amount", "$effective_paid"]})}},
+    ]
+
+
+def charge_totals_update(amount: float, fields: Optional[Dict] = None) -> List[Dict]:
+    """
+    Update pipeline adding ``amount`` of new charges to an invoice's total and
+    re-deriving its balance, overpayment and (once paid or partial) status from
+    the stored ``total_paid``. ``fields`` are set in the same first stage.
+    """
+    paid = {"$ifNull": ["$total_paid", 0]}
+    return [
+        {"$set": {**(fields or {}), "total_amount": _round2({"$add": [{"$ifNull": ["$total_amount", 0]}, amount]})}},
+        {"$set": {
+            "effective_paid": {"$min": [paid, "$total_amount"]},
+            "overpaid_amount": _round2({"$max": [0, {"$subtract": [paid, "$total_amount"]}]}),
+            "status": {"$cond": [
+                {"$in": ["$status", list(PAYMENT_STATUSES)]},
+                {"$cond": [{"$gte": [paid, "$total_amount"]}, "paid", "partial"]},
+                "$status"
+            ]},
+        }},
+        {"$set": {"balance_amount": _round2({"$subtract": ["$total_amount", "$effective_paid"]})}},
+    ]
+
+
+def expected_totals(total_amount: float, total_paid: float) -> Dict:
+    """The payment fields an invoice of ``total_amount`` should carry after ``total_paid``."""
+    total_paid = round(total_paid, 2)
+    effective_paid = min(total_paid, total_amount)
+    return {
+        "total_paid": total_paid,
+        "effective_paid": effective_paid,
+        "overpaid_amount": round(max(0.0, total_paid - total_amount), 2),
+        "balance_amount": round(total_amount - effective_paid, 2),
+    }
+
+
+async def verify(db, property_id=None, repair: bool = False) -> Dict:
+    """
+    Recompute every invoice's payment totals from its Cash debits and diff
+    them against the stored ones. Invoices are read in batches of
+    ``VERIFY_BATCH`` with one ledger aggregation per batch.
+    """
+    cash = CHART_OF_ACCOUNTS["cash"]["account"]
+    query = {} if property_id is None else {"property_id": property_id}
+    projection = {"total_amount": 1, "total_paid": 1, "balance_amount": 1, "status": 1}
+    checked, differences, repairs = 0, [], []
+
+    async def check(batch: List[Dict]):
+        paid = {
+            row["_id"]: row["total"] for row in await db[LEDGER_COLL].aggregate([
+                {"$match": {"invoice_id": {"$in": [_oid(inv["_id"]) for inv in batch]}, "account": cash}},
+                {"$group": {"_id": "$invoice_id", "total": {"$sum": "$debit"}}}
+            ]).to_list(None)
+        }
+        for inv in batch:
+            total_amount = float(inv.get("total_amount") or 0)
+            want = expected_totals(total_amount, paid.get(_oid(inv["_id"]), 0.0))
+            have = {"total_paid": inv.get("total_paid") or 0.0, "balance_amount": inv.get("balance_amount") or 0.0}
+            drift = any(abs(want[k] - have[k]) > TOLERANCE for k in have)
+            status = inv.get("status")
+            want_status = "paid" if want["total_paid"] >= total_amount else "partial"
+            if status in PAYMENT_STATUSES and status != want_status:
+                drift = True
+                want = {**want, "status": want_status}
+            if drift:
+                differences.append({"invoice_id": str(inv["_id"]), "expected": want, "actual": {**have, "status": status}})
+                repairs.append(UpdateOne({"_id": inv["_id"]}, {"$set": want}))
+
+    batch = []
+    async for invoice in db[INVOICE_COLL].find(query, projection):
+        batch.append(invoice)
+        checked += 1
+        if len(batch) >= VERIFY_BATCH:
+            await check(batch)
+            batch = []
+    if batch:
+        await check(batch)
+
+    if repair and repairs:
+        await db[INVOICE_COLL].bulk_write(repairs, ordered=False)
+
+    return {
+        "invoices_checked": checked,
+        "mismatched": len(differences),
+        "repaired": bool(repair and repairs),
+        "differences": differences[:100],
+    }
+
+
+async def _verify_command(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI", "mongodb://mongo:27017/fileq"))
+    try:
+        db = client[os.getenv("MONGO_DATABASE", "fq_db")]
+        report = await verify(db, property_id=args.property, repair=args.repair)
+    finally:
+        client.close()
+
+    print(f"🔎 Checked {report['invoices_checked']} invoices: {report['mismatched']} mismatched")
+    for diff in report["differences"]:
+        print(f"   ❌ invoice {diff['invoice_id']}: expected {diff['expected']} got {diff['actual']}")
+    if report["repaired"]:
+        print("🔧 Mismatched invoices rewritten from the ledger")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify invoice payment totals against the ledger")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("verify", help="recompute invoice totals from Cash debits and diff them")
+    check.add_argument("--property", help="only this property")
+    check.add_argument("--repair", action="store_true", help="rewrite mismatched invoices")
+    asyncio.run(_verify_command(parser.parse_args()))
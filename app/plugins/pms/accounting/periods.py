@@ -0,0 +1,201 @@
+"""
+Accounting period close for the PMS ledger.
+
+Closing a month freezes, per property, the cumulative totals of every
+account as of the month's last day into ``ledger_periods``::
+
+    {property_id, period: "2025-03", period_start, period_end,
+     status: "closing" | "closed" | "reopened", closed_at,
+     accounts: [{account, debit, credit, entries, excluded_*}]}
+
+Reports start from the nearest closed period and only read the balance rows
+after it (``LedgerPeriods.series``, ``account_totals``), so their cost
+follows recent activity instead of lease age.
+
+A posting dated inside a closed month reopens that month and every later one
+(``AccountBalances.apply``); ``close_due_periods`` closes them again, oldest
+first, together with any month that has not been closed yet.
+"""
+from calendar import monthrange
+from dataclasses import asdict, fields
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from plugins.pms.accounting.balances import (
+    BALANCES_COLL,
+    LEDGER_PERIODS_COLL,
+    AccountActivity,
+    AccountBalances,
+    AccountSeries,
+    as_day,
+)
+
+
+def _midnight(value) -> datetime:
+    day = as_day(value)
+    return datetime(day.year, day.month, day.day)
+
+
+def month_bounds(period: str):
+    """First and last day (as midnight datetimes) of a ``YYYY-MM`` period."""
+    year, month = map(int, period.split("-"))
+    return datetime(year, month, 1), datetime(year, month, monthrange(year, month)[1])
+
+
+def next_period(period: str) -> str:
+    _, end = month_bounds(period)
+    return (end + timedelta(days=1)).strftime("%Y-%m")
+
+
+def _totals(period_doc: Dict) -> Dict[str, AccountActivity]:
+    return {row["account"]: AccountActivity.from_doc(row) for row in period_doc.get("accounts", [])}
+
+
+class LedgerPeriods:
+    """Closes monthly ledger periods and serves reports from them."""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db[LEDGER_PERIODS_COLL]
+        self.balances = AccountBalances(db)
+
+    async def _latest_closed(self, property_id, before) -> Optional[Dict]:
+        """Most recent closed period ending before ``before``."""
+        return await self.collection.find_one(
+            {"property_id": property_id, "status": "closed", "period_end": {"$lt": _midnight(before)}},
+            sort=[("period_end", -1)]
+        )
+
+    async def _row_totals(self, property_id, after=None, up_to=None) -> Dict[str, AccountActivity]:
+        match: Dict[str, Any] = {"property_id": property_id}
+        if after is not None or up_to is not None:
+            match["day"] = {}
+            if after is not None:
+                match["day"]["$gt"] = _midnight(after)
+            if up_to is not None:
+                match["day"]["$lte"] = _midnight(up_to)
+        docs = await self.db[BALANCES_COLL].aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$account", **{f.name: {"$sum": f"${f.name}"} for f in fields(AccountActivity)}}}
+        ]).to_list(length=None)
+        return {doc["_id"]: AccountActivity.from_doc(doc) for doc in docs}
+
+    async def close_period(self, property_id, period: str, closed_by: Optional[str] = None) -> Dict:
+        """
+        Freeze the cumulative account totals of ``property_id`` as of the end of
+        ``period`` (``YYYY-MM``): the previous closed period plus the rows after it.
+        """
+        period_start, period_end = month_bounds(period)
+        key = {"property_id": property_id, "period": period}
+        # Mark first: a posting landing while we add up flips this to "reopened"
+        await self.collection.update_one(
+            key,
+            {"$set": {"status": "closing", "period_start": period_start, "period_end": period_end}},
+            upsert=True
+        )
+
+        previous = await self._latest_closed(property_id, before=period_start)
+        totals = _totals(previous) if previous else {}
+        tail = await self._row_totals(property_id, after=previous["period_end"] if previous else None, up_to=period_end)
+        for account, activity in tail.items():
+            totals.setdefault(account, AccountActivity()).add(activity)
+
+        closed = {
+            "status": "closed",
+            "closed_at": datetime.utcnow(),
+            "closed_by": closed_by,
+            "accounts": [{"account": account, **asdict(activity)} for account, activity in totals.items()]
+        }
+        result = await self.collection.update_one({**key, "status": "closing"}, {"$set": closed})
+        if not result.matched_count:
+            print(f"⚠️ Period {period} for {property_id} reopened while closing; left for the next run")
+            return {**key, "status": "reopened"}
+        return {**key, "period_start": period_start, "period_end": period_end, **closed}
+
+    async def close_due_periods(self, today: Optional[date] = None, closed_by: Optional[str] = None) -> Dict[str, int]:
+        """
+        Close every month before the current one that is not closed yet, and
+        re-close reopened ones, for every property with ledger activity.
+        """
+        today = as_day(today or datetime.utcnow())
+        last_period = (date(today.year, today.month, 1) - timedelta(days=1)).strftime("%Y-%m")
+        stats = {"properties": 0, "closed": 0}
+
+        for property_id in await self.db[BALANCES_COLL].distinct("property_id"):
+            periods = await self.collection.find(
+                {"property_id": property_id}, {"period": 1, "status": 1}
+            ).sort("period_end", 1).to_list(length=None)
+
+            first_open = next((p["period"] for p in periods if p["status"] != "closed"), None)
+            if first_open:
+                period = first_open
+            elif periods:
+                period = next_period(periods[-1]["period"])
+            else:
+                first_row = await self.db[BALANCES_COLL].find_one(
+                    {"property_id": property_id}, {"day": 1}, sort=[("day", 1)]
+                )
+                period = first_row["day"].strftime("%Y-%m")
+
+            stats["properties"] += 1
+            while period <= last_period:
+                await self.close_period(property_id, period, closed_by=closed_by)
+                stats["closed"] += 1
+                period = next_period(period)
+        return stats
+
+    async def series(self, property_id=None, since=None, up_to=None) -> AccountSeries:
+        """
+        ``AccountSeries`` for a property, starting from the closed period just
+        before ``since`` (the earliest day the reports will look at).
+        """
+        previous = await self._latest_closed(property_id, before=since) if property_id is not None and since else None
+        if not previous:
+            return await self.balances.series(property_id=property_id, up_to=up_to)
+        return await self.balances.series(
+            property_id=property_id,
+            up_to=up_to,
+            after=previous["period_end"],
+            opening=_totals(previous)
+        )
+
+    async def account_totals(
+        self,
+        account: str,
+        property_ids: Optional[List] = None,
+        start=None,
+        end=None
+    ) -> Dict[Any, AccountActivity]:
+        """
+        Per-property totals of one account for the days ``start`` to ``end``;
+        all-time totals (nearest closed period plus the open tail) without them.
+        """
+        match: Dict[str, Any] = {"account": account}
+        if property_ids:
+            match["property_id"] = {"$in": property_ids}
+        totals: Dict[Any, AccountActivity] = {}
+
+        if start and end:
+            match["day"] = {"$gte": _midnight(start), "$lte": _midnight(end)}
+        else:
+            closed = await self.collection.aggregate([
+                {"$match": {"status": "closed", **({"property_id": {"$in": property_ids}} if property_ids else {})}},
+                {"$sort": {"period_end": -1}},
+                {"$group": {"_id": "$property_id", "period_end": {"$first": "$period_end"}, "accounts": {"$first": "$accounts"}}}
+            ]).to_list(length=None)
+            for doc in closed:
+                row = next((row for row in doc["accounts"] if row["account"] == account), None)
+                if row:
+                    totals[doc["_id"]] = AccountActivity.from_doc(row)
+            if closed:
+                match["$or"] = [
+                    {"property_id": doc["_id"], "day": {"$gt": doc["period_end"]}} for doc in closed
+                ] + [{"property_id": {"$nin": [doc["_id"] for doc in closed]}}]
+
+        docs = await self.db[BALANCES_COLL].aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$property_id", **{f.name: {"$sum": f"${f.name}"} for f in fields(AccountActivity)}}}
+        ]).to_list(length=None)
+        for doc in docs:
+            totals.setdefault(doc["_id"], AccountActivity()).add(AccountActivity.from_doc(doc))
+        return totals
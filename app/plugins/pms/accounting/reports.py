@@ -2,26 +2,96 @@ from calendar import monthrange
 from datetime import datetime,date,timedelta
 from typing import List,Dict,Optional
 from plugins.pms.accounting.chart_of_accounts import resolve_account, CHART_OF_ACCOUNTS
+from plugins.pms.accounting.balances import AccountSeries
+from plugins.pms.accounting.periods import LedgerPeriods
 from plugins.pms.models.ledger_entry import(
     LedgerEntry
 )
+from plugins.pms.accounting.columnar import ColumnarSeries
 from collections import defaultdict
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def _chart_match(account: str, account_type: str) -> Optional[str]:
+    """Chart account of the given type whose name appears in ``account`` (first in chart order)."""
+    return next(
+        (v["account"] for v in CHART_OF_ACCOUNTS.values()
+         if v.get("type") == account_type and v["account"] in account),
+        None
+    )
 
 def account_balance(entries: List[LedgerEntry], up_to: date) -> Dict[str, float]:
     """Aggregate account balances up to a specific date."""
-    bal = {}
-    for e in entries:
-        if e.date <= up_to:
-            bal[e.account] = bal.get(e.account, 0.0) + (e.debit - e.credit)
-    return bal
+    return AccountSeries.from_entries(entries).balances(up_to)
 
 class ReportGenerator:
-    def __init__(self, entries: List[LedgerEntry], property_units: int, vacant_units: int, loan_payment: float = 0.0):
+    """
+    Ledger reports over an ``AccountSeries`` (per-account daily prefix sums).
+
+    Built from a list of entries, with ``columnar``/``from_ledger`` over NumPy
+    columns (accounting/columnar.py), or with ``from_balances`` straight from the
+    materialized ``property_account_balances`` rows. Periods are whole days.
+    """
+    def __init__(
+        self,
+        entries: List[LedgerEntry],
+        property_units: int,
+        vacant_units: int,
+        loan_payment: float = 0.0,
+        series: Optional[AccountSeries] = None
+    ):
         self.entries = entries
+        self.series = series if series is not None else AccountSeries.from_entries(entries)
         self.total_units = property_units
         self.vacant_units = vacant_units
         self.loan_payment = loan_payment
 
+    @classmethod
+    async def from_balances(
+        cls,
+        db,
+        property_units: int,
+        vacant_units: int,
+        loan_payment: float = 0.0,
+        property_id=None,
+        up_to: Optional[date] = None,
+        since: Optional[date] = None
+    ) -> "ReportGenerator":
+        """
+        Report on the running balances instead of loading ledger entries.
+
+        With ``since`` (the earliest day the reports will ask about, e.g. Jan 1
+        for a balance sheet's YTD income) a property's series starts from the
+        closed period just before it and only the open tail is read.
+        """
+        series = await LedgerPeriods(db).series(property_id=property_id, since=since, up_to=up_to)
+        return cls([], property_units, vacant_units, loan_payment, series=series)
+
+    @classmethod
+    def columnar(
+        cls,
+        entries: List[LedgerEntry],
+        property_units: int,
+        vacant_units: int,
+        loan_payment: float = 0.0
+    ) -> "ReportGenerator":
+        """Same reports, computed as masked NumPy reductions over the entries."""
+        return cls(entries, property_units, vacant_units, loan_payment, series=ColumnarSeries.from_entries(entries))
+
+    @classmethod
+    async def from_ledger(
+        cls,
+        db,
+        property_units: int,
+        vacant_units: int,
+        loan_payment: float = 0.0,
+        property_id=None,
+        up_to: Optional[date] = None
+    ) -> "ReportGenerator":
+        """Columnar reports loaded straight from ledger documents, without building models."""
+        series = await ColumnarSeries.load(db, property_id=property_id, up_to=up_to)
+        return cls([], property_units, vacant_units, loan_payment, series=series)
+
     def _filter(self, start: date, end: date) -> List[LedgerEntry]:
         return [e for e in self.entries if start <= e.date <= end]
 
@@ -44,8 +114,8 @@ class ReportGenerator:
         Generate a grouped, chart-aware Income Statement.
         Includes subtotals by 'group' and full category breakdown.
         """
-        entries = self._filter(start, end)
-        if not entries:
+        activity = self.series.activity(start, end)
+        if not activity:
             return {
                 "Income": {},
                 "Expenses": {},
@@ -54,30 +124,19 @@ class ReportGenerator:
                         "Interest": 0.0, "Net Income": 0.0}
             }
 
-        # --- Chart lookups ---
+        # --- Chart lookups (account -> chart match is cached in _chart_match) ---
         income_chart = {v["account"]: v for v in CHART_OF_ACCOUNTS.values() if v.get("type") == "Income"}
         expense_chart = {v["account"]: v for v in CHART_OF_ACCOUNTS.values() if v.get("type") == "Expense"}
 
         income_groups = defaultdict(lambda: defaultdict(float))
         expense_groups = defaultdict(lambda: defaultdict(float))
 
-        # --- Helpers ---
-        def is_revenue(e: LedgerEntry) -> bool:
-            desc = (e.description or "").lower()
-            return (
-                "income" in e.account.lower()
-                and not any(x in desc for x in ("balance", "forward", "deposit", "credit"))
-            )
-
-        def is_expense(e: LedgerEntry) -> bool:
-            return "expense" in e.account.lower()
-
-        # --- Income aggregation ---
-        for e in entries:
-            if not is_revenue(e):
+        # --- Income aggregation (entries flagged by is_excluded_revenue are left out) ---
+        for account, totals in activity.items():
+            if "income" not in account.lower() or not totals.has_revenue:
                 continue
-            amount = e.credit - e.debit
-            matched = next((acct for acct in income_chart if acct in e.account), None)
+            amount = totals.revenue
+            matched = _chart_match(account, "Income")
             if not matched:
                 income_groups["Other Income"]["Uncategorized Income"] += amount
                 continue
@@ -87,11 +146,11 @@ class ReportGenerator:
             income_groups[group][matched] += amount
 
         # --- Expense aggregation ---
-        for e in entries:
-            if not is_expense(e):
+        for account, totals in activity.items():
+            if "expense" not in account.lower():
                 continue
-            amount = e.debit - e.credit
-            matched = next((acct for acct in expense_chart if acct in e.account), None)
+            amount = totals.net
+            matched = _chart_match(account, "Expense")
             if not matched:
                 expense_groups["Other Expense"]["Uncategorized Expense"] += amount
                 continue
@@ -105,8 +164,8 @@ class ReportGenerator:
         expense_group_totals = {g: sum(v.values()) for g, v in expense_groups.items()}
 
         # --- Depreciation / Interest ---
-        depreciation = sum(e.debit - e.credit for e in entries if e.account == "Depreciation Expense")
-        interest = sum(e.debit - e.credit for e in entries if e.account == "Loan Interest Expense")
+        depreciation = activity["Depreciation Expense"].net if "Depreciation Expense" in activity else 0.0
+        interest = activity["Loan Interest Expense"].net if "Loan Interest Expense" in activity else 0.0
 
         # --- Totals ---
         total_income = sum(income_group_totals.values())
@@ -137,15 +196,15 @@ class ReportGenerator:
     
 
     def cash_flow_indirect(self, start: date, end: date, opening_cash: Optional[float] = None) -> Dict:
-        bal_start = account_balance(self.entries, up_to=(start - timedelta(days=1)))
-        bal_end = account_balance(self.entries, up_to=end)
+        bal_start = self.series.balances(start - timedelta(days=1))
+        bal_end = self.series.balances(end)
         is_stmt = self.income_statement(start, end)
-        net_income = is_stmt["Net Income"]
+        net_income = is_stmt["Totals"]["Net Income"] if "Totals" in is_stmt else is_stmt.get("Net Income", 0.0)
         chg_ar = bal_end.get("Accounts Receivable", 0.0) - bal_start.get("Accounts Receivable", 0.0)
         chg_ap = bal_end.get("Accounts Payable", 0.0) - bal_start.get("Accounts Payable", 0.0)
-        depreciation = is_stmt["Depreciation"]
+        depreciation = is_stmt["Totals"]["Depreciation"] if "Totals" in is_stmt else is_stmt.get("Depreciation", 0.0)
         cfo = net_income + depreciation - chg_ar + chg_ap
-        capex_out = sum(e.debit for e in self._filter(start, end) if e.account in ("Property", "Equipment"))
+        capex_out = sum(t.debit for a, t in self.series.activity(start, end).items() if a in ("Property", "Equipment"))
         cfi = -capex_out
         chg_deposits = bal_end.get("Security Deposit Liability", 0.0) - bal_start.get("Security Deposit Liability", 0.0)
         chg_loans = bal_end.get("Loan Payable", 0.0) - bal_start.get("Loan Payable", 0.0)
@@ -173,7 +232,7 @@ class ReportGenerator:
         Automatically computes retained earnings and validates total balance.
         """
         # --- 1️⃣ Calculate balances up to date
-        bal = account_balance(self.entries, up_to=as_of)
+        bal = self.series.balances(as_of)
 
         # --- 2️⃣ Compute YTD Net Income from Income Statement
         start_year = date(as_of.year, 1, 1)
@@ -300,7 +359,7 @@ class ReportGenerator:
         debt_yield = (noi / loan_payment * 100.0) if loan_payment else 0.0
 
         # ---------- Capital Expenditure ----------
-        capex_out = sum(e.debit for e in self._filter(start, end) if e.account in ("Property", "Equipment"))
+        capex_out = sum(t.debit for a, t in self.series.activity(start, end).items() if a in ("Property", "Equipment"))
         capex_ratio = (capex_out / egi * 100.0) if egi else 0.0
 
         # ---------- Profitability & Return Metrics ----------
@@ -313,7 +372,7 @@ class ReportGenerator:
         cash_yield = (cfo / owner_equity * 100.0) if owner_equity else 0.0
 
         # ---------- Expense Efficiency ----------
-        repairs = sum(e.debit for e in self._filter(start, end) if "Repairs" in e.account)
+        repairs = sum(t.debit for a, t in self.series.activity(start, end).items() if "Repairs" in a)
         repairs_ratio = (repairs / op_exp * 100.0) if op_exp else 0.0
 
         # ---------- Reserve Adequacy ----------
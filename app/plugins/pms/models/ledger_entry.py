@@ -63,6 +63,7 @@ class LedgerEntry(MongoModel):
             "invoice_issue",
             "payment_received",
             "tenant_credit",
+            "overpayment_credit",
             "credit_applied",
             "deposit_issue",
             "deposit_received",
@@ -2,19 +2,21 @@ from fastapi import (
     APIRouter, HTTPException, Request, Body, Depends,
     BackgroundTasks, Query, FastAPI
 )
+import io
 import os,asyncio
 import math
-from fastapi.responses import FileResponse, JSONResponse,HTMLResponse
+import time
+from fastapi.responses import FileResponse, JSONResponse,HTMLResponse,StreamingResponse
 from fastapi.templating import Jinja2Templates
-from bson import Regex
 from datetime import datetime, timezone,timedelta,date
 from typing import List, Optional, Dict,Any
 from pydantic import BaseModel, Field
 from bson import ObjectId
 from core.MongoORJSONResponse import normalize_bson
 from fastapi.responses import ORJSONResponse
-from routes.auth import get_current_user, SessionInfo
-from plugins.pms.services.pdf_service import generate_pdf
+from routes.auth import checker, get_current_user, SessionInfo
+from plugins.pms.services.pdf_service import INVOICE_BUCKET, generate_pdf, render_month_invoices
+from plugins.pms.services.meter_ocr import get_meter_ocr_service
 from plugins.pms.helpers import recalc_invoice,find_utility,serialize_doc
 from plugins.pms.models.models import (
     PropertyInDB,PropertyResponse,LeaseCreate,LeaseInDB, Tenant, Unit,
@@ -31,15 +33,28 @@ from plugins.pms.models.models import (
    
 PropertyDetailResponse,UnitUpdate,UnitResponse,PropertyUpdate
 )
-from plugins.pms.utils.invoice_manager import Ticket,TicketPriority,TicketCategory
+from plugins.pms.utils.invoice_manager import Ticket,TicketPriority,TicketCategory,AsyncLeaseInvoiceManager
+from plugins.pms.utils.billing_runs import BillingRunCoordinator, DEFAULT_SHARD_SIZE
+from plugins.pms.utils.loaders import PropertyLoader, page_bounds, page_meta
+from plugins.pms.utils.meter_readings import parse_readings_csv
+from plugins.pms.utils.search_index import get_search_index
+from plugins.pms.tasks.billing_tasks import bill_billing_shard
+from plugins.pms.tasks.reconciliation_tasks import reconcile_statement
+from plugins.pms.utils.statement_reconciliation import STATEMENT_BUCKET, StatementReconciler, parse_statement
 from plugins.pms.utils.tenant_snapshot import TenantSnapshotManager
 from statistics import mean
 from math import ceil
 from plugins.pms.utils.prorate import prorated_rent_charges
 from plugins.pms.property_helper import get_property_detail
+from plugins.pms.reports.rent_roll_n_tax import RentRollAndTaxesReportGenerator, RENT_ROLL_COLUMNS, TAX_COLUMNS
+from plugins.pms.reports.export_stream import MEDIA_TYPES as REPORT_MEDIA_TYPES, stream_report, upload_report
 from plugins.pms.snapshots.property import PropertySnapshotService
 from plugins.pms.snapshots.finance_properties import FinancialSnapshotService
+from plugins.pms.snapshots.invalidation import get_invalidation_bus, snapshots_changed
 from utils.date_helper import parse_period_query
+from utils.pagination import (
+    NDJSON_MEDIA_TYPE, export_cursor, keyset_sort, page_of, paginate, stream_ndjson, with_keyset
+)
 
 templates = Jinja2Templates(directory="plugins/pms/templates")
 router = APIRouter(prefix="/property", tags=["Property Management"])
@@ -93,99 +108,67 @@ from fastapi import FastAPI, UploadFile, Form
 async def read_meter_with_ocr(
     file: UploadFile,
     reference: str = Form(...),
-    confidence_threshold: float = Form(0.5)
+    confidence_threshold: float = Form(0.5),
+    include_timings: bool = Form(False)
 ):
-    
-    import numpy as np
-    import cv2
-    import base64
-    from ultralytics import YOLO
-    from PIL import Image, ImageDraw
-    def add_round_border(image, border_color=(232, 232, 232), border_radius=30, border_width=3):
-        image = image.convert("RGBA")
-        mask = Image.new("L", image.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.rounded_rectangle([0, 0, image.size[0], image.size[1]], radius=border_radius, fill=255)
-        mask_in = Image.new("L", image.size, 0)
-        draw = ImageDraw.Draw(mask_in)
-        draw.rounded_rectangle(
-            [border_width, border_width, image.size[0]-border_width, image.size[1]-border_width],
-            radius=max(border_radius-border_width, 0), fill=255
-        )
-        border_image = Image.new("RGBA", image.size, color=border_color)
-        new_image = Image.new("RGBA", image.size, color=(220, 220, 65))
-        new_image.paste(border_image, mask=mask)
-        new_image.paste(image, mask=mask_in)
-        return new_image
-    
     try:
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        MODEL_PATH = os.path.join(BASE_DIR, "ai", "model.pt")
-        model = YOLO(MODEL_PATH)
-        print("✅ Model loaded:", model.names)
+        result = await get_meter_ocr_service().read(await file.read())
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
 
-        digit_labels = [str(i) for i in range(10)]
-        CONF_THRESH = 0.4
-        
-        image_bytes = await file.read()
-        npimg = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-        if img is None:
-            return JSONResponse({"error": "Invalid image"}, status_code=400)
-
-        # Resize for model
-        img = cv2.resize(img, (720, 525))
-
-        # Predict digits
-        results = model.predict(img, conf=CONF_THRESH, verbose=False)[0]
-        detections = []
-
-        for x1, y1, x2, y2, score, cls in results.boxes.data.tolist():
-            w = x2 - x1
-            if score >= CONF_THRESH and w > 10:
-                detections.append({
-                    "bbox": [int(x1), int(y1), int(x2), int(y2)],
-                    "class_id": int(cls),
-                    "score": float(score)
-                })
+    if not include_timings:
+        result.pop("timings", None)
 
-        if not detections:
-            return JSONResponse({"reading": "", "message": "No digits detected."})
-
-        # Sort digits left→right
-        detections.sort(key=lambda d: d["bbox"][0])
-
-        # Build reading string + average confidence
-        reading = "".join(digit_labels[d["class_id"]] for d in detections)
-        avg_conf = sum(d["score"] for d in detections) / len(detections)
-
-        # Draw boxes for debugging / optional visualization
-        annotated = img.copy()
-        for det in detections:
-            x1, y1, x2, y2 = det["bbox"]
-            label = digit_labels[det["class_id"]]
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 2)
-            cv2.putText(annotated, label, (x1, y1 - 5),
-                        cv2.FONT_HERSHEY_DUPLEX, 0.8, (0, 0, 255), 1)
-
-        # Convert annotated frame to base64 (optional)
-        annotated_pil = Image.fromarray(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB))
-        annotated_pil = add_round_border(annotated_pil)
-        annotated_pil = annotated_pil.convert("RGB")
-        buf = io.BytesIO()
-        annotated_pil.save(buf, format="JPEG")
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-        # Build response
-        return JSONResponse({
-            "reading": reading,
-            "confidence_avg": round(avg_conf, 3),
-            "detections": detections,
-            "annotated_base64": encoded_image
-        })
+    if result.get("error"):
+        return JSONResponse(result, status_code=400)
+    return JSONResponse(result)
+
+
+@router.post("/utility/ocr/reader/bulk")
+async def read_meters_with_ocr_bulk(
+    request: Request,
+    files: List[UploadFile],
+    property_id: str = Form(...),
+    references: List[str] = Form(...),
+    annotate: bool = Form(False),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """
+    Read a property's whole meter round in one request. ``references[i]``
+    names the meter in ``files[i]``; the photos are micro-batched together
+    by the OCR service. Returns per-meter readings and per-stage timings.
+    """
+    if len(files) != len(references):
+        raise HTTPException(status_code=400, detail="Provide one reference per file")
+    await authorize_property(request.app.state.adb, [property_id], user.user_id)
 
+    started = time.perf_counter()
+    images = await asyncio.gather(*(f.read() for f in files))
+    try:
+        results = await get_meter_ocr_service().read_many(list(images), annotate=annotate)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
+
+    stages: Dict[str, List[float]] = {}
+    for reference, result in zip(references, results):
+        result["reference"] = reference
+        for stage, ms in result.get("timings", {}).items():
+            stages.setdefault(stage, []).append(ms)
+
+    return JSONResponse({
+        "property_id": property_id,
+        "count": len(results),
+        "read": sum(1 for r in results if r.get("reading")),
+        "failed": sum(1 for r in results if r.get("error")),
+        "results": results,
+        "timings": {
+            "wall_ms": round((time.perf_counter() - started) * 1000, 2),
+            "avg_ms": {stage: round(mean(values), 2) for stage, values in stages.items()},
+            "max_ms": {stage: round(max(values), 2) for stage, values in stages.items()},
+        }
+    })
+
+
 @router.get("/properties/snapshot")
 async def get_user_property_snapshot(
     request: Request,
@@ -478,7 +461,9 @@ async def add_unit_to_property(request: Request, property_id: str, unit_new: Uni
         created_at=datetime.now(timezone.utc),
     )
 
-    await db["units"].insert_one(unit.model_dump(by_alias=True))
+    unit_doc = unit.model_dump(by_alias=True)
+    await db["units"].insert_one(unit_doc)
+    await snapshots_changed(db, "units", [unit_doc])
 
     # Update property "updated_at"
     await db["properties"].update_one(
@@ -542,6 +527,8 @@ async def update_unit_of_property(request: Request, unit_id: str, up: UnitUpdate
     )
     print(f"{result.modified_count } and {result.matched_count}")
     unit = await db["units"].find_one({"_id": ObjectId(unit_id)})
+    if unit:
+        await snapshots_changed(db, "units", [unit])
     
     
     unit["_id"]=str(unit["_id"])
@@ -738,6 +725,7 @@ async def sign_contract(request: Request, contract_id: str, data: ContractSignRe
             {"_id": contract["property_id"]},
             {"$set": {"landlord_signature": signature,"landlord_signature_metadata":signature_metadata}}
         )
+        await snapshots_changed(db, "properties", ids=[contract["property_id"]])
 
     else:
         raise HTTPException(400, "Invalid role")
@@ -824,7 +812,9 @@ async def create_property(request: Request, data: PropertyCreate,
         prop.units_total= len(generated_units)
         prop.units_occupied = 0
         prop.occupancy_rate=0.0
-    await db["properties"].insert_one(prop.model_dump(by_alias=True))
+    prop_doc = prop.model_dump(by_alias=True)
+    await db["properties"].insert_one(prop_doc)
+    await snapshots_changed(db, "properties", [prop_doc])
     
     return prop
 @router.patch("/{property_id}", response_model=PropertyResponse)
@@ -857,35 +847,39 @@ async def update_property(
     return property_doc
     
 @router.get("/", response_model=PropertyListResponse)
-async def list_properties(request: Request, user: SessionInfo = Depends(get_current_user)):
+async def list_properties(
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    user: SessionInfo = Depends(get_current_user)
+):
     """
     List all properties owned by the current user, including unit summaries
     (units, tenants, utilities, occupancy metrics).
     """
     db = request.app.state.adb
+    query = {"owner_id": user.user_id}
+    skip, limit = page_bounds(page, limit)
 
-    # Fetch all properties for this owner
-    props = await db["properties"].find({"owner_id": user.user_id}).to_list(None)
+    # One page of properties, then their units and tenants in one query each
+    total, props = await asyncio.gather(
+        db["properties"].count_documents(query),
+        db["properties"].find(query).sort("_id", 1).skip(skip).limit(limit).to_list(None)
+    )
     if not props:
         return PropertyListResponse(
-            total=0,
-            page=1,
-            limit=10,
+            total=total,
+            page=page,
+            limit=limit,
             properties=[]
         )
 
-    async def enrich_property(p):
-        # Fetch all units for this property
-        units = await db["units"].find({"propertyId": str(p["_id"])}).to_list(None)
-        # enriched_units = []
+    units_by_property = await PropertyLoader(db).units_by_property(str(p["_id"]) for p in props)
+
+    for p in props:
+        units = units_by_property.get(str(p["_id"]), [])
         for u in units:
-            tenant_name = None
-            if u.get("tenant_id"):
-                tenant = await db["property_tenants"].find_one({"_id": u["tenant_id"]}, {"full_name": 1})
-                tenant_name = tenant["full_name"] if tenant else None
-            u["tenant_name"]=tenant_name
-            u["_id"]=str(u["_id"])
-        #     enriched_units.append(UnitListItem(**u).model_dump(by_alias=True))
+            u["_id"] = str(u["_id"])
 
         total_units = len(units)
         occupied_units = sum(1 for u in units if u.get("occupied"))
@@ -895,21 +889,16 @@ async def list_properties(request: Request, user: SessionInfo = Depends(get_curr
         p["unitsTotal"] = total_units  # Changed from units_total
         p["unitsOccupied"] = occupied_units  # Changed from units_occupied
         p["occupancyRate"] = occupancy_rate  # Changed from occupancy_rate
-        # p["units"] = enriched_units
         p["createdAt"] = p.get("createdAt") or p.get("created_at")  # Handle both cases
         p["updatedAt"] = p.get("updatedAt") or p.get("updated_at")  # Handle both cases
-        
-        return p
-
-    results = await asyncio.gather(*(enrich_property(p) for p in props))
 
     return {
-        "total": len(results),
-        "page": 1,
-        "limit": len(results),
+        "total": total,
+        "page": page,
+        "limit": limit,
         "properties": [
             PropertyResponse(**prop).model_dump(by_alias=True) 
-            for prop in results
+            for prop in props
         ]
     }
 
@@ -927,8 +916,14 @@ async def get_property_summary(
             
 
 @router.get("/{property_id}/units")
-async def list_property_units(request: Request, property_id: str, user: SessionInfo = Depends(get_current_user)):
-    """List all units under a given property."""
+async def list_property_units(
+    request: Request,
+    property_id: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """List the units under a given property, a page at a time."""
     db = request.app.state.adb
 
     # Ensure property belongs to user
@@ -936,19 +931,21 @@ async def list_property_units(request: Request, property_id: str, user: SessionI
     if not prop:
         raise HTTPException(404, "Property not found or unauthorized")
 
-    # Fetch all units
-    units = await db["units"].find({"property_id": property_id}).to_list(None)
+    skip, limit = page_bounds(page, limit)
+    query = {"property_id": property_id}
+    total, units = await asyncio.gather(
+        db["units"].count_documents(query),
+        db["units"].find(query).sort("_id", 1).skip(skip).limit(limit).to_list(None)
+    )
 
-    # Attach tenant info for occupied units
-    for u in units:
-        if u.get("tenant_id"):
-            tenant = await db["property_tenants"].find_one({"_id": u["tenant_id"]}, {"full_name": 1})
-            u["tenant_name"] = tenant["full_name"] if tenant else None
+    # Attach tenant info for occupied units (one query for the page)
+    await PropertyLoader(db).attach_tenant_names(units)
 
     return {
         "property_id": property_id,
         "property_name": prop["name"],
-        "units": units
+        "units": units,
+        "pagination": page_meta(page, limit, total)
     }
 
 @router.post("/tenant/add", response_model=Tenant)
@@ -993,6 +990,75 @@ async def update_water_meter(request: Request, unit_id: str, payload: MeterUpdat
     )
     return {"message": f"Meter updated for {unit['name']}", "reading": payload.current_reading}
 
+
+@router.post("/properties/{property_id}/utility/readings/bulk")
+async def bulk_utility_readings(
+    request: Request,
+    property_id: str,
+    billing_month: Optional[str] = Query(None, description="Format: YYYY-MM; defaults to every open ticket"),
+    dry_run: bool = Query(False, description="Validate and price only"),
+    strict: bool = Query(False, description="Apply nothing if any reading is rejected"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """
+    Submit a property's meter-reading round as JSON (a list, or
+    ``{"readings": [...]}``) or CSV (``text/csv`` body or a multipart
+    ``file``) with columns task_id | unit, utility, current_reading,
+    reading_date. Invoices and tickets are updated in one pass.
+    """
+    db = request.app.state.adb
+    await authorize_property(db, [property_id], user.user_id)
+
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise HTTPException(400, "Upload the readings CSV as 'file'")
+            readings = parse_readings_csv((await upload.read()).decode("utf-8"))
+        elif "csv" in content_type:
+            readings = parse_readings_csv((await request.body()).decode("utf-8"))
+        else:
+            body = await request.json()
+            readings = body.get("readings", []) if isinstance(body, dict) else body
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"Could not parse readings: {e}")
+
+    if not isinstance(readings, list) or not readings:
+        raise HTTPException(400, "No readings provided")
+
+    manager = AsyncLeaseInvoiceManager(db.client, db.name)
+    return await manager.process_utility_readings(
+        property_id, readings, billing_month=billing_month, dry_run=dry_run, strict=strict
+    )
+
+async def _invoice_query(db, user: SessionInfo, start_date, end_date, property_ids, inv_status, q) -> Dict[str, Any]:
+    """Invoice filter shared by the summary and its NDJSON export."""
+    query: Dict[str, Any] = {
+        # "owner.owner_id":ObjectId(user.user_id),
+        "date_issued": {"$gte": start_date, "$lte": end_date}
+    }
+
+    # --- 1️⃣ Authorization: without property_ids, every property the user owns ---
+    authorized = await authorize_property(db, property_ids or None, user.user_id)
+    scope = property_ids or [str(p["id"]) for p in authorized]
+    query["property_id"] = {"$in": scope}
+
+    # --- 4️⃣ Optional filters ---
+    if inv_status and inv_status.lower() != "any":
+        query["status"] = inv_status.lower()
+
+    if q:
+        # Invoices hold ids only: resolve the text through the in-memory index
+        tenant_ids, unit_ids = (await get_search_index(db)).search(q, property_ids=scope)
+        query["$or"] = [
+            {"tenant_id": {"$in": tenant_ids}},
+            {"units_id": {"$in": unit_ids}},
+        ]
+    return query
+
+
 @router.get("/invoices/summary",response_class=ORJSONResponse)
 async def invoices_summary(
     request: Request,
@@ -1005,77 +1071,67 @@ async def invoices_summary(
         default="any",
         description="Invoice status filter: paid | partial | issued | overpaid | any (optional)"
     ),
-    q: str = Query("", description="Search by tenant name, email, or unit"),
-    page: int = Query(1, ge=1, description="Page number, starting from 1"),
+    q: str = Query("", description="Search by tenant name, email, phone or unit"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    page: int = Query(1, ge=1, description="Deprecated offset paging, used only without a cursor"),
     limit: int = Query(10, ge=1, le=200, description="Number of items per page"),
     user: SessionInfo = Depends(get_current_user)
 ):
     """
      Fetches filtered invoices and computes financial + forecast metrics for a given property/month.
+     Pages are keyset-paginated on (date_issued, _id): pass ``next_cursor`` back as ``cursor``.
     """
     db = request.app.state.adb
     start_date, end_date = parse_period_query(month)
-    print(start_date,end_date,month)
-    query: Dict[str, Any] = {
-        # "owner.owner_id":ObjectId(user.user_id),
-        "date_issued": {"$gte": start_date, "$lte": end_date}
-    }
-   
-    
-
-    # --- 1️⃣ Authorization ---
-    if isinstance(property_ids, list):
-        await authorize_property(db, property_ids, user.user_id)
-        query["property_id"] = {"$in": property_ids}
-    
+    query = await _invoice_query(db, user, start_date, end_date, property_ids, inv_status, q)
 
+    # --- 5️⃣ Fetch invoices + related entries in parallel ---
+    try:
+        page_query = with_keyset(query, "date_issued", -1, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    find = db.property_invoices.find(page_query).sort(keyset_sort("date_issued", -1))
+    if not cursor and page > 1:
+        find = find.skip((page - 1) * limit)
 
-    # --- 4️⃣ Optional filters ---
-    if inv_status and inv_status.lower() != "any":
-        query["status"] = inv_status.lower()
+    units_query={}
+    if isinstance(property_ids, list):
+        units_query["property_id"]= {"$in": property_ids}
 
-    if q:
-        
-        query["$or"] = [
-            {"tenant_name": Regex(q, "i")},
-            {"tenant_email": Regex(q, "i")},
-            {"unit_id": Regex(q, "i")},
-        ]
-    
-    # --- 5️⃣ Fetch invoices + related entries in parallel ---
-    total = await db.property_invoices.count_documents(query)
-    skip = (page - 1) * limit
-    cursor = db.property_invoices.find(query).sort("date_issued", -1).skip(skip).limit(limit)
-    invoices = await cursor.to_list(length=limit)
+    # the total is only counted for the first page of a keyset walk
+    invoices, total, unit_counts = await asyncio.gather(
+        find.limit(limit + 1).to_list(length=limit + 1),
+        db.property_invoices.count_documents(query) if not cursor else asyncio.sleep(0, result=None),
+        db.units.aggregate([
+            {"$match": units_query},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None)
+    )
+    invoices, next_cursor = page_of(invoices, "date_issued", limit)
 
-    tenant_ids = [str(inv["tenant_id"]) for inv in invoices if "tenant_id" in inv]
+    # forecast receipts only read Cash debits of the page's tenants
+    tenant_oids = [inv["tenant_id"] for inv in invoices if isinstance(inv.get("tenant_id"), ObjectId)]
     ledger_query={
-       
-        "date": {"$gte": start_date, "$lt": end_date}
+        "date": {"$gte": start_date, "$lt": end_date},
+        "account": "Cash",
+        "tenant_id": {"$in": tenant_oids}
     }
-    units_query={}
     if isinstance(property_ids, list):
-        ledger_query["property_id"] = {"$in": property_ids}
-        units_query["property_id"]= {"$in": property_ids}
-        
-    ledger_query["tenant_id"]= {"$in": tenant_ids}
-    
+        ledger_query["property_id"] = {"$in": [ObjectId(p) if ObjectId.is_valid(p) else p for p in property_ids]}
+
     ledger_entries = await db.property_ledger_entries.find(ledger_query).to_list(None)
-    
-    units = await db.units.find(units_query).to_list(None)
-        
-   
 
     # --- 6️⃣ Detect moving out tenants ---
     moving_out_next_month = []
 
     # --- 7️⃣ Compute analytics ---
-    total_units = len(units)
-    vacant_units = len([u for u in units if u.get("status") != "occupied"])
-    occupied_units = len([u for u in units if u.get("status") == "occupied"])
-    
-   
-    
+    by_status = {c["_id"]: c["count"] for c in unit_counts}
+    total_units = sum(by_status.values())
+    occupied_units = by_status.get("occupied", 0)
+    vacant_units = total_units - occupied_units
+
+
+
     invoices = [Invoice(**inv) for inv in invoices]
     ledger_entries   = [
         LedgerEntry(**{**entry, "_id": str(entry.pop("_id", ""))})
@@ -1126,20 +1182,46 @@ async def invoices_summary(
             "occupied_units": occupied_units,
         },
         "pagination":{
-            "page": page,
+            "page": page if not cursor else None,
             "limit": limit,
             "total": total,
-            "pages": max(1, math.ceil(total / limit))
-            
+            "pages": max(1, math.ceil(total / limit)) if total is not None else None,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         },
         "invoices": [normalize_bson(inv.model_dump(by_alias=True)) for inv in invoices],
     }
    
     return results
+@router.get("/invoices/export")
+async def export_invoices(
+    request: Request,
+    property_ids: Optional[List[str]] = Query(default=None),
+    month: Optional[str] = Query(None, description="Format: YYYY-MM"),
+    inv_status: str | None = Query(default="any"),
+    q: str = Query(""),
+    cursor: Optional[str] = Query(None, description="Resume after this next_cursor"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """The invoices of ``/invoices/summary`` as NDJSON, in the same (date_issued, _id) order."""
+    db = request.app.state.adb
+    start_date, end_date = parse_period_query(month)
+    query = await _invoice_query(db, user, start_date, end_date, property_ids, inv_status, q)
+    try:
+        docs = export_cursor(db.property_invoices, query, "date_issued", -1, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return StreamingResponse(
+        stream_ndjson(docs),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename=invoices_{month or 'current'}.ndjson"},
+    )
+
 @router.get("/tickets/list")
 async def list_tickets(
     request: Request,
-    page: int = Query(1, ge=1, description="Page number, starting at 1"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    page: int = Query(1, ge=1, description="Deprecated offset paging, used only without a cursor"),
     limit: int = Query(20, ge=1, le=100, description="Items per page"),
     property_id: Optional[str] = Query(None, description="Filter by metadata.property_id"),
 ):
@@ -1147,32 +1229,50 @@ async def list_tickets(
     if property_id:
         query["metadata.property_id"] = property_id
     db = request.app.state.adb
-    total = await db.property_tickets.count_documents(query)
-    skip = (page - 1) * limit
 
-    cursor = (
-        db.property_tickets
-        .find(query)
-        .sort("created_at", -1)
-        .skip(skip)
-        .limit(limit)
-    )
+    if cursor or page == 1:
+        try:
+            docs, next_cursor = await paginate(db.property_tickets, query, "created_at", -1, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    else:
+        skip = (page - 1) * limit
+        find = db.property_tickets.find(query).sort(keyset_sort("created_at", -1)).skip(skip)
+        docs, next_cursor = page_of(await find.limit(limit + 1).to_list(length=limit + 1), "created_at", limit)
+    # the total is only counted for the first page of a keyset walk
+    total = await db.property_tickets.count_documents(query) if not cursor else None
 
-    results = []
-   
-    async for doc in cursor:
-        results.append(Ticket(**doc))
+    results = [Ticket(**doc) for doc in docs]
 
     payload = {
         "pagination": {
             "total": total,
-            "page": page,
+            "page": page if not cursor else None,
             "limit": limit,
-            "pages": ceil(total / limit) if total else 1,
+            "pages": (ceil(total / limit) if total else 1) if total is not None else None,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
         },
         "items": results,
     }
     return payload
+
+@router.get("/tickets/export")
+async def export_tickets(
+    request: Request,
+    property_id: Optional[str] = Query(None, description="Filter by metadata.property_id"),
+    cursor: Optional[str] = Query(None, description="Resume after this next_cursor"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """Tickets of the user's properties as NDJSON, newest first."""
+    db = request.app.state.adb
+    authorized = await authorize_property(db, [property_id] if property_id else None, user.user_id)
+    query = {"metadata.property_id": {"$in": [property_id] if property_id else [str(p["id"]) for p in authorized]}}
+    try:
+        docs = export_cursor(db.property_tickets, query, "created_at", -1, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return StreamingResponse(stream_ndjson(docs), media_type=NDJSON_MEDIA_TYPE)
 @router.patch("ticket/{ticket_id}")
 async def update_ticket(
     request: Request,                                                                                                                                                       
@@ -1630,6 +1730,21 @@ async def get_receipt_pdf(request: Request, payment_id: str):
     return FileResponse(pdf_path)
 
 
+@router.post("/invoices/pdf/batch")
+async def render_invoice_pdfs(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    month: str = Query(..., example="2025-10"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """Render the month's invoice PDFs of the user's properties in the background and store them in MinIO."""
+    db = request.app.state.adb
+    property_ids = [p["id"] for p in await authorize_property(db, None, user.user_id)]
+    total = await db["invoices"].count_documents({"month": month, "property_id": {"$in": property_ids}})
+    background_tasks.add_task(render_month_invoices, db, month, property_ids=property_ids)
+    return JSONResponse({"message": f"Rendering {total} invoice PDFs for {month}", "bucket": INVOICE_BUCKET})
+
+
 # ===============================================================
 # REPORTS
 # ===============================================================
@@ -2021,6 +2136,168 @@ async def auto_generate_invoices(request: Request, month: Optional[str] = None):
     return {"month": month, "queued_properties": results}
 
 
+class BillingRunRequest(BaseModel):
+    billing_month: Optional[str] = None
+    force: bool = False
+    balance_method: str = "sum"
+    shard_size: Optional[int] = None
+    # default: every property the user owns; all_properties bills the whole platform (admins only)
+    property_ids: Optional[List[str]] = None
+    all_properties: bool = False
+
+
+def _billing_run_coordinator(db):
+    return BillingRunCoordinator(AsyncLeaseInvoiceManager(db.client, db.name))
+
+
+@router.post("/billing-runs")
+async def start_billing_run(request: Request,
+                            body: BillingRunRequest = Body(...),
+                            user: SessionInfo = Depends(get_current_user)):
+    """Start (or pick up the unfinished) month-end billing run, sharded over the workers."""
+    db = request.app.state.adb
+    if body.all_properties:
+        if not (await checker.check_role(user, "admin")).granted:
+            raise HTTPException(status_code=403, detail="Platform-wide billing runs require the admin role")
+        property_ids = None
+    else:
+        authorized = await authorize_property(db, body.property_ids, user.user_id)
+        property_ids = body.property_ids or [str(p["id"]) for p in authorized]
+
+    coordinator = _billing_run_coordinator(db)
+    billing_month = body.billing_month or datetime.now(timezone.utc).strftime("%Y-%m")
+    run = await coordinator.start_run(
+        billing_month,
+        force=body.force,
+        balance_method=body.balance_method,
+        shard_size=body.shard_size or DEFAULT_SHARD_SIZE,
+        property_ids=property_ids,
+        created_by=user.user_id
+    )
+    shard_indexes = await coordinator.resume(run["_id"])
+    for index in shard_indexes:
+        bill_billing_shard.send(run["_id"], index)
+    return {"run_id": run["_id"], "billing_month": billing_month, "shards_queued": len(shard_indexes)}
+
+
+@router.get("/billing-runs/{run_id}")
+async def get_billing_run(request: Request, run_id: str,
+                          user: SessionInfo = Depends(get_current_user)):
+    """Shard progress and throughput merged across the workers."""
+    summary = await _billing_run_coordinator(request.app.state.adb).summary(run_id, created_by=user.user_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Billing run not found")
+    return normalize_bson(summary)
+
+
+@router.post("/billing-runs/{run_id}/resume")
+async def resume_billing_run(request: Request, run_id: str,
+                             failed_only: bool = Query(False, description="Only retry failed shards"),
+                             user: SessionInfo = Depends(get_current_user)):
+    """Re-queue the shards of a run that did not finish (or only the failed ones)."""
+    try:
+        shard_indexes = await _billing_run_coordinator(request.app.state.adb).resume(
+            run_id, failed_only, created_by=user.user_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    for index in shard_indexes:
+        bill_billing_shard.send(run_id, index)
+    return {"run_id": run_id, "shards_queued": len(shard_indexes)}
+
+
+@router.post("/payments/reconciliations")
+async def start_statement_reconciliation(
+    request: Request,
+    property_ids: Optional[List[str]] = Query(None, description="Properties to match against (default: all owned)"),
+    method: str = Query("bank", description="Payment method recorded on posted payments, e.g. bank, mpesa"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """
+    Upload a bank or mobile-money statement (multipart ``file``, CSV or XLSX)
+    and queue its reconciliation: rows are matched to open invoices, matched
+    payments posted in bulk and the rest written to an exceptions report.
+    """
+    db = request.app.state.adb
+    authorized = await authorize_property(db, property_ids, user.user_id)
+    property_ids = property_ids or [str(p["id"]) for p in authorized]
+
+    form = await request.form()
+    upload = form.get("file")
+    if upload is None:
+        raise HTTPException(400, "Upload the statement as 'file'")
+    data = await upload.read()
+    filename = upload.filename or "statement.csv"
+    try:
+        rows, skipped = parse_statement(data, filename)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"Could not parse statement: {e}")
+    if not rows:
+        raise HTTPException(400, "Statement has no credit rows")
+
+    reconciler = StatementReconciler(db)
+    object_name = f"statements/{ObjectId()}/{os.path.basename(filename)}"
+    minio_client = reconciler._minio()
+    if not await asyncio.to_thread(minio_client.bucket_exists, STATEMENT_BUCKET):
+        await asyncio.to_thread(minio_client.make_bucket, STATEMENT_BUCKET)
+    await asyncio.to_thread(
+        minio_client.put_object, STATEMENT_BUCKET, object_name, io.BytesIO(data), len(data)
+    )
+
+    run = await reconciler.create_run(
+        {"bucket": STATEMENT_BUCKET, "object_name": object_name, "filename": filename},
+        property_ids=property_ids,
+        method=method,
+        created_by=user.user_id
+    )
+    reconcile_statement.send(run["_id"])
+    return {"run_id": run["_id"], "rows": len(rows), "debit_rows_skipped": skipped, "status": run["status"]}
+
+
+@router.get("/payments/reconciliations")
+async def list_statement_reconciliations(request: Request,
+                                         limit: int = Query(20, ge=1, le=100),
+                                         user: SessionInfo = Depends(get_current_user)):
+    """The caller's reconciliation runs, newest first."""
+    runs = await request.app.state.adb.statement_reconciliations.find(
+        {"created_by": user.user_id}, {"exceptions": 0}
+    ).sort("created_at", -1).limit(limit).to_list(None)
+    return normalize_bson(runs)
+
+
+@router.get("/payments/reconciliations/{run_id}")
+async def get_statement_reconciliation(request: Request, run_id: str,
+                                       user: SessionInfo = Depends(get_current_user)):
+    """Progress, match summary and the first exceptions of a reconciliation run."""
+    run = await request.app.state.adb.statement_reconciliations.find_one({"_id": run_id, "created_by": user.user_id})
+    if not run:
+        raise HTTPException(status_code=404, detail="Reconciliation run not found")
+    return normalize_bson(run)
+
+
+@router.get("/payments/reconciliations/{run_id}/exceptions")
+async def download_reconciliation_exceptions(request: Request, run_id: str,
+                                             user: SessionInfo = Depends(get_current_user)):
+    """The full exceptions report (CSV) of a completed run."""
+    run = await request.app.state.adb.statement_reconciliations.find_one(
+        {"_id": run_id, "created_by": user.user_id}, {"report": 1}
+    )
+    if not run:
+        raise HTTPException(status_code=404, detail="Reconciliation run not found")
+    if not run.get("report"):
+        raise HTTPException(status_code=404, detail="Run has no exceptions report")
+
+    report = run["report"]
+    response = await asyncio.to_thread(
+        StatementReconciler(request.app.state.adb)._minio().get_object, report["bucket"], report["object_name"]
+    )
+    return StreamingResponse(
+        response.stream(64 * 1024),
+        media_type=REPORT_MEDIA_TYPES["csv"],
+        headers={"Content-Disposition": f"attachment; filename={run_id}_exceptions.csv"}
+    )
+
+
 
 
 @router.get("/tenant/{tenant_id}/balance")
@@ -2306,6 +2583,61 @@ async def export_monthly_csv(request: Request, month: str = Query(...)):
     return StreamingResponse(output, media_type="text/csv", headers={"Content-Disposition": f"attachment; filename={month}_report.csv"})
 
 
+@router.get("/reports/rent-roll/export")
+async def export_rent_roll(
+    request: Request,
+    property_id: Optional[str] = Query(None, description="Single property (default: all)"),
+    as_of: Optional[date] = Query(None, description="Report date, YYYY-MM-DD (default: today)"),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    include_vacant: bool = Query(True),
+    destination: str = Query("download", pattern="^(download|minio)$"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """Stream the rent roll unit by unit as CSV/XLSX, or store it in MinIO."""
+    db = request.app.state.adb
+    authorized = await authorize_property(db, [property_id] if property_id else None, user.user_id)
+    as_of_date = datetime.combine(as_of, datetime.min.time(), tzinfo=timezone.utc) if as_of else datetime.now(timezone.utc)
+    rows = RentRollAndTaxesReportGenerator(db).iter_rent_roll(
+        property_id, as_of_date, include_vacant, property_ids=[p["id"] for p in authorized]
+    )
+    filename = f"rent_roll_{as_of_date.strftime('%Y%m%d')}.{format}"
+
+    if destination == "minio":
+        return await upload_report(rows, RENT_ROLL_COLUMNS, format, f"rent_roll/{filename}", sheet_title="Rent Roll")
+    return StreamingResponse(
+        stream_report(rows, RENT_ROLL_COLUMNS, format, "Rent Roll"),
+        media_type=REPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@router.get("/reports/tax/export")
+async def export_tax_report(
+    request: Request,
+    property_id: Optional[str] = Query(None, description="Single property (default: all)"),
+    year: Optional[int] = Query(None, ge=2000, le=2100),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    destination: str = Query("download", pattern="^(download|minio)$"),
+    user: SessionInfo = Depends(get_current_user)
+):
+    """Stream the annual tax report property by property as CSV/XLSX, or store it in MinIO."""
+    db = request.app.state.adb
+    authorized = await authorize_property(db, [property_id] if property_id else None, user.user_id)
+    year = year or datetime.now().year
+    rows = RentRollAndTaxesReportGenerator(db).iter_tax_report(
+        property_id, year, property_ids=[p["id"] for p in authorized]
+    )
+    filename = f"tax_report_{year}.{format}"
+
+    if destination == "minio":
+        return await upload_report(rows, TAX_COLUMNS, format, f"tax/{filename}", sheet_title=f"Tax {year}")
+    return StreamingResponse(
+        stream_report(rows, TAX_COLUMNS, format, f"Tax {year}"),
+        media_type=REPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 # ===============================================================
 # Vendo
 # ===============================================================
@@ -2326,4 +2658,8 @@ def init_plugin(app: FastAPI):
     # app.include_router(router)
     # app.add_event_handler("startup", lambda: ensure_indexes(app.state.adb))
     router = add_routes(router)
+    # replica sets push writes to the snapshot caches; standalone servers rely on write hooks
+    get_invalidation_bus(app.state.adb).start()
+    if os.getenv("METER_OCR_PRELOAD", "").lower() in ("1", "true", "yes"):
+        asyncio.get_running_loop().create_task(get_meter_ocr_service().warm_up())
     return {"router": router}
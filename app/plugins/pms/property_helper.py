@@ -1,6 +1,7 @@
 import asyncio
 from datetime import datetime, timedelta
 from typing import Optional
+from bson import ObjectId
 from routes.auth import SessionInfo
 from plugins.pms.models.models import (
     PropertySummary,
@@ -12,6 +13,7 @@ UnitListItem,
 TenantListItem,
 PropertyDetailResponse
 )
+from plugins.pms.utils.loaders import load_grouped, page_bounds, page_meta
 from fastapi import (
     HTTPException, Request,Depends,
 )
@@ -385,26 +387,6 @@ async def get_paginated_units(db, property_id: str, skip: int, limit: int) -> li
                 "as": "tenant_info"
             }
         },
-        {
-            "$lookup": {
-                "from": "invoices",
-                "let": {"unit_tenant_id": "$currentTenantId"},
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$and": [
-                                    {"$eq": ["$tenant_id", "$$unit_tenant_id"]},
-                                    {"$gte": ["$due_date", current_month_start]}
-                                ]
-                            }
-                        }
-                    },
-                    {"$limit": 1}
-                ],
-                "as": "current_invoice"
-            }
-        },
         {
             "$project": {
                 "_id": {"$toString": "$_id"},
@@ -428,6 +410,7 @@ async def get_paginated_units(db, property_id: str, skip: int, limit: int) -> li
                 "hasBalcony": 1,
                 "hasParking": 1,
                 "parkingSpots": {"$ifNull": ["$parkingSpots", 0]},
+                "currentTenantId": 1,
                 "tenantId": {"$toString": "$currentTenantId"},
                 "tenantName": {
                     "$ifNull": [
@@ -448,19 +431,22 @@ async def get_paginated_units(db, property_id: str, skip: int, limit: int) -> li
                         {"$dateToString": {"format": "%Y-%m-%d", "date": "$leaseEndDate"}},
                         None
                     ]
-                },
-                "rentStatus": {
-                    "$cond": [
-                        {"$gt": [{"$size": "$current_invoice"}, 0]},
-                        {"$arrayElemAt": ["$current_invoice.status", 0]},
-                        None
-                    ]
                 }
             }
         }
     ]
     
     units = await db["units"].aggregate(pipeline).to_list(None)
+
+    # One $in query for the page's current invoices instead of a correlated
+    # $lookup per unit.
+    current_invoices = await load_grouped(
+        db["invoices"], "tenant_id", [u.get("currentTenantId") for u in units],
+        {"due_date": {"$gte": current_month_start}}, {"tenant_id": 1, "status": 1}
+    )
+    for unit in units:
+        invoices = current_invoices.get(unit.pop("currentTenantId", None)) or []
+        unit["rentStatus"] = invoices[0].get("status") if invoices else None
     return units
 
 
@@ -502,67 +488,6 @@ async def get_property_tenants(db, property_id: str) -> list[dict]:
             }
         },
         {"$unwind": {"path": "$lease", "preserveNullAndEmptyArrays": True}},
-        {
-            "$lookup": {
-                "from": "payments",
-                "let": {"tenant_id": "$currentTenantId"},
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {"$eq": ["$tenant_id", "$$tenant_id"]}
-                        }
-                    },
-                    {"$sort": {"payment_date": -1}},
-                    {"$limit": 1}
-                ],
-                "as": "last_payment"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "payments",
-                "let": {"tenant_id": "$currentTenantId"},
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {"$eq": ["$tenant_id", "$$tenant_id"]}
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": None,
-                            "total": {"$sum": "$amount"}
-                        }
-                    }
-                ],
-                "as": "payment_summary"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "invoices",
-                "let": {"tenant_id": "$currentTenantId"},
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$and": [
-                                    {"$eq": ["$tenant_id", "$$tenant_id"]},
-                                    {"$in": ["$status", ["pending", "overdue"]]}
-                                ]
-                            }
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": None,
-                            "outstanding": {"$sum": "$amount"}
-                        }
-                    }
-                ],
-                "as": "outstanding_summary"
-            }
-        },
         {
             "$project": {
                 "_id": {"$toString": "$tenant._id"},
@@ -624,36 +549,6 @@ async def get_property_tenants(db, property_id: str) -> list[dict]:
                             ]
                         }
                     ]
-                },
-                "lastPaymentDate": {
-                    "$cond": [
-                        {"$gt": [{"$size": "$last_payment"}, 0]},
-                        {
-                            "$dateToString": {
-                                "format": "%Y-%m-%d",
-                                "date": {"$arrayElemAt": ["$last_payment.payment_date", 0]}
-                            }
-                        },
-                        None
-                    ]
-                },
-                "lastPaymentAmount": {
-                    "$ifNull": [
-                        {"$arrayElemAt": ["$last_payment.amount", 0]},
-                        None
-                    ]
-                },
-                "totalPaid": {
-                    "$ifNull": [
-                        {"$arrayElemAt": ["$payment_summary.total", 0]},
-                        0
-                    ]
-                },
-                "outstandingBalance": {
-                    "$ifNull": [
-                        {"$arrayElemAt": ["$outstanding_summary.outstanding", 0]},
-                        0
-                    ]
                 }
             }
         },
@@ -661,6 +556,38 @@ async def get_property_tenants(db, property_id: str) -> list[dict]:
     ]
     
     tenants = await db["units"].aggregate(pipeline).to_list(None)
+    tenant_ids = [ObjectId(t["_id"]) for t in tenants if ObjectId.is_valid(t["_id"])]
+    if not tenant_ids:
+        return tenants
+
+    # Payment and outstanding totals for every tenant in two grouped
+    # queries, rather than three correlated $lookups per unit.
+    payments, outstanding = await asyncio.gather(
+        db["payments"].aggregate([
+            {"$match": {"tenant_id": {"$in": tenant_ids}}},
+            {"$sort": {"payment_date": -1}},
+            {"$group": {
+                "_id": "$tenant_id",
+                "last_date": {"$first": "$payment_date"},
+                "last_amount": {"$first": "$amount"},
+                "total": {"$sum": "$amount"}
+            }}
+        ]).to_list(None),
+        db["invoices"].aggregate([
+            {"$match": {"tenant_id": {"$in": tenant_ids}, "status": {"$in": ["pending", "overdue"]}}},
+            {"$group": {"_id": "$tenant_id", "outstanding": {"$sum": "$amount"}}}
+        ]).to_list(None)
+    )
+    payments = {str(p["_id"]): p for p in payments}
+    outstanding = {str(o["_id"]): o["outstanding"] for o in outstanding}
+
+    for tenant in tenants:
+        payment = payments.get(tenant["_id"], {})
+        last_date = payment.get("last_date")
+        tenant["lastPaymentDate"] = last_date.strftime("%Y-%m-%d") if last_date else None
+        tenant["lastPaymentAmount"] = payment.get("last_amount")
+        tenant["totalPaid"] = payment.get("total", 0)
+        tenant["outstandingBalance"] = outstanding.get(tenant["_id"], 0)
     return tenants
 
 async def get_property_detail(
@@ -677,10 +604,8 @@ async def get_property_detail(
     Runs all queries in parallel for optimal performance.
     """
     db = request.app.state.adb
-    print(property_id)
-    return {}
     # Run all queries in parallel using asyncio.gather
-    skip = (page - 1) * limit
+    skip, limit = page_bounds(page, limit)
     
     results = await asyncio.gather(
         # 1. Get property with counts
@@ -692,7 +617,7 @@ async def get_property_detail(
         # 4. Get tenants (if requested)
         get_property_tenants(db, property_id) if include_tenants else asyncio.sleep(0, result=[]),
         # 5. Get total unit count for pagination
-        db["units"].count_documents({"property_id": property_id})
+        db["units"].count_documents({"propertyId": property_id})
     )
     
     prop, metrics, units, tenants, total_units = results
@@ -705,10 +630,5 @@ async def get_property_detail(
         "units": units,
         "tenants": tenants,
         "metrics": metrics,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total_units,
-            "totalPages": (total_units + limit - 1) // limit
-        }
+        "pagination": page_meta(page, limit, total_units)
     }
\ No newline at end of file
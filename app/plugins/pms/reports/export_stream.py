@@ -0,0 +1,108 @@
+"""
+Constant-memory CSV/XLSX output for report row streams.
+
+Report generators expose their rows as async generators of dicts (see
+``RentRollAndTaxesReportGenerator.iter_rent_roll``). These helpers turn such
+a stream into a download or a MinIO object without materialising it:
+
+    rows = generator.iter_rent_roll(property_id)
+    return StreamingResponse(stream_csv(rows, RENT_ROLL_COLUMNS), media_type=MEDIA_TYPES["csv"])
+
+    await upload_report(rows, RENT_ROLL_COLUMNS, "xlsx", "reports/rent_roll.xlsx")
+
+CSV is flushed in ``CSV_FLUSH_BYTES`` chunks as rows arrive. XLSX is a zip
+archive and cannot be sent before it is complete, so it is written with
+openpyxl's write-only workbook into a spooled temporary file (memory up to
+``SPOOL_BYTES``, disk beyond) and streamed from there.
+"""
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from typing import AsyncIterator, Dict, Iterator, List
+
+CSV_FLUSH_BYTES = 64 * 1024
+SPOOL_BYTES = 8 * 1024 * 1024
+READ_CHUNK = 256 * 1024
+REPORT_BUCKET = os.getenv("PMS_REPORT_BUCKET", "pms-reports")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+async def stream_csv(rows: AsyncIterator[Dict], columns: List[str]) -> AsyncIterator[bytes]:
+    """CSV bytes for ``rows``, header first, in chunks of about ``CSV_FLUSH_BYTES``."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CSV_FLUSH_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def spool_report(rows: AsyncIterator[Dict], columns: List[str], fmt: str, sheet_title: str = "Report"):
+    """``rows`` written as ``fmt`` to a spooled temporary file, rewound."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    if fmt == "csv":
+        async for chunk in stream_csv(rows, columns):
+            spool.write(chunk)
+    elif fmt == "xlsx":
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=sheet_title[:31])
+        sheet.append(columns)
+        async for row in rows:
+            sheet.append([row.get(column) for column in columns])
+        await asyncio.to_thread(workbook.save, spool)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    spool.seek(0)
+    return spool
+
+
+def file_chunks(f, chunk_size: int = READ_CHUNK) -> Iterator[bytes]:
+    """Read ``f`` in chunks, closing it at the end."""
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def stream_report(rows: AsyncIterator[Dict], columns: List[str], fmt: str,
+                        sheet_title: str = "Report") -> AsyncIterator[bytes]:
+    """Response body for ``rows`` as ``fmt``: CSV as rows arrive, XLSX once spooled."""
+    if fmt == "csv":
+        async for chunk in stream_csv(rows, columns):
+            yield chunk
+        return
+    spool = await spool_report(rows, columns, fmt, sheet_title)
+    for chunk in file_chunks(spool):
+        yield chunk
+
+
+async def upload_report(rows: AsyncIterator[Dict], columns: List[str], fmt: str, object_name: str,
+                        bucket: str = REPORT_BUCKET, minio_client=None, sheet_title: str = "Report") -> Dict:
+    """Spool ``rows`` as ``fmt`` and upload the file to MinIO."""
+    from plugins.pms.services.pdf_service import get_minio_client
+
+    minio_client = minio_client or get_minio_client()
+    spool = await spool_report(rows, columns, fmt, sheet_title)
+    with spool:
+        size = spool.seek(0, io.SEEK_END)
+        spool.seek(0)
+        if not await asyncio.to_thread(minio_client.bucket_exists, bucket):
+            await asyncio.to_thread(minio_client.make_bucket, bucket)
+        await asyncio.to_thread(
+            minio_client.put_object, bucket, object_name, spool, size, content_type=MEDIA_TYPES[fmt]
+        )
+    return {"bucket": bucket, "object_name": object_name, "size": size}
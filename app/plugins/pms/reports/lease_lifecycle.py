@@ -6,6 +6,54 @@ from bson import ObjectId
 import calendar
 from collections import defaultdict
 
+from plugins.pms.utils.loaders import load_by_ids, load_grouped
+
+BATCH_CONCURRENCY = 16
+
+
+def _now_like(reference: datetime) -> datetime:
+    """Current UTC time, naive when ``reference`` is (Mongo returns naive UTC)."""
+    now = datetime.now(timezone.utc)
+    return now if reference.tzinfo is not None else now.replace(tzinfo=None)
+
+
+class LeasePrefetch:
+    """
+    Everything the report sections read for a set of leases, loaded once:
+    invoices grouped by lease (in issue order), tenants, properties, units
+    and each property's invoiced/collected totals.
+    """
+
+    def __init__(self, leases: List[Dict]):
+        self.leases = {lease["_id"]: lease for lease in leases}
+        self.invoices: Dict[str, List[Dict]] = {}
+        self.tenants: Dict = {}
+        self.properties: Dict = {}
+        self.units: Dict = {}
+        self.property_totals: Dict = {}
+
+    @classmethod
+    async def load(cls, db, leases: List[Dict]) -> "LeasePrefetch":
+        prefetch = cls(leases)
+        property_ids = list({lease["property_id"] for lease in leases})
+        (prefetch.invoices, prefetch.tenants, prefetch.properties, prefetch.units, totals) = await asyncio.gather(
+            load_grouped(db.property_invoices, "lease_id", [str(lease["_id"]) for lease in leases],
+                         sort=[("date_issued", 1)]),
+            load_by_ids(db.property_tenants, [lease["tenant_id"] for lease in leases]),
+            load_by_ids(db.properties, property_ids),
+            load_by_ids(db.property_units, [u for lease in leases for u in lease.get("units_id", [])]),
+            db.property_invoices.aggregate([
+                {"$match": {"property_id": {"$in": property_ids}}},
+                {"$group": {
+                    "_id": "$property_id",
+                    "expected": {"$sum": "$total_amount"},
+                    "collected": {"$sum": "$total_paid"}
+                }}
+            ]).to_list(None)
+        )
+        prefetch.property_totals = {row["_id"]: row for row in totals}
+        return prefetch
+
 
 class LeaseLifecycleReportGenerator:
     """
@@ -19,7 +67,8 @@ class LeaseLifecycleReportGenerator:
     async def generate_complete_lifecycle_report(
         self,
         lease_id: str,
-        include_predictions: bool = True
+        include_predictions: bool = True,
+        prefetch: Optional[LeasePrefetch] = None
     ) -> Dict:
         """
         Generate a complete lifecycle report for a specific lease
@@ -35,6 +84,7 @@ class LeaseLifecycleReportGenerator:
         Args:
             lease_id: Lease ID
             include_predictions: Include future predictions
+            prefetch: Batch data to read from instead of querying per section
         
         Returns:
             Complete lifecycle report
@@ -48,45 +98,44 @@ class LeaseLifecycleReportGenerator:
         print("=" * 100)
         
         # Get lease data
-        lease = await self.db.property_leases.find_one({"_id": lease_id})
+        if prefetch is not None:
+            lease = prefetch.leases.get(lease_id)
+        else:
+            lease = await self.db.property_leases.find_one({"_id": lease_id})
         if not lease:
             return {"error": "Lease not found"}
         
-        # Build comprehensive report
-        report = {
-            "report_id": f"LIFECYCLE-{str(lease_id)[:8]}-{datetime.now().strftime('%Y%m%d')}",
-            "generated_at": datetime.now(timezone.utc),
-            "lease_id": str(lease_id),
-            
+        # The sections are independent: run them together
+        sections = {
             # Section 1: Basic Information
-            "basic_info": await self._get_basic_info(lease),
-            
+            "basic_info": self._get_basic_info(lease, prefetch),
             # Section 2: Timeline & Milestones
-            "timeline": await self._get_timeline(lease),
-            
+            "timeline": self._get_timeline(lease),
             # Section 3: Financial Performance
-            "financial_performance": await self._get_financial_performance(lease),
-            
+            "financial_performance": self._get_financial_performance(lease, prefetch),
             # Section 4: Payment Behavior Analysis
-            "payment_behavior": await self._get_payment_behavior(lease),
-            
+            "payment_behavior": self._get_payment_behavior(lease, prefetch),
             # Section 5: Lifecycle Stages
-            "lifecycle_stages": await self._analyze_lifecycle_stages(lease),
-            
+            "lifecycle_stages": self._analyze_lifecycle_stages(lease, prefetch),
             # Section 6: Key Events
-            "key_events": await self._get_key_events(lease),
-            
+            "key_events": self._get_key_events(lease, prefetch),
             # Section 7: Health Score
-            "health_assessment": await self._calculate_lease_health(lease),
-            
+            "health_assessment": self._calculate_lease_health(lease, prefetch),
             # Section 8: Utilities & Consumption
-            "utilities_analysis": await self._analyze_utilities(lease),
-            
+            "utilities_analysis": self._analyze_utilities(lease, prefetch),
             # Section 9: Compliance & Issues
-            "compliance": await self._get_compliance_info(lease),
-            
+            "compliance": self._get_compliance_info(lease),
             # Section 10: Comparative Analysis
-            "comparative_analysis": await self._compare_to_property_average(lease),
+            "comparative_analysis": self._compare_to_property_average(lease, prefetch),
+        }
+        results = await asyncio.gather(*sections.values())
+        
+        # Build comprehensive report
+        report = {
+            "report_id": f"LIFECYCLE-{str(lease_id)[:8]}-{datetime.now().strftime('%Y%m%d')}",
+            "generated_at": datetime.now(timezone.utc),
+            "lease_id": str(lease_id),
+            **dict(zip(sections, results)),
         }
         
         # Section 11: Predictions (if requested)
@@ -98,23 +147,38 @@ class LeaseLifecycleReportGenerator:
         
         return report
     
-    async def _get_basic_info(self, lease: Dict) -> Dict:
+    async def _lease_invoices(self, lease: Dict, prefetch: Optional[LeasePrefetch]) -> List[Dict]:
+        """The lease's invoices in issue order, from the batch prefetch when there is one."""
+        lease_id = str(lease["_id"])
+        if prefetch is not None:
+            return prefetch.invoices.get(lease_id, [])
+        invoices_cursor = self.db.property_invoices.find({
+            "lease_id": lease_id
+        }).sort("date_issued", 1)
+        return await invoices_cursor.to_list(length=None)
+    
+    async def _get_basic_info(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Extract basic lease information"""
         
-        # Get tenant
-        tenant = await self.db.property_tenants.find_one({"_id": lease["tenant_id"]})
-        
-        # Get property
-        property_data = await self.db.properties.find_one({"_id": lease["property_id"]})
-        
-        # Get units
         unit_ids = lease.get("units_id", [])
-        units_cursor = self.db.property_units.find({"_id": {"$in": unit_ids}})
-        units = await units_cursor.to_list(length=None)
+        if prefetch is not None:
+            tenant = prefetch.tenants.get(lease["tenant_id"])
+            property_data = prefetch.properties.get(lease["property_id"])
+            units = [prefetch.units[unit_id] for unit_id in unit_ids if unit_id in prefetch.units]
+        else:
+            # Get tenant
+            tenant = await self.db.property_tenants.find_one({"_id": lease["tenant_id"]})
+            
+            # Get property
+            property_data = await self.db.properties.find_one({"_id": lease["property_id"]})
+            
+            # Get units
+            units_cursor = self.db.property_units.find({"_id": {"$in": unit_ids}})
+            units = await units_cursor.to_list(length=None)
         
-        current_date = datetime.now(timezone.utc)
         start_date = lease["lease_terms"]["start_date"]
         end_date = lease["lease_terms"]["end_date"]
+        current_date = _now_like(start_date)
         
         days_active = (current_date - start_date).days if current_date > start_date else 0
         days_remaining = (end_date - current_date).days if end_date > current_date else 0
@@ -171,7 +235,7 @@ class LeaseLifecycleReportGenerator:
         
         start_date = lease["lease_terms"]["start_date"]
         end_date = lease["lease_terms"]["end_date"]
-        current_date = datetime.now(timezone.utc)
+        current_date = _now_like(start_date)
         
         # Key milestones
         milestones = [
@@ -279,16 +343,11 @@ class LeaseLifecycleReportGenerator:
         
         return timeline
     
-    async def _get_financial_performance(self, lease: Dict) -> Dict:
+    async def _get_financial_performance(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Analyze financial performance throughout lifecycle"""
         
-        lease_id = str(lease["_id"])
-        
         # Get all invoices
-        invoices_cursor = self.db.property_invoices.find({
-            "lease_id": lease_id
-        }).sort("date_issued", 1)
-        invoices = await invoices_cursor.to_list(length=None)
+        invoices = await self._lease_invoices(lease, prefetch)
         
         # Overall metrics
         total_expected = sum(inv.get("total_amount", 0) for inv in invoices)
@@ -350,16 +409,11 @@ class LeaseLifecycleReportGenerator:
             }
         }
     
-    async def _get_payment_behavior(self, lease: Dict) -> Dict:
+    async def _get_payment_behavior(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Analyze payment behavior patterns"""
         
-        lease_id = str(lease["_id"])
-        
         # Get all invoices with payments
-        invoices_cursor = self.db.property_invoices.find({
-            "lease_id": lease_id
-        }).sort("date_issued", 1)
-        invoices = await invoices_cursor.to_list(length=None)
+        invoices = await self._lease_invoices(lease, prefetch)
         
         # Analyze payment timing
         early_payments = 0
@@ -427,18 +481,13 @@ class LeaseLifecycleReportGenerator:
             }
         }
     
-    async def _analyze_lifecycle_stages(self, lease: Dict) -> Dict:
+    async def _analyze_lifecycle_stages(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Analyze performance at different lifecycle stages"""
         
-        lease_id = str(lease["_id"])
         start_date = lease["lease_terms"]["start_date"]
-        current_date = datetime.now(timezone.utc)
         
         # Get invoices
-        invoices_cursor = self.db.property_invoices.find({
-            "lease_id": lease_id
-        }).sort("date_issued", 1)
-        invoices = await invoices_cursor.to_list(length=None)
+        invoices = await self._lease_invoices(lease, prefetch)
         
         # Define stage boundaries
         stage_1_end = start_date + timedelta(days=90)  # First 3 months
@@ -484,7 +533,7 @@ class LeaseLifecycleReportGenerator:
         
         return result
     
-    async def _get_key_events(self, lease: Dict) -> List[Dict]:
+    async def _get_key_events(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> List[Dict]:
         """Get key events in lease lifecycle"""
         
         events = []
@@ -508,12 +557,17 @@ class LeaseLifecycleReportGenerator:
             })
         
         # Get payment events
-        lease_id = str(lease["_id"])
-        invoices_cursor = self.db.property_invoices.find({
-            "lease_id": lease_id,
-            "status": {"$in": ["overdue", "paid"]}
-        }).sort("date_issued", 1).limit(20)
-        invoices = await invoices_cursor.to_list(length=None)
+        if prefetch is not None:
+            invoices = [
+                inv for inv in await self._lease_invoices(lease, prefetch)
+                if inv.get("status") in ("overdue", "paid")
+            ][:20]
+        else:
+            invoices_cursor = self.db.property_invoices.find({
+                "lease_id": str(lease["_id"]),
+                "status": {"$in": ["overdue", "paid"]}
+            }).sort("date_issued", 1).limit(20)
+            invoices = await invoices_cursor.to_list(length=None)
         
         for inv in invoices:
             if inv.get("status") == "overdue":
@@ -530,14 +584,11 @@ class LeaseLifecycleReportGenerator:
         
         return events
     
-    async def _calculate_lease_health(self, lease: Dict) -> Dict:
+    async def _calculate_lease_health(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Calculate overall lease health score"""
         
-        lease_id = str(lease["_id"])
-        
         # Get financial data
-        invoices_cursor = self.db.property_invoices.find({"lease_id": lease_id})
-        invoices = await invoices_cursor.to_list(length=None)
+        invoices = await self._lease_invoices(lease, prefetch)
         
         if not invoices:
             return {
@@ -568,7 +619,7 @@ class LeaseLifecycleReportGenerator:
         # Being further along in lease without issues is positive
         start_date = lease["lease_terms"]["start_date"]
         end_date = lease["lease_terms"]["end_date"]
-        current_date = datetime.now(timezone.utc)
+        current_date = _now_like(start_date)
         
         total_days = (end_date - start_date).days
         days_elapsed = (current_date - start_date).days
@@ -656,16 +707,11 @@ class LeaseLifecycleReportGenerator:
             "recommendations": recommendations
         }
     
-    async def _analyze_utilities(self, lease: Dict) -> Dict:
+    async def _analyze_utilities(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Analyze utility consumption throughout lifecycle"""
         
-        lease_id = str(lease["_id"])
-        
         # Get invoices with utility line items
-        invoices_cursor = self.db.property_invoices.find({
-            "lease_id": lease_id
-        }).sort("date_issued", 1)
-        invoices = await invoices_cursor.to_list(length=None)
+        invoices = await self._lease_invoices(lease, prefetch)
         
         utilities_data = defaultdict(lambda: {
             "total_consumption": 0,
@@ -720,26 +766,31 @@ class LeaseLifecycleReportGenerator:
             "issues": []
         }
     
-    async def _compare_to_property_average(self, lease: Dict) -> Dict:
+    async def _compare_to_property_average(self, lease: Dict, prefetch: Optional[LeasePrefetch] = None) -> Dict:
         """Compare lease performance to property average"""
         
         property_id = lease["property_id"]
-        lease_id = str(lease["_id"])
         
         # Get this lease's performance
-        invoices_cursor = self.db.property_invoices.find({"lease_id": lease_id})
-        invoices = await invoices_cursor.to_list(length=None)
+        invoices = await self._lease_invoices(lease, prefetch)
         
         lease_expected = sum(inv.get("total_amount", 0) for inv in invoices)
         lease_collected = sum(inv.get("total_paid", 0) for inv in invoices)
         lease_collection_rate = (lease_collected / lease_expected * 100) if lease_expected > 0 else 0
         
-        # Get property average
-        property_invoices_cursor = self.db.property_invoices.find({"property_id": property_id})
-        property_invoices = await property_invoices_cursor.to_list(length=None)
-        
-        prop_expected = sum(inv.get("total_amount", 0) for inv in property_invoices)
-        prop_collected = sum(inv.get("total_paid", 0) for inv in property_invoices)
+        # Get property average (summed once per property in a batch)
+        if prefetch is not None:
+            totals = prefetch.property_totals.get(property_id, {})
+            prop_expected = totals.get("expected", 0)
+            prop_collected = totals.get("collected", 0)
+        else:
+            property_invoices_cursor = self.db.property_invoices.find(
+                {"property_id": property_id}, {"total_amount": 1, "total_paid": 1}
+            )
+            property_invoices = await property_invoices_cursor.to_list(length=None)
+            
+            prop_expected = sum(inv.get("total_amount", 0) for inv in property_invoices)
+            prop_collected = sum(inv.get("total_paid", 0) for inv in property_invoices)
         prop_collection_rate = (prop_collected / prop_expected * 100) if prop_expected > 0 else 0
         
         difference = lease_collection_rate - prop_collection_rate
@@ -755,7 +806,7 @@ class LeaseLifecycleReportGenerator:
         """Generate predictions for lease future"""
         
         end_date = lease["lease_terms"]["end_date"]
-        current_date = datetime.now(timezone.utc)
+        current_date = _now_like(end_date)
         days_until_end = (end_date - current_date).days
         
         # Predict renewal likelihood based on health score
@@ -846,14 +897,21 @@ class LeaseLifecycleReportGenerator:
     async def generate_batch_lifecycle_reports(
         self,
         property_id: Optional[str] = None,
-        status: Optional[str] = "signed"
+        status: Optional[str] = "signed",
+        lease_ids: Optional[List] = None
     ) -> List[Dict]:
         """
         Generate lifecycle reports for multiple leases
         
+        Invoices, tenants, properties, units and property totals for all the
+        leases are fetched up front (see ``LeasePrefetch``), so the batch
+        costs a handful of queries however many leases it covers. Reports
+        are then built concurrently, ``BATCH_CONCURRENCY`` at a time.
+        
         Args:
             property_id: Filter by property
             status: Filter by status
+            lease_ids: Only these leases
         
         Returns:
             List of lifecycle reports
@@ -864,6 +922,8 @@ class LeaseLifecycleReportGenerator:
             query["property_id"] = property_id
         if status:
             query["status"] = status
+        if lease_ids:
+            query["_id"] = {"$in": [ObjectId(i) if isinstance(i, str) and ObjectId.is_valid(i) else i for i in lease_ids]}
         
         leases_cursor = self.db.property_leases.find(query)
         leases = await leases_cursor.to_list(length=None)
@@ -873,15 +933,20 @@ class LeaseLifecycleReportGenerator:
         print(f" Generating reports for {len(leases)} leases...")
         print(f"{'='*100}")
         
-        reports = []
-        for i, lease in enumerate(leases, 1):
-            print(f"\nProcessing {i}/{len(leases)}: Lease {str(lease['_id'])[:12]}...")
-            
-            report = await self.generate_complete_lifecycle_report(
-                str(lease["_id"]),
-                include_predictions=True
-            )
-            reports.append(report)
+        prefetch = await LeasePrefetch.load(self.db, leases)
+        limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+        
+        async def build(i, lease):
+            async with limit:
+                print(f"\nProcessing {i}/{len(leases)}: Lease {str(lease['_id'])[:12]}...")
+                return await self.generate_complete_lifecycle_report(
+                    lease["_id"],
+                    include_predictions=True,
+                    prefetch=prefetch
+                )
+        
+        reports = await asyncio.gather(*(build(i, lease) for i, lease in enumerate(leases, 1)))
+        reports = list(reports)
         
         # Generate summary
         print(f"\n{'='*100}")
@@ -1,11 +1,138 @@
 import asyncio
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Literal
+from typing import Any, AsyncIterator, Dict, List, Optional, Literal
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 import calendar
 from collections import defaultdict
 
+from plugins.pms.utils.loaders import load_by_ids
+
+RENT_ROLL_COLUMNS = [
+    "Property", "Unit", "Status", "Tenant Name", "Tenant Phone",
+    "Lease Start", "Lease End", "Monthly Rent", "Security Deposit",
+    "Balance", "Last Payment Date", "Last Payment Amount"
+]
+
+TAX_COLUMNS = [
+    "Property", "Property Value", "Rental Income", "Utility Income", "Other Income",
+    "Gross Rental Income", "Total Collected", "Uncollected", "Total Expenses",
+    "Net Operating Income", "Depreciation", "Taxable Income"
+]
+
+INVOICE_FINANCIAL_FIELDS = {
+    "lease_id": 1, "date_issued": 1, "total_amount": 1, "total_paid": 1,
+    "balance_amount": 1, "payments": 1, "status": 1
+}
+
+
+def _comparable(value: datetime, reference: datetime) -> datetime:
+    """``value`` with the same awareness as ``reference`` (Mongo returns naive UTC)."""
+    if value.tzinfo is None and reference.tzinfo is not None:
+        return value.replace(tzinfo=timezone.utc)
+    if value.tzinfo is not None and reference.tzinfo is None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _financial_summary(invoices: List[Dict], as_of_date: datetime) -> Dict:
+    """Billing, payment and current-month status of one lease's invoices."""
+    total_billed = sum(inv.get("total_amount", 0) for inv in invoices)
+    total_paid = sum(inv.get("total_paid", 0) for inv in invoices)
+    balance = sum(inv.get("balance_amount", 0) for inv in invoices)
+
+    # Get last payment
+    last_payment_date = None
+    last_payment_amount = 0
+
+    for inv in invoices:
+        payments = inv.get("payments", [])
+        if payments:
+            latest = max(payments, key=lambda p: p.get("payment_date", datetime.min))
+            if not last_payment_date or latest["payment_date"] > last_payment_date:
+                last_payment_date = latest["payment_date"]
+                last_payment_amount = latest.get("amount", 0)
+
+    # Check if current month is paid
+    current_month = as_of_date.strftime("%Y-%m")
+    current_month_invoice = next(
+        (inv for inv in invoices if inv.get("date_issued") and inv["date_issued"].strftime("%Y-%m") == current_month),
+        None
+    )
+
+    current_month_status = "not_issued"
+    if current_month_invoice:
+        if current_month_invoice.get("status") == "paid":
+            current_month_status = "paid"
+        elif current_month_invoice.get("balance_amount", 0) > 0:
+            current_month_status = "unpaid"
+
+    return {
+        "total_billed": round(total_billed, 2),
+        "total_paid": round(total_paid, 2),
+        "balance": round(balance, 2),
+        "last_payment_date": last_payment_date,
+        "last_payment_amount": round(last_payment_amount, 2),
+        "current_month_status": current_month_status,
+        "months_outstanding": round(balance / current_month_invoice.get("total_amount", 1), 1) if current_month_invoice else 0
+    }
+
+
+def _date(value) -> str:
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+def rent_roll_row(prop: Dict, unit: Dict) -> Dict:
+    """One export row for a rent-roll unit."""
+    if unit['status'] == 'occupied':
+        return {
+            "Property": prop.get('name'),
+            "Unit": unit['unit_number'],
+            "Status": "Occupied",
+            "Tenant Name": unit['tenant']['name'],
+            "Tenant Phone": unit['tenant']['phone'],
+            "Lease Start": _date(unit['lease']['start_date']),
+            "Lease End": _date(unit['lease']['end_date']),
+            "Monthly Rent": unit['lease']['rent_amount'],
+            "Security Deposit": unit['lease']['deposit_amount'],
+            "Balance": unit['financial'].get('balance', 0),
+            "Last Payment Date": _date(unit['financial'].get('last_payment_date')),
+            "Last Payment Amount": unit['financial'].get('last_payment_amount', 0),
+        }
+    return {
+        "Property": prop.get('name'),
+        "Unit": unit['unit_number'],
+        "Status": "Vacant",
+        "Tenant Name": "",
+        "Tenant Phone": "",
+        "Lease Start": "",
+        "Lease End": "",
+        "Monthly Rent": unit.get('market_rent', 0),
+        "Security Deposit": "",
+        "Balance": "",
+        "Last Payment Date": "",
+        "Last Payment Amount": "",
+    }
+
+
+def tax_row(property_report: Dict) -> Dict:
+    """One export row for a property's tax report."""
+    income = property_report["income_summary"]
+    return {
+        "Property": property_report["property_name"],
+        "Property Value": property_report["property_value"],
+        "Rental Income": income["rental_income"],
+        "Utility Income": income["utility_income"],
+        "Other Income": income["other_income"],
+        "Gross Rental Income": income["gross_rental_income"],
+        "Total Collected": income["total_collected"],
+        "Uncollected": income["uncollected"],
+        "Total Expenses": property_report["expenses_summary"]["total_expenses"],
+        "Net Operating Income": property_report["net_operating_income"],
+        "Depreciation": property_report["depreciation"],
+        "Taxable Income": property_report["taxable_income"],
+    }
+
 
 class RentRollAndTaxesReportGenerator:
     """
@@ -115,127 +242,167 @@ class RentRollAndTaxesReportGenerator:
         """Generate rent roll for a single property"""
         
         property_id = property_data["_id"]
-        
-        # Get all units
-        units_cursor = self.db.property_units.find({"property_id": property_id}).sort("unitNumber", 1)
-        units = await units_cursor.to_list(length=None)
-        
-        # Get active leases
-        leases_cursor = self.db.property_leases.find({
-            "property_id": property_id,
-            "status": "signed",
-            "lease_terms.start_date": {"$lte": as_of_date},
-            "lease_terms.end_date": {"$gte": as_of_date}
-        })
-        leases = await leases_cursor.to_list(length=None)
-        
-        # Create lookup for occupied units
-        occupied_units = {}
-        for lease in leases:
-            for unit_id in lease.get("units_id", []):
-                occupied_units[unit_id] = lease
+        context = await self._property_rent_roll_context(property_id, as_of_date, include_financial_details)
+        occupied_units = context["occupied_units"]
         
         # Build unit details
         unit_details = []
+        total_units = 0
         total_monthly_rent = 0
         total_deposits = 0
         total_outstanding = 0
         
-        for unit in units:
-            unit_id = unit["_id"]
-            lease = occupied_units.get(unit_id)
-            
-            if lease:
-                # Occupied unit
-                tenant_id = lease["tenant_id"]
-                tenant = await self.db.property_tenants.find_one({"_id": tenant_id})
-                
-                # Get financial details
-                if include_financial_details:
-                    financial = await self._get_unit_financial_details(
-                        str(lease["_id"]),
-                        as_of_date
-                    )
-                else:
-                    financial = {}
-                
-                # Calculate lease status
-                end_date = lease["lease_terms"]["end_date"]
-                days_to_expiry = (end_date - as_of_date).days
-                
-                if days_to_expiry < 0:
-                    lease_status = "expired"
-                elif days_to_expiry <= 30:
-                    lease_status = "expiring_soon"
-                elif days_to_expiry <= 90:
-                    lease_status = "expiring_90_days"
-                else:
-                    lease_status = "active"
-                
-                unit_detail = {
-                    "unit_id": str(unit_id),
-                    "unit_number": unit.get("unitNumber"),
-                    "unit_name": unit.get("unitName"),
-                    "bedrooms": unit.get("bedrooms"),
-                    "square_feet": unit.get("squareFeet"),
-                    "status": "occupied",
-                    "tenant": {
-                        "tenant_id": str(tenant_id),
-                        "name": tenant.get("full_name") if tenant else "Unknown",
-                        "email": tenant.get("email") if tenant else "",
-                        "phone": tenant.get("phone") if tenant else "",
-                        "move_in_date": lease.get("move_in_date"),
-                    },
-                    "lease": {
-                        "lease_id": str(lease["_id"]),
-                        "start_date": lease["lease_terms"]["start_date"],
-                        "end_date": lease["lease_terms"]["end_date"],
-                        "days_to_expiry": days_to_expiry,
-                        "lease_status": lease_status,
-                        "rent_amount": lease["lease_terms"]["rent_amount"],
-                        "deposit_amount": lease["lease_terms"]["deposit_amount"],
-                    },
-                    "financial": financial
-                }
-                
-                total_monthly_rent += lease["lease_terms"]["rent_amount"]
-                total_deposits += lease["lease_terms"]["deposit_amount"]
-                total_outstanding += financial.get("balance", 0)
-                
-                unit_details.append(unit_detail)
-            
-            elif include_vacant:
-                # Vacant unit
-                unit_detail = {
-                    "unit_id": str(unit_id),
-                    "unit_number": unit.get("unitNumber"),
-                    "unit_name": unit.get("unitName"),
-                    "bedrooms": unit.get("bedrooms"),
-                    "square_feet": unit.get("squareFeet"),
-                    "status": "vacant",
-                    "market_rent": unit.get("rentAmount"),
-                    "tenant": None,
-                    "lease": None,
-                    "financial": {}
-                }
-                
-                unit_details.append(unit_detail)
+        async for unit in self._property_units(property_id):
+            total_units += 1
+            unit_detail = self._unit_detail(unit, context, as_of_date, include_vacant)
+            if unit_detail is None:
+                continue
+            if unit_detail["status"] == "occupied":
+                total_monthly_rent += unit_detail["lease"]["rent_amount"]
+                total_deposits += unit_detail["lease"]["deposit_amount"]
+                total_outstanding += unit_detail["financial"].get("balance", 0)
+            unit_details.append(unit_detail)
         
         return {
             "property_id": property_id,
             "property_name": property_data.get("name"),
             "property_address": property_data.get("location"),
             "summary": {
-                "total_units": len(units),
+                "total_units": total_units,
                 "occupied_units": len(occupied_units),
-                "vacant_units": len(units) - len(occupied_units),
-                "occupancy_rate": round((len(occupied_units) / len(units) * 100) if units else 0, 2),
+                "vacant_units": total_units - len(occupied_units),
+                "occupancy_rate": round((len(occupied_units) / total_units * 100) if total_units else 0, 2),
                 "total_monthly_rent": round(total_monthly_rent, 2),
                 "total_security_deposits": round(total_deposits, 2),
                 "total_outstanding": round(total_outstanding, 2),
             },
             "units": unit_details
         }
+
+    def _property_units(self, property_id):
+        return self.db.property_units.find({"property_id": property_id}).sort("unitNumber", 1)
+
+    async def _property_rent_roll_context(
+        self,
+        property_id: Any,
+        as_of_date: datetime,
+        include_financial_details: bool
+    ) -> Dict:
+        """
+        Everything a property's unit rows need, fetched once: active leases,
+        their tenants and (optionally) their invoices, so no query runs per unit.
+        """
+        leases = await self.db.property_leases.find({
+            "property_id": property_id,
+            "status": "signed",
+            "lease_terms.start_date": {"$lte": as_of_date},
+            "lease_terms.end_date": {"$gte": as_of_date}
+        }).to_list(length=None)
+        
+        # Create lookup for occupied units
+        occupied_units = {}
+        for lease in leases:
+            for unit_id in lease.get("units_id", []):
+                occupied_units[unit_id] = lease
+        
+        tenants = await load_by_ids(self.db.property_tenants, [lease["tenant_id"] for lease in leases])
+        
+        financials = {}
+        if include_financial_details and leases:
+            by_lease = {str(lease["_id"]): [] for lease in leases}
+            async for inv in self.db.property_invoices.find(
+                {"lease_id": {"$in": list(by_lease)}, "date_issued": {"$lte": as_of_date}},
+                INVOICE_FINANCIAL_FIELDS
+            ):
+                by_lease[inv["lease_id"]].append(inv)
+            financials = {
+                lease_id: _financial_summary(invoices, as_of_date)
+                for lease_id, invoices in by_lease.items()
+            }
+        
+        return {
+            "occupied_units": occupied_units,
+            "tenants": tenants,
+            "financials": financials,
+            "include_financial_details": include_financial_details,
+        }
+
+    def _unit_detail(
+        self,
+        unit: Dict,
+        context: Dict,
+        as_of_date: datetime,
+        include_vacant: bool
+    ) -> Optional[Dict]:
+        """Rent-roll entry for one unit, or None for a vacant unit when they are excluded."""
+        unit_id = unit["_id"]
+        lease = context["occupied_units"].get(unit_id)
+        
+        if lease:
+            # Occupied unit
+            tenant_id = lease["tenant_id"]
+            tenant = context["tenants"].get(tenant_id)
+            
+            # Get financial details
+            if context["include_financial_details"]:
+                financial = context["financials"].get(str(lease["_id"]), {})
+            else:
+                financial = {}
+            
+            # Calculate lease status
+            end_date = lease["lease_terms"]["end_date"]
+            days_to_expiry = (_comparable(end_date, as_of_date) - as_of_date).days
+            
+            if days_to_expiry < 0:
+                lease_status = "expired"
+            elif days_to_expiry <= 30:
+                lease_status = "expiring_soon"
+            elif days_to_expiry <= 90:
+                lease_status = "expiring_90_days"
+            else:
+                lease_status = "active"
+            
+            return {
+                "unit_id": str(unit_id),
+                "unit_number": unit.get("unitNumber"),
+                "unit_name": unit.get("unitName"),
+                "bedrooms": unit.get("bedrooms"),
+                "square_feet": unit.get("squareFeet"),
+                "status": "occupied",
+                "tenant": {
+                    "tenant_id": str(tenant_id),
+                    "name": tenant.get("full_name") if tenant else "Unknown",
+                    "email": tenant.get("email") if tenant else "",
+                    "phone": tenant.get("phone") if tenant else "",
+                    "move_in_date": lease.get("move_in_date"),
+                },
+                "lease": {
+                    "lease_id": str(lease["_id"]),
+                    "start_date": lease["lease_terms"]["start_date"],
+                    "end_date": lease["lease_terms"]["end_date"],
+                    "days_to_expiry": days_to_expiry,
+                    "lease_status": lease_status,
+                    "rent_amount": lease["lease_terms"]["rent_amount"],
+                    "deposit_amount": lease["lease_terms"]["deposit_amount"],
+                },
+                "financial": financial
+            }
+        
+        if include_vacant:
+            # Vacant unit
+            return {
+                "unit_id": str(unit_id),
+                "unit_number": unit.get("unitNumber"),
+                "unit_name": unit.get("unitName"),
+                "bedrooms": unit.get("bedrooms"),
+                "square_feet": unit.get("squareFeet"),
+                "status": "vacant",
+                "market_rent": unit.get("rentAmount"),
+                "tenant": None,
+                "lease": None,
+                "financial": {}
+            }
+        return None
     
     async def _get_unit_financial_details(
         self,
@@ -248,48 +415,9 @@ class RentRollAndTaxesReportGenerator:
         invoices_cursor = self.db.property_invoices.find({
             "lease_id": lease_id,
             "date_issued": {"$lte": as_of_date}
-        })
+        }, INVOICE_FINANCIAL_FIELDS)
         invoices = await invoices_cursor.to_list(length=None)
-        
-        total_billed = sum(inv.get("total_amount", 0) for inv in invoices)
-        total_paid = sum(inv.get("total_paid", 0) for inv in invoices)
-        balance = sum(inv.get("balance_amount", 0) for inv in invoices)
-        
-        # Get last payment
-        last_payment_date = None
-        last_payment_amount = 0
-        
-        for inv in invoices:
-            payments = inv.get("payments", [])
-            if payments:
-                latest = max(payments, key=lambda p: p.get("payment_date", datetime.min))
-                if not last_payment_date or latest["payment_date"] > last_payment_date:
-                    last_payment_date = latest["payment_date"]
-                    last_payment_amount = latest.get("amount", 0)
-        
-        # Check if current month is paid
-        current_month = as_of_date.strftime("%Y-%m")
-        current_month_invoice = next(
-            (inv for inv in invoices if inv.get("date_issued") and inv["date_issued"].strftime("%Y-%m") == current_month),
-            None
-        )
-        
-        current_month_status = "not_issued"
-        if current_month_invoice:
-            if current_month_invoice.get("status") == "paid":
-                current_month_status = "paid"
-            elif current_month_invoice.get("balance_amount", 0) > 0:
-                current_month_status = "unpaid"
-        
-        return {
-            "total_billed": round(total_billed, 2),
-            "total_paid": round(total_paid, 2),
-            "balance": round(balance, 2),
-            "last_payment_date": last_payment_date,
-            "last_payment_amount": round(last_payment_amount, 2),
-            "current_month_status": current_month_status,
-            "months_outstanding": round(balance / current_month_invoice.get("total_amount", 1), 1) if current_month_invoice else 0
-        }
+        return _financial_summary(invoices, as_of_date)
     
     def _print_rent_roll_report(self, report: Dict):
         """Print formatted rent roll report"""
@@ -441,19 +569,21 @@ class RentRollAndTaxesReportGenerator:
         
         # === INCOME SECTION ===
         
-        # Get all invoices for the period
-        invoices_cursor = self.db.property_invoices.find({
-            "property_id": property_id,
-            "date_issued": {"$gte": start_date, "$lte": end_date}
-        })
-        invoices = await invoices_cursor.to_list(length=None)
-        
-        # Break down income by type
+        # Stream the period's invoices; only running totals are kept
         rental_income = 0
         utility_income = 0
         other_income = 0
+        total_collected = 0
+        
+        # Tenant-specific breakdown
+        tenant_income = defaultdict(lambda: {"name": "", "income": 0, "collected": 0})
+        tenant_ids = {}
         
-        for inv in invoices:
+        async for inv in self.db.property_invoices.find({
+            "property_id": property_id,
+            "date_issued": {"$gte": start_date, "$lte": end_date}
+        }, {"line_items": 1, "tenant_id": 1, "total_amount": 1, "total_paid": 1}):
+            # Break down income by type
             for item in inv.get("line_items", []):
                 amount = item.get("amount", 0)
                 item_type = item.get("type")
@@ -464,25 +594,23 @@ class RentRollAndTaxesReportGenerator:
                     utility_income += amount
                 else:
                     other_income += amount
-        
-        gross_rental_income = rental_income + utility_income + other_income
-        
-        # Get actual collections (cash basis)
-        total_collected = sum(inv.get("total_paid", 0) for inv in invoices)
-        
-        # Tenant-specific breakdown
-        tenant_income = defaultdict(lambda: {"name": "", "income": 0, "collected": 0})
-        
-        for inv in invoices:
+            
+            # Get actual collections (cash basis)
+            total_collected += inv.get("total_paid", 0)
+            
             tenant_id = inv.get("tenant_id")
             if tenant_id:
-                tenant = await self.db.property_tenants.find_one({"_id": tenant_id})
-                tenant_name = tenant.get("full_name") if tenant else "Unknown"
-                
-                tenant_income[str(tenant_id)]["name"] = tenant_name
+                tenant_ids[str(tenant_id)] = tenant_id
                 tenant_income[str(tenant_id)]["income"] += inv.get("total_amount", 0)
                 tenant_income[str(tenant_id)]["collected"] += inv.get("total_paid", 0)
         
+        gross_rental_income = rental_income + utility_income + other_income
+        
+        tenants = await load_by_ids(self.db.property_tenants, tenant_ids.values(), {"full_name": 1})
+        for key, data in tenant_income.items():
+            tenant = tenants.get(tenant_ids[key])
+            data["name"] = tenant.get("full_name") if tenant else "Unknown"
+        
         # === EXPENSES SECTION ===
         
         # TODO: Implement expense tracking from tickets/maintenance
@@ -646,6 +774,58 @@ class RentRollAndTaxesReportGenerator:
             "tax_report": tax_report
         }
     
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+
+    def iter_properties(self, property_id: Optional[str] = None, property_ids: Optional[List[Any]] = None):
+        """Async cursor over the report's properties, limited to ``property_ids`` when given."""
+        if property_id:
+            return self.db.properties.find({"_id": property_id})
+        if property_ids is not None:
+            return self.db.properties.find({"_id": {"$in": property_ids}})
+        return self.db.properties.find({})
+
+    async def iter_rent_roll(
+        self,
+        property_id: Optional[str] = None,
+        as_of_date: Optional[datetime] = None,
+        include_vacant: bool = True,
+        include_financial_details: bool = True,
+        property_ids: Optional[List[Any]] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Rent-roll export rows, one unit at a time.
+
+        Per property, leases, tenants and invoices are prefetched in three
+        queries and units are read from a cursor, so memory is bounded by
+        the largest property rather than the portfolio.
+        """
+        if as_of_date is None:
+            as_of_date = datetime.now(timezone.utc)
+        
+        async for prop in self.iter_properties(property_id, property_ids):
+            context = await self._property_rent_roll_context(prop["_id"], as_of_date, include_financial_details)
+            async for unit in self._property_units(prop["_id"]):
+                unit_detail = self._unit_detail(unit, context, as_of_date, include_vacant)
+                if unit_detail is not None:
+                    yield rent_roll_row(prop, unit_detail)
+
+    async def iter_tax_report(
+        self,
+        property_id: Optional[str] = None,
+        year: Optional[int] = None,
+        property_ids: Optional[List[Any]] = None
+    ) -> AsyncIterator[Dict]:
+        """Annual tax export rows, one property at a time."""
+        if year is None:
+            year = datetime.now().year
+        start_date = datetime(year, 1, 1, tzinfo=timezone.utc)
+        end_date = datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
+        
+        async for prop in self.iter_properties(property_id, property_ids):
+            yield tax_row(await self._generate_property_tax_report(prop, start_date, end_date, year))
+    
     async def export_rent_roll_to_csv(
         self,
         property_id: Optional[str] = None,
@@ -655,57 +835,17 @@ class RentRollAndTaxesReportGenerator:
         
         import csv
         
-        report = await self.generate_rent_roll_report(
-            property_id=property_id,
-            as_of_date=as_of_date
-        )
+        if as_of_date is None:
+            as_of_date = datetime.now(timezone.utc)
         
-        filename = f"rent_roll_{report['as_of_date'].strftime('%Y%m%d')}.csv"
+        filename = f"rent_roll_{as_of_date.strftime('%Y%m%d')}.csv"
         
         with open(filename, 'w', newline='') as f:
-            fieldnames = [
-                "Property", "Unit", "Status", "Tenant Name", "Tenant Phone",
-                "Lease Start", "Lease End", "Monthly Rent", "Security Deposit",
-                "Balance", "Last Payment Date", "Last Payment Amount"
-            ]
-            
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer = csv.DictWriter(f, fieldnames=RENT_ROLL_COLUMNS)
             writer.writeheader()
             
-            for prop in report['properties']:
-                for unit in prop['units']:
-                    if unit['status'] == 'occupied':
-                        row = {
-                            "Property": prop['property_name'],
-                            "Unit": unit['unit_number'],
-                            "Status": "Occupied",
-                            "Tenant Name": unit['tenant']['name'],
-                            "Tenant Phone": unit['tenant']['phone'],
-                            "Lease Start": unit['lease']['start_date'].strftime('%Y-%m-%d'),
-                            "Lease End": unit['lease']['end_date'].strftime('%Y-%m-%d'),
-                            "Monthly Rent": unit['lease']['rent_amount'],
-                            "Security Deposit": unit['lease']['deposit_amount'],
-                            "Balance": unit['financial'].get('balance', 0),
-                            "Last Payment Date": unit['financial'].get('last_payment_date', '').strftime('%Y-%m-%d') if unit['financial'].get('last_payment_date') else '',
-                            "Last Payment Amount": unit['financial'].get('last_payment_amount', 0),
-                        }
-                    else:
-                        row = {
-                            "Property": prop['property_name'],
-                            "Unit": unit['unit_number'],
-                            "Status": "Vacant",
-                            "Tenant Name": "",
-                            "Tenant Phone": "",
-                            "Lease Start": "",
-                            "Lease End": "",
-                            "Monthly Rent": unit.get('market_rent', 0),
-                            "Security Deposit": "",
-                            "Balance": "",
-                            "Last Payment Date": "",
-                            "Last Payment Amount": "",
-                        }
-                    
-                    writer.writerow(row)
+            async for row in self.iter_rent_roll(property_id=property_id, as_of_date=as_of_date):
+                writer.writerow(row)
         
         print(f"\n✅ Rent roll exported to {filename}")
         return filename
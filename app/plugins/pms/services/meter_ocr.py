@@ -0,0 +1,288 @@
+"""
+Meter-reading OCR service.
+
+The digit detector (YOLO, ``plugins/pms/ai/model.pt``) is loaded once per
+worker process by the pool initializer, never per request. Requests are
+queued on the event loop and micro-batched: whatever arrives within
+``METER_OCR_MAX_WAIT_MS`` (up to ``METER_OCR_MAX_BATCH`` images) goes to a
+worker as one ``predict`` call. Decoding, inference and annotation all run
+in the worker, so the event loop only awaits a future.
+
+    service = get_meter_ocr_service()
+    result = await service.read(image_bytes)
+    results = await service.read_many([image_bytes, ...])
+
+Every result carries per-stage timings (``queue``, ``decode``, ``predict``,
+``render``, ``total`` in ms), which are also recorded as Prometheus
+histograms via ``metrics.metrics.MetricsCollector``.
+
+If a worker dies (out of memory, a crash in native code) the pool is broken
+for good; the batch that notices is retried once on a fresh pool.
+"""
+import asyncio
+import base64
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.getenv("METER_OCR_MODEL_PATH", os.path.join(BASE_DIR, "ai", "model.pt"))
+WORKERS = int(os.getenv("METER_OCR_WORKERS", "2"))
+MAX_BATCH = int(os.getenv("METER_OCR_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("METER_OCR_MAX_WAIT_MS", "15"))
+
+CONF_THRESH = 0.4
+MIN_DIGIT_WIDTH = 10
+INPUT_SIZE = (720, 525)
+DIGIT_LABELS = [str(i) for i in range(10)]
+
+
+# ---------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------
+
+_model = None
+
+
+def _load_model(model_path: str = MODEL_PATH):
+    """Pool initializer: load the detector once for this process."""
+    global _model
+    from ultralytics import YOLO
+    _model = YOLO(model_path)
+
+
+def _add_round_border(image, border_color=(232, 232, 232), border_radius=30, border_width=3):
+    from PIL import Image, ImageDraw
+    image = image.convert("RGBA")
+    mask = Image.new("L", image.size, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle([0, 0, image.size[0], image.size[1]], radius=border_radius, fill=255)
+    mask_in = Image.new("L", image.size, 0)
+    draw = ImageDraw.Draw(mask_in)
+    draw.rounded_rectangle(
+        [border_width, border_width, image.size[0]-border_width, image.size[1]-border_width],
+        radius=max(border_radius-border_width, 0), fill=255
+    )
+    border_image = Image.new("RGBA", image.size, color=border_color)
+    new_image = Image.new("RGBA", image.size, color=(220, 220, 65))
+    new_image.paste(border_image, mask=mask)
+    new_image.paste(image, mask=mask_in)
+    return new_image
+
+
+def _annotate(img, detections) -> str:
+    """Boxes and labels drawn on the frame, bordered, as base64 JPEG."""
+    import cv2
+    from PIL import Image
+    annotated = img.copy()
+    for det in detections:
+        x1, y1, x2, y2 = det["bbox"]
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        cv2.putText(annotated, DIGIT_LABELS[det["class_id"]], (x1, y1 - 5),
+                    cv2.FONT_HERSHEY_DUPLEX, 0.8, (0, 0, 255), 1)
+    annotated_pil = Image.fromarray(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB))
+    annotated_pil = _add_round_border(annotated_pil).convert("RGB")
+    buf = io.BytesIO()
+    annotated_pil.save(buf, format="JPEG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+def _read_batch(images: List[bytes], annotate: bool = True) -> List[Dict]:
+    """Decode, detect and read a batch of meter photos with one ``predict``."""
+    import cv2
+    import numpy as np
+    if not images:
+        return []
+    if _model is None:
+        _load_model()
+
+    started = time.perf_counter()
+    frames, results = [], []
+    for image_bytes in images:
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR) if image_bytes else None
+        frames.append(None if img is None else cv2.resize(img, INPUT_SIZE))
+    decode_ms = (time.perf_counter() - started) * 1000 / len(images)
+
+    valid = [frame for frame in frames if frame is not None]
+    started = time.perf_counter()
+    predictions = iter(_model.predict(valid, conf=CONF_THRESH, verbose=False) if valid else [])
+    predict_ms = (time.perf_counter() - started) * 1000
+
+    for frame in frames:
+        if frame is None:
+            results.append({"error": "Invalid image", "timings": {"decode": decode_ms}})
+            continue
+
+        started = time.perf_counter()
+        detections = []
+        for x1, y1, x2, y2, score, cls in next(predictions).boxes.data.tolist():
+            if score >= CONF_THRESH and x2 - x1 > MIN_DIGIT_WIDTH:
+                detections.append({
+                    "bbox": [int(x1), int(y1), int(x2), int(y2)],
+                    "class_id": int(cls),
+                    "score": float(score)
+                })
+        detections.sort(key=lambda d: d["bbox"][0])
+
+        result = {"reading": ""}
+        if detections:
+            result["reading"] = "".join(DIGIT_LABELS[d["class_id"]] for d in detections)
+            result["confidence_avg"] = round(sum(d["score"] for d in detections) / len(detections), 3)
+            result["detections"] = detections
+            if annotate:
+                result["annotated_base64"] = _annotate(frame, detections)
+        else:
+            result["message"] = "No digits detected."
+        result["timings"] = {
+            "decode": decode_ms,
+            "predict": predict_ms,
+            "render": (time.perf_counter() - started) * 1000,
+        }
+        results.append(result)
+    return results
+
+
+# ---------------------------------------------------------------
+# Event-loop side
+# ---------------------------------------------------------------
+
+class MeterOCRService:
+    """Process pool of preloaded detectors fed by an asyncio micro-batcher."""
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        max_batch: int = MAX_BATCH,
+        max_wait_ms: float = MAX_WAIT_MS,
+        model_path: str = MODEL_PATH,
+        metrics=None
+    ):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.model_path = model_path
+        self.metrics = metrics
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batchers: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the pool and one batcher per worker (idempotent)."""
+        if self._pool is not None:
+            return
+        self._pool = self._new_pool()
+        self._queue = asyncio.Queue()
+        self._batchers = [asyncio.create_task(self._batcher()) for _ in range(self.workers)]
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: torch does not survive fork() from a threaded parent
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_model,
+            initargs=(self.model_path,)
+        )
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        # every batcher on the broken pool lands here; only the first replaces it
+        if self._pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+    async def _predict(self, images: List[bytes], annotate: bool) -> List[Dict]:
+        """Run one batch on the pool, retrying once on a new pool if the old one broke."""
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            return await loop.run_in_executor(pool, _read_batch, images, annotate)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            return await loop.run_in_executor(self._pool, _read_batch, images, annotate)
+
+    async def warm_up(self):
+        """Spawn the workers and load the model now rather than on the first request."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._pool, _read_batch, []) for _ in range(self.workers)
+        ))
+
+    async def shutdown(self):
+        for task in self._batchers:
+            task.cancel()
+        self._batchers = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def read(self, image_bytes: bytes, annotate: bool = True) -> Dict:
+        """Read one meter photo; waits at most ``max_wait_ms`` for batch-mates."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_bytes, annotate, time.perf_counter(), future))
+        return await future
+
+    async def read_many(self, images: List[bytes], annotate: bool = True) -> List[Dict]:
+        """Read a round of photos; they are batched together by the batchers."""
+        return await asyncio.gather(*(self.read(image, annotate) for image in images))
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batcher(self):
+        while True:
+            batch = await self._next_batch()
+            dispatched = time.perf_counter()
+            # one predict per annotate flag keeps the worker call uniform
+            for annotate in {item[1] for item in batch}:
+                items = [item for item in batch if item[1] == annotate]
+                try:
+                    results = await self._predict([item[0] for item in items], annotate)
+                except Exception as e:
+                    for item in items:
+                        if not item[3].done():
+                            item[3].set_exception(e)
+                    continue
+                for (_, _, queued_at, future), result in zip(items, results):
+                    timings = result["timings"]
+                    timings["queue"] = (dispatched - queued_at) * 1000
+                    timings["total"] = (time.perf_counter() - queued_at) * 1000
+                    result["timings"] = {stage: round(ms, 2) for stage, ms in timings.items()}
+                    self._record(result["timings"])
+                    if not future.done():
+                        future.set_result(result)
+            if self.metrics is not None:
+                self.metrics.record_meter_ocr_batch(len(batch))
+
+    def _record(self, timings: Dict[str, float]):
+        if self.metrics is None:
+            return
+        for stage, ms in timings.items():
+            self.metrics.record_meter_ocr_stage(stage, ms / 1000)
+
+
+_service: Optional[MeterOCRService] = None
+
+
+def get_meter_ocr_service() -> MeterOCRService:
+    """Process-wide service instance, created on first use."""
+    global _service
+    if _service is None:
+        from metrics.metrics import get_metrics
+        _service = MeterOCRService(metrics=get_metrics())
+    return _service
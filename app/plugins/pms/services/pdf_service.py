@@ -1,18 +1,53 @@
+"""
+PDF rendering service.
+
+WeasyPrint is CPU-bound, so documents are rendered in a process pool and the
+event loop only awaits a future. Each worker keeps its compiled Jinja
+templates, font configuration and the bytes of local assets (logo,
+watermark) for its lifetime, so only the per-document layout is paid per
+render.
+
+    path = await generate_pdf("receipt_template.html", ctx, prefix="receipt_")
+    pdf_bytes = await get_pdf_service().render("invoice_template.html", ctx)
+    summary = await render_month_invoices(db, "2025-10")
+
+Water usage charts are drawn locally as SVG bar charts (no network call),
+memoized by the hash of their data. ``render_month_invoices`` renders every
+invoice of a month in parallel and uploads each PDF to MinIO as soon as it
+is ready.
+"""
+import asyncio
+import base64
+import io
+import mimetypes
+import multiprocessing
 import os
-import requests
-from weasyprint import HTML
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from urllib.parse import quote
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from pymongo import UpdateOne
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(BASE_DIR, "..", "templates","pdf")
 TEMPLATE_DIR = os.path.abspath(TEMPLATE_DIR)
 MEDIA_DIR = "media"
 
+WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+BATCH_CHUNK = int(os.getenv("PDF_BATCH_CHUNK", "200"))
+INVOICE_BUCKET = os.getenv("PDF_INVOICE_BUCKET", "pms-invoices")
+# templates are compiled once per worker; set to reload edits without a restart
+TEMPLATE_RELOAD = os.getenv("PDF_TEMPLATE_RELOAD", "").lower() in ("1", "true", "yes")
+
 env = Environment(
     loader=FileSystemLoader(TEMPLATE_DIR),
-    autoescape=select_autoescape(["html", "xml"])
+    autoescape=select_autoescape(["html", "xml"]),
+    auto_reload=TEMPLATE_RELOAD,
+    cache_size=-1
 )
 
 BRAND = {
@@ -23,51 +58,245 @@ BRAND = {
     "signature": "Authorized Manager",
 }
 
+
+# ---------------------------------------------------------------
+# Charts
+# ---------------------------------------------------------------
+
+CHART_SIZE = (400, 200)
+
+
+@lru_cache(maxsize=1024)
+def _water_chart_svg(items: Tuple[Tuple[str, float], ...]) -> str:
+    width, height = CHART_SIZE
+    pad_left, pad_bottom, pad_top = 36, 28, 10
+    plot_w, plot_h = width - pad_left - 8, height - pad_bottom - pad_top
+    peak = max((v for _, v in items), default=0) or 1
+    slot = plot_w / max(len(items), 1)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" font-size="9">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+    ]
+    for step in range(5):
+        y = pad_top + plot_h - plot_h * step / 4
+        parts.append(f'<line x1="{pad_left}" y1="{y:.1f}" x2="{width - 8}" y2="{y:.1f}" stroke="#e5e5e5"/>')
+        parts.append(f'<text x="{pad_left - 4}" y="{y + 3:.1f}" text-anchor="end" fill="#666">{round(peak * step / 4, 1):g}</text>')
+    for i, (label, value) in enumerate(items):
+        bar_h = plot_h * value / peak
+        x = pad_left + i * slot + slot * 0.15
+        parts.append(
+            f'<rect x="{x:.1f}" y="{pad_top + plot_h - bar_h:.1f}" width="{slot * 0.7:.1f}" '
+            f'height="{bar_h:.1f}" fill="{BRAND["color"]}"/>'
+        )
+        parts.append(
+            f'<text x="{x + slot * 0.35:.1f}" y="{height - pad_bottom + 12}" text-anchor="middle" fill="#333">'
+            f'{escape(label)}</text>'
+        )
+    parts.append("</svg>")
+    return "data:image/svg+xml;base64," + base64.b64encode("".join(parts).encode()).decode()
+
+
+def water_chart(water_data: Dict) -> Optional[str]:
+    """Monthly water usage bar chart as an SVG data URI, memoized by data."""
+    if not water_data:
+        return None
+    items = tuple((str(k), float(v or 0)) for k, v in water_data.items())
+    return _water_chart_svg(items)
+
+
+async def generate_water_chart(water_data: dict):
+    """Create a monthly bar chart for water usage"""
+    return water_chart(water_data)
+
+
+# ---------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------
+
+_font_config = None
+_assets: Dict[str, Dict] = {}
+
+
+def _init_worker():
+    """Pool initializer: import WeasyPrint and set up fonts once for this process."""
+    global _font_config
+    from weasyprint.text.fonts import FontConfiguration
+    _font_config = FontConfiguration()
+
+
+def _url_fetcher(url: str):
+    """WeasyPrint fetcher that keeps local files (logo, watermark) in memory."""
+    from weasyprint import default_url_fetcher
+    if not url.startswith("file:"):
+        return default_url_fetcher(url)
+    cached = _assets.get(url)
+    if cached is None:
+        fetched = default_url_fetcher(url)
+        data = fetched.get("string")
+        if data is None:
+            with fetched["file_obj"] as f:
+                data = f.read()
+        cached = _assets[url] = {
+            "string": data,
+            "mime_type": fetched.get("mime_type") or mimetypes.guess_type(url)[0],
+            "encoding": fetched.get("encoding"),
+            "redirected_url": fetched.get("redirected_url", url),
+        }
+    return dict(cached)
+
+
+def _render(template_name: str, context: Dict, out_path: Optional[str] = None) -> bytes:
+    """Render one template to PDF bytes, also written to ``out_path`` if given."""
+    from weasyprint import HTML
+    if _font_config is None:
+        _init_worker()
+    if context.get("water_data"):
+        context["water_chart"] = water_chart(context["water_data"])
+    context["brand"] = BRAND
+    html = env.get_template(template_name).render(**context)
+    pdf = HTML(string=html, base_url=".", url_fetcher=_url_fetcher).write_pdf(font_config=_font_config)
+    if out_path:
+        with open(out_path, "wb") as f:
+            f.write(pdf)
+    return pdf
+
+
+# ---------------------------------------------------------------
+# Event-loop side
+# ---------------------------------------------------------------
+
+class PdfRenderService:
+    """Process pool of WeasyPrint workers with warm template and asset caches."""
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        # spawn: the parent runs Motor/pymongo threads, which fork() would copy mid-state
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    async def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def render(self, template_name: str, context: Dict, out_path: Optional[str] = None) -> bytes:
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, _render, template_name, context, out_path
+        )
+
+
+_service: Optional[PdfRenderService] = None
+
+
+def get_pdf_service() -> PdfRenderService:
+    """Process-wide service instance, created on first use."""
+    global _service
+    if _service is None:
+        _service = PdfRenderService()
+    return _service
+
+
 async def generate_pdf(template_name: str, context: dict, prefix="doc_"):
     """Generate branded PDF with optional water usage graph"""
     os.makedirs(MEDIA_DIR, exist_ok=True)
-    template = env.get_template(template_name)
+    file_path = f"{MEDIA_DIR}/{prefix}{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}.pdf"
+    await get_pdf_service().render(template_name, context, file_path)
+    return file_path
 
-    # Generate chart if data provided
-    if "water_data" in context:
-        context["water_chart"] = await generate_water_chart(context["water_data"])
 
-    context["brand"] = BRAND
-    html = template.render(**context)
-    file_path = f"{MEDIA_DIR}/{prefix}{int(datetime.now().timestamp())}.pdf"
-    HTML(string=html, base_url=".").write_pdf(file_path)
-    return file_path
+# ---------------------------------------------------------------
+# Month batch
+# ---------------------------------------------------------------
 
+def get_minio_client():
+    """MinIO client configured from the same environment as the uploads routes."""
+    from minio import Minio
+    return Minio(
+        os.getenv("MINIO_ENDPOINT", "95.110.228.29:8714"),
+        access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+        secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+        secure=False
+    )
 
-async def generate_water_chart(water_data: dict):
-    """Create a monthly bar chart for water usage using QuickChart.io"""
-    months = list(water_data.keys())
-    values = list(water_data.values())
-
-    chart_config = {
-        "type": "bar",
-        "data": {
-            "labels": months,
-            "datasets": [{
-                "label": "Water Usage (m³)",
-                "backgroundColor": BRAND["color"],
-                "data": values
-            }]
-        },
-        "options": {
-            "plugins": {"legend": {"display": False}},
-            "scales": {"y": {"beginAtZero": True}}
+
+async def render_month_invoices(db, month: str, minio_client=None, bucket: str = INVOICE_BUCKET,
+                                template_name: str = "invoice_template.html",
+                                property_ids: Optional[List[Any]] = None) -> Dict:
+    """
+    Render every invoice of ``month`` (of ``property_ids`` only, when given)
+    and upload it to ``bucket`` as ``invoices/<month>/<invoice_id>.pdf``.
+
+    Invoices are read in chunks of ``BATCH_CHUNK`` with their tenants and
+    properties fetched once per chunk. Renders run on all pool workers and
+    each PDF is uploaded as soon as it is ready, so at most a few documents
+    are held in memory. The object name is stored on the invoice as
+    ``pdf_object``.
+    """
+    from plugins.pms.utils.loaders import load_by_ids
+
+    minio_client = minio_client or get_minio_client()
+    if not await asyncio.to_thread(minio_client.bucket_exists, bucket):
+        await asyncio.to_thread(minio_client.make_bucket, bucket)
+
+    service = get_pdf_service()
+    limit = asyncio.Semaphore(service.workers * 2)
+    today = datetime.now().strftime("%B %d, %Y")
+    rendered, failed = 0, []
+
+    async def render_one(invoice, tenants, properties):
+        object_name = f"invoices/{month}/{invoice['_id']}.pdf"
+        ctx = {
+            "invoice": invoice,
+            "tenant": tenants.get(invoice.get("tenant_id")),
+            "property": properties.get(invoice.get("property_id")),
+            "today": today,
         }
-    }
+        async with limit:
+            pdf = await service.render(template_name, ctx)
+            await asyncio.to_thread(
+                minio_client.put_object, bucket, object_name, io.BytesIO(pdf), len(pdf),
+                content_type="application/pdf"
+            )
+        return object_name
 
-    config_encoded = quote(str(chart_config))
-    chart_url = f"https://quickchart.io/chart?c={config_encoded}&backgroundColor=white&width=400&height=200"
-    out_path = f"{MEDIA_DIR}/water_chart_{int(datetime.now().timestamp())}.png"
+    query: Dict[str, Any] = {"month": month}
+    if property_ids is not None:
+        query["property_id"] = {"$in": property_ids}
+    cursor = db["invoices"].find(query).sort("_id", 1).batch_size(BATCH_CHUNK)
+    chunk: List[Dict] = []
 
-    # download chart image
-    resp = requests.get(chart_url)
-    if resp.status_code == 200:
-        with open(out_path, "wb") as f:
-            f.write(resp.content)
-        return out_path
-    return None
+    async def flush(chunk):
+        nonlocal rendered
+        tenants = await load_by_ids(db["property_tenants"], [inv.get("tenant_id") for inv in chunk])
+        properties = await load_by_ids(db["properties"], [inv.get("property_id") for inv in chunk])
+        results = await asyncio.gather(
+            *(render_one(inv, tenants, properties) for inv in chunk), return_exceptions=True
+        )
+        updates = []
+        for invoice, result in zip(chunk, results):
+            if isinstance(result, BaseException):
+                failed.append({"invoice_id": str(invoice["_id"]), "error": str(result)})
+                continue
+            rendered += 1
+            updates.append(UpdateOne({"_id": invoice["_id"]}, {"$set": {"pdf_object": result, "pdf_bucket": bucket}}))
+        if updates:
+            await db["invoices"].bulk_write(updates, ordered=False)
+
+    async for invoice in cursor:
+        chunk.append(invoice)
+        if len(chunk) >= BATCH_CHUNK:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+
+    return {"month": month, "bucket": bucket, "rendered": rendered, "failed": failed}
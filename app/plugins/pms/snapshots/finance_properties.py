@@ -1,21 +1,34 @@
-import hashlib, json
+import hashlib, json, time
 from datetime import datetime, timedelta, date
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from metrics.metrics import get_metrics
+from plugins.pms.accounting.periods import LedgerPeriods
+
+FINANCIAL_SNAPSHOT_TYPE = "property_financials"
 
 class FinancialSnapshotService:
     """
     Computes and caches property-level financial metrics.
     Works with async Motor and integrates with system_snapshots.
+
+    Invoice flows are one ``$facet`` aggregation (per-property totals,
+    overdue balances, portfolio summary) and cash collected comes from the
+    running account balances, so nothing is pulled into Python per document.
+    One snapshot document is kept per key; cache entries carry ``expires_at``
+    for the TTL index on system_snapshots. Invoice and ledger writes drop the
+    cache entries of their property through ``SnapshotInvalidationBus``.
     """
 
-    def __init__(self, db, ttl_hours: int = 6):
+    def __init__(self, db, ttl_hours: int = 6, metrics=None):
         self.db = db
         self.invoices_col = db.property_invoices
         self.ledger_col = db.property_ledger_entries
         self.snapshots_col = db.system_snapshots
-        self.snapshot_type = "property_financials"
+        self.snapshot_type = FINANCIAL_SNAPSHOT_TYPE
         self.ttl = timedelta(hours=ttl_hours)
+        self.metrics = metrics or get_metrics()
 
     # -------------------------------
     # 🔹 UTILITIES
@@ -37,27 +50,77 @@ class FinancialSnapshotService:
         })
         return cached
 
-    async def _save_snapshot(self, period_key: str, filters: dict, results: list, meta: dict):
-        """Save computed snapshot to DB."""
+    async def _save_snapshot(self, period_key: str, filters: dict, results: list, meta: dict, is_cache: bool = True):
+        """Upsert the snapshot for this key; cache entries expire through the TTL index."""
+        now = datetime.utcnow()
         doc = {
             "type": self.snapshot_type,
             "period_key": period_key,
-            "created_at": datetime.utcnow(),
+            "created_at": now,
             "data": {
                 "filters": filters,
                 "meta": meta,
                 "results": results
             }
         }
-        await self.snapshots_col.insert_one(doc)
+        update = {"$set": doc}
+        if is_cache:
+            doc["expires_at"] = now + self.ttl
+        else:
+            update["$unset"] = {"expires_at": ""}
+        key = {"type": self.snapshot_type, "period_key": period_key}
+        try:
+            await self.snapshots_col.update_one(key, update, upsert=True)
+        except DuplicateKeyError:
+            # a concurrent refresh inserted the key first: update its document
+            await self.snapshots_col.update_one(key, update)
         return doc
 
+    async def migrate_legacy_snapshots(self) -> Dict[str, int]:
+        """
+        Prepare snapshots written before upserts for the unique (type, period_key) index.
+
+        Older versions inserted a new document per refresh and never set
+        ``expires_at``. Keeps the newest document per key, then gives the
+        hash-keyed ones (cache entries) an expiry: stale ones are deleted and
+        fresh ones expire one TTL from now. Snapshots stored under their own
+        human ``period_key`` are left permanent. Safe to run on every startup.
+        """
+        now = datetime.utcnow()
+        duplicates = self.snapshots_col.aggregate([
+            {"$match": {"type": self.snapshot_type}},
+            {"$sort": {"created_at": -1}},
+            {"$group": {"_id": "$period_key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ])
+        stale_ids = []
+        async for group in duplicates:
+            stale_ids.extend(group["ids"][1:])
+        deduped = 0
+        if stale_ids:
+            deduped = (await self.snapshots_col.delete_many({"_id": {"$in": stale_ids}})).deleted_count
+
+        legacy_cache = {
+            "type": self.snapshot_type,
+            "expires_at": {"$exists": False},
+            # _make_key hashes filters to sha1 hex unless a snapshot names its own period_key
+            "period_key": {"$regex": "^[0-9a-f]{40}$"},
+        }
+        expired = (await self.snapshots_col.delete_many(
+            {**legacy_cache, "created_at": {"$lt": now - self.ttl}}
+        )).deleted_count
+        scheduled = (await self.snapshots_col.update_many(
+            legacy_cache, {"$set": {"expires_at": now + self.ttl}}
+        )).modified_count
+        return {"deduped": deduped, "expired": expired, "scheduled": scheduled}
+
     async def invalidate_cache(self, property_ids: List[str]):
         """Invalidate cache entries for specific properties."""
         res = await self.snapshots_col.delete_many({
             "type": self.snapshot_type,
             "data.filters.property_ids": {"$in": property_ids}
         })
+        self.metrics.record_snapshot_invalidation(self.snapshot_type, "invalidate", "manual", res.deleted_count)
         print(f"🧹 Invalidated {res.deleted_count} cache entries for {property_ids}")
 
     # -------------------------------
@@ -77,11 +140,13 @@ class FinancialSnapshotService:
 
         if is_cache:
             cached = await self._get_cached(period_key)
+            self.metrics.record_snapshot_lookup(self.snapshot_type, cached is not None)
             if cached:
                 print(f"✅ Cache hit ({period_key[:8]}...)")
                 return cached["data"]["results"]
 
         # Otherwise compute fresh results
+        started = time.perf_counter()
         results = await self._compute_flows_and_balances(
             property_ids=filters.get("property_ids"),
             start_date=filters.get("start_date"),
@@ -97,7 +162,8 @@ class FinancialSnapshotService:
         }
 
         # Save cache or permanent snapshot
-        saved = await self._save_snapshot(period_key, filters, results, meta)
+        saved = await self._save_snapshot(period_key, filters, results, meta, is_cache=is_cache)
+        self.metrics.record_snapshot_recompute(self.snapshot_type, time.perf_counter() - started)
         print(f"💾 Snapshot saved ({'cache' if is_cache else 'snapshot'}:{period_key[:8]}...)")
 
         return results
@@ -112,48 +178,59 @@ class FinancialSnapshotService:
         end_date: Optional[datetime] = None,
         include_summary: bool = True
     ) -> List[Dict[str, Any]]:
-        """Compute totals per property (async version)."""
+        """Compute totals per property with one aggregation over invoices."""
         today = datetime.combine(date.today(), datetime.min.time())
-        invoice_query, ledger_query = {}, {}
+        invoice_query: Dict[str, Any] = {"property_id": {"$nin": [None, ""]}}
 
         if property_ids:
-            invoice_query["property_id"] = {"$in": property_ids}
-            ledger_query["property_id"] = {"$in": property_ids}
+            invoice_query["property_id"]["$in"] = property_ids
 
         if start_date and end_date:
             invoice_query["date_issued"] = {"$gte": start_date, "$lte": end_date}
-            ledger_query["date"] = {"$gte": start_date, "$lte": end_date}
 
-        invoices = [i async for i in self.invoices_col.find(invoice_query)]
-        ledgers = [e async for e in self.ledger_col.find(ledger_query)]
+        amount = {"$ifNull": ["$total_amount", 0]}
+        facets = (await self.invoices_col.aggregate([
+            {"$match": invoice_query},
+            {"$facet": {
+                "properties": [
+                    {"$group": {"_id": "$property_id", "invoiced": {"$sum": amount}, "count": {"$sum": 1}}},
+                    {"$sort": {"_id": 1}}
+                ],
+                "overdue": [
+                    {"$match": {"due_date": {"$lt": today}, "status": {"$in": ["partial", "unpaid"]}}},
+                    {"$group": {
+                        "_id": "$property_id",
+                        "balance": {"$sum": {"$ifNull": ["$balance_amount", 0]}},
+                        "count": {"$sum": 1}
+                    }}
+                ],
+                "summary": [
+                    {"$group": {"_id": None, "invoiced": {"$sum": amount}, "count": {"$sum": 1}}}
+                ]
+            }}
+        ], allowDiskUse=True).to_list(length=1))[0]
 
-        # Aggregate ledgers (Cash only)
-        ledger_by_property: Dict[str, float] = {}
-        for e in ledgers:
-            if e.get("account") == "Cash" and e.get("property_id"):
-                pid = e["property_id"]
-                ledger_by_property[pid] = ledger_by_property.get(pid, 0.0) + float(e.get("debit", 0.0))
-
-        # Group invoices
-        invoice_by_property: Dict[str, List[Dict]] = {}
-        for inv in invoices:
-            pid = inv.get("property_id")
-            if pid:
-                invoice_by_property.setdefault(pid, []).append(inv)
+        # Cash collected per property: running balances from the nearest closed period on
+        cash = await LedgerPeriods(self.db).account_totals(
+            "Cash",
+            property_ids=property_ids,
+            start=start_date if start_date and end_date else None,
+            end=end_date if start_date and end_date else None
+        )
+        ledger_by_property: Dict[str, float] = {pid: totals.debit for pid, totals in cash.items() if pid}
+        overdue_by_property = {doc["_id"]: doc for doc in facets["overdue"]}
 
         results = []
         totals = dict(period_invoiced=0.0, period_collected=0.0, pending_collection=0.0, overdue_balance=0.0)
 
-        for pid, invs in invoice_by_property.items():
-            total_invoiced = sum(float(i.get("total_amount", 0)) for i in invs)
+        for group in facets["properties"]:
+            pid = group["_id"]
+            total_invoiced = float(group["invoiced"])
             total_collected = float(ledger_by_property.get(pid, 0.0))
             total_pending = total_invoiced - total_collected if total_invoiced else 0.0
 
-            overdue_invs = [
-                i for i in invs
-                if i.get("due_date") and i["due_date"] < today and i.get("status") in ["partial", "unpaid"]
-            ]
-            total_overdue = round(sum(float(i.get("balance_amount", 0)) for i in overdue_invs), 2)
+            overdue = overdue_by_property.get(pid, {})
+            total_overdue = round(float(overdue.get("balance", 0.0)), 2)
 
             collection_rate = (total_collected / total_invoiced * 100) if total_invoiced else 0
             overdue_rate = (total_overdue / total_pending * 100) if total_pending else 0
@@ -166,15 +243,17 @@ class FinancialSnapshotService:
                 "overdue_balance": total_overdue,
                 "collection_rate": round(collection_rate, 1),
                 "overdue_rate": round(overdue_rate, 1),
-                "invoice_count": len(invs),
-                "overdue_count": len(overdue_invs)
+                "invoice_count": group["count"],
+                "overdue_count": overdue.get("count", 0)
             })
 
-            totals["period_invoiced"] += total_invoiced
             totals["period_collected"] += total_collected
             totals["pending_collection"] += total_pending
             totals["overdue_balance"] += total_overdue
 
+        summary = facets["summary"][0] if facets["summary"] else {"invoiced": 0.0, "count": 0}
+        totals["period_invoiced"] = float(summary["invoiced"])
+
         if include_summary and results:
             results.append({
                 "property_id": "ALL",
@@ -184,7 +263,7 @@ class FinancialSnapshotService:
                 "overdue_balance": round(totals["overdue_balance"], 2),
                 "collection_rate": round((totals["period_collected"] / totals["period_invoiced"] * 100) if totals["period_invoiced"] else 0.0, 1),
                 "overdue_rate": round((totals["overdue_balance"] / totals["pending_collection"] * 100) if totals["pending_collection"] else 0.0, 1),
-                "invoice_count": sum(r["invoice_count"] for r in results),
+                "invoice_count": summary["count"],
                 "overdue_count": sum(r["overdue_count"] for r in results)
             })
         return results
@@ -0,0 +1,240 @@
+"""
+Event-driven invalidation of the PMS snapshot caches.
+
+``PropertySnapshotService`` caches each owner's properties and units, and
+``FinancialSnapshotService`` caches invoice and ledger flows per filter set,
+both in ``system_snapshots``. ``SnapshotInvalidationBus`` touches only the
+entries a write affects:
+
+- a unit insert, update or delete is patched into the property snapshots
+  that list its property, so occupancy and rent changes never force a rebuild
+- a property write deletes its owner's snapshot and any snapshot listing the
+  property (which also covers deletes and owner changes)
+- an invoice or ledger write deletes the financial cache entries filtered on
+  its property, plus the portfolio-wide entries without a property filter
+
+Writes reach the bus in one of two ways. With a replica set it follows the
+change streams of the four collections, so every writer is seen, including
+scripts and other processes. A standalone server has no change streams, so
+the write paths call the hook instead (next to ``mark_tenants_dirty``):
+
+    await snapshots_changed(db, "units", ids=[unit_id])
+
+and the TTLs bound anything written elsewhere. While the change stream is
+live the hook returns immediately. Invalidation is best effort: a failure is
+logged and the write it follows still succeeds.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from metrics.metrics import get_metrics
+from plugins.pms.snapshots.finance_properties import FINANCIAL_SNAPSHOT_TYPE
+from plugins.pms.snapshots.property import PROPERTY_SNAPSHOT_TYPE, unit_entry
+
+logger = logging.getLogger(__name__)
+
+FINANCIAL_COLLECTIONS = ("property_invoices", "property_ledger_entries")
+WATCHED_COLLECTIONS = ("properties", "units") + FINANCIAL_COLLECTIONS
+
+
+def _id_variants(values: Iterable[Any]) -> List[Any]:
+    """Each id as stored and as its string/ObjectId counterpart, for ``$in`` matches."""
+    variants = set()
+    for value in values:
+        if value is None:
+            continue
+        variants.add(value)
+        variants.add(str(value))
+        if isinstance(value, str) and ObjectId.is_valid(value):
+            variants.add(ObjectId(value))
+    return list(variants)
+
+
+class SnapshotInvalidationBus:
+    """Applies writes to the watched collections to the cached snapshots of one database."""
+
+    def __init__(self, db, metrics=None):
+        self.db = db
+        self.snapshots = db.system_snapshots
+        self.metrics = metrics or get_metrics()
+        self.live = False
+        self._follower: Optional[asyncio.Task] = None
+
+    # ---------------------------------------------------
+    # Entry points
+    # ---------------------------------------------------
+    async def publish(self, collection: str, docs: Iterable[Dict] = (), ids: Iterable[Any] = (),
+                      deleted_ids: Iterable[Any] = (), source: str = "hook"):
+        """
+        Apply writes to ``collection``: ``docs`` as written, ``ids`` of
+        written documents (loaded here) and ``deleted_ids`` of removed ones.
+        """
+        docs, deleted_ids = list(docs), list(deleted_ids)
+        ids = [i for i in ids if i is not None]
+        if ids:
+            docs += await self.db[collection].find({"_id": {"$in": _id_variants(ids)}}).to_list(None)
+        if not docs and not deleted_ids:
+            return
+        if collection == "units":
+            await self._units_changed(docs, deleted_ids, source)
+        elif collection == "properties":
+            await self._properties_changed(docs, deleted_ids, source)
+        elif collection in FINANCIAL_COLLECTIONS:
+            property_ids = {doc.get("property_id") for doc in docs}
+            # a deleted document's property is unknown, as is a write without one
+            known = not deleted_ids and None not in property_ids
+            await self._finances_changed(property_ids if known else None, source)
+
+    async def apply_change(self, change: Dict):
+        """Apply one change-stream event."""
+        coll = change.get("ns", {}).get("coll")
+        op = change.get("operationType")
+        key = change.get("documentKey", {}).get("_id")
+        doc = change.get("fullDocument")
+        if op not in ("insert", "update", "replace", "delete") or key is None:
+            return
+        if op == "delete" or doc is None:
+            # updateLookup finds nothing when the document was deleted since
+            await self.publish(coll, deleted_ids=[key], source="change_stream")
+        else:
+            await self.publish(coll, docs=[doc], source="change_stream")
+
+    def start(self):
+        """Follow the change streams in the background (no-op once started)."""
+        if self._follower is None:
+            self._follower = asyncio.create_task(self._follow())
+
+    async def stop(self):
+        if self._follower is not None:
+            self._follower.cancel()
+            self._follower = None
+        self.live = False
+
+    async def _follow(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        try:
+            async with self.db.watch(pipeline, full_document="updateLookup") as stream:
+                self.live = True
+                async for change in stream:
+                    try:
+                        await self.apply_change(change)
+                    except PyMongoError as e:
+                        logger.warning("snapshot bus: could not apply %s change (%s)", change.get("ns"), e)
+        except (PyMongoError, NotImplementedError) as e:
+            logger.info("snapshot bus: change streams unavailable (%s); relying on write hooks", e)
+        except Exception:
+            logger.exception("snapshot bus: change stream follower stopped")
+        finally:
+            self.live = False
+
+    # ---------------------------------------------------
+    # Property snapshots
+    # ---------------------------------------------------
+    async def _units_changed(self, units: List[Dict], deleted_ids: List[Any], source: str):
+        """Patch written and deleted units into every snapshot listing them or their property."""
+        written: Dict[str, Tuple[str, Dict]] = {
+            str(u["_id"]): (str(u.get("property_id")), unit_entry(u)) for u in units
+        }
+        deleted: Set[str] = {str(i) for i in deleted_ids}
+        touched = list(written) + list(deleted)
+        property_ids = list({pid for pid, _ in written.values()})
+        query = {
+            "type": PROPERTY_SNAPSHOT_TYPE,
+            "$or": [
+                {"data.properties._id": {"$in": property_ids}},
+                {"data.properties.units._id": {"$in": touched}},
+            ],
+        }
+        patched = dropped = 0
+        async for snapshot in self.snapshots.find(query, {"data.properties": 1}):
+            original = snapshot["data"]["properties"]
+            properties = [self._patch_property(p, written, deleted) for p in original]
+            # only apply over the version read; a concurrent patch makes us drop the entry instead
+            result = await self.snapshots.update_one(
+                {"_id": snapshot["_id"], "data.properties": original},
+                {"$set": {"data.properties": properties}}
+            )
+            if result.modified_count:
+                patched += 1
+            elif not result.matched_count:
+                dropped += (await self.snapshots.delete_one({"_id": snapshot["_id"]})).deleted_count
+        self.metrics.record_snapshot_invalidation(PROPERTY_SNAPSHOT_TYPE, "patch", source, patched)
+        self.metrics.record_snapshot_invalidation(PROPERTY_SNAPSHOT_TYPE, "invalidate", source, dropped)
+
+    @staticmethod
+    def _patch_property(prop: Dict, written: Dict[str, Tuple[str, Dict]], deleted: Set[str]) -> Dict:
+        """``prop`` with written units updated in place or added, and deleted or moved ones removed."""
+        units = []
+        for unit in prop.get("units") or []:
+            if unit["_id"] in deleted:
+                continue
+            update = written.get(unit["_id"])
+            if update is None:
+                units.append(unit)
+            elif update[0] == prop["_id"]:
+                units.append(update[1])
+        present = {unit["_id"] for unit in units}
+        units.extend(
+            entry for unit_id, (property_id, entry) in written.items()
+            if property_id == prop["_id"] and unit_id not in present
+        )
+        return {**prop, "units": units}
+
+    async def _properties_changed(self, properties: List[Dict], deleted_ids: List[Any], source: str):
+        """Drop the snapshots of the owners of written properties and any listing them."""
+        owners = [p["owner_id"] for p in properties if p.get("owner_id") is not None]
+        property_ids = [str(p["_id"]) for p in properties] + [str(i) for i in deleted_ids]
+        result = await self.snapshots.delete_many({
+            "type": PROPERTY_SNAPSHOT_TYPE,
+            "$or": [
+                {"period_key": {"$in": owners}},
+                {"data.properties._id": {"$in": property_ids}},
+            ],
+        })
+        self.metrics.record_snapshot_invalidation(PROPERTY_SNAPSHOT_TYPE, "invalidate", source, result.deleted_count)
+
+    # ---------------------------------------------------
+    # Financial snapshots
+    # ---------------------------------------------------
+    async def _finances_changed(self, property_ids: Optional[Set[Any]], source: str):
+        """
+        Drop the financial cache entries covering ``property_ids`` (all of
+        them when ``None``). Permanent period snapshots, saved without
+        ``expires_at``, are left alone.
+        """
+        query: Dict[str, Any] = {"type": FINANCIAL_SNAPSHOT_TYPE, "expires_at": {"$exists": True}}
+        if property_ids is not None:
+            query["$or"] = [
+                {"data.filters.property_ids": {"$in": _id_variants(property_ids)}},
+                {"data.filters.property_ids": {"$in": [None, []]}},
+            ]
+        result = await self.snapshots.delete_many(query)
+        self.metrics.record_snapshot_invalidation(FINANCIAL_SNAPSHOT_TYPE, "invalidate", source, result.deleted_count)
+
+
+_buses: Dict[Tuple[int, str], SnapshotInvalidationBus] = {}
+
+
+def get_invalidation_bus(db) -> SnapshotInvalidationBus:
+    """The process-wide bus for ``db``."""
+    key = (id(db.client), db.name)
+    bus = _buses.get(key)
+    if bus is None:
+        bus = _buses[key] = SnapshotInvalidationBus(db)
+    return bus
+
+
+async def snapshots_changed(db, collection: str, docs: Iterable[Dict] = (), ids: Iterable[Any] = (),
+                            deleted_ids: Iterable[Any] = ()) -> None:
+    """Write hook: update the snapshot caches after a write the change stream may not see."""
+    bus = get_invalidation_bus(db)
+    if bus.live:
+        return
+    try:
+        await bus.publish(collection, docs=docs, ids=ids, deleted_ids=deleted_ids)
+    except PyMongoError as e:
+        logger.warning("snapshot bus: could not invalidate after %s write (%s)", collection, e)
@@ -1,22 +1,44 @@
+import time
 from datetime import datetime, timedelta,timezone
 from typing import List, Optional
 from bson import ObjectId
 from fastapi import HTTPException
 
+from metrics.metrics import get_metrics
+
+PROPERTY_SNAPSHOT_TYPE = "properties"
+
+
+def unit_entry(u: dict) -> dict:
+    """The fields of a unit kept in a property snapshot."""
+    return {
+        "_id": str(u["_id"]),
+        "unit_number":u.get("unitNumber"),
+        "unit_name": u.get("unitName"),
+        "status": u.get("status"),
+        "rent": u.get("rentAmount")
+    }
+
+
 class PropertySnapshotService:
     """
     Maintains cached structural data (properties + units) per owner.
     Snapshot type: 'properties'
     Cache key: owner_id
+
+    Writes to properties and units reach the cache through
+    ``SnapshotInvalidationBus`` (snapshots/invalidation.py), which patches
+    units in place and drops the snapshot of an owner whose properties change.
     """
 
-    def __init__(self, db, ttl_hours: int = 24):
+    def __init__(self, db, ttl_hours: int = 24, metrics=None):
         self.db = db
         self.snapshots = db.system_snapshots
         self.properties = db.properties
         self.units = db.units
         self.ttl = timedelta(hours=ttl_hours)
-        self.snapshot_type = "properties"
+        self.snapshot_type = PROPERTY_SNAPSHOT_TYPE
+        self.metrics = metrics or get_metrics()
 
     async def _get_cached(self, owner_id: str):
         """Fetch existing properties snapshot if valid."""
@@ -54,13 +76,7 @@ class PropertySnapshotService:
         units_by_prop = {}
         for u in units:
             pid = u["property_id"]
-            units_by_prop.setdefault(pid, []).append({
-                "_id": str(u["_id"]),
-                "unit_number":u.get("unitNumber"),
-                "unit_name": u.get("unitName"),
-                "status": u.get("status"),
-                "rent": u.get("rentAmount")
-            })
+            units_by_prop.setdefault(pid, []).append(unit_entry(u))
 
         for p in props:
             p["_id"] = str(p["_id"])
@@ -85,13 +101,16 @@ class PropertySnapshotService:
     async def get_or_refresh_snapshot(self, owner_id: str,summarize=True) -> dict:
         """Return cached or fresh property snapshot for a user."""
         cached = await self._get_cached(owner_id)
+        self.metrics.record_snapshot_lookup(self.snapshot_type, cached is not None)
         if cached:
             print(f"✅ Property cache hit for {owner_id}")
             return self.prepare_data(cached,summarize)
 
+        started = time.perf_counter()
         props = await self._build_property_snapshot(owner_id)
         doc = await self._save_snapshot(owner_id, props)
-        return self.prepare_data(cached,summarize)
+        self.metrics.record_snapshot_recompute(self.snapshot_type, time.perf_counter() - started)
+        return self.prepare_data(doc,summarize)
 
     async def invalidate_snapshot(self, owner_id: str):
         """Delete cached snapshot if property/unit structure changes."""
@@ -99,4 +118,5 @@ class PropertySnapshotService:
             "type": self.snapshot_type,
             "period_key": owner_id
         })
+        self.metrics.record_snapshot_invalidation(self.snapshot_type, "invalidate", "manual", res.deleted_count)
         print(f"🧹 Deleted {res.deleted_count} cached property snapshot(s) for {owner_id}")
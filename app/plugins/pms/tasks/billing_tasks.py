@@ -0,0 +1,58 @@
+import asyncio
+import os
+import dramatiq
+from motor.motor_asyncio import AsyncIOMotorClient
+from plugins.pms.utils.invoice_manager import AsyncLeaseInvoiceManager
+from plugins.pms.utils.billing_runs import BillingRunCoordinator, DEFAULT_SHARD_SIZE
+from plugins.pms.utils.dirty_tenants import flush_dirty_tenants
+from workers.tasks import MONGO_URI
+
+DATABASE_NAME = os.getenv("MONGO_DATABASE", "fq_db")
+
+
+async def _with_coordinator(fn):
+    client = AsyncIOMotorClient(MONGO_URI)
+    try:
+        manager = AsyncLeaseInvoiceManager(client, DATABASE_NAME)
+        return await fn(BillingRunCoordinator(manager))
+    finally:
+        await flush_dirty_tenants()
+        client.close()
+
+
+@dramatiq.actor(max_retries=0)
+def start_billing_run(
+    billing_month: str,
+    force: bool = False,
+    balance_method: str = "sum",
+    shard_size: int = DEFAULT_SHARD_SIZE
+):
+    """Create (or pick up the unfinished) run for the month and fan its shards out."""
+    async def start(coordinator):
+        run = await coordinator.start_run(billing_month, force, balance_method, shard_size)
+        return run["_id"], await coordinator.resume(run["_id"])
+
+    run_id, shard_indexes = asyncio.run(_with_coordinator(start))
+    for index in shard_indexes:
+        bill_billing_shard.send(run_id, index)
+    print(f"🧾 Billing run {run_id} ({billing_month}): {len(shard_indexes)} shards queued")
+
+
+@dramatiq.actor(max_retries=3, time_limit=60 * 60 * 1000)
+def bill_billing_shard(run_id: str, index: int):
+    """Bill one shard; failures are recorded on the shard and retried by Dramatiq."""
+    results = asyncio.run(_with_coordinator(lambda c: c.run_shard(run_id, index)))
+    if results is None:
+        print(f"⏭️ Billing run {run_id} shard {index} already claimed or done")
+    else:
+        print(f"✅ Billing run {run_id} shard {index}: "
+              f"{len(results['invoices_created'])} invoices, {len(results['errors'])} errors")
+
+
+@dramatiq.actor(max_retries=0)
+def resume_billing_run(run_id: str, failed_only: bool = False):
+    """Re-send unfinished shards, or only the failed ones."""
+    shard_indexes = asyncio.run(_with_coordinator(lambda c: c.resume(run_id, failed_only)))
+    for index in shard_indexes:
+        bill_billing_shard.send(run_id, index)
+    print(f"🔁 Billing run {run_id}: {len(shard_indexes)} shards re-queued")
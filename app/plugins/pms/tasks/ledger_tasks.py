@@ -0,0 +1,24 @@
+import asyncio
+import os
+import dramatiq
+from motor.motor_asyncio import AsyncIOMotorClient
+from plugins.pms.accounting.periods import LedgerPeriods
+from workers.tasks import MONGO_URI
+from core.scheduler_decorators import run_every_day
+
+DATABASE_NAME = os.getenv("MONGO_DATABASE", "fq_db")
+
+
+@run_every_day(hour=1, minute=30)
+@dramatiq.actor(max_retries=3)
+def close_ledger_periods():
+    """Close last month (and re-close back-dated months) for every property."""
+    async def close():
+        client = AsyncIOMotorClient(MONGO_URI)
+        try:
+            return await LedgerPeriods(client[DATABASE_NAME]).close_due_periods(closed_by="scheduler")
+        finally:
+            client.close()
+
+    stats = asyncio.run(close())
+    print(f"📘 Ledger periods: {stats['closed']} closed across {stats['properties']} properties")
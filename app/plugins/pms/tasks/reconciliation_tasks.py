@@ -0,0 +1,29 @@
+import asyncio
+import os
+import dramatiq
+from motor.motor_asyncio import AsyncIOMotorClient
+from plugins.pms.utils.dirty_tenants import flush_dirty_tenants
+from plugins.pms.utils.statement_reconciliation import StatementReconciler
+from workers.tasks import MONGO_URI
+
+DATABASE_NAME = os.getenv("MONGO_DATABASE", "fq_db")
+
+
+async def _reconcile(run_id: str):
+    client = AsyncIOMotorClient(MONGO_URI)
+    try:
+        return await StatementReconciler(client[DATABASE_NAME]).run(run_id)
+    finally:
+        await flush_dirty_tenants()
+        client.close()
+
+
+@dramatiq.actor(max_retries=0, time_limit=60 * 60 * 1000)
+def reconcile_statement(run_id: str):
+    """Match and post a queued statement reconciliation run; failures are recorded on the run."""
+    summary = asyncio.run(_reconcile(run_id))
+    if summary is None:
+        print(f"⏭️ Statement reconciliation {run_id} already claimed or done")
+    else:
+        print(f"✅ Statement reconciliation {run_id}: {summary['posted']}/{summary['rows']} rows posted, "
+              f"{summary['exceptions']} exceptions in {summary['seconds']}s")
@@ -1,85 +1,100 @@
 import asyncio
+import os
+import threading
 import dramatiq
-from bson import ObjectId
 from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
-from plugins.pms.utils.advanced_rent_analytics import AdvancedRentAnalytics
+from plugins.pms.utils.tenant_risk_bulk import BulkTenantRiskScorer
+from plugins.pms.utils.dirty_tenants import pop_dirty_tenants, requeue_dirty_tenants
 from workers.tasks import MONGO_URI
 from core.scheduler_decorators import run_every_day,run_every_hour,run_every_minute
 
+DIRTY_BATCH_SIZE = int(os.getenv("DIRTY_TENANT_BATCH_SIZE", "500"))
+DIRTY_MAX_BATCHES = int(os.getenv("DIRTY_TENANT_MAX_BATCHES", "20"))
+
+# One event loop and one Motor client per worker process, shared by every
+# message, instead of asyncio.run() and a new client per run
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+
+def _run(coro):
+    """Run a coroutine on the worker's shared event loop and wait for it."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="pms-tenant-tasks", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def _db():
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(MONGO_URI)
+    return _client["fq_db"]
+
+
 @run_every_hour
 @dramatiq.actor
 def test_hourly():
     """Entry point for Dramatiq (sync context)."""
     print(f"Called at {datetime.now(timezone.utc)}")
-    
+
 @run_every_minute
 @dramatiq.actor
+def enrich_dirty_tenants():
+    """Rescore only tenants whose invoices, payments or ledger entries changed."""
+    _run(_async_enrich_dirty_tenants())
+
+@run_every_day(hour=2, minute=0)
+@dramatiq.actor
 def daily_enrich_active_tenants():
-    """Entry point for Dramatiq (sync context)."""
-    asyncio.run(_async_daily_enrich_active_tenants())
+    """Nightly full recompute; reconciles anything the incremental runs missed."""
+    _run(_async_daily_enrich_active_tenants())
 
 @dramatiq.actor
 def generate_custom_messaging(tenant_data):
     print(f"{tenant_data.get('tenant_name')} About to be customized")
-    
+
+
+async def _async_enrich_dirty_tenants():
+    """Drain the dirty-tenant set in batches."""
+    scorer = BulkTenantRiskScorer(_db())
+    scored = 0
+    for _ in range(DIRTY_MAX_BATCHES):
+        tenant_ids = await pop_dirty_tenants(DIRTY_BATCH_SIZE)
+        if not tenant_ids:
+            break
+        try:
+            stats = await scorer.enrich(tenant_ids, on_result=generate_custom_messaging.send)
+        except Exception:
+            await requeue_dirty_tenants(tenant_ids)
+            raise
+        scored += stats["scored"]
+
+    if scored:
+        print(f"♻️ Rescored {scored} tenants with changed finances")
+
+
 async def _async_daily_enrich_active_tenants():
-    """Runs inside its own event loop."""
-    # ---- DB setup ----
-    client = AsyncIOMotorClient(MONGO_URI)
-    db = client["fq_db"]
-    analytics = AdvancedRentAnalytics(db)
+    """Score every tenant with an active lease."""
+    scorer = BulkTenantRiskScorer(_db())
 
     today = datetime.now(timezone.utc)
+    tenant_ids = await scorer.active_tenant_ids(today)
+    print(f"📅 Enriching {len(tenant_ids)} tenants with active leases... "
+      f"[pid={os.getpid()}, thread={threading.current_thread().name}]")
 
-    # ---- MongoDB query (async) ----
-    cursor = db.property_leases.find(
-        {
-            "status": "signed",
-            "lease_terms.start_date": {"$lte": today},
-            "lease_terms.end_date": {"$gte": today},
-        },
-        {"tenant_id": 1},
+    # ---- score every tenant in chunks, one bulk_write per chunk ----
+    stats = await scorer.enrich(
+        tenant_ids,
+        now=today,
+        on_result=generate_custom_messaging.send
     )
-    active_leases = await cursor.to_list(length=None)
-    import threading,os
-    # print(f"📅 Enriching {len(active_leases)} tenants with active leases...")
-    print(f"📅 Enriching {len(active_leases)} tenants with active leases... "
-      f"[pid={os.getpid()}, thread={threading.current_thread().name}]")
+    if stats["updated"] < stats["scored"]:
+        print(f"⚠️ {stats['scored'] - stats['updated']} tenants not found while updating")
 
-    # ---- iterate async results ----
-    for lease in active_leases:
-        tenant_id = ObjectId(lease["tenant_id"])
-        
-
-        results = await analytics.get_tenant_risk_score(tenant_id,print_=False)
-        tenant_name=results.get("tenant_name")
-        # Prepare meta payload
-        meta_payload = {
-            "risk_score": results.get("risk_score"),
-            "risk_components": results.get("risk_components"),
-            "finance_metrics": results.get("metrics"),
-            "recommendations": results.get("recommendations"),
-            "last_enriched": datetime.now(timezone.utc),
-        }
-
-        update_result = await db.property_tenants.update_one(
-                {"_id": tenant_id},
-                {
-                    "$set": {
-                        "meta.risk_score": results.get("risk_score"),
-                        "meta.risk_components": results.get("risk_components"),
-                        "meta.finance_metrics": results.get("metrics"),
-                        "meta.recommendations": results.get("recommendations"),
-                        "meta.last_enriched": datetime.now(timezone.utc),
-                    }
-                },
-            )
-        if update_result.matched_count or update_result.upserted_id:
-            print(f"✅ Updated meta for tenant {tenant_name}")
-        else:
-            print(f"⚠️ Tenant not found: {tenant_name}")
-        generate_custom_messaging.send(results)
-
-    client.close()
-    print("✅  Finished enrichment")
+    print(f"✅  Finished enrichment: {stats['scored']} scored, "
+          f"{stats['no_history']} without payment history")
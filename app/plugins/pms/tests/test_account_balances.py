@@ -0,0 +1,189 @@
+"""
+Tests for the materialized ledger balances (accounting/balances.py)
+
+Posts random entries through ``Ledger`` and checks that:
+- the balance rows match a rebuild from the entries (``AccountBalances.verify``)
+- reports read from the rows match reports built from the entries
+- removing entries takes them back out, and ``verify(repair=True)`` fixes drift
+- reports started from closed periods (accounting/periods.py) match, and a
+  back-dated posting reopens the periods it lands in
+
+Usage:
+  python -m plugins.pms.tests.test_account_balances
+"""
+
+import asyncio
+import random
+from datetime import date, datetime, timedelta, timezone
+from bson import ObjectId
+
+from plugins.pms.models.ledger_entry import LedgerEntry
+from plugins.pms.accounting.ledger import Ledger
+from plugins.pms.accounting.balances import AccountBalances
+from plugins.pms.accounting.periods import LedgerPeriods
+from plugins.pms.accounting.reports import ReportGenerator
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+ACCOUNTS = [
+    "Cash", "Rental Income", "Water Income", "Late Fee Income", "Maintenance & Repairs",
+    "Depreciation Expense", "Loan Interest Expense", "Accounts Receivable", "Accounts Payable",
+    "Security Deposit Liability", "Loan Payable", "Property", "Tenant Credit / Prepaid Rent"
+]
+DESCRIPTIONS = ["Monthly rent", "Balance forward", "Deposit", "Credit applied", None]
+
+
+def _random_entries(rng: random.Random, property_ids, tenant_ids, count: int):
+    entries = []
+    for _ in range(count):
+        amount = round(rng.uniform(1, 5000), 2)
+        debit = rng.random() < 0.5
+        entries.append(LedgerEntry.create(
+            date=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=rng.randint(0, 400), hours=rng.randint(0, 23)),
+            account=rng.choice(ACCOUNTS),
+            debit=amount if debit else 0.0,
+            credit=0.0 if debit else amount,
+            description=rng.choice(DESCRIPTIONS),
+            property_id=rng.choice(property_ids),
+            tenant_id=rng.choice(tenant_ids)
+        ))
+    return entries
+
+
+def _assert_close(expected, actual, path=""):
+    if isinstance(expected, dict):
+        assert set(expected) == set(actual), f"{path}: keys differ {set(expected) ^ set(actual)}"
+        for key in expected:
+            _assert_close(expected[key], actual[key], f"{path}.{key}")
+    elif isinstance(expected, float):
+        assert abs(expected - actual) <= 0.011, f"{path}: {expected} != {actual}"
+    else:
+        assert expected == actual, f"{path}: {expected!r} != {actual!r}"
+
+
+async def test_account_balances():
+    """Running balances agree with the ledger entries"""
+    print("\n" + "="*80)
+    print("TEST: Materialized Account Balances")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    ledger = Ledger(db)
+    balances = AccountBalances(db)
+
+    property_ids = [ObjectId(), ObjectId()]
+    tenant_ids = [ObjectId() for _ in range(4)]
+    entries = _random_entries(random.Random(11), property_ids, tenant_ids, 600)
+    for start in range(0, len(entries), 2):
+        await ledger._insert_entries(entries[start:start + 2])
+
+    report = await balances.verify()
+    print(f"\n📊 {report['rows_checked']} balance rows, {report['mismatched']} mismatched")
+    assert report["mismatched"] == 0
+
+    for property_id in property_ids:
+        from_entries = ReportGenerator([e for e in entries if e.property_id == property_id], 10, 2)
+        from_rows = await ReportGenerator.from_balances(db, 10, 2, property_id=property_id)
+        for month in (3, 9):
+            start, end = date(2024, month, 1), date(2024, month, 28)
+            _assert_close(from_entries.income_statement(start, end), from_rows.income_statement(start, end))
+            _assert_close(from_entries.cash_flow_indirect(start, end), from_rows.cash_flow_indirect(start, end))
+            _assert_close(from_entries.balance_sheet(end), from_rows.balance_sheet(end))
+            # income_statement_old still sums entries directly
+            first, last = datetime(2024, month, 1, tzinfo=timezone.utc), datetime(2024, month, 28, tzinfo=timezone.utc)
+            old = from_entries.income_statement_old(first, last)
+            window = [e for e in entries if e.property_id == property_id and first <= e.date <= last]
+            for line, account in (("Depreciation", "Depreciation Expense"), ("Interest", "Loan Interest Expense")):
+                _assert_close(sum(e.debit - e.credit for e in window if e.account == account), old[line])
+    print("   reports from balance rows ✅ MATCH")
+
+    tenant_id = tenant_ids[0]
+    expected_credit = round(sum(
+        e.credit - e.debit for e in entries
+        if e.tenant_id == tenant_id and e.account == "Tenant Credit / Prepaid Rent"
+    ), 2)
+    assert await ledger.get_tenant_credit_balance(str(tenant_id)) == expected_credit
+    print(f"   tenant credit balance {expected_credit} ✅ MATCH")
+
+    removed = await balances.remove_entries({"property_id": property_ids[0]})
+    assert (await balances.verify())["mismatched"] == 0
+    print(f"   removed {removed} entries, balances still consistent ✅")
+
+    await db.property_account_balances.update_one({}, {"$inc": {"debit": 5.0}})
+    report = await balances.verify(repair=True)
+    assert report["mismatched"] == 1 and report["repaired"]
+    assert (await balances.verify())["mismatched"] == 0
+    print("   drift detected and repaired ✅")
+
+    client.close()
+
+
+async def test_period_close():
+    """Reports started from closed periods match reports over every entry"""
+    print("\n" + "="*80)
+    print("TEST: Ledger Period Close")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    ledger = Ledger(db)
+    periods = LedgerPeriods(db)
+
+    property_ids = [ObjectId(), ObjectId()]
+    tenant_ids = [ObjectId() for _ in range(3)]
+    entries = _random_entries(random.Random(5), property_ids, tenant_ids, 400)
+    for start in range(0, len(entries), 4):
+        await ledger._insert_entries(entries[start:start + 4])
+
+    stats = await periods.close_due_periods(today=date(2025, 3, 15))
+    print(f"\n📘 {stats}")
+    assert await db.ledger_periods.count_documents({"status": {"$ne": "closed"}}) == 0
+
+    async def check_reports(property_id, label):
+        from_entries = ReportGenerator([e for e in entries if e.property_id == property_id], 10, 2)
+        from_periods = await ReportGenerator.from_balances(db, 10, 2, property_id=property_id, since=date(2024, 7, 1))
+        for month in (7, 10, 12):
+            start, end = date(2024, month, 1), date(2024, month, 28)
+            _assert_close(from_entries.income_statement(start, end), from_periods.income_statement(start, end))
+            _assert_close(from_entries.cash_flow_indirect(start, end), from_periods.cash_flow_indirect(start, end))
+        _assert_close(from_entries.balance_sheet(date(2025, 2, 20)), (await ReportGenerator.from_balances(
+            db, 10, 2, property_id=property_id, since=date(2025, 1, 1)
+        )).balance_sheet(date(2025, 2, 20)))
+        print(f"   {label}: reports from closed periods ✅ MATCH")
+
+    await check_reports(property_ids[0], "after close")
+
+    try:
+        from_periods = await ReportGenerator.from_balances(db, 10, 2, property_id=property_ids[0], since=date(2024, 7, 1))
+        from_periods.income_statement(date(2024, 3, 1), date(2024, 3, 31))
+        raise AssertionError("series answered for a day before its opening period")
+    except ValueError:
+        pass
+
+    backdated = LedgerEntry.create(
+        date=date(2024, 5, 10), account="Cash", debit=1234.0,
+        property_id=property_ids[0], tenant_id=tenant_ids[0]
+    )
+    await ledger._insert_entries([backdated])
+    entries.append(backdated)
+    reopened = await db.ledger_periods.count_documents({"property_id": property_ids[0], "status": "reopened"})
+    assert reopened and not await db.ledger_periods.count_documents(
+        {"property_id": property_ids[0], "status": "reopened", "period": {"$lt": "2024-05"}}
+    )
+    print(f"   back-dated posting reopened {reopened} periods")
+    await check_reports(property_ids[0], "while reopened")
+
+    await periods.close_due_periods(today=date(2025, 3, 15))
+    assert await db.ledger_periods.count_documents({"status": {"$ne": "closed"}}) == 0
+    await check_reports(property_ids[0], "after re-close")
+
+    cash = await periods.account_totals("Cash")
+    for property_id in property_ids:
+        expected = sum(e.debit for e in entries if e.property_id == property_id and e.account == "Cash")
+        assert abs(cash[property_id].debit - expected) < 0.01
+    print("   all-time cash totals from closed periods ✅ MATCH")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_account_balances())
+    asyncio.run(test_period_close())
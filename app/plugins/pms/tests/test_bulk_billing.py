@@ -0,0 +1,120 @@
+"""
+Parity test for the bulk billing engine (utils/invoice_bulk.py)
+
+Seeds one dataset, bills it with the per-lease path and with the bulk
+engine, and checks both leave the same invoices, tenant credits, tickets
+and notifications behind (ids and wall-clock timestamps aside).
+
+Scenarios covered in one run:
+1. First billing run (itemized previous balances, metered and fixed utilities)
+2. Re-run without force (every lease reports an existing invoice)
+3. Forced regeneration with the sum method (restores and re-consolidates)
+"""
+
+import asyncio
+import copy
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from plugins.pms.utils.invoice_manager import AsyncLeaseInvoiceManager
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+COLLECTIONS = ["properties", "units", "property_tenants", "property_leases", "property_invoices"]
+RESULT_COLLECTIONS = ["property_invoices", "property_tenants", "property_tickets", "property_notifications"]
+VOLATILE_KEYS = {
+    "_id", "id", "created_at", "updated_at", "message", "invoice_id",
+    "consolidated_into_invoice_id", "source_invoice_id", "original_invoice_id"
+}
+
+
+def _strip(value):
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    if isinstance(value, ObjectId):
+        return "oid"
+    return value
+
+
+async def _seed(db):
+    """Two properties; one tenant holds two leases; every lease has last month's invoice."""
+    for p in range(2):
+        property_id = await TestSetup.create_test_property(db)
+        for t in range(2):
+            tenant_id = await TestSetup.create_test_tenant(db, property_id)
+            for _ in range(1 + t):
+                unit_id = await TestSetup.create_test_unit(db, property_id)
+                lease_id = await TestSetup.create_test_lease(db, property_id, tenant_id, unit_id)
+                if t == 0:
+                    # No meter to read, so the invoice is ready and notified straight away
+                    await db.property_leases.update_one(
+                        {"_id": ObjectId(lease_id)},
+                        {"$pull": {"utilities": {"billingBasis": "metered"}}}
+                    )
+                await db.property_invoices.insert_one({
+                    "_id": ObjectId(),
+                    "tenant_id": ObjectId(tenant_id),
+                    "property_id": property_id,
+                    "date_issued": datetime(2024, 1, 1, tzinfo=timezone.utc),
+                    "due_date": datetime(2024, 1, 5, tzinfo=timezone.utc),
+                    "total_amount": 15000.0,
+                    "total_paid": 10000.0,
+                    "balance_amount": 5000.0 + 1000 * t,
+                    "status": "partial",
+                    "meta": {"billing_period": "2024-01", "lease_id": lease_id},
+                    "line_items": [{"utility_name": "Water", "meta": {"current_reading": 100.0 + p}}],
+                    "balance_forwarded": False
+                })
+
+
+async def _bill(client, db, seed_docs, bulk: bool):
+    for name in COLLECTIONS + RESULT_COLLECTIONS:
+        await db[name].delete_many({})
+    for name, docs in seed_docs.items():
+        if docs:
+            await db[name].insert_many(copy.deepcopy(docs))
+
+    manager = AsyncLeaseInvoiceManager(client, "pms_test_db")
+    manager.current_date = datetime(2024, 2, 10, tzinfo=timezone.utc)
+    runs = [
+        await manager.process_all_leases("2024-02", balance_method="itemized", bulk=bulk, property_batch_size=1),
+        await manager.process_all_leases("2024-02", bulk=bulk),
+        await manager.process_all_leases("2024-02", force=True, balance_method="sum", bulk=bulk),
+    ]
+    counts = [{k: len(v) if isinstance(v, list) else v for k, v in r.items()} for r in runs]
+
+    state = {}
+    for name in RESULT_COLLECTIONS:
+        docs = await db[name].find({}).to_list(length=None)
+        state[name] = sorted(repr(_strip(doc)) for doc in docs)
+    return counts, state
+
+
+async def test_bulk_matches_per_lease():
+    """Bulk engine and per-lease path leave identical billing state"""
+    print("\n" + "="*80)
+    print("TEST: Bulk Billing Parity")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    await _seed(db)
+    seed_docs = {name: await db[name].find({}).to_list(length=None) for name in COLLECTIONS}
+
+    per_lease_counts, per_lease_state = await _bill(client, db, seed_docs, bulk=False)
+    bulk_counts, bulk_state = await _bill(client, db, seed_docs, bulk=True)
+
+    print(f"\n📊 Per-lease results: {per_lease_counts}")
+    print(f"📊 Bulk results:      {bulk_counts}")
+    assert per_lease_counts == bulk_counts
+
+    for name in RESULT_COLLECTIONS:
+        same = per_lease_state[name] == bulk_state[name]
+        print(f"   {name:.<30} {len(bulk_state[name])} docs {'✅ MATCH' if same else '❌ DIFFER'}")
+        assert same, name
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_bulk_matches_per_lease())
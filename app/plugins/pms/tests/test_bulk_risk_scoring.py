@@ -0,0 +1,219 @@
+"""
+Parity test and benchmark for the batch tenant risk scorer (utils/tenant_risk_bulk.py)
+
+Parity: seeds tenants with mixed payment histories and checks
+``BulkTenantRiskScorer`` returns the same result per tenant as
+``AdvancedRentAnalytics.get_tenant_risk_score`` (floats to the rounding the
+results already carry) and backfills the same ``meta.property``.
+
+Benchmark: seeds N tenants with 12 invoices each and times the batch scorer
+against the per-tenant path (timed on a sample and extrapolated).
+
+Usage:
+  python -m plugins.pms.tests.test_bulk_risk_scoring
+  python -m plugins.pms.tests.test_bulk_risk_scoring --benchmark 10000 100000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+import pandas as pd
+
+from plugins.pms.utils.advanced_rent_analytics import AdvancedRentAnalytics
+from plugins.pms.utils.tenant_risk_bulk import BulkTenantRiskScorer, invoice_frame, score_frame
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+STATUSES = ["paid", "paid", "paid", "partial", "overdue", "unpaid", "issued", "paid"]
+FLOAT_TOLERANCE = 0.011
+
+
+def _tenant_docs(rng: random.Random, property_id: str, unit_ids, count: int, now: datetime):
+    tenants, leases, invoices = [], [], []
+    for i in range(count):
+        tenant_id = ObjectId()
+        meta = {} if i % 3 == 0 else {"property": {"name": "Test Property", "location": "Nairobi, Kenya", "type": None}}
+        tenants.append({
+            "_id": tenant_id,
+            "property_id": property_id,
+            "units_id": [unit_ids[i % len(unit_ids)]],
+            "full_name": f"Tenant {i}",
+            "phone": "+254712345678",
+            "joined_at": now - timedelta(days=rng.randint(10, 900)),
+            "meta": meta
+        })
+        if i % 7 != 0:
+            leases.append({
+                "_id": ObjectId(),
+                "tenant_id": tenant_id,
+                "property_id": property_id,
+                "status": "signed",
+                "lease_terms": {
+                    "start_date": now - timedelta(days=400),
+                    "end_date": now + timedelta(days=rng.randint(-30, 400)),
+                    "rent_amount": float(rng.choice([8000, 12000, 15000, 25000]))
+                }
+            })
+        if i % 11 == 0:
+            continue  # no payment history
+        for m in range(rng.randint(1, 12)):
+            issued = now - timedelta(days=30 * (12 - m), hours=rng.randint(0, 20))
+            due = issued + timedelta(days=5)
+            status = rng.choice(STATUSES)
+            total = 15000.0
+            paid = total if status == "paid" else (rng.choice([2000.0, 7500.0]) if status == "partial" else 0.0)
+            invoice = {
+                "_id": ObjectId(),
+                "tenant_id": tenant_id,
+                "property_id": property_id,
+                "status": status,
+                "date_issued": issued,
+                "due_date": due,
+                "created_at": issued - timedelta(days=rng.randint(0, 3), hours=rng.randint(0, 12)),
+                "total_amount": total,
+                "total_paid": paid,
+                "balance_amount": total - paid,
+                "meta": {"billing_period": issued.strftime("%Y-%m")},
+                "line_items": [
+                    {"type": "rent", "amount": 12000.0},
+                    {"type": "utility", "utility_name": "Water", "amount": 3000.0, "meta": {
+                        "billing_basis": "metered", "usage": float(rng.randint(5, 30)),
+                        "rate": 100.0, "unit_of_measure": "m3"
+                    }}
+                ]
+            }
+            if status in ("paid", "partial") and rng.random() < 0.9:
+                invoice["payment_date"] = due + timedelta(days=rng.randint(-6, 20), hours=rng.randint(0, 23))
+            invoices.append(invoice)
+    return tenants, leases, invoices
+
+
+async def _seed(db, count: int, seed: int = 7):
+    now = datetime.now(timezone.utc)
+    property_id = await TestSetup.create_test_property(db)
+    unit_ids = [await TestSetup.create_test_unit(db, property_id) for _ in range(3)]
+    tenants, leases, invoices = _tenant_docs(random.Random(seed), property_id, unit_ids, count, now)
+    for name, docs in (("property_tenants", tenants), ("property_leases", leases), ("property_invoices", invoices)):
+        for start in range(0, len(docs), 10000):
+            await db[name].insert_many(docs[start:start + 10000])
+    return [tenant["_id"] for tenant in tenants]
+
+
+def _differences(expected, actual, path=""):
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        diffs = []
+        for key in set(expected) | set(actual):
+            diffs += _differences(expected.get(key), actual.get(key), f"{path}.{key}")
+        return diffs
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        return [d for e, a, i in zip(expected, actual, range(len(expected))) for d in _differences(e, a, f"{path}[{i}]")]
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)) and not isinstance(expected, bool):
+        return [] if abs(expected - actual) <= FLOAT_TOLERANCE else [f"{path}: {expected} != {actual}"]
+    return [] if expected == actual else [f"{path}: {expected!r} != {actual!r}"]
+
+
+async def test_bulk_risk_matches_per_tenant():
+    """Batch scorer and per-tenant scoring agree for every tenant"""
+    print("\n" + "="*80)
+    print("TEST: Bulk Tenant Risk Scoring Parity")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    tenant_ids = await _seed(db, 60)
+
+    # Score before the per-tenant pass: it backfills meta.property as it goes
+    scorer = BulkTenantRiskScorer(db, chunk_size=25)
+    bulk_results = []
+    bulk_backfill = {}
+    for start in range(0, len(tenant_ids), scorer.chunk_size):
+        results, backfill = await scorer.score(tenant_ids[start:start + scorer.chunk_size])
+        bulk_results += results
+        bulk_backfill.update(backfill)
+
+    analytics = AdvancedRentAnalytics(db)
+    with contextlib.redirect_stdout(io.StringIO()):
+        per_tenant = [await analytics.get_tenant_risk_score(tenant_id, print_=False) for tenant_id in tenant_ids]
+
+    assert len(bulk_results) == len(per_tenant)
+    mismatched = 0
+    for expected, actual in zip(per_tenant, bulk_results):
+        diffs = _differences(expected, actual)
+        if diffs:
+            mismatched += 1
+            print(f"   ❌ {expected['tenant_id']}: {diffs[:5]}")
+    print(f"\n📊 {len(per_tenant)} tenants compared, {mismatched} mismatched")
+    assert mismatched == 0
+
+    backfilled = {
+        tenant["_id"]: tenant["meta"]["property"]
+        async for tenant in db.property_tenants.find({"_id": {"$in": list(bulk_backfill)}})
+    }
+    assert backfilled == bulk_backfill, "meta.property backfill differs"
+    print(f"   meta.property backfill for {len(bulk_backfill)} tenants ✅ MATCH")
+
+    stats = await scorer.enrich(tenant_ids)
+    assert stats["updated"] == len(tenant_ids)
+    enriched = await db.property_tenants.count_documents({"meta.last_enriched": {"$exists": True}})
+    assert enriched == len(tenant_ids)
+    print(f"   enrich(): {stats}")
+
+    client.close()
+
+
+async def benchmark(tenant_counts, sample: int = 200):
+    """Batch scorer vs per-tenant scoring at each portfolio size."""
+    client, db = await TestSetup.setup_test_db()
+    analytics = AdvancedRentAnalytics(db)
+
+    for count in tenant_counts:
+        await db.property_tenants.delete_many({})
+        await db.property_leases.delete_many({})
+        await db.property_invoices.delete_many({})
+        await db.property_invoices.create_index([("tenant_id", 1), ("date_issued", 1)])
+        await db.property_leases.create_index("tenant_id")
+
+        started = time.perf_counter()
+        tenant_ids = await _seed(db, count)
+        seeded = time.perf_counter() - started
+
+        scorer = BulkTenantRiskScorer(db)
+        started = time.perf_counter()
+        invoices = await scorer._invoices(tenant_ids[:scorer.chunk_size])
+        fetch_time = time.perf_counter() - started
+        started = time.perf_counter()
+        rents, _ = await scorer._leases(tenant_ids[:scorer.chunk_size], datetime.now(timezone.utc))
+        score_frame(invoice_frame(invoices), rents, pd.Series(dtype="datetime64[ns, UTC]"), datetime.now(timezone.utc))
+        compute_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        stats = await scorer.enrich(tenant_ids)
+        bulk_time = time.perf_counter() - started
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for tenant_id in tenant_ids[:sample]:
+                await analytics.get_tenant_risk_score(tenant_id, print_=False)
+            per_tenant_time = (time.perf_counter() - started) / sample * count
+
+        print(f"\n📊 {count:,} tenants (seeded in {seeded:.1f}s)")
+        print(f"   first chunk: invoice aggregation {fetch_time:.2f}s, leases + NumPy scoring {compute_time:.2f}s")
+        print(f"   bulk enrich:        {bulk_time:8.2f}s  ({stats['scored'] / bulk_time:,.0f} tenants/s)")
+        print(f"   per-tenant (est.):  {per_tenant_time:8.2f}s  (from {sample} tenants, scoring only)")
+        print(f"   speedup:            {per_tenant_time / bulk_time:8.1f}x")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk tenant risk scoring parity test / benchmark")
+    parser.add_argument("--benchmark", nargs="*", type=int, metavar="TENANTS",
+                        help="benchmark at these portfolio sizes (default 10000 100000)")
+    args = parser.parse_args()
+    if args.benchmark is not None:
+        asyncio.run(benchmark(args.benchmark or [10_000, 100_000]))
+    else:
+        asyncio.run(test_bulk_risk_matches_per_tenant())
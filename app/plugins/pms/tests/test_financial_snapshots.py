@@ -0,0 +1,228 @@
+"""
+Parity test and benchmark for FinancialSnapshotService (snapshots/finance_properties.py)
+
+Parity: seeds invoices and Cash/income ledger entries for a few properties
+and checks ``_compute_flows_and_balances`` (one ``$facet`` aggregation plus
+running balances) returns what the previous find()-everything
+implementation, kept below as ``legacy_flows_and_balances``, returned. Also
+checks repeated cache misses upsert a single snapshot with ``expires_at``
+and that legacy duplicate snapshots are collapsed before the unique index.
+
+Benchmark: seeds N invoices (and as many ledger entries) and reports peak
+Python memory (tracemalloc) and latency of both implementations.
+
+Usage:
+  python -m plugins.pms.tests.test_financial_snapshots
+  python -m plugins.pms.tests.test_financial_snapshots --benchmark 10000 100000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from bson import ObjectId
+
+from plugins.pms.models.ledger_entry import LedgerEntry
+from plugins.pms.accounting.balances import AccountBalances
+from plugins.pms.accounting.periods import LedgerPeriods
+from plugins.pms.snapshots.finance_properties import FinancialSnapshotService
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+
+async def legacy_flows_and_balances(db, property_ids=None, start_date=None, end_date=None) -> List[Dict]:
+    """The implementation this service replaced: every document through Python."""
+    today = datetime.combine(date.today(), datetime.min.time())
+    invoice_query, ledger_query = {}, {}
+    if property_ids:
+        invoice_query["property_id"] = {"$in": property_ids}
+        ledger_query["property_id"] = {"$in": property_ids}
+    if start_date and end_date:
+        invoice_query["date_issued"] = {"$gte": start_date, "$lte": end_date}
+        ledger_query["date"] = {"$gte": start_date, "$lte": end_date}
+
+    invoices = [i async for i in db.property_invoices.find(invoice_query)]
+    ledgers = [e async for e in db.property_ledger_entries.find(ledger_query)]
+
+    ledger_by_property: Dict = {}
+    for e in ledgers:
+        if e.get("account") == "Cash" and e.get("property_id"):
+            ledger_by_property[e["property_id"]] = ledger_by_property.get(e["property_id"], 0.0) + float(e.get("debit", 0.0))
+    invoice_by_property: Dict = {}
+    for inv in invoices:
+        if inv.get("property_id"):
+            invoice_by_property.setdefault(inv["property_id"], []).append(inv)
+
+    results = []
+    totals = dict(period_invoiced=0.0, period_collected=0.0, pending_collection=0.0, overdue_balance=0.0)
+    for pid, invs in invoice_by_property.items():
+        total_invoiced = sum(float(i.get("total_amount", 0)) for i in invs)
+        total_collected = float(ledger_by_property.get(pid, 0.0))
+        total_pending = total_invoiced - total_collected if total_invoiced else 0.0
+        overdue_invs = [
+            i for i in invs
+            if i.get("due_date") and i["due_date"] < today and i.get("status") in ["partial", "unpaid"]
+        ]
+        total_overdue = round(sum(float(i.get("balance_amount", 0)) for i in overdue_invs), 2)
+        results.append({
+            "property_id": pid,
+            "period_invoiced": round(total_invoiced, 2),
+            "period_collected": round(total_collected, 2),
+            "pending_collection": round(total_pending, 2),
+            "overdue_balance": total_overdue,
+            "collection_rate": round((total_collected / total_invoiced * 100) if total_invoiced else 0, 1),
+            "overdue_rate": round((total_overdue / total_pending * 100) if total_pending else 0, 1),
+            "invoice_count": len(invs),
+            "overdue_count": len(overdue_invs)
+        })
+        totals["period_invoiced"] += total_invoiced
+        totals["period_collected"] += total_collected
+        totals["pending_collection"] += total_pending
+        totals["overdue_balance"] += total_overdue
+
+    if results:
+        results.append({
+            "property_id": "ALL",
+            "period_invoiced": round(totals["period_invoiced"], 2),
+            "period_collected": round(totals["period_collected"], 2),
+            "pending_collection": round(totals["pending_collection"], 2),
+            "overdue_balance": round(totals["overdue_balance"], 2),
+            "collection_rate": round((totals["period_collected"] / totals["period_invoiced"] * 100) if totals["period_invoiced"] else 0.0, 1),
+            "overdue_rate": round((totals["overdue_balance"] / totals["pending_collection"] * 100) if totals["pending_collection"] else 0.0, 1),
+            "invoice_count": sum(r["invoice_count"] for r in results),
+            "overdue_count": sum(r["overdue_count"] for r in results)
+        })
+    return results
+
+
+async def _seed(db, invoice_count: int, property_count: int = 5, seed: int = 9):
+    rng = random.Random(seed)
+    property_ids = [ObjectId() for _ in range(property_count)]
+    invoices, entries = [], []
+    for _ in range(invoice_count):
+        property_id = rng.choice(property_ids)
+        issued = datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 500))
+        status = rng.choice(["paid", "partial", "unpaid", "issued"])
+        invoices.append({
+            "_id": ObjectId(),
+            "property_id": property_id,
+            "tenant_id": ObjectId(),
+            "status": status,
+            "date_issued": issued,
+            "due_date": issued + timedelta(days=5),
+            "total_amount": 15000.0,
+            "balance_amount": 0.0 if status == "paid" else float(rng.choice([2500, 15000])),
+        })
+        entries.append(LedgerEntry.create(
+            date=issued + timedelta(days=rng.randint(0, 20)),
+            account=rng.choice(["Cash", "Cash", "Rental Income"]),
+            debit=float(rng.randint(1000, 15000)),
+            property_id=property_id
+        ).model_dump(by_alias=True))
+    for start in range(0, invoice_count, 10000):
+        await db.property_invoices.insert_many(invoices[start:start + 10000])
+        await db.property_ledger_entries.insert_many(entries[start:start + 10000])
+        await AccountBalances(db).apply(entries[start:start + 10000])
+    return property_ids
+
+
+def _by_property(results):
+    return sorted(results, key=lambda r: str(r["property_id"]))
+
+
+async def test_financial_snapshot_parity():
+    """Aggregation-based flows match the find()-everything implementation"""
+    print("\n" + "="*80)
+    print("TEST: Financial Snapshot Aggregation Parity")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    property_ids = await _seed(db, 600)
+    await LedgerPeriods(db).close_due_periods(today=date(2024, 12, 10))
+    service = FinancialSnapshotService(db)
+
+    for filters in (
+        {},
+        {"property_ids": property_ids[:2]},
+        {"start_date": datetime(2024, 3, 1), "end_date": datetime(2024, 9, 30)},
+    ):
+        expected = await legacy_flows_and_balances(db, **filters)
+        actual = await service._compute_flows_and_balances(**filters)
+        assert _by_property(expected) == _by_property(actual), f"mismatch for {list(filters)}"
+        print(f"   filters {list(filters) or 'none'}: {len(actual)} rows ✅ MATCH")
+
+    await service.get_or_refresh_snapshot({"property_ids": property_ids[:2]}, is_cache=False)
+    await service.get_or_refresh_snapshot({"property_ids": property_ids[:2]}, is_cache=False)
+    await service.get_or_refresh_snapshot({"property_ids": property_ids[:3]})
+    assert await db.system_snapshots.count_documents({"type": service.snapshot_type}) == 2
+    assert await db.system_snapshots.count_documents({"type": service.snapshot_type, "expires_at": {"$exists": True}}) == 1
+    print("   one upserted snapshot per key, cache entries carry expires_at ✅")
+
+    # legacy inserts: duplicate keys and no expires_at
+    await db.system_snapshots.delete_many({"type": service.snapshot_type})
+    now = datetime.utcnow()
+    legacy = [
+        ("a" * 40, {}, now - timedelta(hours=1)),
+        ("a" * 40, {}, now - timedelta(minutes=5)),
+        ("b" * 40, {}, now - timedelta(days=2)),
+        ("2024-Q1", {"period_key": "2024-Q1"}, now - timedelta(days=90)),
+        ("2024-Q1", {"period_key": "2024-Q1"}, now - timedelta(days=30)),
+    ]
+    await db.system_snapshots.insert_many([
+        {"type": service.snapshot_type, "period_key": key, "created_at": created, "data": {"filters": filters}}
+        for key, filters, created in legacy
+    ])
+    migrated = await service.migrate_legacy_snapshots()
+    assert migrated == {"deduped": 2, "expired": 1, "scheduled": 1}, migrated
+    remaining = {d["period_key"]: d async for d in db.system_snapshots.find({"type": service.snapshot_type})}
+    assert set(remaining) == {"a" * 40, "2024-Q1"}
+    assert remaining["a" * 40]["created_at"] == legacy[1][2].replace(microsecond=legacy[1][2].microsecond // 1000 * 1000)
+    assert "expires_at" in remaining["a" * 40] and "expires_at" not in remaining["2024-Q1"]
+    assert await service.migrate_legacy_snapshots() == {"deduped": 0, "expired": 0, "scheduled": 0}
+    print("   legacy duplicates collapsed to the newest, legacy cache entries expire ✅")
+
+    client.close()
+
+
+async def _measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = await fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+async def benchmark(invoice_counts):
+    """Peak memory and latency: legacy vs aggregation."""
+    client, db = await TestSetup.setup_test_db()
+    for count in invoice_counts:
+        for name in ("property_invoices", "property_ledger_entries", "property_account_balances", "ledger_periods"):
+            await db[name].delete_many({})
+        await db.property_invoices.create_index([("property_id", 1), ("date_issued", 1)])
+        await _seed(db, count)
+        await LedgerPeriods(db).close_due_periods()
+        service = FinancialSnapshotService(db)
+
+        _, legacy_time, legacy_mb = await _measure(lambda: legacy_flows_and_balances(db))
+        _, new_time, new_mb = await _measure(lambda: service._compute_flows_and_balances())
+
+        print(f"\n📊 {count:,} invoices + {count:,} ledger entries")
+        print(f"   legacy find():   {legacy_time:7.2f}s  peak {legacy_mb:8.1f} MiB")
+        print(f"   aggregation:     {new_time:7.2f}s  peak {new_mb:8.1f} MiB")
+        print(f"   speedup {legacy_time / new_time:.1f}x, memory {legacy_mb / max(new_mb, 0.01):.0f}x lower")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Financial snapshot parity test / benchmark")
+    parser.add_argument("--benchmark", nargs="*", type=int, metavar="INVOICES",
+                        help="benchmark at these invoice counts (default 10000 100000)")
+    args = parser.parse_args()
+    if args.benchmark is not None:
+        asyncio.run(benchmark(args.benchmark or [10_000, 100_000]))
+    else:
+        asyncio.run(test_financial_snapshot_parity())
@@ -0,0 +1,81 @@
+"""
+Parity test for batch lease lifecycle reports (reports/lease_lifecycle.py)
+
+Builds every lease's report once on its own (each section querying for
+itself) and once through ``generate_batch_lifecycle_reports`` (one shared
+prefetch), and checks the reports are identical apart from their
+generation time, and that the batch issued a fixed number of queries.
+"""
+
+import asyncio
+
+from plugins.pms.reports.lease_lifecycle import LeaseLifecycleReportGenerator
+from plugins.pms.tests.test_ledger_system import TestSetup
+from plugins.pms.tests.test_report_exports import _seed
+
+
+class _CountingCollection:
+    def __init__(self, collection, counts):
+        self._collection = collection
+        self._counts = counts
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in ("find", "find_one", "aggregate", "count_documents"):
+            def counted(*args, **kwargs):
+                self._counts[self._collection.name] = self._counts.get(self._collection.name, 0) + 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class _CountingDB:
+    """Database wrapper counting the queries issued per collection."""
+
+    def __init__(self, db):
+        self._db = db
+        self.counts = {}
+
+    def __getattr__(self, name):
+        return _CountingCollection(getattr(self._db, name), self.counts)
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name], self.counts)
+
+
+def _comparable(report):
+    return {key: value for key, value in report.items() if key != "generated_at"}
+
+
+async def test_batch_reports_match_single_reports():
+    """Batch reports equal per-lease reports and cost a fixed number of queries"""
+    print("\n" + "="*80)
+    print("TEST: Batch Lease Lifecycle Reports")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    await _seed(db, properties=3, units_per_property=8)
+
+    single_db = _CountingDB(db)
+    single = LeaseLifecycleReportGenerator(single_db)
+    leases = await db.property_leases.find({"status": "signed"}).to_list(None)
+    expected = [await single.generate_complete_lifecycle_report(lease["_id"]) for lease in leases]
+
+    batch_db = _CountingDB(db)
+    reports = await LeaseLifecycleReportGenerator(batch_db).generate_batch_lifecycle_reports()
+
+    assert len(reports) == len(leases) == 18
+    for got, want in zip(reports, expected):
+        assert _comparable(got) == _comparable(want), want["lease_id"]
+
+    single_queries = sum(single_db.counts.values())
+    batch_queries = sum(batch_db.counts.values())
+    print(f"\n   {len(reports)} reports match ✅")
+    print(f"   queries: {single_queries} one by one, {batch_queries} batched")
+    assert batch_queries <= 6, batch_db.counts
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_batch_reports_match_single_reports())
@@ -0,0 +1,140 @@
+"""
+Parity test for bulk meter-reading ingestion (utils/meter_readings.py)
+
+Bills a seeded dataset so every metered utility gets a reading task, then
+records the same readings once through ``process_utility_reading`` (one
+call per task) and once through ``process_utility_readings`` (one batch),
+and checks both leave the same invoices, tickets and notifications behind
+(ids and wall-clock timestamps aside).
+
+Also checks the batch validation: readings below the previous reading,
+duplicates and unknown units are rejected by row, ``strict`` applies
+nothing, and a CSV round addressed by unit id parses and applies once.
+"""
+
+import asyncio
+import copy
+from datetime import datetime, timezone
+
+from plugins.pms.utils.invoice_manager import AsyncLeaseInvoiceManager
+from plugins.pms.utils.meter_readings import parse_readings_csv
+from plugins.pms.tests.test_bulk_billing import COLLECTIONS, RESULT_COLLECTIONS, _seed, _strip
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+
+async def _billed(client, db, seed_docs):
+    """Reset to the seed and bill February, leaving reading tasks open."""
+    for name in COLLECTIONS + RESULT_COLLECTIONS:
+        await db[name].delete_many({})
+    for name, docs in seed_docs.items():
+        if docs:
+            await db[name].insert_many(copy.deepcopy(docs))
+    manager = AsyncLeaseInvoiceManager(client, "pms_test_db")
+    manager.current_date = datetime(2024, 2, 10, tzinfo=timezone.utc)
+    await manager.process_all_leases("2024-02")
+    return manager
+
+
+async def _tasks(db):
+    tickets = await db.property_tickets.find({"status": "pending_input"}).to_list(length=None)
+    return [(ticket["metadata"]["property_id"], task) for ticket in tickets for task in ticket["tasks"]]
+
+
+def _key(task):
+    return task["metadata"]["lease_id"], task["metadata"]["utility_name"]
+
+
+async def _state(db):
+    return {
+        name: sorted(repr(_strip(doc)) for doc in await db[name].find({}).to_list(length=None))
+        for name in RESULT_COLLECTIONS
+    }
+
+
+async def test_bulk_readings_match_per_reading():
+    """Batch ingestion and per-reading processing leave identical state"""
+    print("\n" + "="*80)
+    print("TEST: Bulk Meter Reading Parity")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    await _seed(db)
+    seed_docs = {name: await db[name].find({}).to_list(length=None) for name in COLLECTIONS}
+
+    manager = await _billed(client, db, seed_docs)
+    tasks = await _tasks(db)
+    assert tasks, "seed produced no reading tasks"
+    readings = {_key(task): task["metadata"]["previous_reading"] + 12.5 for _, task in tasks}
+    for _, task in tasks:
+        result = await manager.process_utility_reading(task["id"], readings[_key(task)], reading_date="2024-02-09")
+        assert result["success"], result["error"]
+    per_reading = await _state(db)
+
+    manager = await _billed(client, db, seed_docs)
+    by_property = {}
+    for property_id, task in await _tasks(db):
+        by_property.setdefault(property_id, []).append(
+            {"task_id": task["id"], "current_reading": readings[_key(task)], "reading_date": "2024-02-09"}
+        )
+    for property_id, batch in by_property.items():
+        result = await manager.process_utility_readings(property_id, batch)
+        assert result["success"] and len(result["accepted"]) == len(batch), result["rejected"]
+        print(f"\n📊 {property_id}: {len(batch)} readings, {result['invoices_updated']} invoices, "
+              f"{len(result['tickets_closed'])} tickets closed, {result['notifications_sent']} notifications")
+    bulk = await _state(db)
+
+    print(f"\n   {len(tasks)} readings over {len(by_property)} properties")
+    for name in RESULT_COLLECTIONS:
+        same = per_reading[name] == bulk[name]
+        print(f"   {name:.<30} {len(bulk[name])} docs {'✅ MATCH' if same else '❌ DIFFER'}")
+        assert same, name
+
+    client.close()
+
+
+async def test_bulk_reading_validation():
+    """Bad rows are rejected by row number; strict and dry runs write nothing"""
+    print("\n" + "="*80)
+    print("TEST: Bulk Meter Reading Validation")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    await _seed(db)
+    seed_docs = {name: await db[name].find({}).to_list(length=None) for name in COLLECTIONS}
+    manager = await _billed(client, db, seed_docs)
+
+    property_id, task = (await _tasks(db))[0]
+    previous = task["metadata"]["previous_reading"]
+    unit_id = task["metadata"]["units_id"][0]
+    utility = task["metadata"]["utility_name"]
+    before = await _state(db)
+
+    batch = [
+        {"task_id": task["id"], "current_reading": previous - 1},
+        {"unit": "no-such-unit", "utility": utility, "current_reading": 5},
+        {"task_id": task["id"], "current_reading": "abc"},
+    ]
+    result = await manager.process_utility_readings(property_id, batch)
+    assert [r["row"] for r in result["rejected"]] == [1, 2, 3] and not result["accepted"]
+
+    ok_row = {"task_id": task["id"], "current_reading": previous + 3}
+    result = await manager.process_utility_readings(property_id, [ok_row, batch[1]], strict=True)
+    assert not result["success"] and len(result["accepted"]) == 1
+    result = await manager.process_utility_readings(property_id, [ok_row], dry_run=True)
+    assert result["success"] and result["total_amount"] == round(3 * task["metadata"]["rate"], 2)
+    assert await _state(db) == before
+    print("\n   rejected rows reported; strict and dry runs wrote nothing ✅")
+
+    csv_text = f"unit,utility,current_reading,reading_date\n{unit_id},{utility},{previous + 7},2024-02-09\n"
+    result = await manager.process_utility_readings(property_id, parse_readings_csv(csv_text))
+    assert result["success"] and result["accepted"][0]["task_id"] == task["id"]
+    result = await manager.process_utility_readings(property_id, parse_readings_csv(csv_text))
+    assert "already recorded" in result["rejected"][0]["error"]
+    print("   CSV round by unit id applied once ✅")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_bulk_readings_match_per_reading())
+    asyncio.run(test_bulk_reading_validation())
@@ -0,0 +1,121 @@
+"""
+Tests for atomic invoice payment totals (accounting/payment_totals.py)
+
+Checks that:
+- a run of partial, full and over-payments leaves every invoice's
+  total_paid/balance_amount/status equal to what the ledger sums give
+  (``verify`` finds nothing), without querying the ledger per payment
+- concurrent payments to one invoice all land in its total
+- ``verify`` reports an invoice whose totals drifted and repairs it
+- charges added after a payment (``charge_totals_update``) keep the payment
+  and move the invoice back to partial
+"""
+
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from plugins.pms.accounting import payment_totals
+from plugins.pms.accounting.ledger import INVOICE_COLL, LEDGER_COLL, Ledger
+from plugins.pms.models.ledger_entry import Invoice, InvoiceLineItem, InvoiceStatus
+from plugins.pms.tests.test_lease_lifecycle_batch import _CountingDB
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+
+def _invoice(property_id: str, rent: float, utilities: float) -> Invoice:
+    return Invoice(
+        id=str(ObjectId()),
+        property_id=property_id,
+        tenant_id=str(ObjectId()),
+        date_issued=datetime.now(timezone.utc),
+        due_date=datetime.now(timezone.utc),
+        units_id=[str(ObjectId())],
+        line_items=[
+            InvoiceLineItem(id=str(ObjectId()), description="Monthly Rent", amount=rent, category="rent"),
+            InvoiceLineItem(id=str(ObjectId()), description="Utilities", amount=utilities, category="utilities"),
+        ],
+        total_amount=rent + utilities,
+        total_paid=0.0,
+        balance_amount=rent + utilities,
+        status=InvoiceStatus.READY,
+        meta={}
+    )
+
+
+async def test_payments_match_ledger_sums():
+    """Incremental totals equal the ledger's Cash debits after mixed payments"""
+    print("\n" + "="*80)
+    print("TEST: Atomic Payment Totals vs Ledger")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    rng = random.Random(11)
+    property_id = str(ObjectId())
+    invoices = [_invoice(property_id, rng.choice([8000.0, 12500.0]), round(rng.uniform(100, 900), 2)) for _ in range(8)]
+    for invoice in invoices:
+        await Ledger(db).post_invoice_to_ledger(invoice)
+
+    counting = _CountingDB(db)
+    ledger = Ledger(counting)
+    for invoice in invoices:
+        for _ in range(rng.randint(1, 3)):
+            amount = round(invoice.total_amount * rng.choice([0.25, 0.5, 0.7, 1.1]), 2)
+            await ledger.post_payment_to_ledger(invoice, amount, datetime(2024, 5, rng.randint(1, 28)))
+    assert counting.counts.get(LEDGER_COLL, 0) == 0, counting.counts
+
+    report = await payment_totals.verify(db)
+    assert report["invoices_checked"] == 8 and report["mismatched"] == 0, report["differences"]
+    statuses = {doc["status"] for doc in await db[INVOICE_COLL].find({}).to_list(None)}
+    assert statuses <= {"paid", "partial"} and "paid" in statuses
+    print(f"\n   8 invoices consistent with the ledger, statuses {sorted(statuses)} ✅")
+    print("   no ledger queries while posting payments ✅")
+
+    client.close()
+
+
+async def test_concurrent_payments_and_repair():
+    """Concurrent payments all count; verify finds and repairs drifted totals"""
+    print("\n" + "="*80)
+    print("TEST: Concurrent Payments + Consistency Check")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    ledger = Ledger(db)
+    invoice = _invoice(str(ObjectId()), 10000.0, 500.0)
+    await ledger.post_invoice_to_ledger(invoice)
+
+    await asyncio.gather(*(
+        ledger.post_payment_to_ledger(invoice, 1500.0, datetime(2024, 6, 1 + i)) for i in range(6)
+    ))
+    stored = await db[INVOICE_COLL].find_one({"_id": invoice.id})
+    assert stored["total_paid"] == 9000.0 and stored["balance_amount"] == 1500.0
+    assert stored["status"] == "partial"
+    print("\n   6 concurrent payments → total_paid 9000.00 ✅")
+
+    await db[INVOICE_COLL].update_one({"_id": invoice.id}, {"$set": {"total_paid": 7500.0, "status": "paid"}})
+    report = await payment_totals.verify(db, repair=True)
+    assert report["mismatched"] == 1 and report["repaired"]
+    assert report["differences"][0]["expected"]["status"] == "partial"
+    assert (await payment_totals.verify(db))["mismatched"] == 0
+    repaired = await db[INVOICE_COLL].find_one({"_id": invoice.id})
+    assert repaired["total_paid"] == 9000.0 and repaired["status"] == "partial"
+    print("   drifted invoice reported and repaired ✅")
+
+    await ledger.post_payment_to_ledger(invoice, 1500.0, datetime(2024, 6, 20))
+    await db[INVOICE_COLL].update_one({"_id": invoice.id}, payment_totals.charge_totals_update(
+        300.0, {"meta.utilities_usage.water_usage": {"$literal": {"usage": 3}}}
+    ))
+    charged = await db[INVOICE_COLL].find_one({"_id": invoice.id})
+    assert charged["total_amount"] == 10800.0 and charged["total_paid"] == 10500.0
+    assert charged["balance_amount"] == 300.0 and charged["status"] == "partial"
+    assert charged["meta"]["utilities_usage"]["water_usage"] == {"usage": 3}
+    print("   charges added after payment keep total_paid, back to partial ✅")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_payments_match_ledger_sums())
+    asyncio.run(test_concurrent_payments_and_repair())
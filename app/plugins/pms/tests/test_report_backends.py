@@ -0,0 +1,107 @@
+"""
+Parity test and benchmark for the ReportGenerator backends
+
+Parity: builds reports over the same random entries with the default
+``AccountSeries`` backend, the NumPy ``ColumnarSeries`` backend
+(``ReportGenerator.columnar``) and columns loaded from Mongo
+(``ReportGenerator.from_ledger``) and checks every statement agrees.
+
+Benchmark: times loading N entries spread across several years plus a
+12-month ``generate_monthly_summary`` and a balance sheet, for each backend.
+
+Usage:
+  python -m plugins.pms.tests.test_report_backends
+  python -m plugins.pms.tests.test_report_backends --benchmark 100000 1000000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from bson import ObjectId
+
+from plugins.pms.models.ledger_entry import LedgerEntry
+from plugins.pms.accounting.reports import ReportGenerator
+from plugins.pms.tests.test_account_balances import ACCOUNTS, DESCRIPTIONS, _assert_close
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+
+def _entries(count: int, years: int = 4, seed: int = 3):
+    rng = random.Random(seed)
+    property_id = ObjectId()
+    accounts = ACCOUNTS + ["Utilities Expense", "Odd Expense", "Strange Income", "Equipment"]
+    entries = []
+    for _ in range(count):
+        amount = round(rng.uniform(1, 5000), 2)
+        debit = rng.random() < 0.5
+        entries.append(LedgerEntry.create(
+            date=datetime(2022, 1, 1, tzinfo=timezone.utc) + timedelta(days=rng.randint(0, 365 * years - 1), hours=rng.randint(0, 23)),
+            account=rng.choice(accounts),
+            debit=amount if debit else 0.0,
+            credit=0.0 if debit else amount,
+            description=rng.choice(DESCRIPTIONS),
+            property_id=property_id
+        ))
+    return entries
+
+
+def _statements(generator: ReportGenerator):
+    return {
+        "summary": generator.generate_monthly_summary(2023, avg_rent_per_unit=15000, owner_equity=2_000_000),
+        "balance_sheet": generator.balance_sheet(date(2024, 6, 30)),
+        "income": generator.income_statement(date(2022, 1, 1), date(2025, 12, 31)),
+        "cash_flow": generator.cash_flow_indirect(date(2024, 1, 1), date(2024, 3, 31)),
+    }
+
+
+async def test_report_backends_match():
+    """Series, columnar and Mongo-loaded columnar reports agree"""
+    print("\n" + "="*80)
+    print("TEST: ReportGenerator Backend Parity")
+    print("="*80)
+
+    entries = _entries(3000)
+    expected = _statements(ReportGenerator(entries, 20, 3, 50000.0))
+    _assert_close(expected, _statements(ReportGenerator.columnar(entries, 20, 3, 50000.0)))
+    print("\n   columnar backend ✅ MATCH")
+
+    client, db = await TestSetup.setup_test_db()
+    await db.property_ledger_entries.insert_many([e.model_dump(by_alias=True) for e in entries])
+    loaded = await ReportGenerator.from_ledger(db, 20, 3, 50000.0, property_id=entries[0].property_id)
+    _assert_close(expected, _statements(loaded))
+    print("   columnar backend loaded from Mongo ✅ MATCH")
+    client.close()
+
+
+def benchmark(entry_counts):
+    """Default series backend vs NumPy columnar backend."""
+    for count in entry_counts:
+        entries = _entries(count)
+        timings = {}
+        for name, build in (
+            ("series", lambda: ReportGenerator(entries, 20, 3, 50000.0)),
+            ("columnar", lambda: ReportGenerator.columnar(entries, 20, 3, 50000.0)),
+        ):
+            started = time.perf_counter()
+            generator = build()
+            loaded = time.perf_counter() - started
+            started = time.perf_counter()
+            _statements(generator)
+            timings[name] = (loaded, time.perf_counter() - started)
+
+        print(f"\n📊 {count:,} entries over 4 years")
+        for name, (loaded, reported) in timings.items():
+            print(f"   {name:9s} load {loaded:7.2f}s   statements {reported:7.3f}s")
+        print(f"   speedup (load + statements): {sum(timings['series']) / sum(timings['columnar']):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ReportGenerator backend parity test / benchmark")
+    parser.add_argument("--benchmark", nargs="*", type=int, metavar="ENTRIES",
+                        help="benchmark at these ledger sizes (default 100000 1000000)")
+    args = parser.parse_args()
+    if args.benchmark is not None:
+        benchmark(args.benchmark or [100_000, 1_000_000])
+    else:
+        asyncio.run(test_report_backends_match())
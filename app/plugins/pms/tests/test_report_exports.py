@@ -0,0 +1,123 @@
+"""
+Tests for streaming rent-roll and tax exports (reports/rent_roll_n_tax.py)
+
+Seeds a small portfolio and checks that:
+- the per-property prefetch gives every lease the same financial details as
+  the per-lease ``_get_unit_financial_details`` query
+- ``iter_rent_roll`` yields the rows of ``generate_rent_roll_report``
+- ``stream_csv`` emits the same rows in several chunks
+- ``iter_tax_report`` matches ``generate_tax_report`` per property and only
+  covers the ``property_ids`` it is given
+"""
+
+import asyncio
+import csv
+import io
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from plugins.pms.reports import export_stream
+from plugins.pms.reports.export_stream import stream_csv
+from plugins.pms.reports.rent_roll_n_tax import (
+    RENT_ROLL_COLUMNS, RentRollAndTaxesReportGenerator, rent_roll_row, tax_row
+)
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+AS_OF = datetime(2024, 6, 15)
+
+
+async def _seed(db, properties=3, units_per_property=12):
+    for p in range(properties):
+        property_id = f"prop-{p}"
+        await db.properties.insert_one({"_id": property_id, "name": f"Block {p}", "propertyValue": 1_000_000 * (p + 1)})
+        for u in range(units_per_property):
+            unit_id = ObjectId()
+            await db.property_units.insert_one({
+                "_id": unit_id, "property_id": property_id, "unitNumber": f"{p}{u:02d}", "rentAmount": 15000
+            })
+            if u % 4 == 3:
+                continue  # vacant
+            tenant_id = ObjectId()
+            lease_id = ObjectId()
+            await db.property_tenants.insert_one({"_id": tenant_id, "full_name": f"Tenant {p}-{u}", "phone": f"07{p}{u:02d}"})
+            await db.property_leases.insert_one({
+                "_id": lease_id, "property_id": property_id, "tenant_id": tenant_id, "units_id": [unit_id],
+                "status": "signed",
+                "lease_terms": {
+                    "start_date": AS_OF - timedelta(days=200), "end_date": AS_OF + timedelta(days=20 * u),
+                    "rent_amount": 15000 + 500 * u, "deposit_amount": 30000
+                }
+            })
+            for month in range(1, 7):
+                paid = 15000 if (u + month) % 3 else 5000
+                await db.property_invoices.insert_one({
+                    "lease_id": str(lease_id), "property_id": property_id, "tenant_id": tenant_id,
+                    "date_issued": datetime(2024, month, 1), "status": "paid" if paid == 15000 else "partial",
+                    "total_amount": 15000, "total_paid": paid, "balance_amount": 15000 - paid,
+                    "line_items": [{"type": "rent", "amount": 14000}, {"type": "utility", "amount": 1000}],
+                    "payments": [{"payment_date": datetime(2024, month, 5 + u % 3), "amount": paid}]
+                })
+
+
+async def test_rent_roll_stream_matches_report():
+    """Streamed rows and prefetched financials match the report and per-lease queries"""
+    print("\n" + "="*80)
+    print("TEST: Streaming Rent Roll")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    await _seed(db)
+    generator = RentRollAndTaxesReportGenerator(db)
+
+    for prop in await db.properties.find({}).to_list(None):
+        context = await generator._property_rent_roll_context(prop["_id"], AS_OF, True)
+        for lease_id, financial in context["financials"].items():
+            assert financial == await generator._get_unit_financial_details(lease_id, AS_OF), lease_id
+
+    report = await generator.generate_rent_roll_report(as_of_date=AS_OF)
+    expected = [rent_roll_row({"name": p["property_name"]}, unit) for p in report["properties"] for unit in p["units"]]
+    streamed = [row async for row in generator.iter_rent_roll(as_of_date=AS_OF)]
+    assert streamed == expected and len(streamed) == 36
+    print(f"\n   {len(streamed)} rows, financials equal to per-lease queries ✅")
+
+    flush_bytes, export_stream.CSV_FLUSH_BYTES = export_stream.CSV_FLUSH_BYTES, 512
+    try:
+        chunks = [chunk async for chunk in stream_csv(generator.iter_rent_roll(as_of_date=AS_OF), RENT_ROLL_COLUMNS)]
+    finally:
+        export_stream.CSV_FLUSH_BYTES = flush_bytes
+    parsed = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert len(chunks) > 1 and [row["Unit"] for row in parsed] == [row["Unit"] for row in expected]
+    assert parsed[0]["Balance"] == str(expected[0]["Balance"])
+    print(f"   CSV streamed in {len(chunks)} chunks ✅")
+
+    client.close()
+
+
+async def test_tax_stream_matches_report():
+    """Streamed tax rows equal the in-memory report's properties"""
+    print("\n" + "="*80)
+    print("TEST: Streaming Tax Report")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    await _seed(db)
+    generator = RentRollAndTaxesReportGenerator(db)
+
+    report = await generator.generate_tax_report(year=2024)
+    streamed = [row async for row in generator.iter_tax_report(year=2024)]
+    assert streamed == [tax_row(p) for p in report["properties"]]
+    assert all(len(p["tenant_breakdown"]) == 9 for p in report["properties"])
+    assert report["properties"][0]["tenant_breakdown"][0]["tenant_name"].startswith("Tenant 0-")
+    print(f"\n   {len(streamed)} property rows match ✅")
+
+    scoped = [row async for row in generator.iter_tax_report(year=2024, property_ids=["prop-0", "prop-2"])]
+    assert scoped == [streamed[0], streamed[2]]
+    print("   scoped to the authorized properties ✅")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_rent_roll_stream_matches_report())
+    asyncio.run(test_tax_stream_matches_report())
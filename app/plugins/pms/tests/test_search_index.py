@@ -0,0 +1,179 @@
+"""
+Tests for invoice search and keyset pages (utils/search_index.py, utils/pagination.py)
+
+Checks that the n-gram index returns exactly what a case-insensitive
+substring scan returns, that unit matches pull in their tenants, that a
+search limited to some properties filters before the match cap, and that
+walking invoices page by page with cursors visits every invoice once in
+(date_issued, _id) order, in both directions, including across equal and
+missing issue dates, and that the NDJSON export resumes from a page cursor
+in the same order.
+"""
+
+import asyncio
+import json
+import random
+import string
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from plugins.pms.utils.search_index import NgramIndex, PmsSearchIndex
+from plugins.pms.tests.test_ledger_system import TestSetup
+from utils.pagination import decode_cursor, export_cursor, keyset_sort, page_of, paginate, stream_ndjson, with_keyset
+
+
+def _word(rng, size):
+    return "".join(rng.choice(string.ascii_letters + " .@") for _ in range(size))
+
+
+async def test_ngram_index_matches_substring_scan():
+    """Index lookups equal a brute-force substring scan"""
+    print("\n" + "="*80)
+    print("TEST: N-gram Index vs Substring Scan")
+    print("="*80)
+
+    rng = random.Random(7)
+    index = NgramIndex()
+    docs = {}
+    for key in range(400):
+        docs[key] = [_word(rng, rng.randint(3, 14)), _word(rng, rng.randint(0, 10))]
+        index.add(key, docs[key])
+    for key in range(0, 400, 5):
+        index.remove(key)
+        docs.pop(key)
+
+    for _ in range(300):
+        values = docs[rng.choice(list(docs))]
+        text = values[rng.randrange(2)] or values[0]
+        start = rng.randrange(len(text))
+        query = text[start:start + rng.randint(1, 5)].swapcase()
+        needle = " ".join(query.lower().split())
+        if not needle:
+            continue
+        expected = {
+            key for key, vals in docs.items()
+            if any(needle in " ".join(v.lower().split()) for v in vals if v)
+        }
+        assert set(index.search(query)) == expected, query
+    print("\n   300 random queries match the scan ✅")
+
+
+async def test_unit_search_includes_tenant():
+    """A unit-number match also yields the unit's current tenant"""
+    print("\n" + "="*80)
+    print("TEST: Unit Search Resolves Tenants")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    tenant_id, other_id, unit_id = ObjectId(), ObjectId(), ObjectId()
+    await db.property_tenants.insert_many([
+        {"_id": tenant_id, "full_name": "Jane Wanjiru", "email": "jane@example.com", "phone": "+254700111222"},
+        {"_id": other_id, "full_name": "Peter Otieno", "email": "peter@example.com", "phone": "+254700333444"},
+    ])
+    await db.units.insert_one({"_id": unit_id, "unitNumber": "B-204", "currentTenantId": str(tenant_id)})
+
+    index = PmsSearchIndex(db)
+    await index.rebuild()
+    assert index.search("OTIENO") == ([other_id], [])
+    assert index.search("b-20") == ([tenant_id], [str(unit_id)])
+    assert index.search("0700")[0] == [] and set(index.search("2547")[0]) == {tenant_id, other_id}
+
+    index.apply_change({"operationType": "delete", "ns": {"coll": "property_tenants"}, "documentKey": {"_id": other_id}})
+    assert index.search("otieno") == ([], [])
+    print("\n   tenant, unit and change-event lookups ✅")
+
+    await db.property_tenants.insert_many([
+        {"_id": ObjectId(), "full_name": f"Mary Achieng {n}", "property_id": "p1" if n < 30 else "p2"}
+        for n in range(40)
+    ])
+    await index.rebuild()
+    scoped, _ = index.search("achieng", limit=10, property_ids=["p2"])
+    assert len(scoped) == 10
+    assert {t["property_id"] for t in await db.property_tenants.find({"_id": {"$in": scoped}}).to_list(None)} == {"p2"}
+    assert index.search("achieng", property_ids=[]) == ([], [])
+    print("   property filter applied before the match cap ✅")
+
+    client.close()
+
+
+async def test_keyset_walk_visits_every_invoice_once():
+    """Cursor pages cover the sorted collection without gaps or repeats"""
+    print("\n" + "="*80)
+    print("TEST: Keyset Pagination Walk")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    base = datetime(2024, 2, 1)
+    # few distinct dates, so most page boundaries fall inside a run of ties
+    await db.property_invoices.insert_many([
+        {"_id": ObjectId(), "date_issued": base + timedelta(days=i % 4), "status": "issued"}
+        for i in range(53)
+    ] + [
+        # drafts without an issue date sort below every date
+        {"_id": ObjectId(), "date_issued": None, "status": "issued"} for _ in range(6)
+    ] + [
+        {"_id": ObjectId(), "status": "issued"} for _ in range(3)
+    ])
+    query = {"status": "issued"}
+    for direction in (-1, 1):
+        expected = [
+            doc["_id"] for doc in
+            await db.property_invoices.find(query).sort(keyset_sort("date_issued", direction)).to_list(None)
+        ]
+
+        seen, token, pages = [], None, 0
+        while True:
+            docs = await db.property_invoices.find(with_keyset(query, "date_issued", direction, token)) \
+                .sort(keyset_sort("date_issued", direction)).limit(8).to_list(None)
+            docs, token = page_of(docs, "date_issued", 7)
+            seen.extend(doc["_id"] for doc in docs)
+            pages += 1
+            if token is None:
+                break
+            assert decode_cursor(token) == (docs[-1].get("date_issued"), docs[-1]["_id"])
+        assert seen == expected and pages == 9, (direction, len(seen), pages)
+        print(f"\n   {len(seen)} invoices over {pages} pages in order (direction {direction}) ✅")
+
+    try:
+        with_keyset(query, "date_issued", -1, "not-a-cursor")
+        raise AssertionError("bad cursor accepted")
+    except ValueError:
+        pass
+
+    client.close()
+
+
+async def test_paginate_and_ndjson_export():
+    """paginate pages and the NDJSON export agree on order and resume point"""
+    print("\n" + "="*80)
+    print("TEST: Paginate + NDJSON Export")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    base = datetime(2024, 3, 1)
+    await db.property_tickets.insert_many([
+        {"_id": ObjectId(), "created_at": base + timedelta(hours=i % 5), "metadata": {"property_id": "p1" if i % 3 else "p2"}}
+        for i in range(30)
+    ])
+    query = {"metadata.property_id": "p1"}
+    expected = [
+        str(doc["_id"]) for doc in
+        await db.property_tickets.find(query).sort(keyset_sort("created_at", -1)).to_list(None)
+    ]
+
+    first, token = await paginate(db.property_tickets, query, "created_at", -1, 6)
+    lines = [line async for line in stream_ndjson(export_cursor(db.property_tickets, query, "created_at", -1, token))]
+    exported = [json.loads(line) for line in lines]
+    assert all(line.endswith(b"\n") for line in lines)
+    assert [str(doc["_id"]) for doc in first] + [doc["_id"] for doc in exported] == expected
+    print(f"\n   6 paged + {len(exported)} exported = {len(expected)} tickets in order ✅")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_ngram_index_matches_substring_scan())
+    asyncio.run(test_unit_search_includes_tenant())
+    asyncio.run(test_keyset_walk_visits_every_invoice_once())
+    asyncio.run(test_paginate_and_ndjson_export())
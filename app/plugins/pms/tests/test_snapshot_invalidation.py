@@ -0,0 +1,133 @@
+"""
+Tests for the snapshot invalidation bus (snapshots/invalidation.py)
+
+Checks that:
+- unit writes are patched into the cached property snapshot, which keeps
+  being served from cache (no rebuild) with the new unit data
+- a property write drops only its owner's snapshot
+- an invoice or ledger write drops the financial cache entries of its
+  property and the unfiltered ones, keeping other properties' entries and
+  permanent snapshots
+- change-stream events go through the same path
+- hits, misses, recomputes and invalidations reach the Prometheus metrics
+"""
+
+import asyncio
+
+from bson import ObjectId
+from prometheus_client import REGISTRY
+
+from plugins.pms.snapshots.finance_properties import FinancialSnapshotService
+from plugins.pms.snapshots.invalidation import SnapshotInvalidationBus, snapshots_changed
+from plugins.pms.snapshots.property import PropertySnapshotService
+from plugins.pms.tests.test_ledger_system import TestSetup
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+async def _seed_properties(db):
+    unit_ids = {}
+    for owner, property_id in (("owner-1", "prop-a"), ("owner-1", "prop-b"), ("owner-2", "prop-c")):
+        await db.properties.insert_one({"_id": property_id, "owner_id": owner, "name": property_id.upper()})
+        for n in range(3):
+            unit_id = ObjectId()
+            unit_ids[(property_id, n)] = unit_id
+            await db.units.insert_one({
+                "_id": unit_id, "property_id": property_id, "unitNumber": f"{property_id[-1]}{n}",
+                "status": "vacant", "rentAmount": 10000
+            })
+    return unit_ids
+
+
+def _units(snapshot, property_id):
+    prop = next(p for p in snapshot if p["id"] == property_id)
+    return {u["_id"]: u for u in prop["units"]}
+
+
+async def test_property_snapshot_patched_in_place():
+    """Unit writes patch the cached snapshot; property writes drop only the owner's"""
+    print("\n" + "="*80)
+    print("TEST: Property Snapshot Invalidation")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    unit_ids = await _seed_properties(db)
+    service = PropertySnapshotService(db)
+    bus = SnapshotInvalidationBus(db)
+    misses = _sample("snapshot_cache_requests_total", snapshot="properties", result="miss")
+    hits = _sample("snapshot_cache_requests_total", snapshot="properties", result="hit")
+    recomputes = _sample("snapshot_recompute_seconds_count", snapshot="properties")
+
+    first = await service.get_or_refresh_snapshot("owner-1")
+    assert len(first) == 2 and len(_units(first, "prop-a")) == 3
+    await service.get_or_refresh_snapshot("owner-2")
+
+    # update, insert and delete units of owner-1
+    occupied, removed, added = unit_ids[("prop-a", 0)], unit_ids[("prop-b", 2)], ObjectId()
+    await db.units.update_one({"_id": occupied}, {"$set": {"status": "occupied", "rentAmount": 12000}})
+    await db.units.insert_one({"_id": added, "property_id": "prop-b", "unitNumber": "b9", "status": "vacant"})
+    await db.units.delete_one({"_id": removed})
+    await bus.publish("units", ids=[occupied, added])
+    await bus.apply_change({
+        "operationType": "delete", "ns": {"coll": "units"}, "documentKey": {"_id": removed}
+    })
+
+    patched = await service.get_or_refresh_snapshot("owner-1")
+    assert _units(patched, "prop-a")[str(occupied)]["status"] == "occupied"
+    assert _units(patched, "prop-a")[str(occupied)]["rent"] == 12000
+    assert set(_units(patched, "prop-b")) == {str(unit_ids[("prop-b", 0)]), str(unit_ids[("prop-b", 1)]), str(added)}
+    await service.invalidate_snapshot("owner-1")
+    assert await service.get_or_refresh_snapshot("owner-1") == patched
+    print("\n   unit update/insert/delete patched, equal to a rebuild ✅")
+
+    await db.properties.update_one({"_id": "prop-c"}, {"$set": {"name": "Renamed"}})
+    await bus.publish("properties", ids=["prop-c"])
+    assert await db.system_snapshots.count_documents({"type": "properties", "period_key": "owner-2"}) == 0
+    assert await db.system_snapshots.count_documents({"type": "properties", "period_key": "owner-1"}) == 1
+    assert (await service.get_or_refresh_snapshot("owner-2"))[0]["name"] == "Renamed"
+    print("   property write dropped only its owner's snapshot ✅")
+
+    assert _sample("snapshot_cache_requests_total", snapshot="properties", result="miss") - misses == 4
+    assert _sample("snapshot_cache_requests_total", snapshot="properties", result="hit") - hits == 1
+    assert _sample("snapshot_recompute_seconds_count", snapshot="properties") - recomputes == 4
+    assert _sample("snapshot_invalidations_total", snapshot="properties", action="patch", source="change_stream") >= 1
+    print("   hit/miss/recompute metrics recorded ✅")
+
+    client.close()
+
+
+async def test_financial_cache_dropped_per_property():
+    """Invoice and ledger writes drop their property's and unfiltered cache entries only"""
+    print("\n" + "="*80)
+    print("TEST: Financial Snapshot Invalidation")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    service = FinancialSnapshotService(db)
+    for filters in ({}, {"property_ids": ["prop-a"]}, {"property_ids": ["prop-b"]}):
+        await service._save_snapshot(service._make_key(filters), filters, [], {})
+    await service._save_snapshot("2024-05", {"period_key": "2024-05"}, [], {}, is_cache=False)
+
+    def remaining():
+        return db.system_snapshots.distinct("data.filters.property_ids", {"type": "property_financials"})
+
+    await snapshots_changed(db, "property_ledger_entries", [{"_id": ObjectId(), "property_id": "prop-a", "debit": 50}])
+    assert await remaining() == ["prop-b"]
+    assert await db.system_snapshots.count_documents({"type": "property_financials"}) == 2
+    print("\n   ledger write for prop-a kept prop-b and the period snapshot ✅")
+
+    invoice_id = ObjectId()
+    await db.property_invoices.insert_one({"_id": invoice_id, "property_id": "prop-b", "total_amount": 100})
+    await snapshots_changed(db, "property_invoices", ids=[invoice_id])
+    assert await remaining() == []
+    assert await db.system_snapshots.count_documents({"period_key": "2024-05"}) == 1
+    print("   invoice write for prop-b dropped its entry ✅")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_property_snapshot_patched_in_place())
+    asyncio.run(test_financial_cache_dropped_per_property())
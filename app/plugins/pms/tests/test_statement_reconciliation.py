@@ -0,0 +1,212 @@
+"""
+Tests for bulk statement reconciliation (utils/statement_reconciliation.py)
+
+Checks that:
+- statement rows are matched by invoice number, unit, phone and (fuzzy)
+  payer name, posted to the ledger and recorded as payments, leaving every
+  invoice's totals consistent with the ledger (``verify`` finds nothing)
+- a payment larger than the referenced invoice spills onto the tenant's
+  other open invoices, and beyond them becomes tenant credit
+- unmatched, ambiguous, amount-only, duplicate, already-posted and
+  unreadable rows land in the exceptions report instead of being posted
+- a queued run is claimed once, tracks progress and uploads its report
+- a 10k-row statement is matched in memory in well under a second per 1k rows
+"""
+
+import asyncio
+import csv
+import io
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from plugins.pms.accounting import payment_totals
+from plugins.pms.accounting.ledger import INVOICE_COLL, LEDGER_COLL
+from plugins.pms.models.ledger_entry import Invoice, InvoiceLineItem, InvoiceStatus
+from plugins.pms.tests.test_ledger_system import TestSetup
+from plugins.pms.utils.statement_reconciliation import (
+    RUN_COMPLETED, StatementReconciler, parse_statement
+)
+
+PROPERTY_ID = str(ObjectId())
+
+
+class _MemoryMinio:
+    """Just enough of the MinIO client for statement downloads and report uploads."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def bucket_exists(self, bucket):
+        return True
+
+    def make_bucket(self, bucket):
+        pass
+
+    def put_object(self, bucket, name, data, length, content_type=None):
+        self.objects[(bucket, name)] = data.read(length)
+
+    def get_object(self, bucket, name):
+        response = io.BytesIO(self.objects[(bucket, name)])
+        response.release_conn = lambda: None
+        return response
+
+
+async def _seed_tenant(db, name, phone, unit_number, rents, invoice_numbers=None):
+    tenant_id, unit_id = ObjectId(), ObjectId()
+    await db.property_tenants.insert_one({
+        "_id": tenant_id, "full_name": name, "phone": phone, "property_id": PROPERTY_ID
+    })
+    await db.units.insert_one({"_id": unit_id, "property_id": PROPERTY_ID, "unitNumber": unit_number})
+    invoices = []
+    for month, rent in enumerate(rents, start=1):
+        invoice = Invoice(
+            id=str(ObjectId()),
+            invoice_number=(invoice_numbers or {}).get(month, f"INV-{unit_number}-{month:02d}"),
+            property_id=PROPERTY_ID,
+            tenant_id=str(tenant_id),
+            date_issued=datetime(2024, month, 1, tzinfo=timezone.utc),
+            due_date=datetime(2024, month, 5, tzinfo=timezone.utc),
+            units_id=[str(unit_id)],
+            line_items=[InvoiceLineItem(id=str(ObjectId()), description="Monthly Rent", amount=rent, category="rent")],
+            total_amount=rent,
+            balance_amount=rent,
+            status=InvoiceStatus.ISSUED,
+            meta={}
+        )
+        await db[INVOICE_COLL].insert_one(invoice.model_dump(by_alias=True))
+        invoices.append(invoice)
+    return str(tenant_id), invoices
+
+
+def _statement(lines):
+    out = io.StringIO()
+    out.write("Bank Statement - Account 0123\n\n")
+    writer = csv.writer(out)
+    writer.writerow(["Date", "Reference", "Details", "Phone", "Account", "Amount"])
+    writer.writerows(lines)
+    return out.getvalue().encode()
+
+
+async def test_reconcile_statement():
+    """Rows are matched, posted in bulk and reported consistently with the ledger"""
+    print("\n" + "="*80)
+    print("TEST: Statement Reconciliation")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    alice, alice_invoices = await _seed_tenant(db, "Alice Wanjiru", "+254711000001", "A1", [10000.0, 10000.0])
+    bob, bob_invoices = await _seed_tenant(db, "Bob Otieno", "0722000002", "B2", [12000.0])
+    carol, _ = await _seed_tenant(db, "Carol Njeri Kamau", "0733000003", "C3", [9000.0])
+    dan, _ = await _seed_tenant(db, "Dan Mwangi", "0744000004", "D4", [7500.0])
+    eve, _ = await _seed_tenant(db, "Eve Achieng", "0755000005", "E5", [5000.0])
+    await _seed_tenant(db, "Eva Achieng", "0766000006", "E6", [5100.0])
+    await db.property_payments.insert_one({"_id": str(ObjectId()), "reference": "QX55", "amount": 1})
+
+    data = _statement([
+        ("2024-02-03", "QA1", "Payment INV-A1-02", "", "", "4,000.00"),          # invoice number in details
+        ("2024-02-03", "QA2", "Cash deposit", "", "A1", "16000"),                # unit → both invoices
+        ("03/02/2024", "QB1", "MPESA", "254722000002", "", "12000"),             # phone
+        ("2024-02-04", "QC1", "KAMAU CAROL", "2547****003", "", "9000"),         # fuzzy name
+        ("2024-02-04", "QD1", "Standing order", "", "", "7500"),                 # amount only → suggestion
+        ("2024-02-04", "QE1", "EV ACHIENG", "", "", "5000"),                     # two close names, amount fits Eve
+        ("2024-02-04", "QZ1", "Unknown payer", "", "", "123"),                   # unmatched
+        ("2024-02-05", "QB1", "MPESA", "254722000002", "", "12000"),             # duplicate in file
+        ("2024-02-05", "QX55", "MPESA", "254722000002", "", "500"),              # already posted
+        ("2024-02-05", "QW1", "Bank charges", "", "", "-35.00"),                 # debit, skipped
+        ("2024-02-05", "QW2", "Interest", "", "", "n/a"),                        # unreadable amount
+        ("2024-02-06", "QA3", "Top up", "0711000001", "", "2500"),               # phone, beyond all invoices
+    ])
+    rows, skipped = parse_statement(data, "statement.csv")
+    assert len(rows) == 11 and skipped == 1
+    assert rows[0].line == 4 and rows[0].amount == 4000.0 and rows[2].date.day == 3
+
+    reconciler = StatementReconciler(db)
+    summary, exceptions = await reconciler.reconcile(rows, property_ids=[PROPERTY_ID], method="bank")
+    reasons = {row["reference"]: row["reason"] for row in exceptions}
+    assert summary["posted"] == 6, summary
+    assert summary["by_method"] == {"reference": 1, "unit": 1, "phone": 2, "fuzzy_name": 2}, summary["by_method"]
+    assert reasons == {
+        "QD1": "suggested", "QZ1": "unmatched", "QB1": "duplicate_in_file",
+        "QX55": "already_posted", "QW2": "invalid_amount"
+    }, reasons
+    suggested = next(row for row in exceptions if row["reason"] == "suggested")
+    assert suggested["suggested_tenant_id"] == dan
+    eve_payment = await db.property_payments.find_one({"reference": "QE1"})
+    assert str(eve_payment["tenant_id"]) == eve and eve_payment["match"]["method"] == "fuzzy_name"
+    print(f"\n   {summary['posted']} rows posted {summary['by_method']} ✅")
+    print(f"   exceptions {sorted(reasons.values())} ✅")
+
+    alice_feb = await db[INVOICE_COLL].find_one({"_id": alice_invoices[1].id})
+    alice_jan = await db[INVOICE_COLL].find_one({"_id": alice_invoices[0].id})
+    assert alice_jan["status"] == "paid" and alice_feb["status"] == "paid"
+    assert alice_feb["total_paid"] == 12500.0 and alice_feb["overpaid_amount"] == 2500.0
+    credit = await db[LEDGER_COLL].aggregate([
+        {"$match": {"tenant_id": ObjectId(alice), "account": "Tenant Credit / Prepaid Rent"}},
+        {"$group": {"_id": None, "total": {"$sum": "$credit"}}}
+    ]).to_list(None)
+    assert credit[0]["total"] == 2500.0
+    print("   payments spill across invoices, excess becomes tenant credit ✅")
+
+    report = await payment_totals.verify(db)
+    assert report["mismatched"] == 0, report["differences"]
+    payments = await db.property_payments.count_documents({"statement_line": {"$exists": True}})
+    assert payments == 6
+    print("   invoice totals consistent with the ledger ✅")
+
+    client.close()
+
+
+async def test_run_lifecycle_and_scale():
+    """A run is claimed once and reports; 10k rows match in memory quickly"""
+    print("\n" + "="*80)
+    print("TEST: Reconciliation Run + 10k Rows")
+    print("="*80)
+
+    client, db = await TestSetup.setup_test_db()
+    for n in range(1000):
+        await _seed_tenant(db, f"Tenant {n:04d} Name", f"07{n:08d}", f"U{n}", [15000.0])
+
+    lines = []
+    for n in range(10000):
+        t = n % 1000
+        lines.append(("2024-01-10", f"R{n:05d}", f"Payer {n}", f"2547{t:08d}", "", "1500"))
+    lines.append(("2024-01-10", "R99999", "Nobody", "", "", "77"))
+    minio = _MemoryMinio()
+    minio.objects[("pms-statements", "statements/s.csv")] = _statement(lines)
+
+    reconciler = StatementReconciler(db, minio_client=minio)
+    rows, _ = parse_statement(minio.objects[("pms-statements", "statements/s.csv")])
+    index = await reconciler.build_index([PROPERTY_ID])
+    started = time.perf_counter()
+    matches = [reconciler.match(row, index)[0] for row in rows]
+    seconds = time.perf_counter() - started
+    assert sum(1 for m in matches if m) == 10000
+    assert seconds < 5, seconds
+    print(f"\n   10,001 rows matched in memory in {seconds:.2f}s ✅")
+
+    run = await reconciler.create_run(
+        {"bucket": "pms-statements", "object_name": "statements/s.csv", "filename": "s.csv"},
+        property_ids=[PROPERTY_ID], method="mpesa"
+    )
+    summary = await reconciler.run(run["_id"])
+    assert summary["posted"] == 10000 and summary["exceptions"] == 1
+    assert await reconciler.run(run["_id"]) is None
+
+    stored = await db.statement_reconciliations.find_one({"_id": run["_id"]})
+    assert stored["status"] == RUN_COMPLETED
+    assert stored["progress"]["rows_total"] == 10001 and stored["progress"]["rows_done"] == 10001
+    assert stored["exceptions"][0]["reference"] == "R99999"
+    report = minio.objects[(stored["report"]["bucket"], stored["report"]["object_name"])].decode()
+    assert report.splitlines()[0].startswith("line,date,reference") and "R99999" in report
+    paid = await db[INVOICE_COLL].count_documents({"status": "paid"})
+    assert paid == 1000 and (await payment_totals.verify(db))["mismatched"] == 0
+    print(f"   run posted 10,000 payments in {summary['seconds']:.2f}s, claimed once, report uploaded ✅")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_reconcile_statement())
+    asyncio.run(test_run_lifecycle_and_scale())
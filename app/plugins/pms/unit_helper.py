@@ -3,6 +3,7 @@ import re
 from datetime import datetime,timezone
 from plugins.pms.models.models import PropertyCreate ,UnitBase
 from bson import ObjectId
+from plugins.pms.snapshots.invalidation import snapshots_changed
 from datetime import datetime, timezone
 from typing import List, Optional
 
@@ -328,6 +329,7 @@ async def ensureRoomAssigned(contract,db):
                     
             }}
         )
+    await snapshots_changed(db, "units", ids=contract["units_id"])
 
 async def batch_insert_units(
     generated_units: List[dict],
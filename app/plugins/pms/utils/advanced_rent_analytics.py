@@ -499,7 +499,7 @@ class AdvancedRentAnalytics:
                         
                     else:
                         late_payments += 1
-                        delay_days = max((payment_date - due_date).days, 0)
+                        delay_days = max((payment_date - due_date).days, 0) if payment_date else 0
                         total_delay_days += delay_days
                         delayed_invoices += 1
                         
@@ -0,0 +1,375 @@
+"""
+Month-end billing runs sharded across Dramatiq workers.
+
+A run splits the properties that have billable leases into shards and records
+them in ``billing_runs``::
+
+    {_id, billing_month, force, balance_method, shard_size, status,
+     created_by, property_ids, created_at, updated_at, completed_at, lease_statuses,
+     shards: [{index, property_ids, status, attempts, worker, started_at,
+               finished_at, error, results, metrics}]}
+
+Every shard is one ``bill_billing_shard`` message (tasks/billing_tasks.py).
+A worker claims its shard with a single conditional update, bills it with
+``BulkBillingEngine`` and writes the outcome and its ``PerformanceMonitor``
+snapshot back to the shard, so:
+
+- a redelivered or duplicated message finds its shard claimed or done and
+  returns without billing anything
+- ``resume`` re-sends every unfinished shard, including ones whose worker
+  died mid-shard (``running`` for longer than ``SHARD_TIMEOUT``)
+- ``resume(failed_only=True)`` re-sends failed shards only
+- invoices carry ``meta.billing_run_id``, so re-running a shard skips the
+  leases this run already billed instead of erroring or regenerating them
+
+Shard status: queued -> running -> done | failed (failed shards can be claimed
+again). Run status: running -> completed | completed_with_errors, or failed
+while any shard is failed and nothing is left to run.
+"""
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from plugins.pms.utils.invoice_bulk import BulkBillingEngine
+from plugins.pms.utils.invoice_batch import PerformanceMonitor
+
+DEFAULT_SHARD_SIZE = int(os.getenv("BILLING_SHARD_SIZE", "50"))
+SHARD_TIMEOUT = timedelta(minutes=int(os.getenv("BILLING_SHARD_TIMEOUT_MINUTES", "30")))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+MAX_STORED_ERRORS = 100
+
+SHARD_QUEUED = "queued"
+SHARD_RUNNING = "running"
+SHARD_DONE = "done"
+SHARD_FAILED = "failed"
+
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_COMPLETED_WITH_ERRORS = "completed_with_errors"
+RUN_FAILED = "failed"
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _empty_results(billing_month: str) -> Dict:
+    """Same shape as ``process_all_leases`` results."""
+    return {
+        "billing_period": billing_month,
+        "leases_processed": 0,
+        "leases_expiring": [],
+        "leases_expired": [],
+        "invoices_created": [],
+        "invoices_regenerated": [],
+        "invoices_consolidated": [],
+        "tickets_created": [],
+        "notifications_queued": [],
+        "errors": []
+    }
+
+
+class BillingRunCoordinator:
+    """Creates, claims, completes and resumes billing-run shards."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.db = manager.db
+        self.runs = manager.db.billing_runs
+
+    async def start_run(
+        self,
+        billing_month: str,
+        force: bool = False,
+        balance_method: str = "sum",
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        property_ids: Optional[List[str]] = None,
+        created_by: Optional[str] = None
+    ) -> Dict:
+        """
+        Create a run for ``billing_month`` over ``property_ids`` (every
+        property when None) and return it.
+
+        An unfinished run of the same user for the same month and properties
+        is returned as-is, so starting twice does not bill twice; resume it
+        instead.
+        """
+        property_ids = sorted(property_ids, key=str) if property_ids is not None else None
+        active = await self.runs.find_one({
+            "billing_month": billing_month,
+            "created_by": created_by,
+            "property_ids": property_ids,
+            "status": {"$in": [RUN_RUNNING, RUN_FAILED]}
+        })
+        if active:
+            return active
+
+        # Expire/flag leases once per run rather than once per shard
+        lease_statuses = _empty_results(billing_month)
+        await self.manager._update_lease_statuses(lease_statuses)
+
+        query = {"status": {"$in": ["active", "signed"]}}
+        if property_ids is not None:
+            query["property_id"] = {"$in": property_ids}
+        billable = sorted(await self.db.property_leases.distinct("property_id", query), key=str)
+
+        now = datetime.now(timezone.utc)
+        shards = [
+            {
+                "index": index,
+                "property_ids": billable[start:start + shard_size],
+                "status": SHARD_QUEUED,
+                "attempts": 0,
+                "worker": None,
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "results": None,
+                "metrics": None
+            }
+            for index, start in enumerate(range(0, len(billable), shard_size))
+        ]
+        run = {
+            "_id": str(ObjectId()),
+            "billing_month": billing_month,
+            "force": force,
+            "balance_method": balance_method,
+            "shard_size": shard_size,
+            "created_by": created_by,
+            "property_ids": property_ids,
+            "status": RUN_RUNNING if shards else RUN_COMPLETED,
+            "created_at": now,
+            "updated_at": now,
+            "completed_at": None if shards else now,
+            "lease_statuses": {
+                "leases_expired": len(lease_statuses["leases_expired"]),
+                "leases_expiring": len(lease_statuses["leases_expiring"])
+            },
+            "shards": shards
+        }
+        await self.runs.insert_one(run)
+        return run
+
+    @staticmethod
+    def _run_filter(run_id: str, created_by: Optional[str]) -> Dict:
+        return {"_id": run_id} if created_by is None else {"_id": run_id, "created_by": created_by}
+
+    async def resume(self, run_id: str, failed_only: bool = False, created_by: Optional[str] = None) -> List[int]:
+        """
+        Indexes of the unfinished (or only the failed) shards that need
+        re-sending; with ``created_by``, only a run that user started.
+        """
+        run = await self.runs.find_one(self._run_filter(run_id, created_by), {"shards.property_ids": 0})
+        if not run:
+            raise ValueError(f"Billing run {run_id} not found")
+
+        stale_before = datetime.now(timezone.utc) - SHARD_TIMEOUT
+        indexes = []
+        for shard in run["shards"]:
+            status = shard["status"]
+            if status == SHARD_FAILED:
+                indexes.append(shard["index"])
+            elif failed_only:
+                continue
+            elif status == SHARD_QUEUED:
+                indexes.append(shard["index"])
+            elif status == SHARD_RUNNING and _as_utc(shard.get("started_at")) < stale_before:
+                indexes.append(shard["index"])
+
+        if indexes:
+            await self.runs.update_one(
+                {"_id": run_id},
+                {"$set": {"status": RUN_RUNNING, "updated_at": datetime.now(timezone.utc)}}
+            )
+        return indexes
+
+    async def claim_shard(self, run_id: str, index: int) -> Optional[Dict]:
+        """
+        Take a shard for this worker. Returns the run (with only that shard)
+        or None if the shard is done or another worker holds it.
+        """
+        now = datetime.now(timezone.utc)
+        return await self.runs.find_one_and_update(
+            {
+                "_id": run_id,
+                "shards": {"$elemMatch": {
+                    "index": index,
+                    "$or": [
+                        {"status": {"$in": [SHARD_QUEUED, SHARD_FAILED]}},
+                        {"status": SHARD_RUNNING, "started_at": {"$lt": now - SHARD_TIMEOUT}}
+                    ]
+                }}
+            },
+            {
+                "$set": {
+                    "shards.$.status": SHARD_RUNNING,
+                    "shards.$.worker": WORKER_ID,
+                    "shards.$.started_at": now,
+                    "shards.$.error": None,
+                    "status": RUN_RUNNING,
+                    "updated_at": now
+                },
+                "$inc": {"shards.$.attempts": 1}
+            },
+            projection={
+                "billing_month": 1,
+                "force": 1,
+                "balance_method": 1,
+                "shards": {"$elemMatch": {"index": index}}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def run_shard(self, run_id: str, index: int) -> Optional[Dict]:
+        """Claim, bill and record one shard. Returns its results, or None if not claimed."""
+        run = await self.claim_shard(run_id, index)
+        if not run:
+            return None
+
+        shard = run["shards"][0]
+        billing_month = run["billing_month"]
+        results = _empty_results(billing_month)
+        monitor = PerformanceMonitor()
+        monitor.start()
+        start = time.perf_counter()
+
+        try:
+            property_ids = shard["property_ids"]
+            leases_by_property: Dict[Any, List[Dict]] = {property_id: [] for property_id in property_ids}
+            cursor = self.db.property_leases.find({
+                "property_id": {"$in": property_ids},
+                "status": {"$in": ["active", "signed"]}
+            })
+            async for lease in cursor:
+                leases_by_property[lease["property_id"]].append(lease)
+            leases_by_property = {pid: leases for pid, leases in leases_by_property.items() if leases}
+
+            engine = BulkBillingEngine(self.manager, run_id=run_id)
+            await engine.process_property_batch(
+                leases_by_property,
+                billing_month,
+                run["force"],
+                run["balance_method"],
+                results
+            )
+        except Exception as e:
+            await self._finish_shard(run_id, index, SHARD_FAILED, results, monitor, error=str(e))
+            raise
+
+        monitor.record_batch(len(results["invoices_created"]), time.perf_counter() - start)
+        monitor.metrics["properties_processed"] += len(leases_by_property)
+        for _ in results["errors"]:
+            monitor.record_error()
+        await self._finish_shard(run_id, index, SHARD_DONE, results, monitor)
+        return results
+
+    async def _finish_shard(
+        self,
+        run_id: str,
+        index: int,
+        status: str,
+        results: Dict,
+        monitor: PerformanceMonitor,
+        error: Optional[str] = None
+    ):
+        monitor.stop()
+        now = datetime.now(timezone.utc)
+        await self.runs.update_one(
+            {"_id": run_id, "shards.index": index},
+            {"$set": {
+                "shards.$.status": status,
+                "shards.$.finished_at": now,
+                "shards.$.error": error,
+                "shards.$.results": {
+                    "leases_processed": results["leases_processed"],
+                    "leases_skipped": len(results.get("leases_skipped", [])),
+                    "invoices_created": len(results["invoices_created"]),
+                    "invoices_regenerated": len(results["invoices_regenerated"]),
+                    "invoices_consolidated": len(results["invoices_consolidated"]),
+                    "tickets_created": len(results["tickets_created"]),
+                    "notifications_queued": len(results["notifications_queued"]),
+                    "errors": results["errors"][:MAX_STORED_ERRORS],
+                    "error_count": len(results["errors"])
+                },
+                "shards.$.metrics": monitor.to_dict(),
+                "updated_at": now
+            }}
+        )
+        await self._refresh_run_status(run_id)
+
+    async def _refresh_run_status(self, run_id: str):
+        """Settle the run's status; the worker that completes it sends landlord summaries."""
+        run = await self.runs.find_one(
+            {"_id": run_id},
+            {"status": 1, "billing_month": 1, "shards.status": 1, "shards.results.error_count": 1}
+        )
+        statuses = [shard["status"] for shard in run["shards"]]
+        if any(status in (SHARD_QUEUED, SHARD_RUNNING) for status in statuses):
+            return
+
+        if SHARD_FAILED in statuses:
+            await self.runs.update_one(
+                {"_id": run_id, "status": RUN_RUNNING},
+                {"$set": {"status": RUN_FAILED, "updated_at": datetime.now(timezone.utc)}}
+            )
+            return
+
+        lease_errors = sum((shard.get("results") or {}).get("error_count", 0) for shard in run["shards"])
+        now = datetime.now(timezone.utc)
+        completed = await self.runs.find_one_and_update(
+            {"_id": run_id, "status": {"$in": [RUN_RUNNING, RUN_FAILED]}},
+            {"$set": {
+                "status": RUN_COMPLETED_WITH_ERRORS if lease_errors else RUN_COMPLETED,
+                "completed_at": now,
+                "updated_at": now
+            }}
+        )
+        if completed:
+            summaries = _empty_results(run["billing_month"])
+            await self.manager._generate_landlord_summaries(run["billing_month"], summaries)
+
+    async def summary(self, run_id: str, created_by: Optional[str] = None) -> Optional[Dict]:
+        """Run progress plus PerformanceMonitor metrics merged across all workers."""
+        run = await self.runs.find_one(self._run_filter(run_id, created_by), {"shards.property_ids": 0})
+        if not run:
+            return None
+
+        shards = run["shards"]
+        by_status: Dict[str, int] = {}
+        by_worker: Dict[str, Dict[str, float]] = {}
+        totals: Dict[str, int] = {}
+        for shard in shards:
+            by_status[shard["status"]] = by_status.get(shard["status"], 0) + 1
+            for key, value in (shard.get("results") or {}).items():
+                if isinstance(value, int):
+                    totals[key] = totals.get(key, 0) + value
+            if shard.get("worker") and shard.get("metrics"):
+                worker = by_worker.setdefault(shard["worker"], {"shards": 0, "invoices": 0, "seconds": 0.0})
+                worker["shards"] += 1
+                worker["invoices"] += shard["metrics"]["metrics"].get("total_invoices", 0)
+                worker["seconds"] += sum(shard["metrics"]["metrics"].get("batch_times", []))
+
+        monitor = PerformanceMonitor.merge([shard["metrics"] for shard in shards if shard.get("metrics")])
+        return {
+            "run_id": run["_id"],
+            "billing_month": run["billing_month"],
+            "status": run["status"],
+            "created_at": run["created_at"],
+            "completed_at": run.get("completed_at"),
+            "lease_statuses": run.get("lease_statuses", {}),
+            "shards": {"total": len(shards), **by_status},
+            "totals": totals,
+            "performance": monitor.get_summary(),
+            "workers": by_worker,
+            "failed_shards": [
+                {"index": shard["index"], "attempts": shard["attempts"], "error": shard.get("error")}
+                for shard in shards if shard["status"] == SHARD_FAILED
+            ]
+        }
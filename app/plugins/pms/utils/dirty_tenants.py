@@ -0,0 +1,102 @@
+"""
+Tenants whose finances changed since they were last risk-scored.
+
+Ledger postings (``Ledger``), invoice saves and payments
+(``AsyncLeaseInvoiceManager``, ``BulkBillingEngine``) add the tenant to a
+Redis set. ``enrich_dirty_tenants`` (tasks/tenant_tasks.py) pops the set in
+batches and rescores only those tenants; the nightly full recompute
+reconciles anything missed.
+
+Marking is best effort and never waits on Redis: ``mark_tenants_dirty``
+only adds the ids to an in-process set, and a background task sends
+everything marked meanwhile with one ``SADD``. When Redis is unreachable (or
+not installed) the failure is logged, the financial write is unaffected and
+the tenant is caught up by the nightly run. Short-lived event loops (the
+Dramatiq actors' ``asyncio.run``) call ``flush_dirty_tenants`` before
+returning so their last marks are not cancelled with the loop.
+"""
+import asyncio
+import logging
+import os
+import weakref
+from typing import Iterable, List, Set
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+DIRTY_TENANTS_KEY = os.getenv("DIRTY_TENANTS_KEY", "pms:risk:dirty_tenants")
+
+# redis.asyncio connections belong to the loop that opened them, and so do
+# the marks waiting for the loop's flush task
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+_pending: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Set[str]]" = weakref.WeakKeyDictionary()
+_flushes: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+
+def _client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # imported here so write paths do not need redis installed to mark tenants
+        import redis.asyncio as redis
+
+        client = redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2
+        )
+        _clients[loop] = client
+    return client
+
+
+async def _add(members: Set[str]) -> None:
+    try:
+        await _client().sadd(DIRTY_TENANTS_KEY, *members)
+    except Exception as e:
+        logger.warning("could not mark %d tenants for rescoring: %s", len(members), e)
+
+
+async def _flush_pending() -> None:
+    loop = asyncio.get_running_loop()
+    # marks made while this SADD is in flight start the next batch
+    members = _pending.pop(loop, set())
+    _flushes.pop(loop, None)
+    if members:
+        await _add(members)
+
+
+async def mark_tenants_dirty(*tenant_ids) -> None:
+    """Queue tenants for incremental rescoring; returns without waiting for Redis."""
+    members = {str(tenant_id) for tenant_id in tenant_ids if tenant_id}
+    if not members:
+        return
+    loop = asyncio.get_running_loop()
+    _pending.setdefault(loop, set()).update(members)
+    if loop not in _flushes:
+        _flushes[loop] = loop.create_task(_flush_pending())
+
+
+async def flush_dirty_tenants() -> None:
+    """Wait until this loop's marks have been sent (or failed)."""
+    task = _flushes.get(asyncio.get_running_loop())
+    if task is not None:
+        await task
+
+
+async def pop_dirty_tenants(count: int) -> List[ObjectId]:
+    """Take up to ``count`` tenants off the set."""
+    members = await _client().spop(DIRTY_TENANTS_KEY, count) or []
+    return [ObjectId(member) for member in members if ObjectId.is_valid(member)]
+
+
+async def requeue_dirty_tenants(tenant_ids: Iterable) -> None:
+    """Put back tenants whose rescoring failed."""
+    await mark_tenants_dirty(*tenant_ids)
+    await flush_dirty_tenants()
+
+
+async def dirty_tenant_count() -> int:
+    return await _client().scard(DIRTY_TENANTS_KEY)
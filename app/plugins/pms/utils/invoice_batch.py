@@ -294,6 +294,49 @@ class PerformanceMonitor:
         """Record cache miss"""
         self.metrics["cache_misses"] += 1
     
+    def to_dict(self) -> Dict:
+        """Snapshot of the raw metrics, e.g. to store with a billing-run shard"""
+        return {
+            "metrics": dict(self.metrics),
+            "property_metrics": self.property_metrics
+        }
+    
+    @classmethod
+    def merge(cls, snapshots: List[Dict]) -> "PerformanceMonitor":
+        """
+        Combine ``to_dict`` snapshots from several workers into one monitor.
+        
+        Counters are summed; the time window runs from the earliest start to
+        the latest end, so throughput reflects the workers running in parallel.
+        """
+        merged = cls()
+        starts, ends = [], []
+        for snapshot in snapshots:
+            metrics = snapshot.get("metrics", {})
+            for key in ("total_invoices", "error_count", "cache_hits", "cache_misses", "properties_processed"):
+                merged.metrics[key] += metrics.get(key, 0)
+            merged.metrics["batch_times"].extend(metrics.get("batch_times", []))
+            for key, bucket in (("start_time", starts), ("end_time", ends)):
+                value = metrics.get(key)
+                if isinstance(value, datetime):
+                    bucket.append(value if value.tzinfo else value.replace(tzinfo=timezone.utc))
+            for property_id, values in snapshot.get("property_metrics", {}).items():
+                target = merged.property_metrics.setdefault(
+                    property_id, {"invoices": 0, "processing_time": 0, "batches": 0}
+                )
+                for key in target:
+                    target[key] += values.get(key, 0)
+        
+        if starts:
+            merged.metrics["start_time"] = min(starts)
+        if ends:
+            merged.metrics["end_time"] = max(ends)
+        if starts and ends:
+            merged.metrics["total_processing_time"] = (
+                merged.metrics["end_time"] - merged.metrics["start_time"]
+            ).total_seconds()
+        return merged
+    
     def get_summary(self) -> Dict:
         """Get performance summary"""
         avg_batch_time = (
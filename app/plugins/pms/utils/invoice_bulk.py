@@ -0,0 +1,467 @@
+"""
+Bulk billing engine behind ``AsyncLeaseInvoiceManager.process_all_leases``.
+
+The per-lease path reads its inputs one lease at a time (existing invoice,
+units, unpaid invoices, tenant credit, last month's meter readings) and writes
+every invoice, consolidation, ticket and notification on its own. For a batch
+of properties this engine instead:
+
+1. loads every input with one ``$in`` query per collection into a
+   ``BillingContext`` of in-memory indexes
+2. bills each lease in memory through the manager's ``_build_lease_invoice``,
+   replaying the per-lease side effects (regeneration restores, credit use,
+   consolidation, invoices issued earlier in the run) on those indexes, so a
+   tenant's later leases see what the per-lease path would have read back
+3. persists the batch with one ordered ``bulk_write`` per collection and one
+   ``insert_many`` each for tickets and notifications
+
+Invoices, line items, consolidations, credits, tickets and notifications come
+out the same as with ``process_all_leases(bulk=False)``, apart from generated ids.
+
+When driven by a billing run (``billing_runs.py``) invoices are stamped with
+``meta.billing_run_id`` and leases the same run already billed are skipped,
+so a retried shard neither errors on nor regenerates its own invoices.
+"""
+import copy
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+
+from plugins.pms.accounting.balances import AccountBalances
+from plugins.pms.models.ledger_entry import InvoiceStatus
+from plugins.pms.utils.dirty_tenants import mark_tenants_dirty
+from plugins.pms.snapshots.invalidation import snapshots_changed
+
+# Statuses get_tenant_previous_balance never forwards
+NOT_FORWARDABLE = (
+    InvoiceStatus.CONSOLIDATED.value,
+    InvoiceStatus.PAID.value,
+    InvoiceStatus.CANCELLED.value,
+)
+
+
+@dataclass
+class BillingContext:
+    """Everything one property batch needs, indexed for in-memory lookups."""
+    billing_month: str
+    month_start: datetime
+    properties: Dict[Any, Dict] = field(default_factory=dict)
+    units: Dict[str, Dict] = field(default_factory=dict)
+    tenants: Dict[str, Dict] = field(default_factory=dict)
+    existing_invoices: Dict[str, Dict] = field(default_factory=dict)   # lease_id -> this month
+    previous_invoices: Dict[str, Dict] = field(default_factory=dict)   # lease_id -> last month
+    invoices: Dict[str, Dict] = field(default_factory=dict)            # invoice_id -> current state
+    tenant_invoices: Dict[str, List[str]] = field(default_factory=dict)
+
+    def track_invoice(self, invoice: Dict):
+        """Index an invoice that may be forwarded into a tenant's next invoice."""
+        invoice_id = str(invoice["_id"])
+        self.invoices[invoice_id] = invoice
+        tenant_id = invoice.get("tenant_id")
+        # The balance query matches tenant_id as an ObjectId only
+        if isinstance(tenant_id, ObjectId):
+            ids = self.tenant_invoices.setdefault(str(tenant_id), [])
+            if invoice_id not in ids:
+                ids.append(invoice_id)
+
+
+@dataclass
+class BillingWrites:
+    """Writes collected while billing a batch, in the order the per-lease path issues them."""
+    invoice_ops: List[Any] = field(default_factory=list)
+    tenant_ops: List[Any] = field(default_factory=list)
+    tickets: List[Dict] = field(default_factory=list)
+    notifications: List[Dict] = field(default_factory=list)
+    deleted_invoice_ids: List[str] = field(default_factory=list)
+    tenant_ids: Set[Any] = field(default_factory=set)
+    property_ids: Set[Any] = field(default_factory=set)
+
+
+class BulkBillingEngine:
+    """Prefetch, bill in memory and bulk-persist one batch of properties at a time."""
+
+    def __init__(self, manager, run_id: Optional[str] = None):
+        self.manager = manager
+        self.db = manager.db
+        self.run_id = run_id
+        codec_options = getattr(self.db, "codec_options", None)
+        self.tz_aware = getattr(codec_options, "tz_aware", False)
+
+    async def process_property_batch(
+        self,
+        leases_by_property: Dict[Any, List[Dict]],
+        billing_month: str,
+        force: bool,
+        balance_method: str,
+        results: Dict
+    ):
+        """Bill every lease of ``leases_by_property`` and persist the batch."""
+        ctx = await self.prefetch(leases_by_property, billing_month, force)
+        writes = BillingWrites()
+
+        for property_id, leases in leases_by_property.items():
+            try:
+                self._bill_property(ctx, writes, property_id, leases, force, balance_method, results)
+            except Exception as e:
+                results["errors"].append({
+                    "property_id": property_id,
+                    "error": str(e)
+                })
+
+        await self.flush(writes, billing_month)
+
+    # ---------------------------------------------------
+    # Prefetch
+    # ---------------------------------------------------
+    async def prefetch(
+        self,
+        leases_by_property: Dict[Any, List[Dict]],
+        billing_month: str,
+        force: bool
+    ) -> BillingContext:
+        year, month = map(int, billing_month.split("-"))
+        ctx = BillingContext(
+            billing_month=billing_month,
+            month_start=datetime(year, month, 1, tzinfo=timezone.utc)
+        )
+        leases = [lease for group in leases_by_property.values() for lease in group]
+        lease_ids = list(dict.fromkeys(str(lease["_id"]) for lease in leases))
+        unit_ids = list(dict.fromkeys(
+            str(unit_id) for lease in leases for unit_id in lease.get("units_id", [])
+        ))
+        tenant_oids = list(dict.fromkeys(
+            ObjectId(str(lease["tenant_id"])) for lease in leases
+            if ObjectId.is_valid(str(lease.get("tenant_id")))
+        ))
+        metered_lease_ids = [
+            str(lease["_id"]) for lease in leases
+            if any(u.get("billingBasis") == "metered" for u in lease.get("utilities", []))
+        ]
+
+        async for property_data in self.db.properties.find({"_id": {"$in": list(leases_by_property)}}):
+            ctx.properties[property_data["_id"]] = property_data
+
+        async for unit in self.db.units.find({"_id": {"$in": unit_ids}}):
+            ctx.units[str(unit["_id"])] = unit
+
+        async for tenant in self.db.property_tenants.find({"_id": {"$in": tenant_oids}}):
+            ctx.tenants[str(tenant["_id"])] = tenant
+
+        await self._index_by_lease(ctx.existing_invoices, lease_ids, billing_month)
+        if metered_lease_ids:
+            await self._index_by_lease(
+                ctx.previous_invoices,
+                metered_lease_ids,
+                self.manager._previous_billing_month(billing_month),
+                {"lease_id": 1, "meta.lease_id": 1, "line_items": 1}
+            )
+
+        cursor = self.db.property_invoices.find({
+            "tenant_id": {"$in": tenant_oids},
+            "balance_amount": {"$gt": 0},
+            "date_issued": {"$lt": ctx.month_start},
+            "status": {"$nin": list(NOT_FORWARDABLE)},
+            "balance_forwarded": {"$ne": True}
+        }).sort("date_issued", 1)
+        async for invoice in cursor:
+            ctx.track_invoice(invoice)
+
+        # Regenerating an invoice restores the ones it consolidated, which
+        # makes them forwardable again
+        if force:
+            source_oids = [
+                ObjectId(rule["source_invoice_id"])
+                for invoice in ctx.existing_invoices.values()
+                for rule in invoice.get("meta", {}).get("payment_allocation_rules", [])
+                if ObjectId.is_valid(str(rule.get("source_invoice_id")))
+            ]
+            if source_oids:
+                async for invoice in self.db.property_invoices.find({"_id": {"$in": source_oids}}):
+                    if str(invoice["_id"]) not in ctx.invoices:
+                        ctx.track_invoice(invoice)
+
+        return ctx
+
+    async def _index_by_lease(
+        self,
+        index: Dict[str, Dict],
+        lease_ids: List[str],
+        billing_month: str,
+        projection: Optional[Dict] = None
+    ):
+        """First invoice of ``billing_month`` per lease, matched on lease_id or meta.lease_id."""
+        wanted = set(lease_ids)
+        cursor = self.db.property_invoices.find({
+            "$or": [
+                {"lease_id": {"$in": lease_ids}},
+                {"meta.lease_id": {"$in": lease_ids}},
+            ],
+            "meta.billing_period": billing_month
+        }, projection)
+        async for invoice in cursor:
+            for key in (invoice.get("lease_id"), invoice.get("meta", {}).get("lease_id")):
+                if isinstance(key, str) and key in wanted:
+                    index.setdefault(key, invoice)
+
+    # ---------------------------------------------------
+    # In-memory billing
+    # ---------------------------------------------------
+    def _bill_property(
+        self,
+        ctx: BillingContext,
+        writes: BillingWrites,
+        property_id: Any,
+        leases: List[Dict],
+        force: bool,
+        balance_method: str,
+        results: Dict
+    ):
+        property_data = ctx.properties.get(property_id)
+        if not property_data:
+            raise ValueError(f"Property {property_id} not found")
+
+        utility_tasks = []
+        for lease in leases:
+            try:
+                invoice_result = self._bill_lease(ctx, writes, lease, property_data, force, balance_method, results)
+                if invoice_result.get("utility_tasks"):
+                    utility_tasks.extend(invoice_result["utility_tasks"])
+            except Exception as e:
+                results["errors"].append({
+                    "lease_id": str(lease.get("_id")),
+                    "error": str(e)
+                })
+
+        if utility_tasks:
+            ticket = self.manager._build_property_ticket(
+                property_id,
+                property_data["name"],
+                ctx.billing_month,
+                utility_tasks,
+                property_data.get("owner_id")
+            )
+            writes.tickets.append(self.manager._ticket_document(ticket))
+            results["tickets_created"].append(str(ticket.id))
+
+    def _bill_lease(
+        self,
+        ctx: BillingContext,
+        writes: BillingWrites,
+        lease: Dict,
+        property_data: Dict,
+        force: bool,
+        balance_method: str,
+        results: Dict
+    ) -> Dict:
+        """In-memory counterpart of ``AsyncLeaseInvoiceManager._process_single_lease``."""
+        manager = self.manager
+        billing_month = ctx.billing_month
+        lease_id = str(lease["_id"])
+        tenant_id = str(lease["tenant_id"])
+
+        existing_invoice = ctx.existing_invoices.get(lease_id)
+        if (
+            existing_invoice and self.run_id
+            and existing_invoice.get("meta", {}).get("billing_run_id") == self.run_id
+        ):
+            results.setdefault("leases_skipped", []).append(lease_id)
+            return {"invoice_id": str(existing_invoice["_id"]), "utility_tasks": None}
+        if existing_invoice and not force:
+            raise ValueError(
+                f"Invoice already exists for lease {lease_id} in {billing_month}. "
+                f"Use force=True to regenerate. {existing_invoice['_id']}"
+            )
+        if existing_invoice and force:
+            self._delete_existing_invoice(ctx, writes, existing_invoice)
+            results["invoices_regenerated"].append(str(existing_invoice["_id"]))
+
+        units = [ctx.units[str(u)] for u in lease["units_id"] if str(u) in ctx.units]
+
+        tenant_oid = ObjectId(tenant_id)
+        previous_balance, itemized_balances = manager._summarize_unpaid_invoices(
+            self._forwardable_invoices(ctx, tenant_id)
+        )
+
+        tenant = ctx.tenants.get(tenant_id)
+        tenant_overpayment = tenant.get("credit_balance", 0.0) if tenant else 0.0
+
+        previous_invoice = ctx.previous_invoices.get(lease_id)
+        previous_readings = {}
+        for utility in lease.get("utilities", []):
+            if utility.get("billingBasis") == "metered":
+                previous_readings[utility["name"]] = manager._reading_from_invoice(
+                    previous_invoice, utility["name"]
+                )
+
+        plan = manager._build_lease_invoice(
+            lease,
+            billing_month,
+            property_data,
+            units,
+            previous_balance,
+            itemized_balances,
+            tenant_overpayment,
+            balance_method,
+            previous_readings
+        )
+        invoice = plan["invoice"]
+        invoice_id = plan["invoice_id"]
+        if self.run_id:
+            invoice.meta["billing_run_id"] = self.run_id
+
+        if tenant_overpayment > 0:
+            writes.tenant_ops.append(UpdateOne(
+                {"_id": tenant_oid},
+                {"$set": {
+                    "credit_balance": plan["remaining_credit"],
+                    "last_credit_update": manager.current_date
+                }}
+            ))
+            tenant["credit_balance"] = plan["remaining_credit"]
+
+        if plan["overpaid_amount"] > 0:
+            writes.tenant_ops.append(UpdateOne(
+                {"_id": tenant_oid},
+                {"$inc": {"credit_balance": plan["overpaid_amount"]}}
+            ))
+            if tenant:
+                tenant["credit_balance"] = tenant.get("credit_balance", 0.0) + plan["overpaid_amount"]
+
+        document = manager._invoice_document(invoice)
+        writes.invoice_ops.append(InsertOne(document))
+        writes.tenant_ids.add(document["tenant_id"])
+        writes.property_ids.add(document.get("property_id"))
+        stored = self._stored_copy(document)
+        ctx.track_invoice(stored)
+        results["invoices_created"].append(invoice_id)
+        results["leases_processed"] += 1
+
+        if previous_balance > 0 and itemized_balances:
+            for item in itemized_balances:
+                consolidation_info = manager._consolidation_info(item, invoice_id, billing_month)
+                writes.invoice_ops.append(UpdateOne(
+                    {"_id": ObjectId(item["invoice_id"])},
+                    {"$set": {
+                        "status": InvoiceStatus.CONSOLIDATED.value,
+                        "balance_forwarded": True,
+                        "meta.consolidation": consolidation_info
+                    }}
+                ))
+                consolidated = ctx.invoices[item["invoice_id"]]
+                consolidated["status"] = InvoiceStatus.CONSOLIDATED.value
+                consolidated["balance_forwarded"] = True
+                consolidated.setdefault("meta", {})["consolidation"] = consolidation_info
+            results["invoices_consolidated"].extend(item["invoice_id"] for item in itemized_balances)
+
+        if invoice.status == InvoiceStatus.READY:
+            # Saved as READY with no pending utilities, so there is nothing to finalize
+            tenant_doc = ctx.tenants.get(str(stored["tenant_id"]))
+            if tenant_doc:
+                notification = manager._build_invoice_notification(stored, tenant_doc, property_data)
+                writes.notifications.append(manager._notification_document(notification))
+            else:
+                print(f"Tenant {stored['tenant_id']} not found")
+            results["notifications_queued"].append({
+                "type": "tenant_invoice",
+                "invoice_id": invoice.id,
+                "tenant_id": invoice.tenant_id
+            })
+
+        return {
+            "invoice_id": invoice_id,
+            "utility_tasks": plan["utility_tasks"]
+        }
+
+    def _delete_existing_invoice(self, ctx: BillingContext, writes: BillingWrites, invoice: Dict):
+        """Queue ``_delete_existing_invoice_and_tickets`` and apply it to the indexes."""
+        invoice_id = str(invoice["_id"])
+        for rule in invoice.get("meta", {}).get("payment_allocation_rules", []):
+            source_invoice_id = rule.get("source_invoice_id")
+            if not source_invoice_id:
+                continue
+            writes.invoice_ops.append(UpdateOne(
+                {"_id": ObjectId(source_invoice_id)},
+                {
+                    "$set": {
+                        "status": InvoiceStatus.OVERDUE.value,
+                        "balance_forwarded": False
+                    },
+                    "$unset": {
+                        "meta.consolidation": ""
+                    }
+                }
+            ))
+            source = ctx.invoices.get(str(source_invoice_id))
+            if source:
+                source["status"] = InvoiceStatus.OVERDUE.value
+                source["balance_forwarded"] = False
+                source.get("meta", {}).pop("consolidation", None)
+
+        writes.invoice_ops.append(DeleteOne({"_id": ObjectId(invoice_id)}))
+        writes.deleted_invoice_ids.append(invoice_id)
+        writes.property_ids.add(invoice.get("property_id"))
+        ctx.invoices.pop(invoice_id, None)
+
+    def _forwardable_invoices(self, ctx: BillingContext, tenant_id: str) -> List[Dict]:
+        """The tenant's unpaid invoices as ``get_tenant_previous_balance`` would query them now."""
+        candidates = []
+        for invoice_id in ctx.tenant_invoices.get(tenant_id, []):
+            invoice = ctx.invoices.get(invoice_id)
+            if not invoice:
+                continue
+            balance = invoice.get("balance_amount")
+            date_issued = invoice.get("date_issued")
+            if not isinstance(balance, (int, float)) or balance <= 0:
+                continue
+            if not isinstance(date_issued, datetime):
+                continue
+            if self.manager._normalize_datetime(date_issued) >= ctx.month_start:
+                continue
+            if invoice.get("status") in NOT_FORWARDABLE or invoice.get("balance_forwarded") is True:
+                continue
+            candidates.append(invoice)
+        return sorted(candidates, key=lambda inv: self.manager._normalize_datetime(inv["date_issued"]))
+
+    def _stored_copy(self, document: Dict) -> Dict:
+        """The invoice as a later ``find_one`` would return it (BSON datetimes)."""
+        stored = copy.deepcopy(document)
+        for key in ("date_issued", "due_date"):
+            value = stored.get(key)
+            if isinstance(value, datetime):
+                value = value.replace(microsecond=value.microsecond // 1000 * 1000)
+                if not self.tz_aware and value.tzinfo:
+                    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+                stored[key] = value
+        return stored
+
+    # ---------------------------------------------------
+    # Persist
+    # ---------------------------------------------------
+    async def flush(self, writes: BillingWrites, billing_month: str):
+        """Write a billed batch: ordered where operations depend on each other."""
+        if writes.invoice_ops:
+            await self.db.property_invoices.bulk_write(writes.invoice_ops, ordered=True)
+
+        if writes.deleted_invoice_ids:
+            await self.db.property_tickets.delete_many({
+                "metadata.billing_month": billing_month,
+                "tasks.metadata.invoice_id": {"$in": writes.deleted_invoice_ids}
+            })
+            await AccountBalances(self.db).remove_entries({
+                "invoice_id": {"$in": [ObjectId(i) for i in writes.deleted_invoice_ids]}
+            })
+
+        if writes.tenant_ops:
+            await self.db.property_tenants.bulk_write(writes.tenant_ops, ordered=True)
+
+        if writes.tickets:
+            await self.db.property_tickets.insert_many(writes.tickets, ordered=False)
+
+        if writes.notifications:
+            await self.db.property_notifications.insert_many(writes.notifications, ordered=False)
+
+        await mark_tenants_dirty(*writes.tenant_ids)
+        await snapshots_changed(self.db, "property_invoices", [{"property_id": p} for p in writes.property_ids])
@@ -7,8 +7,13 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import asyncio
 import calendar
 from plugins.pms.accounting.ledger import Ledger
+from plugins.pms.accounting.balances import AccountBalances
 from core.MongoORJSONResponse import PyObjectId
 from plugins.pms.models.ledger_entry import Invoice,InvoiceLineItem,InvoiceStatus
+from plugins.pms.utils.invoice_bulk import BulkBillingEngine
+from plugins.pms.utils.meter_readings import BulkReadingIngestor
+from plugins.pms.utils.dirty_tenants import mark_tenants_dirty
+from plugins.pms.snapshots.invalidation import snapshots_changed
 class LeaseStatus(str, Enum):
     PENDING = "pending"
     ACTIVE = "active"
@@ -221,8 +226,10 @@ class AsyncLeaseInvoiceManager:
         }).sort("date_issued", 1)
         
         unpaid_invoices = await cursor.to_list(length=None)
-        
-        
+        return self._summarize_unpaid_invoices(unpaid_invoices)
+    
+    def _summarize_unpaid_invoices(self, unpaid_invoices: List[Dict]) -> Tuple[float, List[Dict]]:
+        """Total and itemize unpaid invoices (oldest first) for balance forwarding."""
         total_balance = 0.0
         itemized_balances = []
         
@@ -246,9 +253,18 @@ class AsyncLeaseInvoiceManager:
         self, 
         billing_month: Optional[str] = None,
         force: bool = False,
-        balance_method: str = "sum"
+        balance_method: str = "sum",
+        bulk: bool = True,
+        property_batch_size: int = 50
     ) -> Dict:
-        """Main entry point - processes all leases and generates invoices."""
+        """
+        Main entry point - processes all leases and generates invoices.
+        
+        With ``bulk`` (the default) properties are billed in batches of
+        ``property_batch_size`` by ``BulkBillingEngine``: a few ``$in``
+        queries per batch, invoices computed in memory, one bulk write per
+        collection. ``bulk=False`` keeps the per-lease path.
+        """
         if not billing_month:
             billing_month = self.current_date.strftime("%Y-%m")
             
@@ -270,21 +286,31 @@ class AsyncLeaseInvoiceManager:
             await self._update_lease_statuses(results)
             active_leases_by_property = await self._get_active_leases_by_property()
             
-            for property_id, leases in active_leases_by_property.items():
-                try:
-                    await self._process_property_leases(
-                        property_id, 
-                        leases, 
-                        billing_month, 
-                        force,
-                        balance_method,
-                        results
-                    )
-                except Exception as e:
-                    results["errors"].append({
-                        "property_id": property_id,
-                        "error": str(e)
-                    })
+            if bulk:
+                await self._process_leases_in_bulk(
+                    active_leases_by_property,
+                    billing_month,
+                    force,
+                    balance_method,
+                    results,
+                    property_batch_size
+                )
+            else:
+                for property_id, leases in active_leases_by_property.items():
+                    try:
+                        await self._process_property_leases(
+                            property_id, 
+                            leases, 
+                            billing_month, 
+                            force,
+                            balance_method,
+                            results
+                        )
+                    except Exception as e:
+                        results["errors"].append({
+                            "property_id": property_id,
+                            "error": str(e)
+                        })
                     
             await self._generate_landlord_summaries(billing_month, results)
             
@@ -296,6 +322,38 @@ class AsyncLeaseInvoiceManager:
             
         return results
     
+    async def _process_leases_in_bulk(
+        self,
+        leases_by_property: Dict[str, List[Dict]],
+        billing_month: str,
+        force: bool,
+        balance_method: str,
+        results: Dict,
+        property_batch_size: int = 50
+    ):
+        """Bill properties batch by batch with one prefetch and one flush per batch."""
+        engine = BulkBillingEngine(self)
+        property_ids = list(leases_by_property)
+        
+        for start in range(0, len(property_ids), property_batch_size):
+            batch = {
+                property_id: leases_by_property[property_id]
+                for property_id in property_ids[start:start + property_batch_size]
+            }
+            try:
+                await engine.process_property_batch(
+                    batch,
+                    billing_month,
+                    force,
+                    balance_method,
+                    results
+                )
+            except Exception as e:
+                results["errors"].append({
+                    "property_ids": list(batch),
+                    "error": str(e)
+                })
+    
     def _normalize_datetime(self, dt) -> datetime:
         """Normalize datetime to timezone-aware UTC datetime."""
         if isinstance(dt, dict) and "$date" in dt:
@@ -317,45 +375,62 @@ class AsyncLeaseInvoiceManager:
         return dt
     
     async def _update_lease_statuses(self, results: Dict):
-        """Check and update lease expiration statuses."""
-        cursor = self.db.property_leases.find({
-            "status": {"$in": ["active", "signed", "expiring"]}
-        })
-        
+        """
+        Check and update lease expiration statuses.
+
+        Each transition is one conditional ``update_many`` that also stamps
+        the leases it moves with this pass's ``status_pass_id``; one ``find``
+        on that id then yields the leases this pass actually moved. A lease
+        another process moved first no longer matches the filter, so it is
+        neither moved nor reported twice, and the pass costs the same number
+        of round trips for ten leases or ten thousand.
+        """
         expiration_threshold = self.current_date + timedelta(
             days=self.expiration_threshold_months * 30
         )
-        
-        async for lease in cursor:
-            lease_id = lease["_id"]
-            end_date = lease["lease_terms"]["end_date"]
-            end_date = self._normalize_datetime(end_date)
-            
-            if end_date < self.current_date:
-                await self.db.property_leases.update_one(
-                    {"_id": lease_id},
-                    {
-                        "$set": {
-                            "status": LeaseStatus.EXPIRED.value,
-                            "updated_at": self.current_date
-                        }
-                    }
-                )
-                results["leases_expired"].append(str(lease_id))
-                await self._queue_expiration_notification(lease, "expired")
-                
-            elif end_date < expiration_threshold and lease["status"] != "expiring":
-                await self.db.property_leases.update_one(
-                    {"_id": lease_id},
-                    {
-                        "$set": {
-                            "status": LeaseStatus.EXPIRING.value,
-                            "updated_at": self.current_date
-                        }
+        transitions = [
+            (
+                LeaseStatus.EXPIRED.value,
+                "leases_expired",
+                {
+                    "status": {"$in": ["active", "signed", "expiring"]},
+                    "lease_terms.end_date": {"$lt": self.current_date}
+                }
+            ),
+            (
+                LeaseStatus.EXPIRING.value,
+                "leases_expiring",
+                {
+                    "status": {"$in": ["active", "signed"]},
+                    "lease_terms.end_date": {
+                        "$gte": self.current_date,
+                        "$lt": expiration_threshold
                     }
-                )
-                results["leases_expiring"].append(str(lease_id))
-                await self._queue_expiration_notification(lease, "expiring")
+                }
+            )
+        ]
+
+        pass_id = str(ObjectId())
+        moved = 0
+        for status, _, query in transitions:
+            update = await self.db.property_leases.update_many(
+                query,
+                {"$set": {"status": status, "updated_at": self.current_date, "status_pass_id": pass_id}}
+            )
+            moved += update.modified_count
+        if not moved:
+            return
+
+        result_keys = {status: result_key for status, result_key, _ in transitions}
+        notify = []
+        async for lease in self.db.property_leases.find(
+            {"status_pass_id": pass_id},
+            {"tenant_id": 1, "property_id": 1, "status": 1, "lease_terms.end_date": 1}
+        ):
+            results[result_keys[lease["status"]]].append(str(lease["_id"]))
+            notify.append((lease, lease["status"]))
+
+        await self._queue_expiration_notifications(notify)
 
     async def _get_active_leases_by_property(self) -> Dict[str, List[Dict]]:
         """Get all active and signed leases grouped by property."""
@@ -436,9 +511,7 @@ class AsyncLeaseInvoiceManager:
     ) -> Optional[Dict]:
         """Process a single lease for invoice generation."""
         lease_id = str(lease["_id"])
-        property_id = lease["property_id"]
         tenant_id = str(lease["tenant_id"])
-        units_id = lease["units_id"]
         
         # Check if invoice already exis
         existing_invoice = await self.db.property_invoices.find_one({
@@ -462,6 +535,113 @@ class AsyncLeaseInvoiceManager:
             )
             results["invoices_regenerated"].append(str(existing_invoice["_id"]))
         
+        # Get unit details
+        units = []
+        for unit_id in lease["units_id"]:
+            unit = await self.db.units.find_one({"_id": str(unit_id)})
+            if unit:
+                units.append(unit)
+        
+        # Get tenant's previous balance
+        previous_balance, itemized_balances = await self.get_tenant_previous_balance(
+            tenant_id, 
+            billing_month,
+            balance_method
+        )
+        
+        # Get tenant's overpayment
+        tenant_overpayment = await self.get_tenant_overpayment(tenant_id)
+        
+        previous_readings = {}
+        for utility in lease.get("utilities", []):
+            if utility.get("billingBasis") == "metered":
+                previous_readings[utility["name"]] = await self._get_previous_utility_reading(
+                    lease_id, 
+                    utility["name"],
+                    billing_month
+                )
+        
+        plan = self._build_lease_invoice(
+            lease,
+            billing_month,
+            property_data,
+            units,
+            previous_balance,
+            itemized_balances,
+            tenant_overpayment,
+            balance_method,
+            previous_readings
+        )
+        invoice = plan["invoice"]
+        invoice_id = plan["invoice_id"]
+        
+        # Update tenant's credit balance
+        if tenant_overpayment > 0:
+            await self.db.property_tenants.update_one(
+                {"_id": ObjectId(tenant_id)},
+                {
+                    "$set": {
+                        "credit_balance": plan["remaining_credit"],
+                        "last_credit_update": self.current_date
+                    }
+                }
+            )
+        
+        # Add excess to tenant credit
+        if plan["overpaid_amount"] > 0:
+            await self.db.property_tenants.update_one(
+                {"_id": ObjectId(tenant_id)},
+                {
+                    "$inc": {"credit_balance": plan["overpaid_amount"]}
+                }
+            )
+        
+        # Save invoice
+        await self._save_invoice(invoice)
+        results["invoices_created"].append(invoice_id)
+        results["leases_processed"] += 1
+        
+        # Consolidate previous invoices
+        if previous_balance > 0 and itemized_balances:
+            consolidated_ids = await self._consolidate_previous_invoices(
+                itemized_balances,
+                invoice_id,
+                billing_month
+            )
+            results["invoices_consolidated"].extend(consolidated_ids)
+        
+        # If ready, finalize and notify
+        if invoice.status == InvoiceStatus.READY:
+            await self._finalize_and_notify_invoice(invoice, property_data, results)
+        
+        return {
+            "invoice_id": invoice_id,
+            "utility_tasks": plan["utility_tasks"]
+        }
+    
+    def _build_lease_invoice(
+        self,
+        lease: Dict,
+        billing_month: str,
+        property_data: Dict,
+        units: List[Dict],
+        previous_balance: float,
+        itemized_balances: List[Dict],
+        tenant_overpayment: float,
+        balance_method: str,
+        previous_readings: Dict[str, float]
+    ) -> Dict:
+        """
+        Build a lease's invoice from already loaded inputs, without touching the database.
+        
+        Shared by the per-lease path above and the bulk engine in
+        ``invoice_bulk.py`` so both produce the same invoices.
+        """
+        lease_id = str(lease["_id"])
+        property_id = lease["property_id"]
+        tenant_id = str(lease["tenant_id"])
+        units_id = lease["units_id"]
+        
         # Initialize invoice
         invoice_id = str(ObjectId())
         line_items = []
@@ -470,17 +650,15 @@ class AsyncLeaseInvoiceManager:
         units_info = []
         unit_numbers = []
         
-        for unit_id in units_id:
-            unit = await self.db.units.find_one({"_id": str(unit_id)})
-            if unit:
-                unit_number = unit.get("unitNumber", "")
-                unit_numbers.append(unit_number)
-                units_info.append({
-                    "_id": unit["_id"],
-                    "unitNumber": unit_number,
-                    "unitName": unit.get("unitName", ""),
-                    "rentAmount": unit.get("rentAmount", 0)
-                })
+        for unit in units:
+            unit_number = unit.get("unitNumber", "")
+            unit_numbers.append(unit_number)
+            units_info.append({
+                "_id": unit["_id"],
+                "unitNumber": unit_number,
+                "unitName": unit.get("unitName", ""),
+                "rentAmount": unit.get("rentAmount", 0)
+            })
         
         unit_numbers_str = ", ".join(unit_numbers)
         
@@ -496,16 +674,6 @@ class AsyncLeaseInvoiceManager:
             due_day = min(due_day, last_day)
             due_date = datetime(year, month, due_day, tzinfo=timezone.utc)
         
-        # Get tenant's previous balance
-        previous_balance, itemized_balances = await self.get_tenant_previous_balance(
-            tenant_id, 
-            billing_month,
-            balance_method
-        )
-        
-        # Get tenant's overpayment
-        tenant_overpayment = await self.get_tenant_overpayment(tenant_id)
-        
         # Invoice metadata
         invoice_meta = {
             "lease_id": lease_id,
@@ -591,11 +759,7 @@ class AsyncLeaseInvoiceManager:
             if utility.get("billingBasis") == "metered":
                 metered_utilities.append(utility)
                 
-                previous_reading = await self._get_previous_utility_reading(
-                    str(lease["_id"]), 
-                    utility["name"],
-                    billing_month
-                )
+                previous_reading = previous_readings[utility["name"]]
                 
                 task_data = {
                     "utility": utility,
@@ -648,17 +812,6 @@ class AsyncLeaseInvoiceManager:
                     "remaining_credit": remaining_credit
                 }
             ))
-            
-            # Update tenant's credit balance
-            await self.db.property_tenants.update_one(
-                {"_id": ObjectId(tenant_id)},
-                {
-                    "$set": {
-                        "credit_balance": remaining_credit,
-                        "last_credit_update": self.current_date
-                    }
-                }
-            )
         
         # Determine invoice status
         if metered_utilities:
@@ -678,14 +831,6 @@ class AsyncLeaseInvoiceManager:
             overpaid_amount = abs(total_amount)
             balance_amount = 0.0
             total_amount = 0.0
-            
-            # Add excess to tenant credit
-            await self.db.property_tenants.update_one(
-                {"_id": ObjectId(tenant_id)},
-                {
-                    "$inc": {"credit_balance": overpaid_amount}
-                }
-            )
         
         # Create invoice
         invoice = Invoice(
@@ -707,27 +852,12 @@ class AsyncLeaseInvoiceManager:
             meta=invoice_meta
         )
         
-        # Save invoice
-        await self._save_invoice(invoice)
-        results["invoices_created"].append(invoice_id)
-        results["leases_processed"] += 1
-        
-        # Consolidate previous invoices
-        if previous_balance > 0 and itemized_balances:
-            consolidated_ids = await self._consolidate_previous_invoices(
-                itemized_balances,
-                invoice_id,
-                billing_month
-            )
-            results["invoices_consolidated"].extend(consolidated_ids)
-        
-        # If ready, finalize and notify
-        if invoice_status == InvoiceStatus.READY:
-            await self._finalize_and_notify_invoice(invoice, property_data, results)
-        
         return {
             "invoice_id": invoice_id,
-            "utility_tasks": utility_tasks_data if metered_utilities else None
+            "invoice": invoice,
+            "utility_tasks": utility_tasks_data if metered_utilities else None,
+            "remaining_credit": remaining_credit,
+            "overpaid_amount": overpaid_amount
         }
     
     async def _consolidate_previous_invoices(
@@ -744,18 +874,7 @@ class AsyncLeaseInvoiceManager:
         
         for item in itemized_balances:
             old_invoice_id = item["invoice_id"]
-            balance_amount = item["balance_amount"]
-            
-            consolidation_info = {
-                "consolidated_into_invoice_id": new_invoice_id,
-                "consolidated_date": self.current_date,
-                "consolidated_billing_period": billing_month,
-                "balance_at_consolidation": balance_amount,
-                "original_balance": item["balance_amount"],
-                "original_total": item["original_total"],
-                "total_paid_before_consolidation": item["total_paid"],
-                "payments_after_consolidation": []
-            }
+            consolidation_info = self._consolidation_info(item, new_invoice_id, billing_month)
             
             # Update old invoice
             await self.db.property_invoices.update_one(
@@ -773,6 +892,18 @@ class AsyncLeaseInvoiceManager:
         
         return consolidated_ids
     
+    def _consolidation_info(self, item: Dict, new_invoice_id: str, billing_month: str) -> Dict:
+        return {
+            "consolidated_into_invoice_id": new_invoice_id,
+            "consolidated_date": self.current_date,
+            "consolidated_billing_period": billing_month,
+            "balance_at_consolidation": item["balance_amount"],
+            "original_balance": item["balance_amount"],
+            "original_total": item["original_total"],
+            "total_paid_before_consolidation": item["total_paid"],
+            "payments_after_consolidation": []
+        }
+    
     async def _delete_existing_invoice_and_tickets(
         self, 
         invoice_id: str, 
@@ -807,7 +938,7 @@ class AsyncLeaseInvoiceManager:
             "metadata.billing_month": billing_month,
             "tasks.metadata.invoice_id": invoice_id
         })
-        await self.db.property_ledger_entries.delete_many({
+        await AccountBalances(self.db).remove_entries({
             "invoice_id":  ObjectId(invoice_id)
         })
     
@@ -820,6 +951,20 @@ class AsyncLeaseInvoiceManager:
         created_by: str
     ) -> Ticket:
         """Create ONE ticket for a property with multiple utility reading tasks."""
+        ticket = self._build_property_ticket(
+            property_id, property_name, billing_month, utility_tasks_data, created_by
+        )
+        await self._save_ticket(ticket)
+        return ticket
+    
+    def _build_property_ticket(
+        self,
+        property_id: str,
+        property_name: str,
+        billing_month: str,
+        utility_tasks_data: List[Dict],
+        created_by: str
+    ) -> Ticket:
         ticket_id = str(ObjectId())
         
         year, month = map(int, billing_month.split("-"))
@@ -874,7 +1019,6 @@ class AsyncLeaseInvoiceManager:
             }
         )
         
-        await self._save_ticket(ticket)
         return ticket
     
     async def process_utility_reading(
@@ -984,7 +1128,7 @@ class AsyncLeaseInvoiceManager:
                 )
                 
                 for inv_id in unique_invoice_ids:
-                    invoice = await self.db.property_invoices.find_one({"_id": inv_id})
+                    invoice = await self.db.property_invoices.find_one({"_id": ObjectId(inv_id)})
                     if invoice:
                         await self._finalize_invoice(inv_id)
                         await self._send_invoice_notification(invoice, property_data)
@@ -1004,6 +1148,25 @@ class AsyncLeaseInvoiceManager:
         
         return result
     
+    async def process_utility_readings(
+        self,
+        property_id: str,
+        readings: List[Dict],
+        billing_month: Optional[str] = None,
+        dry_run: bool = False,
+        strict: bool = False
+    ) -> Dict:
+        """
+        Process a batch of utility meter readings for a property.
+
+        Validates every reading against its task's previous reading in memory,
+        then applies all line items and task updates with one bulk_write per
+        collection (see ``utils/meter_readings.py``).
+        """
+        return await BulkReadingIngestor(self).ingest(
+            property_id, readings, billing_month=billing_month, dry_run=dry_run, strict=strict
+        )
+
     async def _add_utility_to_invoice(
         self, 
         invoice_id: str, 
@@ -1032,7 +1195,7 @@ class AsyncLeaseInvoiceManager:
             }
         }
         
-        invoice = await self.db.property_invoices.find_one({"_id": invoice_id})
+        invoice = await self.db.property_invoices.find_one({"_id": ObjectId(invoice_id)})
         new_total = invoice["total_amount"] + usage_record.amount
         new_balance = new_total - invoice["total_paid"]
         
@@ -1058,6 +1221,8 @@ class AsyncLeaseInvoiceManager:
                 }
             }
         )
+        await mark_tenants_dirty(invoice.get("tenant_id"))
+        await snapshots_changed(self.db, "property_invoices", [invoice])
     
     async def process_payment(
         self,
@@ -1330,6 +1495,10 @@ class AsyncLeaseInvoiceManager:
             print(f"Tenant {invoice['tenant_id']} not found")
             return
         
+        notification = self._build_invoice_notification(invoice, tenant, property_data)
+        await self._save_notification(notification)
+    
+    def _build_invoice_notification(self, invoice: Dict, tenant: Dict, property_data: Dict) -> Notification:
         payment_methods = self._build_payment_methods(property_data)
         breakdown = self._build_invoice_breakdown(invoice)
         
@@ -1358,7 +1527,7 @@ class AsyncLeaseInvoiceManager:
             status="pending"
         )
         
-        await self._save_notification(notification)
+        return notification
     
     async def _generate_landlord_summaries(self, billing_month: str, results: Dict):
         """Generate and send landlord summary notifications."""
@@ -1441,16 +1610,7 @@ class AsyncLeaseInvoiceManager:
         current_billing_month: str
     ) -> float:
         """Get previous utility reading from last invoice."""
-        year, month = map(int, current_billing_month.split("-"))
-        
-        if month == 1:
-            prev_month = 12
-            prev_year = year - 1
-        else:
-            prev_month = month - 1
-            prev_year = year
-        
-        prev_billing_month = f"{prev_year}-{prev_month:02d}"
+        prev_billing_month = self._previous_billing_month(current_billing_month)
         
         prev_invoice = await self.db.property_invoices.find_one({
             "$or": [
@@ -1459,7 +1619,24 @@ class AsyncLeaseInvoiceManager:
             ],
             "meta.billing_period": prev_billing_month
         })
+        return self._reading_from_invoice(prev_invoice, utility_name)
+    
+    @staticmethod
+    def _previous_billing_month(billing_month: str) -> str:
+        year, month = map(int, billing_month.split("-"))
+        
+        if month == 1:
+            prev_month = 12
+            prev_year = year - 1
+        else:
+            prev_month = month - 1
+            prev_year = year
         
+        return f"{prev_year}-{prev_month:02d}"
+    
+    @staticmethod
+    def _reading_from_invoice(prev_invoice: Optional[Dict], utility_name: str) -> float:
+        """Pick a utility's closing reading out of last month's invoice."""
         if prev_invoice:
             utilities = [l for l in prev_invoice.get("line_items", []) if utility_name.lower() in l.get("utility_name","").lower() ]
             if len(utilities)>0:
@@ -1649,11 +1826,44 @@ class AsyncLeaseInvoiceManager:
     
     async def _queue_expiration_notification(self, lease: Dict, notification_type: str):
         """Queue notification for lease expiration."""
-        tenant = await self.db.property_tenants.find_one({"_id": ObjectId(lease["tenant_id"])})
-        if not tenant:
+        await self._queue_expiration_notifications([(lease, notification_type)])
+
+    async def _queue_expiration_notifications(self, leases: List[tuple]):
+        """Queue expiration notifications for ``(lease, notification_type)`` pairs in one insert."""
+        if not leases:
             return
-        
-        property_data = await self.db.properties.find_one({"_id": lease["property_id"]})
+
+        tenant_ids = {ObjectId(lease["tenant_id"]) for lease, _ in leases}
+        property_ids = {lease["property_id"] for lease, _ in leases}
+        tenants = {
+            tenant["_id"]: tenant
+            async for tenant in self.db.property_tenants.find({"_id": {"$in": list(tenant_ids)}})
+        }
+        properties = {
+            prop["_id"]: prop
+            async for prop in self.db.properties.find({"_id": {"$in": list(property_ids)}})
+        }
+
+        documents = []
+        for lease, notification_type in leases:
+            tenant = tenants.get(ObjectId(lease["tenant_id"]))
+            if not tenant:
+                continue
+            notification = self._build_expiration_notification(
+                lease, tenant, properties.get(lease["property_id"]), notification_type
+            )
+            documents.append(self._notification_document(notification))
+
+        if documents:
+            await self.db.property_notifications.insert_many(documents, ordered=False)
+
+    def _build_expiration_notification(
+        self,
+        lease: Dict,
+        tenant: Dict,
+        property_data: Dict,
+        notification_type: str
+    ) -> Notification:
         end_date = self._normalize_datetime(lease["lease_terms"]["end_date"])
         
         if notification_type == "expired":
@@ -1676,7 +1886,7 @@ class AsyncLeaseInvoiceManager:
                 f"Best regards,\n{property_data['name']} Management"
             )
         
-        notification = Notification(
+        return Notification(
             id=str(ObjectId()),
             recipient_type="tenant",
             recipient_id=str(tenant["_id"]),
@@ -1693,12 +1903,16 @@ class AsyncLeaseInvoiceManager:
             created_at=self.current_date,
             status="pending"
         )
-        
-        await self._save_notification(notification)
     
     async def _save_invoice(self, invoice: Invoice):
         """Save invoice to database."""
-        invoice_dict = {
+        document = self._invoice_document(invoice)
+        await self.db.property_invoices.insert_one(document)
+        await mark_tenants_dirty(invoice.tenant_id)
+        await snapshots_changed(self.db, "property_invoices", [document])
+    
+    def _invoice_document(self, invoice: Invoice) -> Dict:
+        return {
             "_id": ObjectId(invoice.id),
             "property_id": invoice.property_id,
             "tenant_id": ObjectId(invoice.tenant_id),
@@ -1715,10 +1929,12 @@ class AsyncLeaseInvoiceManager:
             "balance_forwarded": invoice.balance_forwarded,
             "meta": invoice.meta
         }
-        await self.db.property_invoices.insert_one(invoice_dict)
     
     async def _save_ticket(self, ticket: Ticket):
         """Save ticket to database."""
+        await self.db.property_tickets.insert_one(self._ticket_document(ticket))
+    
+    def _ticket_document(self, ticket: Ticket) -> Dict:
         ticket_dict = ticket.model_dump(by_alias=True)
         ticket_dict["_id"]=ObjectId(ticket_dict["_id"])
         ticket_dict["tasks"] = [task.model_dump() for task in ticket.tasks]
@@ -1731,11 +1947,14 @@ class AsyncLeaseInvoiceManager:
             if task.get("completed_at") and isinstance(task["completed_at"], datetime):
                 task["completed_at"] = task["completed_at"]
         
-        await self.db.property_tickets.insert_one(ticket_dict)
+        return ticket_dict
     
     async def _save_notification(self, notification: Notification):
         """Save notification to database."""
-        notification_dict = {
+        await self.db.property_notifications.insert_one(self._notification_document(notification))
+    
+    def _notification_document(self, notification: Notification) -> Dict:
+        return {
             "_id": ObjectId(notification.id),
             "recipient_type": notification.recipient_type,
             "recipient_id": notification.recipient_id,
@@ -1749,13 +1968,13 @@ class AsyncLeaseInvoiceManager:
             "sent_at": notification.sent_at,
             "status": notification.status
         }
-        await self.db.property_notifications.insert_one(notification_dict)
     
     async def _save_payment(self, payment: Payment):
         """Save payment to database."""
         payment_dict = payment.model_dump(by_alias=True)
         payment_dict["_id"]=ObjectId(payment_dict["_id"])
         await self.db.property_payments.insert_one(payment_dict)
+        await mark_tenants_dirty(payment.tenant_id)
     async def get_tenant_balance(self,id):
         return 0
     async def get_tenant_invoice_history(
@@ -0,0 +1,101 @@
+"""
+Batched lookups for PMS endpoints.
+
+Listing endpoints used to fetch units per property and a tenant per unit,
+one query each. These helpers fetch each related collection once with
+``$in`` (chunked for very large id sets) and join in Python with dicts:
+
+    units = await load_grouped(db.units, "propertyId", property_ids)
+    names = await load_by_ids(db.property_tenants, tenant_ids, {"full_name": 1})
+
+``PropertyLoader`` bundles the joins the property/unit listings share, and
+``page_bounds``/``page_meta`` give them one way to paginate.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+IN_CHUNK_SIZE = 5000
+
+
+def _unique(values: Iterable) -> List:
+    seen, ordered = set(), []
+    for value in values:
+        if value is None or value in seen:
+            continue
+        seen.add(value)
+        ordered.append(value)
+    return ordered
+
+
+async def load_by_ids(
+    collection,
+    ids: Iterable,
+    projection: Optional[Dict] = None,
+    key: str = "_id"
+) -> Dict[Any, Dict]:
+    """Documents whose ``key`` is in ``ids``, keyed by that field."""
+    ids = _unique(ids)
+    found: Dict[Any, Dict] = {}
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        async for doc in collection.find({key: {"$in": ids[start:start + IN_CHUNK_SIZE]}}, projection):
+            found[doc[key]] = doc
+    return found
+
+
+async def load_grouped(
+    collection,
+    field: str,
+    values: Iterable,
+    query: Optional[Dict] = None,
+    projection: Optional[Dict] = None,
+    sort: Optional[List] = None
+) -> Dict[Any, List[Dict]]:
+    """Documents whose ``field`` is in ``values``, grouped by that field."""
+    values = _unique(values)
+    grouped: Dict[Any, List[Dict]] = {value: [] for value in values}
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        cursor = collection.find({**(query or {}), field: {"$in": values[start:start + IN_CHUNK_SIZE]}}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        async for doc in cursor:
+            grouped.setdefault(doc.get(field), []).append(doc)
+    return grouped
+
+
+def page_bounds(page: int, limit: int):
+    """``(skip, limit)`` for a 1-based page."""
+    page = max(page, 1)
+    return (page - 1) * limit, limit
+
+
+def page_meta(page: int, limit: int, total: int) -> Dict[str, int]:
+    return {
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "totalPages": math.ceil(total / limit) if limit else 0
+    }
+
+
+class PropertyLoader:
+    """Batched unit and tenant joins for property listings."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def tenant_names(self, tenant_ids: Iterable) -> Dict[Any, Optional[str]]:
+        tenants = await load_by_ids(self.db["property_tenants"], tenant_ids, {"full_name": 1})
+        return {tenant_id: tenant.get("full_name") for tenant_id, tenant in tenants.items()}
+
+    async def attach_tenant_names(self, units: List[Dict], tenant_field: str = "tenant_id") -> List[Dict]:
+        """Set ``tenant_name`` on every unit from one tenant query."""
+        names = await self.tenant_names(u.get(tenant_field) for u in units)
+        for unit in units:
+            unit["tenant_name"] = names.get(unit.get(tenant_field)) if unit.get(tenant_field) else None
+        return units
+
+    async def units_by_property(self, property_ids: Iterable, field: str = "propertyId") -> Dict[Any, List[Dict]]:
+        """Units of every property, with tenant names, in two queries."""
+        grouped = await load_grouped(self.db["units"], field, property_ids)
+        await self.attach_tenant_names([unit for units in grouped.values() for unit in units])
+        return grouped
@@ -0,0 +1,381 @@
+"""
+Bulk meter-reading ingestion behind ``AsyncLeaseInvoiceManager.process_utility_readings``.
+
+``process_utility_reading`` handles one reading: it reads the ticket, updates
+the task, reads and patches the invoice, re-reads the ticket for progress and,
+once every task is in, finalizes and notifies invoice by invoice. For a
+caretaker's whole round of readings for a property this ingestor instead:
+
+1. loads the property's open invoice-preparation tickets with one query and
+   indexes their tasks by task id and by (unit, utility)
+2. validates every reading in memory: unknown or already-recorded tasks,
+   duplicates within the batch and readings below the previous reading are
+   rejected with their row number
+3. loads the affected invoices with one ``$in`` query and computes all
+   utility line items and usage metadata in memory
+4. persists the batch with one ordered ``bulk_write`` each for invoices and
+   tickets and one ``insert_many`` for the notifications of invoices whose
+   ticket the batch completed. Each invoice update adds its charges to the
+   stored total and re-derives the balance server-side
+   (``payment_totals.charge_totals_update``), so a payment posted meanwhile
+   is not overwritten
+
+Readings come as dicts (``task_id`` or ``unit`` + ``utility``,
+``current_reading``, optional ``reading_date``); ``parse_readings_csv`` turns
+a CSV upload with those columns into the same shape.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from plugins.pms.accounting.payment_totals import charge_totals_update
+from plugins.pms.models.extra import TaskStatus, TicketCategory, TicketStatus, UtilityUsageRecord
+from plugins.pms.models.ledger_entry import InvoiceStatus
+from plugins.pms.snapshots.invalidation import snapshots_changed
+from plugins.pms.utils.dirty_tenants import mark_tenants_dirty
+
+OPEN_TICKET_STATUSES = [
+    TicketStatus.OPEN.value,
+    TicketStatus.PENDING_INPUT.value,
+    TicketStatus.IN_PROGRESS.value,
+]
+CSV_COLUMNS = ("task_id", "unit", "utility", "current_reading", "reading_date")
+
+
+def parse_readings_csv(text: str) -> List[Dict]:
+    """Rows of a readings CSV (header row required) as reading dicts."""
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    if not reader.fieldnames or "current_reading" not in [f.strip() for f in reader.fieldnames]:
+        raise ValueError("CSV must have a header row with a current_reading column")
+    readings = []
+    for row in reader:
+        row = {(k or "").strip(): (v or "").strip() for k, v in row.items()}
+        readings.append({key: row[key] for key in CSV_COLUMNS if row.get(key)})
+    return readings
+
+
+def _usage_key(utility_name: str) -> str:
+    return f"{utility_name.lower().replace(' ', '_')}_usage"
+
+
+@dataclass
+class ReadingContext:
+    """Open tickets of one property and the invoices their readings land on."""
+    tickets: Dict[Any, Dict] = field(default_factory=dict)
+    tasks: Dict[str, Tuple[Any, Dict]] = field(default_factory=dict)        # task_id -> (ticket _id, task)
+    by_unit: Dict[Tuple[str, str], List[str]] = field(default_factory=dict)  # (unit, utility) -> task ids
+    invoices: Dict[str, Dict] = field(default_factory=dict)
+
+    def index_ticket(self, ticket: Dict):
+        self.tickets[ticket["_id"]] = ticket
+        for task in ticket.get("tasks", []):
+            self.tasks[task["id"]] = (ticket["_id"], task)
+            meta = task.get("metadata", {})
+            utility = str(meta.get("utility_name", "")).lower()
+            units = [str(u) for u in meta.get("units_id", [])] + [str(u) for u in meta.get("unit_numbers", [])]
+            for unit in dict.fromkeys(units):
+                self.by_unit.setdefault((unit.lower(), utility), []).append(task["id"])
+
+
+@dataclass
+class ReadingWrites:
+    """Writes collected while applying a batch of readings."""
+    invoice_ops: List[Any] = field(default_factory=list)
+    ticket_ops: List[Any] = field(default_factory=list)
+    notifications: List[Dict] = field(default_factory=list)
+    tenant_ids: List[Any] = field(default_factory=list)
+    invoices: Dict[Any, Dict] = field(default_factory=dict)
+    closed_tickets: List[Any] = field(default_factory=list)
+
+
+class BulkReadingIngestor:
+    """Validate, price and bulk-apply a property's batch of meter readings."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.db = manager.db
+
+    async def ingest(
+        self,
+        property_id: str,
+        readings: List[Dict],
+        billing_month: Optional[str] = None,
+        dry_run: bool = False,
+        strict: bool = False
+    ) -> Dict:
+        """
+        Apply ``readings`` to the property's open invoice-preparation tickets.
+
+        ``dry_run`` validates and prices without writing; ``strict`` writes
+        nothing if any reading is rejected.
+        """
+        now = self.manager.current_date
+        result = {
+            "success": False,
+            "property_id": property_id,
+            "received": len(readings),
+            "accepted": [],
+            "rejected": [],
+            "invoices_updated": 0,
+            "tickets_closed": [],
+            "notifications_sent": 0,
+            "total_amount": 0.0,
+            "dry_run": dry_run
+        }
+
+        ctx = await self.prefetch(property_id, billing_month)
+        accepted = self._validate(ctx, readings, now, result)
+        await self._load_invoices(ctx, accepted)
+        for reading in accepted:
+            if reading["invoice_id"] not in ctx.invoices:
+                result["rejected"].append({
+                    "row": reading["row"],
+                    "reading": readings[reading["row"] - 1],
+                    "error": f"Invoice {reading['invoice_id']} not found"
+                })
+        accepted = [r for r in accepted if r["invoice_id"] in ctx.invoices]
+        result["rejected"].sort(key=lambda r: r["row"])
+        result["accepted"] = accepted
+        result["total_amount"] = round(sum(r["usage_record"]["amount"] for r in accepted), 2)
+
+        if dry_run or not accepted or (strict and result["rejected"]):
+            result["success"] = not result["rejected"]
+            return result
+
+        writes = ReadingWrites()
+        self._apply(ctx, writes, accepted, now, result)
+        if writes.closed_tickets:
+            await self._finalize(ctx, writes, property_id, result)
+        await self.flush(writes)
+
+        result["success"] = not result["rejected"]
+        return result
+
+    # ---------------------------------------------------
+    # Prefetch
+    # ---------------------------------------------------
+    async def prefetch(self, property_id: str, billing_month: Optional[str]) -> ReadingContext:
+        ctx = ReadingContext()
+        query: Dict[str, Any] = {
+            "metadata.property_id": property_id,
+            "category": TicketCategory.INVOICE_PREP.value,
+            "status": {"$in": OPEN_TICKET_STATUSES}
+        }
+        if billing_month:
+            query["metadata.billing_month"] = billing_month
+        async for ticket in self.db.property_tickets.find(query).sort("created_at", 1):
+            ctx.index_ticket(ticket)
+        return ctx
+
+    async def _load_invoices(self, ctx: ReadingContext, accepted: List[Dict]):
+        invoice_ids = {r["invoice_id"] for r in accepted}
+        oids = [ObjectId(i) for i in invoice_ids if ObjectId.is_valid(i)]
+        async for invoice in self.db.property_invoices.find({"_id": {"$in": oids}}):
+            ctx.invoices[str(invoice["_id"])] = invoice
+
+    # ---------------------------------------------------
+    # Validate and price in memory
+    # ---------------------------------------------------
+    def _resolve_task(self, ctx: ReadingContext, reading: Dict) -> Tuple[Any, Dict]:
+        task_id = reading.get("task_id")
+        if task_id:
+            if task_id not in ctx.tasks:
+                raise ValueError(f"Task {task_id} not found in an open ticket")
+            return ctx.tasks[task_id]
+
+        unit, utility = reading.get("unit"), reading.get("utility")
+        if not unit or not utility:
+            raise ValueError("Provide task_id, or unit and utility")
+        candidates = ctx.by_unit.get((str(unit).lower(), str(utility).lower()), [])
+        pending = [t for t in candidates if ctx.tasks[t][1]["status"] != TaskStatus.COMPLETED.value]
+        if not candidates:
+            raise ValueError(f"No open {utility} reading task for unit {unit}")
+        if len(pending) > 1:
+            raise ValueError(f"Several open {utility} tasks for unit {unit}; send task_id instead")
+        return ctx.tasks[(pending or candidates)[0]]
+
+    def _validate(self, ctx: ReadingContext, readings: List[Dict], now: datetime, result: Dict) -> List[Dict]:
+        accepted, seen = [], set()
+        for row, reading in enumerate(readings, start=1):
+            try:
+                ticket_id, task = self._resolve_task(ctx, reading)
+                if task["id"] in seen:
+                    raise ValueError(f"Duplicate reading for task {task['id']}")
+                if task["status"] == TaskStatus.COMPLETED.value:
+                    raise ValueError(f"Reading for task {task['id']} was already recorded")
+
+                try:
+                    current_reading = float(reading.get("current_reading"))
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid current_reading: {reading.get('current_reading')!r}")
+
+                meta = task["metadata"]
+                previous_reading = meta["previous_reading"]
+                if current_reading < previous_reading:
+                    raise ValueError(
+                        f"Current reading ({current_reading}) cannot be less than "
+                        f"previous reading ({previous_reading})"
+                    )
+
+                usage = current_reading - previous_reading
+                usage_record = UtilityUsageRecord(
+                    utility_name=meta["utility_name"],
+                    previous_reading=previous_reading,
+                    current_reading=current_reading,
+                    usage=usage,
+                    rate=meta["rate"],
+                    amount=usage * meta["rate"],
+                    reading_date=reading.get("reading_date") or now.isoformat(),
+                    unit_of_measure=meta["unit_of_measure"]
+                )
+            except (KeyError, ValueError) as e:
+                result["rejected"].append({"row": row, "reading": reading, "error": str(e)})
+                continue
+
+            seen.add(task["id"])
+            accepted.append({
+                "row": row,
+                "task_id": task["id"],
+                "ticket_id": str(ticket_id),
+                "invoice_id": str(meta["invoice_id"]),
+                "unit_numbers_str": meta.get("unit_numbers_str", ""),
+                "usage_record": usage_record.model_dump()
+            })
+        return accepted
+
+    def _apply(self, ctx: ReadingContext, writes: ReadingWrites, accepted: List[Dict], now: datetime, result: Dict):
+        """Invoice line items and task updates for every accepted reading."""
+        by_invoice: Dict[str, List[Dict]] = {}
+        for reading in accepted:
+            by_invoice.setdefault(reading["invoice_id"], []).append(reading)
+
+        for invoice_id, invoice_readings in by_invoice.items():
+            invoice = ctx.invoices[invoice_id]
+            line_items, usage_meta = [], {}
+            for reading in invoice_readings:
+                record = reading["usage_record"]
+                unit_numbers = ctx.tasks[reading["task_id"]][1]["metadata"].get("unit_numbers", [])
+                line_items.append({
+                    "_id": str(ObjectId()),
+                    "description": f"{reading['unit_numbers_str']}, {record['utility_name']} Usage - {record['usage']} {record['unit_of_measure']}",
+                    "amount": record["amount"],
+                    "category": "utility",
+                    "usage_units": record["usage"],
+                    "rate": record["rate"],
+                    "meta": {
+                        "utility_type": "metered",
+                        "utility_name": record["utility_name"],
+                        "previous_reading": record["previous_reading"],
+                        "current_reading": record["current_reading"],
+                        "reading_date": record["reading_date"],
+                        "unit_of_measure": record["unit_of_measure"],
+                        "unit_numbers": unit_numbers
+                    }
+                })
+                usage_meta[f"meta.utilities_usage.{_usage_key(record['utility_name'])}"] = {
+                    "reading_date": record["reading_date"],
+                    "previous_reading": record["previous_reading"],
+                    "current_reading": record["current_reading"],
+                    "usage": record["usage"],
+                    "rate": record["rate"],
+                    "amount": record["amount"],
+                    "unit": record["unit_of_measure"],
+                    "unit_numbers": unit_numbers
+                }
+
+            added = sum(item["amount"] for item in line_items)
+            writes.invoice_ops.append(UpdateOne(
+                {"_id": invoice["_id"]},
+                charge_totals_update(added, {
+                    "line_items": {"$concatArrays": [{"$ifNull": ["$line_items", []]}, {"$literal": line_items}]},
+                    **{path: {"$literal": value} for path, value in usage_meta.items()}
+                })
+            ))
+            # the in-memory copy only feeds the notifications
+            new_total = invoice["total_amount"] + added
+            invoice["total_amount"] = new_total
+            invoice["balance_amount"] = new_total - min(invoice.get("total_paid", 0.0), new_total)
+            invoice.setdefault("line_items", []).extend(line_items)
+            writes.tenant_ids.append(invoice.get("tenant_id"))
+            writes.invoices[invoice["_id"]] = {"_id": invoice["_id"], "property_id": invoice.get("property_id")}
+            result["invoices_updated"] += 1
+
+            for reading in invoice_readings:
+                record = reading["usage_record"]
+                ticket_id, task = ctx.tasks[reading["task_id"]]
+                task["status"] = TaskStatus.COMPLETED.value
+                writes.ticket_ops.append(UpdateOne(
+                    {"_id": ticket_id, "tasks.id": task["id"]},
+                    {"$set": {
+                        "tasks.$.status": TaskStatus.COMPLETED.value,
+                        "tasks.$.completed_at": now,
+                        "tasks.$.updated_at": now,
+                        "tasks.$.metadata.current_reading": record["current_reading"],
+                        "tasks.$.metadata.usage": record["usage"],
+                        "tasks.$.metadata.amount": record["amount"],
+                        "tasks.$.metadata.reading_date": record["reading_date"],
+                        "updated_at": now
+                    }}
+                ))
+
+        for ticket_id in dict.fromkeys(ctx.tasks[r["task_id"]][0] for r in accepted):
+            ticket = ctx.tickets[ticket_id]
+            completed = sum(1 for t in ticket["tasks"] if t["status"] == TaskStatus.COMPLETED.value)
+            update = {"metadata.completed_tasks": completed, "updated_at": now}
+            if completed == len(ticket["tasks"]):
+                update.update({"status": TicketStatus.CLOSED.value, "closed_at": now})
+                writes.closed_tickets.append(ticket_id)
+                result["tickets_closed"].append(str(ticket_id))
+            writes.ticket_ops.append(UpdateOne({"_id": ticket_id}, {"$set": update}))
+
+    async def _finalize(self, ctx: ReadingContext, writes: ReadingWrites, property_id: str, result: Dict):
+        """Mark the closed tickets' invoices ready and queue their notifications."""
+        invoice_ids = list(dict.fromkeys(
+            str(task["metadata"]["invoice_id"])
+            for ticket_id in writes.closed_tickets
+            for task in ctx.tickets[ticket_id]["tasks"]
+            if "invoice_id" in task.get("metadata", {})
+        ))
+        missing = [ObjectId(i) for i in invoice_ids if i not in ctx.invoices and ObjectId.is_valid(i)]
+        if missing:
+            async for invoice in self.db.property_invoices.find({"_id": {"$in": missing}}):
+                ctx.invoices[str(invoice["_id"])] = invoice
+
+        property_data = await self.db.properties.find_one({"_id": property_id})
+        invoices = [ctx.invoices[i] for i in invoice_ids if i in ctx.invoices]
+        tenants = {}
+        tenant_oids = [ObjectId(str(i["tenant_id"])) for i in invoices if ObjectId.is_valid(str(i.get("tenant_id")))]
+        async for tenant in self.db.property_tenants.find({"_id": {"$in": tenant_oids}}):
+            tenants[str(tenant["_id"])] = tenant
+
+        for invoice in invoices:
+            writes.invoice_ops.append(UpdateOne(
+                {"_id": invoice["_id"]},
+                {"$set": {"status": InvoiceStatus.READY.value}, "$unset": {"meta.pending_utilities": ""}}
+            ))
+            invoice["status"] = InvoiceStatus.READY.value
+            writes.invoices[invoice["_id"]] = {"_id": invoice["_id"], "property_id": invoice.get("property_id")}
+            tenant = tenants.get(str(invoice.get("tenant_id")))
+            if property_data and tenant:
+                notification = self.manager._build_invoice_notification(invoice, tenant, property_data)
+                writes.notifications.append(self.manager._notification_document(notification))
+        result["notifications_sent"] = len(writes.notifications)
+
+    # ---------------------------------------------------
+    # Persist
+    # ---------------------------------------------------
+    async def flush(self, writes: ReadingWrites):
+        """One ordered bulk_write per collection; finalization follows its line items."""
+        if writes.invoice_ops:
+            await self.db.property_invoices.bulk_write(writes.invoice_ops, ordered=True)
+            await snapshots_changed(self.db, "property_invoices", list(writes.invoices.values()))
+        if writes.ticket_ops:
+            await self.db.property_tickets.bulk_write(writes.ticket_ops, ordered=True)
+        if writes.notifications:
+            await self.db.property_notifications.insert_many(writes.notifications, ordered=False)
+        await mark_tenants_dirty(*[t for t in writes.tenant_ids if t])
@@ -0,0 +1,232 @@
+"""
+In-process n-gram search over PMS tenants and units.
+
+Invoices carry only ``tenant_id`` and ``units_id``. Searching them by tenant
+name, email, phone or unit number therefore means resolving the text to ids
+first. ``PmsSearchIndex`` keeps trigram posting lists for every tenant and
+unit in memory:
+
+    index = await get_search_index(db)
+    tenant_ids, unit_ids = index.search("otieno", property_ids=authorized_ids)
+    query["$or"] = [{"tenant_id": {"$in": tenant_ids}}, {"units_id": {"$in": unit_ids}}]
+
+A query is the intersection of its trigrams' postings, confirmed by a
+substring check, so it matches exactly what an unanchored case-insensitive
+regex would (queries shorter than a trigram scan the stored keys).
+Every key also records its ``property_id``; a search limited to some
+properties drops the others before ``MAX_MATCHES`` is applied.
+
+The index is built on first use from ``property_tenants`` and ``units`` and
+then follows their change streams. On a standalone server, which has no
+change streams, a background task rebuilds it every ``REFRESH_SECONDS``
+instead, so searches never wait for a rebuild. ``invalidate()`` forces the
+next search to rebuild.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+NGRAM = 3
+MAX_MATCHES = 5000
+REFRESH_SECONDS = float(os.getenv("PMS_SEARCH_REFRESH_SECONDS", "60"))
+
+TENANT_FIELDS = ("full_name", "fullName", "email", "phone", "id_number", "idNumber")
+UNIT_FIELDS = ("unitNumber", "unitName", "name")
+
+
+def _normalize(text: Any) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class NgramIndex:
+    """Trigram posting lists over the searchable text of keyed documents."""
+
+    def __init__(self):
+        self.texts: Dict[Any, str] = {}
+        self.postings: Dict[str, Set[Any]] = {}
+        self.groups: Dict[Any, str] = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, key: Any, values: Iterable[Any], group: Any = None):
+        self.remove(key)
+        text = "\x00".join(_normalize(v) for v in values if v not in (None, ""))
+        if not text:
+            return
+        self.texts[key] = text
+        if group is not None:
+            self.groups[key] = str(group)
+        for gram in _grams(text):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: Any):
+        text = self.texts.pop(key, None)
+        self.groups.pop(key, None)
+        if text is None:
+            return
+        for gram in _grams(text):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def search(self, query: str, limit: int = MAX_MATCHES, groups: Optional[Set[str]] = None) -> List[Any]:
+        """Keys whose text contains ``query``, only those in ``groups`` when given."""
+        query = _normalize(query)
+        if not query:
+            return []
+        grams = _grams(query)
+        if grams:
+            postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            candidates = set.intersection(*postings) if postings[0] else set()
+        else:
+            candidates = self.texts.keys()
+        matches = []
+        for key in candidates:
+            if groups is not None and self.groups.get(key) not in groups:
+                continue
+            if query in self.texts[key]:
+                matches.append(key)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+
+class PmsSearchIndex:
+    """Tenant and unit n-gram indexes for one database."""
+
+    def __init__(self, db):
+        self.db = db
+        self.tenants = NgramIndex()
+        self.units = NgramIndex()
+        self.unit_tenants: Dict[str, Any] = {}
+        self.built_at: Optional[float] = None
+        self.live = False
+        self._lock = asyncio.Lock()
+        self._follower: Optional[asyncio.Task] = None
+
+    # ---------------------------------------------------
+    # Build and maintain
+    # ---------------------------------------------------
+    @staticmethod
+    def _tenant_values(doc: Dict):
+        return [doc.get(f) for f in TENANT_FIELDS]
+
+    @staticmethod
+    def _unit_values(doc: Dict):
+        return [str(doc["_id"])] + [doc.get(f) for f in UNIT_FIELDS]
+
+    async def rebuild(self):
+        """Build fresh indexes, then swap them in so searches never see a partial build."""
+        tenants, units, unit_tenants = NgramIndex(), NgramIndex(), {}
+        async for doc in self.db.property_tenants.find({}, {**{f: 1 for f in TENANT_FIELDS}, "property_id": 1}):
+            tenants.add(doc["_id"], self._tenant_values(doc), doc.get("property_id"))
+        projection = {**{f: 1 for f in UNIT_FIELDS}, "currentTenantId": 1, "tenant_id": 1, "property_id": 1}
+        async for doc in self.db.units.find({}, projection):
+            units.add(str(doc["_id"]), self._unit_values(doc), doc.get("property_id"))
+            unit_tenants[str(doc["_id"])] = doc.get("currentTenantId") or doc.get("tenant_id")
+        self.tenants, self.units, self.unit_tenants = tenants, units, unit_tenants
+        self.built_at = time.monotonic()
+
+    def invalidate(self):
+        self.built_at = None
+
+    async def ensure_fresh(self):
+        """Build on first use (or after ``invalidate``); later refreshes happen in the background."""
+        if self.built_at is None:
+            async with self._lock:
+                if self.built_at is None:
+                    await self.rebuild()
+        if self._follower is None:
+            self._follower = asyncio.create_task(self._follow())
+
+    def apply_change(self, change: Dict):
+        """Apply one change-stream event to the indexes."""
+        coll = change.get("ns", {}).get("coll")
+        key = change.get("documentKey", {}).get("_id")
+        doc = change.get("fullDocument")
+        if change.get("operationType") == "delete" or doc is None:
+            if coll == "units":
+                self.units.remove(str(key))
+                self.unit_tenants.pop(str(key), None)
+            else:
+                self.tenants.remove(key)
+        elif coll == "units":
+            self.units.add(str(key), self._unit_values(doc), doc.get("property_id"))
+            self.unit_tenants[str(key)] = doc.get("currentTenantId") or doc.get("tenant_id")
+        else:
+            self.tenants.add(key, self._tenant_values(doc), doc.get("property_id"))
+
+    async def _follow(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": ["property_tenants", "units"]}}}]
+        try:
+            async with self.db.watch(pipeline, full_document="updateLookup") as stream:
+                self.live = True
+                # events between the build and the watch are covered by one more rebuild
+                await self.rebuild()
+                async for change in stream:
+                    self.apply_change(change)
+        except (PyMongoError, NotImplementedError) as e:
+            logger.info("pms search index: change streams unavailable (%s); rebuilding every %ss", e, REFRESH_SECONDS)
+        except Exception:
+            logger.exception("pms search index: change stream follower stopped")
+        self.live = False
+        await self._refresh_periodically()
+
+    async def _refresh_periodically(self):
+        """Without change streams, rebuild every ``REFRESH_SECONDS`` off the request path."""
+        while True:
+            await asyncio.sleep(REFRESH_SECONDS)
+            try:
+                async with self._lock:
+                    await self.rebuild()
+            except Exception:
+                logger.exception("pms search index: periodic rebuild failed")
+
+    # ---------------------------------------------------
+    # Query
+    # ---------------------------------------------------
+    def search(self, query: str, limit: int = MAX_MATCHES,
+               property_ids: Optional[Iterable[Any]] = None) -> Tuple[List[Any], List[str]]:
+        """
+        ``(tenant_ids, unit_ids)`` matching ``query``, within ``property_ids``
+        when given. Tenants of matching units are included, so a unit search
+        also finds their invoices.
+        """
+        groups = {str(p) for p in property_ids} if property_ids is not None else None
+        tenant_ids = self.tenants.search(query, limit, groups)
+        unit_ids = self.units.search(query, limit, groups)
+        seen = set(tenant_ids)
+        for unit_id in unit_ids:
+            tenant_id = self.unit_tenants.get(unit_id)
+            if tenant_id is not None and tenant_id not in seen:
+                seen.add(tenant_id)
+                tenant_ids.append(tenant_id)
+        tenant_ids = [ObjectId(t) if isinstance(t, str) and ObjectId.is_valid(t) else t for t in tenant_ids]
+        return tenant_ids, unit_ids
+
+
+_indexes: Dict[Tuple[int, str], PmsSearchIndex] = {}
+
+
+async def get_search_index(db) -> PmsSearchIndex:
+    """The process-wide index for ``db``, built or refreshed as needed."""
+    key = (id(db.client), db.name)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = PmsSearchIndex(db)
+    await index.ensure_fresh()
+    return index
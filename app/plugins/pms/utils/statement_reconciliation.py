@@ -0,0 +1,665 @@
+"""
+Bulk reconciliation of bank and mobile-money statements against open invoices.
+
+Recording a statement row by row through ``process_payment`` costs a tenant
+lookup, an open-invoice query and a ledger posting per row. For a whole
+statement file (10k+ rows) the reconciler instead:
+
+1. parses the file (CSV, or XLSX) with ``parse_statement``; columns are
+   recognised by the usual bank / M-Pesa header names (``STATEMENT_COLUMNS``)
+   and debit rows are skipped
+2. loads the open invoices of the run's properties, their tenants and units
+   once and indexes them in memory (``ReconciliationIndex``) by invoice
+   reference, unit/account number, normalised phone and open balance
+3. matches every row: invoice reference, then unit/account number, then
+   phone. Rows none of those identify fall back to a trigram match of the
+   payer name against tenant names, accepted when it is clear of the
+   runner-up or the amount equals the tenant's open balance. A row whose
+   amount equals exactly one open balance but that nothing else identifies
+   is reported as a suggestion, never posted
+4. allocates each matched row to the tenant's open invoices oldest first
+   (the referenced invoice first), tracking balances in memory, and posts
+   every ``POST_CHUNK`` rows with one ``Ledger.post_payments_bulk`` and one
+   ``insert_many`` into ``property_payments``
+5. writes the rows it did not post (unmatched, ambiguous, suggested,
+   duplicate in the file, reference already posted, no open invoice,
+   unreadable amount) to an exceptions report uploaded with ``upload_report``
+
+Runs are Dramatiq jobs (tasks/reconciliation_tasks.py) tracked in
+``statement_reconciliations``::
+
+    {_id, status, method, property_ids, created_by, created_at, updated_at,
+     started_at, completed_at, source: {bucket, object_name, filename},
+     progress: {stage, rows_total, rows_done}, summary, report,
+     exceptions: [first MAX_STORED_EXCEPTIONS], error}
+
+Status: queued -> running -> completed | failed. A worker claims the run with
+one conditional update, so a redelivered message does not post it twice.
+"""
+import asyncio
+import csv
+import io
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from plugins.pms.accounting.ledger import Ledger
+from plugins.pms.models.ledger_entry import Invoice, InvoiceStatus
+from plugins.pms.models.models import Payment
+from plugins.pms.reports.export_stream import REPORT_BUCKET, upload_report
+
+STATEMENT_BUCKET = os.getenv("PMS_STATEMENT_BUCKET", "pms-statements")
+POST_CHUNK = 1000
+PROGRESS_EVERY = 1000
+HEADER_SCAN_ROWS = 20
+FUZZY_THRESHOLD = 0.6
+FUZZY_MARGIN = 0.15
+MAX_STORED_EXCEPTIONS = 100
+
+RUN_QUEUED = "queued"
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+
+CLOSED_INVOICE_STATUSES = [InvoiceStatus.CANCELLED.value, InvoiceStatus.CONSOLIDATED.value]
+
+STATEMENT_COLUMNS = {
+    "date": ("date", "transaction date", "trans date", "value date", "posting date", "completion time"),
+    "reference": ("reference", "ref", "receipt", "receipt no", "transaction id", "transaction ref",
+                  "bank reference", "mpesa ref"),
+    "amount": ("amount", "paid in", "credit", "credit amount", "deposit", "amount paid"),
+    "phone": ("phone", "phone number", "msisdn", "mobile", "sender phone"),
+    "name": ("name", "payer", "payer name", "sender", "customer name", "other party info",
+             "details", "description", "narrative", "narration"),
+    "account": ("account", "account no", "account number", "bill ref", "bill ref number",
+                "bill reference", "invoice", "unit"),
+}
+
+EXCEPTION_COLUMNS = [
+    "line", "date", "reference", "amount", "phone", "name", "account",
+    "reason", "detail", "suggested_tenant_id", "suggested_invoice_id",
+]
+
+DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y",
+)
+
+
+@dataclass
+class StatementRow:
+    """One credit line of a statement; ``amount`` is None when unreadable."""
+    line: int
+    amount: Optional[float]
+    date: Optional[datetime] = None
+    reference: str = ""
+    phone: str = ""
+    name: str = ""
+    account: str = ""
+
+    def as_report_row(self, reason: str, detail: str = "", **extra) -> Dict:
+        return {
+            "line": self.line, "date": self.date, "reference": self.reference, "amount": self.amount,
+            "phone": self.phone, "name": self.name, "account": self.account,
+            "reason": reason, "detail": detail, **extra
+        }
+
+
+def _header_key(value: Any) -> str:
+    return re.sub(r"\s+", " ", str(value or "").strip().lower().replace(".", "").replace("_", " "))
+
+
+def _parse_amount(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    text = str(value or "").strip()
+    negative = text.startswith("(") and text.endswith(")") or text.startswith("-")
+    text = re.sub(r"[^0-9.]", "", text)
+    try:
+        amount = round(float(text), 2)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value or "").strip()
+        if not text:
+            return None
+        parsed = None
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            try:
+                parsed = datetime.fromisoformat(text)
+            except ValueError:
+                return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() if value is not None else ""
+
+
+def _statement_table(data: bytes, filename: str) -> List[List[Any]]:
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            return [list(row) for row in workbook.active.iter_rows(values_only=True)]
+        finally:
+            workbook.close()
+    text = data.decode("utf-8-sig", errors="replace")
+    return list(csv.reader(io.StringIO(text)))
+
+
+def parse_statement(data: bytes, filename: str = "statement.csv") -> Tuple[List[StatementRow], int]:
+    """
+    Credit rows of a CSV/XLSX statement and the number of debit rows skipped.
+
+    Preamble lines before the header (bank letterheads, M-Pesa summaries) are
+    ignored: the header is the first of ``HEADER_SCAN_ROWS`` rows naming an
+    amount column.
+    """
+    table = _statement_table(data, filename)
+    columns: Dict[str, int] = {}
+    header_at = None
+    for index, cells in enumerate(table[:HEADER_SCAN_ROWS]):
+        keys = [_header_key(c) for c in cells]
+        if any(k in STATEMENT_COLUMNS["amount"] for k in keys):
+            header_at = index
+            for field_name, aliases in STATEMENT_COLUMNS.items():
+                for alias in aliases:
+                    if alias in keys:
+                        columns[field_name] = keys.index(alias)
+                        break
+            break
+    if header_at is None:
+        raise ValueError("Statement needs a header row with an amount column (e.g. Amount, Paid In, Credit)")
+
+    rows, skipped = [], 0
+    for offset, cells in enumerate(table[header_at + 1:], start=header_at + 2):
+        if not any(_cell(c) for c in cells):
+            continue
+
+        def value(name):
+            position = columns.get(name)
+            return cells[position] if position is not None and position < len(cells) else None
+
+        raw_amount = value("amount")
+        if not _cell(raw_amount):
+            skipped += 1
+            continue
+        amount = _parse_amount(raw_amount)
+        if amount is not None and amount <= 0:
+            skipped += 1
+            continue
+        rows.append(StatementRow(
+            line=offset,
+            amount=amount,
+            date=_parse_date(value("date")),
+            reference=_cell(value("reference")),
+            phone=_cell(value("phone")),
+            name=_cell(value("name")),
+            account=_cell(value("account")),
+        ))
+    return rows, skipped
+
+
+def normalize_reference(value: Any) -> str:
+    return re.sub(r"[^0-9A-Z]", "", str(value or "").upper())
+
+
+def normalize_phone(value: Any) -> str:
+    """Last nine digits of a phone number; masked numbers (2547****123) give ''."""
+    text = str(value or "")
+    if "*" in text or "x" in text.lower():
+        return ""
+    digits = re.sub(r"\D", "", text)
+    return digits[-9:] if len(digits) >= 9 else ""
+
+
+def name_grams(value: Any) -> Set[str]:
+    """Trigrams of a name with its words sorted, so "DOE JOHN" matches "John Doe"."""
+    words = sorted(re.findall(r"[a-z]+", str(value or "").lower()))
+    text = f" {' '.join(words)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)} if words else set()
+
+
+def _id_variants(ids: Iterable[Any]) -> List[Any]:
+    variants = []
+    for value in ids:
+        variants.append(value)
+        if isinstance(value, ObjectId):
+            variants.append(str(value))
+        elif ObjectId.is_valid(value):
+            variants.append(ObjectId(value))
+    return variants
+
+
+@dataclass
+class ReconciliationIndex:
+    """Open invoices, tenants and units of a run, indexed for row matching."""
+    invoices: Dict[Any, Dict] = field(default_factory=dict)
+    open_balance: Dict[Any, float] = field(default_factory=dict)
+    tenant_invoices: Dict[str, List[Any]] = field(default_factory=dict)  # oldest first
+    tenants: Dict[str, Dict] = field(default_factory=dict)
+    by_reference: Dict[str, Any] = field(default_factory=dict)           # reference -> invoice _id
+    by_unit: Dict[str, Set[str]] = field(default_factory=dict)           # unit number -> tenant ids
+    by_phone: Dict[str, Set[str]] = field(default_factory=dict)          # phone -> tenant ids
+    by_amount: Dict[float, List[Any]] = field(default_factory=dict)      # open balance -> invoice _ids
+    grams: Dict[str, Set[str]] = field(default_factory=dict)             # name trigram -> tenant ids
+    tenant_grams: Dict[str, Set[str]] = field(default_factory=dict)
+
+    def index_invoice(self, invoice: Dict):
+        invoice_id, tenant_id = invoice["_id"], str(invoice["tenant_id"])
+        self.invoices[invoice_id] = invoice
+        self.open_balance[invoice_id] = round(float(invoice.get("balance_amount") or 0), 2)
+        self.tenant_invoices.setdefault(tenant_id, []).append(invoice_id)
+        self.by_amount.setdefault(self.open_balance[invoice_id], []).append(invoice_id)
+        for reference in (invoice.get("invoice_number"), str(invoice_id)):
+            if reference:
+                self.by_reference[normalize_reference(reference)] = invoice_id
+
+    def index_tenant(self, tenant: Dict):
+        tenant_id = str(tenant["_id"])
+        self.tenants[tenant_id] = tenant
+        phone = normalize_phone(tenant.get("phone"))
+        if phone:
+            self.by_phone.setdefault(phone, set()).add(tenant_id)
+        grams = name_grams(tenant.get("full_name") or tenant.get("name"))
+        self.tenant_grams[tenant_id] = grams
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(tenant_id)
+
+    def index_unit(self, unit: Dict, tenant_ids: Iterable[str]):
+        for key in ("unitNumber", "unitName", "name"):
+            number = normalize_reference(unit.get(key))
+            if number:
+                self.by_unit.setdefault(number, set()).update(tenant_ids)
+
+    def tenant_open(self, tenant_id: str) -> float:
+        return round(sum(self.open_balance[i] for i in self.tenant_invoices.get(tenant_id, [])), 2)
+
+    def fuzzy_tenants(self, name: str) -> List[Tuple[float, str]]:
+        """Tenants by Dice similarity of name trigrams, best first."""
+        grams = name_grams(name)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        scored = [
+            (2 * count / (len(grams) + len(self.tenant_grams[tenant_id])), tenant_id)
+            for tenant_id, count in shared.items()
+        ]
+        return sorted(scored, reverse=True)[:5]
+
+
+@dataclass
+class RowMatch:
+    tenant_id: str
+    method: str
+    invoice_id: Any = None
+    score: float = 1.0
+
+
+class StatementReconciler:
+    """Parse, match, bulk-post and report one statement reconciliation run."""
+
+    def __init__(self, db, minio_client=None):
+        self.db = db
+        self.runs = db.statement_reconciliations
+        self.ledger = Ledger(db)
+        self.minio_client = minio_client
+
+    # ------------------------------------------------------------------
+    # Runs
+    # ------------------------------------------------------------------
+    async def create_run(
+        self,
+        source: Dict,
+        property_ids: Optional[List[str]] = None,
+        method: str = "bank",
+        created_by: Optional[str] = None
+    ) -> Dict:
+        now = datetime.now(timezone.utc)
+        run = {
+            "_id": str(ObjectId()),
+            "status": RUN_QUEUED,
+            "method": method,
+            "property_ids": property_ids,
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "completed_at": None,
+            "source": source,
+            "progress": {"stage": RUN_QUEUED, "rows_total": 0, "rows_done": 0},
+            "summary": None,
+            "report": None,
+            "exceptions": [],
+            "error": None
+        }
+        await self.runs.insert_one(run)
+        return run
+
+    async def claim(self, run_id: str) -> Optional[Dict]:
+        now = datetime.now(timezone.utc)
+        return await self.runs.find_one_and_update(
+            {"_id": run_id, "status": RUN_QUEUED},
+            {"$set": {"status": RUN_RUNNING, "started_at": now, "updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _progress(self, run_id: Optional[str], stage: str, rows_done: int, rows_total: Optional[int] = None):
+        if run_id is None:
+            return
+        update = {"progress.stage": stage, "progress.rows_done": rows_done, "updated_at": datetime.now(timezone.utc)}
+        if rows_total is not None:
+            update["progress.rows_total"] = rows_total
+        await self.runs.update_one({"_id": run_id}, {"$set": update})
+
+    def _minio(self):
+        if self.minio_client is None:
+            from plugins.pms.services.pdf_service import get_minio_client
+            self.minio_client = get_minio_client()
+        return self.minio_client
+
+    def _download(self, bucket: str, object_name: str) -> bytes:
+        response = self._minio().get_object(bucket, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def run(self, run_id: str) -> Optional[Dict]:
+        """Claim and reconcile a queued run. Returns its summary, or None if not claimed."""
+        run = await self.claim(run_id)
+        if not run:
+            return None
+
+        try:
+            source = run["source"]
+            await self._progress(run_id, "parsing", 0)
+            data = await asyncio.to_thread(self._download, source["bucket"], source["object_name"])
+            rows, skipped = parse_statement(data, source.get("filename") or source["object_name"])
+            summary, exceptions = await self.reconcile(
+                rows, property_ids=run.get("property_ids"), method=run.get("method", "bank"), run_id=run_id
+            )
+            summary["debit_rows_skipped"] = skipped
+
+            report = None
+            if exceptions:
+                await self._progress(run_id, "reporting", summary["rows"])
+                report = await upload_report(
+                    _rows(exceptions), EXCEPTION_COLUMNS, "csv", f"reconciliation/{run_id}_exceptions.csv",
+                    bucket=REPORT_BUCKET, minio_client=self._minio()
+                )
+        except Exception as e:
+            await self.runs.update_one(
+                {"_id": run_id},
+                {"$set": {"status": RUN_FAILED, "error": str(e), "updated_at": datetime.now(timezone.utc)}}
+            )
+            raise
+
+        now = datetime.now(timezone.utc)
+        await self.runs.update_one({"_id": run_id}, {"$set": {
+            "status": RUN_COMPLETED,
+            "summary": summary,
+            "report": report,
+            "exceptions": exceptions[:MAX_STORED_EXCEPTIONS],
+            "progress.stage": RUN_COMPLETED,
+            "completed_at": now,
+            "updated_at": now
+        }})
+        return summary
+
+    # ------------------------------------------------------------------
+    # Matching and posting
+    # ------------------------------------------------------------------
+    async def build_index(self, property_ids: Optional[List[str]] = None) -> ReconciliationIndex:
+        """Open invoices of ``property_ids`` (all when None) with their tenants and units, in three queries."""
+        index = ReconciliationIndex()
+        query: Dict[str, Any] = {"balance_amount": {"$gt": 0}, "status": {"$nin": CLOSED_INVOICE_STATUSES}}
+        tenant_query: Dict[str, Any] = {}
+        if property_ids is not None:
+            query["property_id"] = {"$in": _id_variants(property_ids)}
+            tenant_query["property_id"] = {"$in": _id_variants(property_ids)}
+
+        unit_tenants: Dict[str, Set[str]] = {}
+        cursor = self.db.property_invoices.find(query).sort([("date_issued", 1), ("_id", 1)])
+        async for invoice in cursor:
+            index.index_invoice(invoice)
+            for unit_id in invoice.get("units_id") or []:
+                unit_tenants.setdefault(str(unit_id), set()).add(str(invoice["tenant_id"]))
+
+        tenant_ids = _id_variants(index.tenant_invoices)
+        tenant_query = {"$or": [tenant_query, {"_id": {"$in": tenant_ids}}]} if tenant_query else {"_id": {"$in": tenant_ids}}
+        async for tenant in self.db.property_tenants.find(tenant_query, {"full_name": 1, "name": 1, "phone": 1}):
+            index.index_tenant(tenant)
+
+        async for unit in self.db.units.find(
+            {"_id": {"$in": _id_variants(unit_tenants)}}, {"unitNumber": 1, "unitName": 1, "name": 1}
+        ):
+            index.index_unit(unit, unit_tenants[str(unit["_id"])])
+        return index
+
+    def match(self, row: StatementRow, index: ReconciliationIndex) -> Tuple[Optional[RowMatch], Dict]:
+        """The tenant (and invoice) a row pays, or None with the exception fields."""
+        # 1. invoice reference anywhere in the account, reference or details
+        for text in (row.account, row.reference, row.name):
+            for token in [text, *re.split(r"[\s,;/#:]+", text)]:
+                invoice_id = index.by_reference.get(normalize_reference(token))
+                if token and invoice_id is not None:
+                    invoice = index.invoices[invoice_id]
+                    return RowMatch(str(invoice["tenant_id"]), "reference", invoice_id), {}
+
+        # 2. unit / account number, 3. phone
+        for method, candidates in (
+            ("unit", index.by_unit.get(normalize_reference(row.account), set()) if row.account else set()),
+            ("phone", index.by_phone.get(normalize_phone(row.phone), set()) if row.phone else set()),
+        ):
+            if len(candidates) == 1:
+                return RowMatch(next(iter(candidates)), method), {}
+            if len(candidates) > 1:
+                exact = [t for t in candidates if self._amount_fits(row.amount, t, index)]
+                if len(exact) == 1:
+                    return RowMatch(exact[0], method), {}
+                return None, {"reason": "ambiguous", "detail": f"{method} matches {len(candidates)} tenants"}
+
+        # 4. fuzzy payer name
+        scored = index.fuzzy_tenants(row.name)
+        if scored and scored[0][0] >= FUZZY_THRESHOLD:
+            best, best_tenant = scored[0]
+            runner_up = scored[1][0] if len(scored) > 1 else 0.0
+            if best - runner_up >= FUZZY_MARGIN:
+                return RowMatch(best_tenant, "fuzzy_name", score=round(best, 3)), {}
+            close = [(score, t) for score, t in scored if score >= FUZZY_THRESHOLD]
+            fits = [(score, t) for score, t in close if self._amount_fits(row.amount, t, index)]
+            if len(fits) == 1:
+                return RowMatch(fits[0][1], "fuzzy_name", score=round(fits[0][0], 3)), {}
+            return None, {"reason": "ambiguous", "detail": f"name close to {len(close)} tenants"}
+
+        # amount alone is only a suggestion
+        same_amount = index.by_amount.get(row.amount, [])
+        if len(same_amount) == 1:
+            invoice = index.invoices[same_amount[0]]
+            return None, {
+                "reason": "suggested", "detail": "amount equals one open balance",
+                "suggested_tenant_id": str(invoice["tenant_id"]), "suggested_invoice_id": str(invoice["_id"])
+            }
+        return None, {"reason": "unmatched"}
+
+    @staticmethod
+    def _amount_fits(amount: float, tenant_id: str, index: ReconciliationIndex) -> bool:
+        invoice_ids = index.tenant_invoices.get(tenant_id, [])
+        return amount == index.tenant_open(tenant_id) or any(index.open_balance[i] == amount for i in invoice_ids)
+
+    def allocate(self, amount: float, match: RowMatch, index: ReconciliationIndex) -> List[Tuple[Any, float]]:
+        """
+        Split ``amount`` over the tenant's open invoices (the matched one
+        first, then oldest first) against the balances left by earlier rows.
+        Anything beyond them lands on the last invoice as overpayment.
+        """
+        invoice_ids = list(index.tenant_invoices.get(match.tenant_id, []))
+        if match.invoice_id is not None:
+            invoice_ids.remove(match.invoice_id)
+            invoice_ids.insert(0, match.invoice_id)
+        if not invoice_ids:
+            return []
+
+        allocations: Dict[Any, float] = {}
+        remaining = round(amount, 2)
+        for invoice_id in invoice_ids:
+            if remaining <= 0:
+                break
+            take = min(remaining, index.open_balance[invoice_id])
+            if take > 0:
+                allocations[invoice_id] = take
+                index.open_balance[invoice_id] = round(index.open_balance[invoice_id] - take, 2)
+                remaining = round(remaining - take, 2)
+        if remaining > 0:
+            last = next(reversed(allocations), invoice_ids[-1])
+            allocations[last] = round(allocations.get(last, 0.0) + remaining, 2)
+        return list(allocations.items())
+
+    async def reconcile(
+        self,
+        rows: List[StatementRow],
+        property_ids: Optional[List[str]] = None,
+        method: str = "bank",
+        run_id: Optional[str] = None
+    ) -> Tuple[Dict, List[Dict]]:
+        """Match and post ``rows``. Returns the summary and the exception rows."""
+        start = time.perf_counter()
+        await self._progress(run_id, "indexing", 0, len(rows))
+        index = await self.build_index(property_ids)
+
+        references = list({row.reference for row in rows if row.reference})
+        posted_before = {
+            normalize_reference(p["reference"])
+            for p in await self.db.property_payments.find(
+                {"reference": {"$in": references}}, {"reference": 1}
+            ).to_list(None)
+        } if references else set()
+
+        exceptions: List[Dict] = []
+        summary: Dict[str, Any] = {
+            "rows": len(rows), "matched": 0, "posted": 0, "amount_posted": 0.0,
+            "invoices_paid_into": 0, "ledger_entries": 0, "exceptions": 0,
+            "by_method": {}, "by_reason": {}
+        }
+        seen: Set[str] = set()
+        pending: List[Tuple[StatementRow, RowMatch, List[Tuple[Any, float]]]] = []
+        invoices_touched: Set[Any] = set()
+
+        for done, row in enumerate(rows, start=1):
+            reference = normalize_reference(row.reference)
+            problem: Dict = {}
+            match = None
+            if row.amount is None:
+                problem = {"reason": "invalid_amount"}
+            elif reference and reference in posted_before:
+                problem = {"reason": "already_posted", "detail": "reference already in payments"}
+            elif reference and reference in seen:
+                problem = {"reason": "duplicate_in_file"}
+            else:
+                match, problem = self.match(row, index)
+            if reference:
+                seen.add(reference)
+
+            allocations = self.allocate(row.amount, match, index) if match else []
+            if match and not allocations:
+                problem = {"reason": "no_open_invoice", "suggested_tenant_id": match.tenant_id}
+            if problem:
+                exceptions.append(row.as_report_row(**problem))
+                summary["by_reason"][problem["reason"]] = summary["by_reason"].get(problem["reason"], 0) + 1
+            else:
+                summary["matched"] += 1
+                summary["by_method"][match.method] = summary["by_method"].get(match.method, 0) + 1
+                pending.append((row, match, allocations))
+                invoices_touched.update(invoice_id for invoice_id, _ in allocations)
+
+            if len(pending) >= POST_CHUNK:
+                await self._post(pending, index, method, run_id, summary)
+                pending = []
+                await self._progress(run_id, "posting", done)
+            elif done % PROGRESS_EVERY == 0:
+                await self._progress(run_id, "matching", done)
+
+        if pending:
+            await self._post(pending, index, method, run_id, summary)
+
+        summary["amount_posted"] = round(summary["amount_posted"], 2)
+        summary["invoices_paid_into"] = len(invoices_touched)
+        summary["exceptions"] = len(exceptions)
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        await self._progress(run_id, "posted", len(rows))
+        return summary, exceptions
+
+    async def _post(self, pending, index: ReconciliationIndex, method: str, run_id: Optional[str], summary: Dict):
+        """Ledger entries, invoice totals and payment records for a chunk of matched rows."""
+        now = datetime.now(timezone.utc)
+        models: Dict[Any, Invoice] = {}
+        paid: Dict[Any, float] = {}
+        payments, records = [], []
+        for row, match, allocations in pending:
+            pay_date = row.date or now
+            for invoice_id, amount in allocations:
+                if invoice_id not in models:
+                    doc = dict(index.invoices[invoice_id], tenant_id=str(index.invoices[invoice_id]["tenant_id"]))
+                    models[invoice_id] = Invoice(**doc)
+                payments.append((models[invoice_id], amount, pay_date))
+                paid[invoice_id] = paid.get(invoice_id, 0.0) + amount
+
+            record = Payment(
+                invoice_id=allocations[0][0],
+                amount=row.amount,
+                method=method,
+                pay_date=pay_date,
+                reference=row.reference or f"STMT-{run_id or 'adhoc'}-{row.line}",
+                tenant_id=match.tenant_id
+            ).model_dump(by_alias=True)
+            record.update({
+                "property_id": index.invoices[allocations[0][0]].get("property_id"),
+                "allocations": [{"invoice_id": invoice_id, "amount": amount} for invoice_id, amount in allocations],
+                "statement_run_id": run_id,
+                "statement_line": row.line,
+                "match": {"method": match.method, "score": match.score},
+            })
+            records.append(record)
+
+        entries = await self.ledger.post_payments_bulk(payments)
+        await self.db.property_payments.insert_many(records)
+
+        # next chunk continues from the totals this one left
+        for invoice_id, amount in paid.items():
+            stored = index.invoices[invoice_id]
+            stored["total_paid"] = round((stored.get("total_paid") or 0) + amount, 2)
+
+        summary["posted"] += len(records)
+        summary["amount_posted"] += sum(row.amount for row, _, _ in pending)
+        summary["ledger_entries"] += len(entries)
+
+
+async def _rows(items: List[Dict]):
+    for item in items:
+        yield item
@@ -0,0 +1,472 @@
+"""
+Portfolio-wide tenant risk scoring.
+
+Batch form of ``AdvancedRentAnalytics.get_tenant_risk_score``: instead of one
+tenant lookup, one invoice query and one lease lookup per tenant, a chunk of
+tenants is scored from
+
+- one ``$in`` read of the tenants (plus one read each of their properties and
+  units when ``meta.property`` still has to be backfilled)
+- one aggregation over their invoices, projected down to the fields the score
+  uses and sorted by tenant and ``date_issued``
+- one ``$in`` read of their leases
+
+The per-invoice rules (late, on time, delay/early days, ...) become boolean
+and timedelta columns, the per-tenant totals one ``groupby().sum()``, and the
+risk components plain NumPy arithmetic over the tenant frame. Results have the
+same shape and values as the per-tenant method and are written back with a
+single ``bulk_write`` per chunk.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from plugins.pms.utils.advanced_rent_analytics import (
+    generate_recommendations,
+    summarize_utilities_for_tenant
+)
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("RISK_SCORING_CHUNK_SIZE", "5000"))
+DEFAULT_MONTHLY_RENT = 15000
+
+SETTLED_STATUSES = ["paid", "partial", "partially_paid"]
+LATE_STATUSES = ["overdue", "unpaid"]
+PARTIAL_STATUSES = ["partially_paid", "unpaid", "partial"]
+UNPAID_STATUSES = ["unpaid", "issued"]
+
+INVOICE_COUNTERS = [
+    "invoices", "late", "on_time", "paid", "issued", "overdue", "partial", "unpaid",
+    "delay_days", "early_days", "days_to_pay", "create_to_issue",
+    "outstanding", "expected", "collected"
+]
+
+
+def _utc(values) -> pd.Series:
+    """Datetimes (naive = UTC), ISO strings or None as a tz-aware column."""
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors="coerce", format="ISO8601")
+
+
+def _days(later: pd.Series, earlier) -> pd.Series:
+    """Whole days between two datetime columns, floored like ``timedelta.days``."""
+    return (later - earlier).dt.days
+
+
+def _safe_avg(total: pd.Series, count: pd.Series) -> pd.Series:
+    return (total / count.where(count > 0)).round(2).fillna(0.0)
+
+
+def invoice_frame(invoices: List[Dict]) -> pd.DataFrame:
+    """One row per invoice with the per-invoice risk flags and day counts."""
+    columns = {
+        name: [inv.get(name) for inv in invoices]
+        for name in ("tenant_id", "status", "due_date", "date_issued", "created_at", "payment_date")
+    }
+    status = pd.Series(columns["status"], dtype=object)
+    due = _utc(columns["due_date"])
+    issued = _utc(columns["date_issued"])
+    created = _utc(columns["created_at"])
+    paid_on = _utc(columns["payment_date"])
+
+    settled = status.isin(SETTLED_STATUSES)
+    has_due = settled & due.notna()
+    has_payment = has_due & paid_on.notna()
+    offset = _days(paid_on, due).where(has_payment)
+    on_time = has_payment & (paid_on <= due)
+    late_settled = has_due & ~on_time
+    has_created = created.notna() & issued.notna()
+
+    frame = pd.DataFrame({
+        "tenant_id": columns["tenant_id"],
+        "invoices": 1,
+        "late": status.isin(LATE_STATUSES) | late_settled,
+        "on_time": on_time,
+        "paid": status == "paid",
+        "issued": has_created,
+        "overdue": status == "overdue",
+        "partial": status.isin(PARTIAL_STATUSES),
+        "unpaid": status.isin(UNPAID_STATUSES),
+        "offset": offset,
+        # A settled invoice without a payment date counts as late with no measurable delay
+        "delay_days": offset.clip(lower=0).where(late_settled, 0).fillna(0),
+        "early_days": _days(due, paid_on).where(on_time, 0),
+        "days_to_pay": _days(paid_on, issued).where(has_payment & issued.notna(), 0),
+        "create_to_issue": _days(issued, created).clip(lower=0).where(has_created, 0),
+        "outstanding": [inv.get("balance_amount", 0) for inv in invoices],
+        "expected": [inv.get("total_amount", 0) for inv in invoices],
+        "collected": [inv.get("total_paid", 0) for inv in invoices]
+    })
+    return frame
+
+
+def score_frame(
+    frame: pd.DataFrame,
+    monthly_rent: pd.Series,
+    joined_at: pd.Series,
+    now: datetime
+) -> pd.DataFrame:
+    """
+    Risk components for every tenant in ``frame``.
+
+    ``frame`` must keep each tenant's invoices in ``date_issued`` order (the
+    payment trend compares the older half with the newer half).
+    ``monthly_rent`` and ``joined_at`` are indexed by tenant id.
+    """
+    grouped = frame.groupby("tenant_id", sort=False)
+    t = grouped[INVOICE_COUNTERS].sum().astype(float)
+
+    offsets = frame.loc[frame["offset"].notna(), ["tenant_id", "offset"]]
+    by_tenant = offsets.groupby("tenant_id", sort=False)["offset"]
+    count = by_tenant.transform("size")
+    older = by_tenant.cumcount() < count // 2
+    n_offsets = by_tenant.size().reindex(t.index, fill_value=0)
+    mid = n_offsets // 2
+    older_sum = offsets["offset"].where(older, 0).groupby(offsets["tenant_id"], sort=False).sum()
+    newer_sum = offsets["offset"].where(~older, 0).groupby(offsets["tenant_id"], sort=False).sum()
+    past_avg = older_sum.reindex(t.index, fill_value=0) / np.maximum(mid, 1)
+    recent_avg = newer_sum.reindex(t.index, fill_value=0) / np.maximum(n_offsets - mid, 1)
+    volatility_days = by_tenant.std(ddof=1).reindex(t.index).where(n_offsets >= 2, 0).fillna(0)
+
+    s = pd.DataFrame(index=t.index)
+    s["total_invoices"] = t["invoices"]
+    s["late_payments"] = t["late"]
+    s["on_time_payments"] = t["on_time"]
+    s["total_outstanding"] = t["outstanding"]
+    s["total_paid"] = t["collected"]
+
+    s["on_time_ratio"] = _safe_avg(t["on_time"], t["invoices"])
+    s["on_time_rate"] = (s["on_time_ratio"] * 100).round(2)
+    s["avg_delay"] = _safe_avg(t["delay_days"], t["late"])
+    s["avg_early"] = _safe_avg(t["early_days"], t["on_time"])
+    s["avg_days_to_pay"] = _safe_avg(t["days_to_pay"], t["paid"])
+    s["avg_create_to_issue"] = _safe_avg(t["create_to_issue"], t["issued"])
+    s["collection_rate"] = (t["collected"] / t["expected"].where(t["expected"] > 0)).fillna(0)
+
+    s["payment_volatility_score"] = np.minimum(volatility_days / 10 * 100, 100)
+    effective_late_ratio = (t["overdue"] + t["partial"] * 0.5 + t["unpaid"] * 0.2) / t["invoices"]
+    s["late_payment_score"] = np.minimum(effective_late_ratio * 100, 100)
+
+    rent = monthly_rent.reindex(t.index).fillna(DEFAULT_MONTHLY_RENT).astype(float)
+    s["outstanding_months"] = (t["outstanding"] / rent.where(rent > 0)).fillna(0)
+    s["outstanding_score"] = np.minimum(s["outstanding_months"] * 25, 100)
+
+    s["trend_score"] = ((past_avg - recent_avg) * 10).clip(-100, 100)
+    history = [t["invoices"] < 3, t["invoices"] < 6]
+    volatility_weight = np.select(history, [0.95, 0.80], 0.65)
+    trend_weight = np.select(history, [0.05, 0.20], 0.35)
+    consistency = (
+        (100 - s["payment_volatility_score"].clip(0, 100) * volatility_weight)
+        + s["trend_score"] * trend_weight
+    )
+    s["consistency_score"] = consistency.clip(0, 100).round(2)
+
+    joined = joined_at.reindex(t.index).fillna(pd.Timestamp(now))
+    s["months_as_tenant"] = _days(pd.Series(pd.Timestamp(now), index=t.index), joined) / 30
+    s["tenure_score"] = np.maximum(0, 100 - s["months_as_tenant"] * 5)
+
+    s["avg_delay_score"] = np.minimum(s["avg_delay"] / 30 * 100, 100)
+    s["collection_score"] = (1 - s["collection_rate"]) * 100
+    s["avg_days_score"] = np.minimum(s["avg_days_to_pay"] / 30 * 100, 100)
+    s["create_to_issue_score"] = np.minimum(s["avg_create_to_issue"] / 10 * 100, 100)
+    s["early_payment_score"] = 100 - np.minimum(s["avg_early"] * 10, 100)
+
+    s["risk_score"] = (
+        s["late_payment_score"] * 0.23
+        + s["outstanding_score"] * 0.23
+        + s["consistency_score"] * 0.15
+        + s["avg_delay_score"] * 0.10
+        + s["avg_days_score"] * 0.07
+        + s["payment_volatility_score"] * 0.05
+        + s["collection_score"] * 0.05
+        + s["create_to_issue_score"] * 0.04
+        + s["tenure_score"] * 0.03
+        - s["early_payment_score"] * 0.05
+    )
+    s["risk_level"] = np.select([s["risk_score"] < 30, s["risk_score"] < 60], ["LOW", "MEDIUM"], "HIGH")
+    return s
+
+
+class BulkTenantRiskScorer:
+    """Scores and enriches tenants chunk by chunk."""
+
+    def __init__(self, db, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    async def active_tenant_ids(self, today: Optional[datetime] = None) -> List[ObjectId]:
+        """Tenants holding a signed lease that covers ``today``."""
+        today = today or datetime.now(timezone.utc)
+        tenant_ids = await self.db.property_leases.distinct("tenant_id", {
+            "status": "signed",
+            "lease_terms.start_date": {"$lte": today},
+            "lease_terms.end_date": {"$gte": today},
+        })
+        return sorted({ObjectId(tenant_id) for tenant_id in tenant_ids})
+
+    async def enrich(
+        self,
+        tenant_ids: List[ObjectId],
+        now: Optional[datetime] = None,
+        on_result: Optional[Callable[[Dict], Any]] = None
+    ) -> Dict[str, int]:
+        """Score ``tenant_ids`` and write ``meta.risk_*`` back, one ``bulk_write`` per chunk."""
+        now = now or datetime.now(timezone.utc)
+        stats = {"tenants": 0, "scored": 0, "no_history": 0, "updated": 0}
+
+        for start in range(0, len(tenant_ids), self.chunk_size):
+            chunk = tenant_ids[start:start + self.chunk_size]
+            results, backfill = await self.score(chunk, now)
+
+            operations = []
+            for result in results:
+                tenant_id = ObjectId(result["tenant_id"])
+                update = {
+                    "meta.risk_score": result.get("risk_score"),
+                    "meta.risk_components": result.get("risk_components"),
+                    "meta.finance_metrics": result.get("metrics"),
+                    "meta.recommendations": result.get("recommendations"),
+                    "meta.last_enriched": now,
+                }
+                if tenant_id in backfill:
+                    update["meta.property"] = backfill[tenant_id]
+                operations.append(UpdateOne({"_id": tenant_id}, {"$set": update}))
+
+            if operations:
+                write = await self.db.property_tenants.bulk_write(operations, ordered=False)
+                stats["updated"] += write.matched_count
+
+            stats["tenants"] += len(chunk)
+            stats["scored"] += len(results)
+            stats["no_history"] += sum(1 for result in results if "message" in result)
+            if on_result:
+                for result in results:
+                    on_result(result)
+
+        return stats
+
+    async def score(self, tenant_ids: List[ObjectId], now: Optional[datetime] = None):
+        """
+        Risk results for ``tenant_ids`` (missing tenants are left out) and the
+        ``meta.property`` backfill for tenants that lack it.
+        """
+        now = now or datetime.now(timezone.utc)
+        tenant_ids = [ObjectId(tenant_id) for tenant_id in tenant_ids]
+
+        tenants = {
+            tenant["_id"]: tenant
+            async for tenant in self.db.property_tenants.find(
+                {"_id": {"$in": tenant_ids}},
+                {"full_name": 1, "phone": 1, "meta.property": 1, "property_id": 1,
+                 "units_id": 1, "joined_at": 1}
+            )
+        }
+        backfill = await self._property_backfill(tenants.values())
+        invoices = await self._invoices(list(tenants))
+        rents, expiries = await self._leases(list(tenants), now)
+
+        by_tenant: Dict[ObjectId, List[Dict]] = {}
+        for invoice in invoices:
+            by_tenant.setdefault(invoice["tenant_id"], []).append(invoice)
+
+        scores = None
+        if invoices:
+            joined_at = _utc([tenants[tenant_id].get("joined_at") for tenant_id in tenants])
+            joined_at.index = list(tenants)
+            scores = score_frame(invoice_frame(invoices), rents, joined_at, now)
+
+        results = []
+        for tenant_id in tenant_ids:
+            tenant = tenants.get(tenant_id)
+            if tenant is None:
+                continue
+            if tenant_id not in by_tenant:
+                results.append(self._no_history_result(tenant))
+                continue
+            results.append(self._result(
+                tenant,
+                scores.loc[tenant_id],
+                expiries.get(tenant_id),
+                summarize_utilities_for_tenant(by_tenant[tenant_id])
+            ))
+        return results, backfill
+
+    async def _invoices(self, tenant_ids: List[ObjectId]) -> List[Dict]:
+        """Each tenant's invoices in ``date_issued`` order, projected to what scoring reads."""
+        if not tenant_ids:
+            return []
+        pipeline = [
+            {"$match": {"tenant_id": {"$in": tenant_ids}}},
+            {"$sort": {"tenant_id": 1, "date_issued": 1}},
+            {"$project": {
+                "_id": 0,
+                "tenant_id": 1,
+                "status": 1,
+                "due_date": 1,
+                "date_issued": 1,
+                "created_at": 1,
+                "payment_date": 1,
+                "total_amount": 1,
+                "total_paid": 1,
+                "balance_amount": 1,
+                "meta.billing_period": 1,
+                "line_items": {"$filter": {
+                    "input": {"$ifNull": ["$line_items", []]},
+                    "as": "item",
+                    "cond": {"$and": [
+                        {"$eq": ["$$item.type", "utility"]},
+                        {"$eq": ["$$item.meta.billing_basis", "metered"]}
+                    ]}
+                }}
+            }}
+        ]
+        return await self.db.property_invoices.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+    async def _leases(self, tenant_ids: List[ObjectId], now: datetime):
+        """Monthly rent and days to expiry from each tenant's first lease."""
+        first_lease: Dict[ObjectId, Dict] = {}
+        cursor = self.db.property_leases.find(
+            {"tenant_id": {"$in": tenant_ids}},
+            {"tenant_id": 1, "lease_terms.rent_amount": 1, "lease_terms.end_date": 1}
+        )
+        async for lease in cursor:
+            first_lease.setdefault(lease["tenant_id"], lease)
+
+        tenant_index = list(first_lease)
+        rents = pd.Series(
+            [first_lease[t]["lease_terms"]["rent_amount"] for t in tenant_index],
+            index=tenant_index,
+            dtype=float
+        )
+        end_dates = _utc([first_lease[t]["lease_terms"].get("end_date") for t in tenant_index])
+        days_left = _days(end_dates, pd.Timestamp(now))
+        expiries = {
+            tenant_id: int(days) for tenant_id, days in zip(tenant_index, days_left) if pd.notna(days)
+        }
+        return rents, expiries
+
+    async def _property_backfill(self, tenants) -> Dict[ObjectId, Dict]:
+        """``meta.property`` for tenants that do not carry it yet."""
+        missing = [t for t in tenants if (t.get("meta") or {}).get("property") is None]
+        if not missing:
+            return {}
+
+        property_ids = list({str(t.get("property_id")) for t in missing})
+        properties = {
+            prop["_id"]: prop
+            async for prop in self.db.properties.find(
+                {"_id": {"$in": property_ids}},
+                {"name": 1, "location": 1, "type": 1}
+            )
+        }
+        unit_ids = list({str(unit_id) for t in missing for unit_id in t.get("units_id") or []})
+        unit_order = {}
+        if unit_ids:
+            async for unit in self.db.units.find({"_id": {"$in": unit_ids}}, {"unitName": 1, "unitNumber": 1}):
+                unit_order[unit["_id"]] = (len(unit_order), unit)
+
+        backfill = {}
+        for tenant in missing:
+            property_data = properties.get(str(tenant.get("property_id")))
+            if not property_data:
+                continue
+            entry = {
+                "name": property_data.get("name"),
+                "location": property_data.get("location"),
+                "type": property_data.get("type")
+            }
+            units = sorted(
+                (unit_order[str(unit_id)] for unit_id in set(tenant.get("units_id") or [])
+                 if str(unit_id) in unit_order),
+                key=lambda pair: pair[0]
+            )
+            if units:
+                entry["units"] = [
+                    {"unitName": unit.get("unitName"), "unitNumber": unit.get("unitNumber")}
+                    for _, unit in units
+                ]
+            backfill[tenant["_id"]] = entry
+        return backfill
+
+    @staticmethod
+    def _no_history_result(tenant: Dict) -> Dict:
+        return {
+            "tenant_id": str(tenant["_id"]),
+            "tenant_name": tenant.get("full_name"),
+            "risk_score": 0,
+            "risk_level": "LOW",
+            "message": "No payment history",
+            "risk_components": {},
+            "metrics": {
+                "tenant_name": tenant.get("full_name"),
+                "property": (tenant.get("meta") or {}).get("property")
+            }
+        }
+
+    @staticmethod
+    def _result(tenant: Dict, s: pd.Series, days_to_expiry: Optional[int], utility_summary: Dict) -> Dict:
+        total_invoices = int(s["total_invoices"])
+        on_time = int(s["on_time_payments"])
+        late = int(s["late_payments"])
+        risk_components = {
+            "late_payment_score": round(float(s["late_payment_score"]), 2),
+            "outstanding_score": round(float(s["outstanding_score"]), 2),
+            "consistency_score": round(float(s["consistency_score"]), 2),
+            "tenure_score": round(float(s["tenure_score"]), 2),
+            "avg_delay_score": round(float(s["avg_delay_score"]), 2),
+            "risk_score": round(float(s["risk_score"]), 2),
+        }
+        recommendations = generate_recommendations(**risk_components)
+        return {
+            "tenant_id": str(tenant["_id"]),
+            "tenant_name": tenant.get("full_name"),
+            "tenant_phone": tenant.get("phone"),
+            "risk_score": round(float(s["risk_score"]), 2),
+            "risk_level": str(s["risk_level"]),
+            "risk_components": risk_components | {
+                "risk_level": str(s["risk_level"]),
+                "payment_volatility_score": round(float(s["payment_volatility_score"]), 2),
+                "trend_score": round(float(s["trend_score"]), 2),
+                "early_payment_score": round(float(s["early_payment_score"]), 2)
+            },
+            "metrics": {
+                "tenant_name": tenant.get("full_name"),
+                "property": (tenant.get("meta") or {}).get("property"),
+                "total_invoices": total_invoices,
+                "late_payments": late,
+                "on_time_payments": on_time,
+                "late_payment_ratio": round(float(s["late_payment_score"]), 2),
+                "total_outstanding": round(float(s["total_outstanding"]), 2),
+                "outstanding_months": round(float(s["outstanding_months"]), 2),
+                "months_as_tenant": round(float(s["months_as_tenant"]), 1),
+                "collection_rate": round(float(s["collection_rate"]), 2),
+                "on_time_rate": round(float(s["on_time_rate"]), 2),
+                "total_invoice_paid": round(float(s["total_paid"]), 2),
+                "avg_delay_days": round(float(s["avg_delay"]), 2),
+                "on_time_ratio": round(float(s["on_time_ratio"]), 2),
+                "avg_early": round(float(s["avg_early"]), 2),
+                "avg_days_to_pay": round(float(s["avg_days_to_pay"]), 2),
+                "avg_create_to_issue": round(float(s["avg_create_to_issue"]), 2),
+                "days_to_lease_expiry": days_to_expiry,
+                "utility_summary": utility_summary,
+                "behavior_metrics": {
+                    "rent_payment_history": {
+                        "on_time": on_time,
+                        "late": late,
+                        "partial": 0,
+                        "total": total_invoices,
+                        "summary": f"On-time ({on_time}/{total_invoices}), Late ({late}/{total_invoices}), Partial (0/{total_invoices})"
+                    },
+                    "extra": {
+                        "maintenance_requests_count": 0,
+                        "lease_violations_count": 0,
+                        "move_out_notice_given": 0,
+                        "tenant_satisfaction_score": 0
+                    }
+                }
+            },
+            "recommendations": recommendations
+        }
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Request, Body
+from fastapi import APIRouter, HTTPException, Request, Body, Query, Response
+from fastapi.responses import StreamingResponse
 from core.database import get_database
 from plugins.ticketing.models import Ticket,Comment,TicketCreate
 from datetime import datetime,timezone
 from routes.auth import get_current_user,checker,Depends,SessionInfo
+from utils.pagination import NDJSON_MEDIA_TYPE, export_cursor, paginate, stream_ndjson
 
 router = APIRouter()
 
@@ -27,16 +29,41 @@ async def create_ticket(request:Request,ticket: TicketCreate,user:SessionInfo=De
 
 # --- List / Filter tickets ---
 @router.get("/", response_model=list[Ticket])
-async def list_tickets(request:Request,status: str | None = None, assigned_to: str | None = None):
+async def list_tickets(request:Request,response:Response,status: str | None = None, assigned_to: str | None = None,
+                       limit: int = Query(100, ge=1, le=500), cursor: str | None = None):
     tickets = request.app.state.adb["tickets"]
+    query = _ticket_query(status, assigned_to)
+    try:
+        result, next_cursor = await paginate(tickets, query, "created_at", -1, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return result
+
+
+# --- Export tickets as NDJSON ---
+@router.get("/export")
+async def export_tickets(request:Request,status: str | None = None, assigned_to: str | None = None, cursor: str | None = None,
+                         user:SessionInfo=Depends(get_current_user)):
+    tickets = request.app.state.adb["tickets"]
+    # these tickets carry no property: export the ones the user raised or is assigned
+    query = _ticket_query(status, assigned_to)
+    query["$or"] = [{"created_by": user.user_id}, {"assigned_to": user.user_id}]
+    try:
+        docs = export_cursor(tickets, query, "created_at", -1, cursor)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    return StreamingResponse(stream_ndjson(docs), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _ticket_query(status: str | None, assigned_to: str | None) -> dict:
     query = {}
     if status:
         query["status"] = status
     if assigned_to:
         query["assigned_to"] = assigned_to
-    result = await tickets.find(query).sort("created_at", -1).to_list(100)
-    
-    return result
+    return query
 
 
 # --- Get single ticket ---
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException,UploadFile,File, Form, Header,Request,Query,BackgroundTasks
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse, PlainTextResponse,RedirectResponse,FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse,RedirectResponse,FileResponse,StreamingResponse
 from bson import ObjectId
 from minio import Minio
 from datetime import timedelta,datetime,timezone
@@ -8,6 +8,7 @@ from botocore.exceptions import ClientError
 from botocore.config import Config
 from typing import Optional,List
 from minio.error import S3Error
+from pymongo import UpdateOne
 import uuid
 import os,time
 import tempfile
@@ -15,9 +16,12 @@ import boto3,math
 import logging
 import asyncio
 import secrets
+import hashlib
 from routes.auth import get_current_user,checker,Depends,SessionInfo
 import pytz
 from utils.media_tools import (BASE_TOOLS,MIME_TOOLS)
+from services.blob_store import BlobStore, CAS_ENABLED, blob_object_name
+from utils.pagination import NDJSON_MEDIA_TYPE, export_cursor, iter_ndjson, keyset_sort, page_of, paginate_sync
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 logger=logging.getLogger(__file__)
@@ -60,16 +64,17 @@ def report_usage_sync(request, ext_id: str, size: int, object_name: str, file):
     """Background task: upload to MinIO, then push Lago usage."""
 
     try:
-        # 1. Blocking MinIO upload
-        with open(file, "rb") as f:
-            result = minio_client.put_object(
-                BUCKET,
-                object_name,
-                f,                 # file-like object
-                length=-1,                 # unknown length → multipart
-                part_size=10 * 1024 * 1024 # 10 MB chunks
-            )
-            print(f"✅ Uploaded {object_name} to {BUCKET}, etag={result.etag}")
+        # 1. Blocking MinIO upload (skipped when the bytes are already stored)
+        if file:
+            with open(file, "rb") as f:
+                result = minio_client.put_object(
+                    BUCKET,
+                    object_name,
+                    f,                 # file-like object
+                    length=-1,                 # unknown length → multipart
+                    part_size=10 * 1024 * 1024 # 10 MB chunks
+                )
+                print(f"✅ Uploaded {object_name} to {BUCKET}, etag={result.etag}")
 
         # 2. Run async Lago calls inside sync func
         async def _report():
@@ -136,6 +141,9 @@ class PartReport(BaseModel):
     part_number: int
     etag: str
     size: int
+
+class PartReportBatch(BaseModel):
+    parts: List[PartReport]
 class MultipartInitRequest(BaseModel):
     batch_id:Optional[str]=None
     filename: str
@@ -154,6 +162,7 @@ class MultipartInitResponse(BaseModel):
     part_size: int
     parts: list
     upload_token: Optional[str]=None
+    deduplicated: bool = False
 
 
 class MultipartCompleteRequest(BaseModel):
@@ -274,10 +283,19 @@ async def upload_file(request:Request,file: UploadFile = File(...),
         # )
         
         
-        tmp = tempfile.NamedTemporaryFile(delete=False)
         contents = await file.read()
-        tmp.write(contents)
-        tmp.close()
+        blob = None
+        if CAS_ENABLED:
+            sha256 = (await asyncio.to_thread(hashlib.sha256, contents)).hexdigest()
+            blob = BlobStore(request.app.state.db, minio_client).acquire(sha256, len(contents))
+            object_name = blob["object_name"] if blob else blob_object_name(sha256, file_id)
+
+        tmp_path = None
+        if not blob:
+            tmp = tempfile.NamedTemporaryFile(delete=False)
+            tmp.write(contents)
+            tmp.close()
+            tmp_path = tmp.name
         
         size_mb = size_bytes / (1024 ** 2)
         elapsed = time.time() - start_minio
@@ -292,12 +310,12 @@ async def upload_file(request:Request,file: UploadFile = File(...),
             ext_id,
             size,
             object_name,
-            tmp.name
+            tmp_path
         )
         elapsed = time.time() - start_usage
         print(f"Took {elapsed:.2f} seconds to upload {size_mb:.2f} MB to report usage in bg")
         
-        request.app.state.metrics.files_uploaded_total.labels(method="simple_upload", status="uploaded").inc()
+        request.app.state.metrics.files_uploaded_total.labels(method="simple_upload", status="deduplicated" if blob else "uploaded").inc()
         request.app.state.metrics.ingress_bytes_total.inc(size)
         
         # Generate a download URL
@@ -324,12 +342,16 @@ async def upload_file(request:Request,file: UploadFile = File(...),
             "ip_address": request.client.host,
             "user_agent": user_agent,
             "download_url": download_url,
-            "tmp_path":tmp.name,
+            "tmp_path":tmp_path,
             "session_id": secrets.token_urlsafe(8),
             "meta":{
                 "mime_type":file.content_type or "application/octet-stream"
             }
         }
+        if blob:
+            # Same bytes already stored and validated: nothing left to process
+            file_entry.update({"blob_id": blob["_id"], "safe_status": "stored",
+                               "status": "valid", "sha256": blob["_id"]})
         
 #         # Store in database
         request.app.state.db.files.insert_one(file_entry)
@@ -369,7 +391,8 @@ async def upload_file(request:Request,file: UploadFile = File(...),
 async def list_files(
     request: Request,
     upload_token: str,
-    page: int = Query(1, ge=1)
+    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page")
 ):
     user_agent = request.headers.get("user-agent", "").lower()
 
@@ -379,19 +402,46 @@ async def list_files(
     else:
         per_page = 10
 
-    skip = (page - 1) * per_page
-    cursor = request.app.state.db.files.find({"user_token":upload_token}).sort("timestamp", -1).skip(skip).limit(per_page)
-    docs = list(cursor)
-    
+    files = request.app.state.db.files
+    query = {"user_token": upload_token}
+    if cursor or page == 1:
+        try:
+            docs, next_cursor = paginate_sync(files, query, "timestamp", -1, per_page, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        # deprecated offset paging, kept for old clients
+        skip = (page - 1) * per_page
+        docs = list(files.find(query).sort(keyset_sort("timestamp", -1)).skip(skip).limit(per_page + 1))
+        docs, next_cursor = page_of(docs, "timestamp", per_page)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+
     # Format output
     if "curl" in user_agent:
         boxes = [make_upload_box(doc['user_token'],doc['file_name'],doc['file_size'],f"http://localhost:8000/uploads/download/{doc['session_id']}",doc['expiry_date'],doc['downloads'],title="File Details") for doc in docs]
-        return PlainTextResponse("\n\n".join(boxes))
+        return PlainTextResponse("\n\n".join(boxes), headers=headers)
     else:
         # Clean Mongo ObjectId for JSON
         for d in docs:
             d["_id"] = str(d["_id"])
-        return JSONResponse(docs)
+        return JSONResponse(docs, headers=headers)
+
+@router.get("/media/list/{upload_token}/export")
+async def export_files(
+    request: Request,
+    upload_token: str,
+    cursor: Optional[str] = Query(None, description="Resume after this X-Next-Cursor")
+):
+    """Every file of an upload token as NDJSON, newest first."""
+    try:
+        docs = export_cursor(request.app.state.db.files, {"user_token": upload_token}, "timestamp", -1, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        iter_ndjson(docs),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={upload_token}.ndjson"},
+    )
 
 @router.get("/download/{token}")
 async def download_file(token: str, request: Request, tz: str = "UTC",user:SessionInfo=Depends(get_current_user)):
@@ -402,6 +452,8 @@ async def download_file(token: str, request: Request, tz: str = "UTC",user:Sessi
         file_entry = request.app.state.db.files.find_one({"session_id": token})
         if not file_entry:
             raise HTTPException(status_code=404, detail="File not found")
+        if file_entry.get("safe_status") == "expired":
+            raise HTTPException(status_code=410, detail="File has expired")
 
         # prepare download metadata
         ip = request.state.geo_id
@@ -436,7 +488,18 @@ async def download_file(token: str, request: Request, tz: str = "UTC",user:Sessi
         )
         
         try:
-            if is_file_ready(minio_client,BUCKET, file_entry["object_name"]):
+            # safe_status leaves "pending" once MinIO reports the object as
+            # created (services/bucket_events.py). Only files still pending,
+            # including every upload from before notifications, are probed,
+            # and a hit settles them so the next download skips the probe
+            ready = file_entry.get("safe_status", "pending") != "pending"
+            if not ready and is_file_ready(minio_client, BUCKET, file_entry["object_name"]):
+                request.app.state.db.files.update_one(
+                    {"_id": file_entry["_id"], "safe_status": {"$in": ["pending", None]}},
+                    {"$set": {"safe_status": "stored", "stored_at": datetime.now(timezone.utc)}}
+                )
+                ready = True
+            if ready:
                 request.app.state.metrics.files_downloaded_total.labels(source="minio", file_type=file_type,country=country).inc()
                 request.app.state.metrics.files_downloaded_bytes_total.labels(source="minio", file_type=file_type,country=country).inc(file_entry["file_size"])
                 
@@ -560,8 +623,52 @@ async def multipart_init(req: MultipartInitRequest,request:Request):
     file_id = str(uuid.uuid4())
 
     object_name = f"{file_id}_{sanitize_s3_key(req.filename)}"
-    s3_client = getS3()
     user_agent = request.headers.get("user-agent", "").lower()
+
+    # A client-supplied hash is only trusted against blobs this token already holds
+    claimed_sha256 = (req.meta or {}).get("sha256")
+    if CAS_ENABLED and claimed_sha256 and req.upload_token:
+        blob = BlobStore(request.app.state.db, minio_client).acquire(
+            claimed_sha256, req.total_size, user_token=req.upload_token
+        )
+        if blob:
+            created_at = datetime.now(timezone.utc)
+            request.app.state.db.files.insert_one({
+                "_id": _id,
+                "batch_id": req.batch_id,
+                "timestamp": created_at.isoformat(),
+                "file_name": req.filename,
+                "object_name": blob["object_name"],
+                "blob_id": blob["_id"],
+                "sha256": blob["_id"],
+                "user_token": req.upload_token,
+                "expiry_date": created_at + timedelta(days=31),
+                "downloads": 0,
+                "download_info": [],
+                "file_size": req.total_size,
+                "safe_status": "stored",
+                "status": "valid",
+                "ip_address": request.client.host,
+                "user_agent": user_agent,
+                "download_url": None,
+                "session_id": secrets.token_urlsafe(8),
+                "meta": {
+                    "mime_type": req.content_type or "application/octet-stream",
+                    "file_id": file_id,
+                }
+            })
+            request.app.state.metrics.files_uploaded_total.labels(method="multipart", status="deduplicated").inc()
+            return MultipartInitResponse(
+                filename=req.filename,
+                file_id=file_id,
+                upload_id="",
+                part_size=0,
+                parts=[],
+                upload_token=req.upload_token,
+                deduplicated=True
+            )
+
+    s3_client = getS3()
     try:
         # Start upload
         resp = s3_client.create_multipart_upload(
@@ -775,6 +882,41 @@ async def report_part(report: PartReport, request: Request):
     return {"status": "ok", "upload_id": report.upload_id}
 
 
+@router.post("/report-parts")
+async def report_parts(batch: PartReportBatch, request: Request):
+    """
+    Bulk variant of /report-part: one bulk_write for every upload in the batch.
+    Unknown upload ids are reported back instead of failing the whole batch.
+    """
+    files = request.app.state.db.files
+
+    by_upload = {}
+    for report in batch.parts:
+        by_upload.setdefault(report.upload_id, []).append(report.dict())
+
+    if not by_upload:
+        return {"status": "ok", "accepted": 0, "unknown_uploads": []}
+
+    known = set(files.distinct("meta.upload_id", {"meta.upload_id": {"$in": list(by_upload)}}))
+    ops = [
+        # $addToSet keeps client retries of the same batch idempotent
+        UpdateOne(
+            {"meta.upload_id": upload_id},
+            {"$addToSet": {"meta.completed_parts": {"$each": reports}}}
+        )
+        for upload_id, reports in by_upload.items()
+        if upload_id in known
+    ]
+    if ops:
+        files.bulk_write(ops, ordered=False)
+
+    return {
+        "status": "ok",
+        "accepted": sum(len(by_upload[u]) for u in known),
+        "unknown_uploads": [u for u in by_upload if u not in known]
+    }
+
+
 @router.get("/progress/{upload_id}")
 async def get_progress(upload_id: str, request: Request):
     db    = request.app.state.db
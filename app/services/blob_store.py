@@ -0,0 +1,112 @@
+"""
+Content-addressed blob storage (opt-in via ``CONTENT_ADDRESSED_STORAGE=true``).
+
+A blob is one stored object, identified by the SHA-256 of its bytes::
+
+    blobs: {_id: <sha256>, bucket, object_name, size, refcount,
+            created_at, updated_at}
+
+Per-user ``files`` documents keep their own metadata and point at a blob via
+``blob_id``; any number of files may share one object. ``refcount`` counts
+those files, and the object is deleted when the last one expires.
+
+Blob documents are only created from a server-side hash (the simple upload
+path, or ``validate_file`` once an object is in MinIO), so a client cannot
+attach itself to bytes it does not have by claiming a hash. A hash claimed at
+``multipart_init`` only short-circuits against blobs the same upload token
+already references.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+CAS_ENABLED = os.getenv("CONTENT_ADDRESSED_STORAGE", "false").lower() == "true"
+BLOB_PREFIX = "sha256"
+
+
+def blob_object_name(sha256: str, file_id: str) -> str:
+    """Object key for a new upload of ``sha256``.
+
+    The file id keeps concurrent first uploads of the same bytes (and an
+    upload racing the deletion of an expired copy) on distinct keys; the
+    blob document records which one is kept.
+    """
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}/{file_id}"
+
+
+class BlobStore:
+    """Reference-counted blobs over the sync ``blobs``/``files`` collections."""
+
+    def __init__(self, db, minio_client):
+        self.blobs = db.blobs
+        self.files = db.files
+        self.minio = minio_client
+
+    def acquire(self, sha256: str, size: int, user_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Take a reference on an existing blob, or return None if there is none.
+
+        With ``user_token`` the blob must already be referenced by that user
+        (used when the hash comes from the client rather than the server).
+        """
+        if user_token is not None and not self.files.find_one(
+            {"blob_id": sha256, "user_token": user_token, "safe_status": {"$ne": "expired"}},
+            {"_id": 1}
+        ):
+            return None
+        return self.blobs.find_one_and_update(
+            {"_id": sha256, "size": size, "deleting": {"$ne": True}},
+            {"$inc": {"refcount": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def adopt(self, file_query: Dict[str, Any], sha256: str, size: int,
+              bucket: str, object_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Register a freshly stored object under its hash and link the file to it.
+
+        If another object already holds these bytes the file is repointed to
+        it and the redundant copy is removed. Returns None (file left as a
+        plain object) if the existing blob is being deleted right now.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            blob = self.blobs.find_one_and_update(
+                {"_id": sha256, "deleting": {"$ne": True}},
+                {
+                    "$setOnInsert": {"bucket": bucket, "object_name": object_name, "size": size, "created_at": now},
+                    "$inc": {"refcount": 1},
+                    "$set": {"updated_at": now},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return None
+        self.files.update_one(file_query, {"$set": {"blob_id": sha256, "object_name": blob["object_name"]}})
+        if blob["object_name"] != object_name:
+            self.minio.remove_object(bucket, object_name)
+        return blob
+
+    def release(self, sha256: str) -> bool:
+        """Drop one reference; delete the object with the last one. Returns True if deleted."""
+        blob = self.blobs.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refcount": -1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not blob or blob["refcount"] > 0:
+            return False
+
+        # Fence off concurrent acquire/adopt before the object goes away
+        fenced = self.blobs.find_one_and_update(
+            {"_id": sha256, "refcount": {"$lte": 0}},
+            {"$set": {"deleting": True}}
+        )
+        if not fenced:
+            return False
+        self.minio.remove_object(blob["bucket"], blob["object_name"])
+        self.blobs.delete_one({"_id": sha256, "deleting": True})
+        return True
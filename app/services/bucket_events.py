@@ -0,0 +1,193 @@
+"""
+MinIO bucket notification ingestion.
+
+MinIO posts ``s3:ObjectCreated:*`` records to ``minio-worker``'s
+``/notifications`` webhook, which batches them into a single
+``ingest_bucket_events`` Dramatiq message. The worker side lands here:
+
+1. parse the raw webhook payloads into ``ObjectCreatedEvent`` records
+2. drop redeliveries with one Redis ``SET NX`` per (bucket, key, etag)
+3. resolve the matching ``files`` documents with one ``$in`` query
+4. enqueue ``validate_file`` (and ``transcribe_audio`` for audio)
+5. flip ``safe_status`` pending -> stored with one ``bulk_write``
+
+If anything after step 2 raises, the batch's claims are released so the
+Dramatiq retry processes its events instead of dropping them as duplicates.
+Files uploaded before notifications were wired up stay ``pending``;
+``download_file`` settles them on first download with a ``stat_object``
+probe, and ``bucket_events_harness.py backfill`` settles them in bulk.
+
+Collaborators are injected so the same code runs against the real
+Mongo/Redis/Dramatiq stack and against the offline harness.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import unquote_plus
+
+from pymongo import UpdateOne
+
+OBJECT_CREATED_PREFIX = "s3:ObjectCreated:"
+DEDUP_KEY = "minio:event:{bucket}/{key}:{version}"
+DEDUP_TTL_SECONDS = 24 * 3600
+
+# safe_status lifecycle: "pending" until the object lands in MinIO
+SAFE_STATUS_PENDING = "pending"
+SAFE_STATUS_STORED = "stored"
+
+
+@dataclass
+class ObjectCreatedEvent:
+    bucket: str
+    key: str
+    size: int
+    etag: Optional[str]
+    sequencer: Optional[str]
+    content_type: Optional[str]
+    event_name: str
+    event_time: Optional[str] = None
+
+    @property
+    def dedup_key(self) -> str:
+        version = self.etag or self.sequencer or "none"
+        return DEDUP_KEY.format(bucket=self.bucket, key=self.key, version=version)
+
+
+def parse_notification(payload: Dict[str, Any]) -> List[ObjectCreatedEvent]:
+    """Extract ObjectCreated records from one MinIO webhook payload."""
+    events = []
+    for record in payload.get("Records") or []:
+        event_name = record.get("eventName", "")
+        if not event_name.startswith(OBJECT_CREATED_PREFIX):
+            continue
+        s3 = record.get("s3", {})
+        obj = s3.get("object", {})
+        key = obj.get("key")
+        bucket = s3.get("bucket", {}).get("name")
+        if not key or not bucket:
+            continue
+        events.append(ObjectCreatedEvent(
+            bucket=bucket,
+            # Keys arrive URL-encoded in the webhook body
+            key=unquote_plus(key),
+            size=int(obj.get("size") or 0),
+            etag=(obj.get("eTag") or "").strip('"') or None,
+            sequencer=obj.get("sequencer"),
+            content_type=obj.get("contentType"),
+            event_name=event_name,
+            event_time=record.get("eventTime"),
+        ))
+    return events
+
+
+def parse_notifications(payloads: Iterable[Dict[str, Any]]) -> List[ObjectCreatedEvent]:
+    events = []
+    for payload in payloads:
+        events.extend(parse_notification(payload))
+    return events
+
+
+class BucketEventIngestor:
+    """Turns ObjectCreated events into file status updates and Dramatiq messages."""
+
+    def __init__(self, files_collection, redis_client,
+                 enqueue_validate: Callable[[str, str, str], Any],
+                 enqueue_transcribe: Optional[Callable[[str, str, str], Any]] = None,
+                 dedup_ttl: int = DEDUP_TTL_SECONDS):
+        self.files = files_collection
+        self.redis = redis_client
+        self.enqueue_validate = enqueue_validate
+        self.enqueue_transcribe = enqueue_transcribe
+        self.dedup_ttl = dedup_ttl
+
+    def _claim(self, events: List[ObjectCreatedEvent]) -> List[ObjectCreatedEvent]:
+        """Keep the first sighting of each (bucket, key, etag), across batches too."""
+        unique: Dict[str, ObjectCreatedEvent] = {}
+        for event in events:
+            unique.setdefault(event.dedup_key, event)
+        if not unique:
+            return []
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key in unique:
+            pipe.set(key, 1, nx=True, ex=self.dedup_ttl)
+        claimed = pipe.execute()
+        return [event for event, ok in zip(unique.values(), claimed) if ok]
+
+    def _release(self, events: List[ObjectCreatedEvent]) -> None:
+        """Forget claims for events that could not be matched yet, so a retry can."""
+        if events:
+            self.redis.delete(*[event.dedup_key for event in events])
+
+    def ingest(self, events: List[ObjectCreatedEvent]) -> Dict[str, Any]:
+        received = len(events)
+        events = self._claim(events)
+        try:
+            return self._ingest_claimed(events, received)
+        except Exception:
+            # a retry must see these events again rather than skip them as duplicates
+            self._release(events)
+            raise
+
+    def _ingest_claimed(self, events: List[ObjectCreatedEvent], received: int) -> Dict[str, Any]:
+        summary = {
+            "received": received,
+            "duplicates": received - len(events),
+            "stored": 0,
+            "validations_queued": 0,
+            "transcriptions_queued": 0,
+            "unknown_objects": [],
+        }
+        if not events:
+            return summary
+
+        by_name = {event.key: event for event in events}
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in self.files.find(
+            {"object_name": {"$in": list(by_name)}},
+            {"_id": 1, "object_name": 1, "safe_status": 1, "meta.mime_type": 1}
+        ):
+            found.setdefault(doc["object_name"], []).append(doc)
+
+        unknown = [event for name, event in by_name.items() if name not in found]
+        self._release(unknown)
+        summary["unknown_objects"] = [f"{e.bucket}/{e.key}" for e in unknown]
+
+        # Deduplicated files can share an object; only the ones still waiting
+        # for it need the status flip and a validation pass
+        pending = [
+            (by_name[name], doc)
+            for name, docs in found.items() for doc in docs
+            if doc.get("safe_status", SAFE_STATUS_PENDING) == SAFE_STATUS_PENDING
+        ]
+
+        # Queue first: if the status flip then fails, the retry still finds
+        # the files pending; validating a file twice is harmless
+        for event, doc in pending:
+            file_id = str(doc["_id"])
+            self.enqueue_validate(event.bucket, event.key, file_id)
+            summary["validations_queued"] += 1
+
+            mime = doc.get("meta", {}).get("mime_type") or event.content_type or ""
+            if self.enqueue_transcribe and mime.startswith("audio/"):
+                self.enqueue_transcribe(event.bucket, event.key, file_id)
+                summary["transcriptions_queued"] += 1
+
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne(
+                {"_id": doc["_id"], "safe_status": {"$in": [SAFE_STATUS_PENDING, None]}},
+                {"$set": {
+                    "safe_status": SAFE_STATUS_STORED,
+                    "stored_at": now,
+                    "meta.etag": event.etag,
+                    "meta.stored_size": event.size,
+                }}
+            )
+            for event, doc in pending
+        ]
+        if operations:
+            result = self.files.bulk_write(operations, ordered=False)
+            summary["stored"] = result.modified_count
+
+        return summary
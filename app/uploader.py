@@ -13,7 +13,6 @@ A production-ready multipart file upload client with:
 
 import os
 import sys
-import math
 import time
 import random
 import hashlib
@@ -24,6 +23,7 @@ import argparse
 import json
 import threading
 import socket
+import queue
 from pathlib import Path
 from dataclasses import dataclass, field, asdict
 from typing import Dict, List, Optional, Tuple, Any, Callable, Iterator
@@ -133,8 +133,11 @@ class OptimizedUploadConfig:
     
     # Features
     verify_checksums: bool = False
+    content_addressed: bool = False    # send SHA-256 so the server can skip re-uploads
     progress_tracking: bool = True
     progress_interval: int = 5
+    report_batch_size: int = 200       # part completions per /report-parts call
+    report_flush_interval: float = 1.0  # max seconds a completion waits to be sent
     debug: bool = False
     generate_manifest: bool = True
     
@@ -164,6 +167,43 @@ class OptimizedUploadConfig:
             raise ValueError("timeout must be at least 60 seconds")
 
 
+def build_auth_headers(auth_config: AuthConfig) -> Dict[str, str]:
+    """Generate authentication headers for an auth config (shared by all engines)."""
+    headers = {}
+    
+    if auth_config.auth_type == "bearer" and auth_config.token:
+        headers['Authorization'] = f'Bearer {auth_config.token}'
+    
+    elif auth_config.auth_type == "token" and auth_config.token:
+        if auth_config.header_name:
+            headers[auth_config.header_name] = auth_config.token
+        else:
+            headers['Authorization'] = f'Token {auth_config.token}'
+    
+    elif auth_config.auth_type == "api_key" and auth_config.api_key:
+        if auth_config.header_name:
+            headers[auth_config.header_name] = auth_config.api_key
+        else:
+            headers['X-API-Key'] = auth_config.api_key
+    
+    return headers
+
+
+def build_auth_params(auth_config: AuthConfig, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Add URL-based authentication parameters if the auth config needs them."""
+    if params is None:
+        params = {}
+    
+    if (auth_config.auth_type in ["token", "api_key"] and 
+        auth_config.param_name and 
+        (auth_config.token or auth_config.api_key)):
+        
+        auth_value = auth_config.token or auth_config.api_key
+        params[auth_config.param_name] = auth_value
+    
+    return params
+
+
 class OptimizedHTTPAdapter(HTTPAdapter):
     """Custom HTTP adapter with performance optimizations and platform compatibility."""
     
@@ -304,38 +344,11 @@ class SessionManager:
     
     def _get_auth_headers(self) -> Dict[str, str]:
         """Generate authentication headers based on config."""
-        headers = {}
-        
-        if self.auth_config.auth_type == "bearer" and self.auth_config.token:
-            headers['Authorization'] = f'Bearer {self.auth_config.token}'
-        
-        elif self.auth_config.auth_type == "token" and self.auth_config.token:
-            if self.auth_config.header_name:
-                headers[self.auth_config.header_name] = self.auth_config.token
-            else:
-                headers['Authorization'] = f'Token {self.auth_config.token}'
-        
-        elif self.auth_config.auth_type == "api_key" and self.auth_config.api_key:
-            if self.auth_config.header_name:
-                headers[self.auth_config.header_name] = self.auth_config.api_key
-            else:
-                headers['X-API-Key'] = self.auth_config.api_key
-        
-        return headers
+        return build_auth_headers(self.auth_config)
     
     def _add_auth_params(self, url: str, params: Dict[str, Any] = None) -> Tuple[str, Dict[str, Any]]:
         """Add authentication parameters to URL if needed."""
-        if params is None:
-            params = {}
-        
-        if (self.auth_config.auth_type in ["token", "api_key"] and 
-            self.auth_config.param_name and 
-            (self.auth_config.token or self.auth_config.api_key)):
-            
-            auth_value = self.auth_config.token or self.auth_config.api_key
-            params[self.auth_config.param_name] = auth_value
-        
-        return url, params
+        return url, build_auth_params(self.auth_config, params)
     
     def request(self, method: str, url: str, **kwargs) -> requests.Response:
         """Make request with session management, authentication, and statistics tracking."""
@@ -454,6 +467,7 @@ class EnhancedFileInfo:
     total_size: int
     content_type: str = "application/octet-stream"
     checksum: Optional[str] = None
+    sha256: Optional[str] = None
     relative_path: Optional[str] = None
     manifest_entry: Optional[FileManifestEntry] = None
     
@@ -473,6 +487,20 @@ class UploadSession:
     part_size: int
     parts: List[Dict[str, Any]]
     upload_token: Optional[str] = None
+    deduplicated: bool = False
+    
+    @classmethod
+    def from_response(cls, data: Dict[str, Any]) -> "UploadSession":
+        """Build a session from a ``/multipart/init`` response body."""
+        return cls(
+            filename=data["filename"],
+            file_id=data["file_id"],
+            upload_id=data["upload_id"],
+            part_size=data["part_size"],
+            parts=data["parts"],
+            upload_token=data.get("upload_token"),
+            deduplicated=data.get("deduplicated", False)
+        )
     
     @property
     def parts_map(self) -> Dict[int, str]:
@@ -644,6 +672,121 @@ class ProgressTracker:
                     logger.warning(f"Progress callback failed: {e}")
 
 
+class PartCompletionReporter:
+    """Coalesces part-completion reports and sends them in batches.
+    
+    Part upload threads only enqueue; a single background thread groups up to
+    ``batch_size`` reports (or whatever arrived within ``flush_interval``) and
+    hands them to ``send_batch``. Reporting is best-effort progress data, so a
+    failed batch is logged and dropped rather than failing the upload.
+    """
+    
+    def __init__(self, send_batch: Callable[[List[Dict[str, Any]]], None],
+                 batch_size: int = 200, flush_interval: float = 1.0):
+        self.send_batch = send_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.stop_event = Event()
+        self.flush_event = Event()
+        self.worker = None
+        self.lock = Lock()
+        self.stats = {'parts_reported': 0, 'batches_sent': 0, 'batches_failed': 0}
+    
+    def start(self):
+        """Start the background sender (idempotent)."""
+        with self.lock:
+            if self.worker and self.worker.is_alive():
+                return
+            self.stop_event.clear()
+            self.worker = threading.Thread(target=self._run, name="part-reporter", daemon=True)
+            self.worker.start()
+    
+    def submit(self, upload_id: str, part_number: int, etag: str, size: int):
+        """Queue a completed part; never blocks the caller."""
+        self.start()
+        self.queue.put_nowait({
+            "upload_id": upload_id,
+            "part_number": part_number,
+            "etag": etag,
+            "size": size
+        })
+    
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Send everything queued so far; returns False if ``timeout`` expired first."""
+        if not self.worker:
+            return True
+        
+        self.flush_event.set()
+        deadline = time.monotonic() + timeout
+        try:
+            with self.queue.all_tasks_done:
+                while self.queue.unfinished_tasks:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.queue.all_tasks_done.wait(remaining)
+            return True
+        finally:
+            self.flush_event.clear()
+    
+    def close(self, timeout: float = 30.0):
+        """Flush pending reports and stop the background sender."""
+        if not self.worker:
+            return
+        
+        if not self.flush(timeout):
+            logger.warning(f"Dropping {self.queue.unfinished_tasks} unsent part reports")
+        self.stop_event.set()
+        self.worker.join(timeout=2)
+        self.worker = None
+    
+    def get_stats(self) -> Dict[str, int]:
+        return self.stats.copy()
+    
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Block for the first report, then coalesce whatever follows."""
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.flush_event.is_set():
+                break
+            try:
+                batch.append(self.queue.get(timeout=min(remaining, 0.05)))
+            except queue.Empty:
+                continue
+        
+        return batch
+    
+    def _run(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            
+            try:
+                self.send_batch(batch)
+                self.stats['batches_sent'] += 1
+                self.stats['parts_reported'] += len(batch)
+            except Exception as e:
+                self.stats['batches_failed'] += 1
+                logger.warning(f"Failed to report {len(batch)} parts: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
 class ManifestGenerator:
     """Generate directory structure manifests."""
     
@@ -707,28 +850,12 @@ class ManifestGenerator:
         return md5_hash.hexdigest()
 
 
-class EnhancedMultipartUploader:
-    """Enhanced multipart file uploader with optimized HTTP session management."""
+class UploadPlanner:
+    """Engine-independent planning helpers (concurrency, chunking, URL checks).
     
-    def __init__(self, config: OptimizedUploadConfig):
-        self.config = config
-        self.session_manager = SessionManager(config)
-        self.upload_lock = Lock()
-        self.progress_tracker = ProgressTracker(config)
-    
-    def __enter__(self):
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.session_manager.close()
-        self.progress_tracker.stop()
-        
-        # Print session statistics
-        if self.config.debug:
-            stats = self.session_manager.get_stats()
-            logger.info("=== SESSION STATISTICS ===")
-            for key, value in stats.items():
-                logger.info(f"{key}: {value}")
+    Shared by the thread-pool uploader and the asyncio engine so both make the
+    same decisions for the same file; subclasses only need ``self.config``.
+    """
     
     def calculate_optimal_workers(self, file_size: int, total_parts: int) -> int:
         """Calculate optimal number of workers based on file characteristics."""
@@ -760,6 +887,153 @@ class EnhancedMultipartUploader:
         else:
             return self.config.min_chunk_size  # 5MB minimum
     
+    def generate_test_files(self, folder: str = "test_files", num_files: int = 3):
+        """Generate test files for upload testing."""
+        folder_path = Path(folder)
+        folder_path.mkdir(exist_ok=True)
+        
+        sizes_mb = [1, 5, 10, 20, 50]
+        for i in range(num_files):
+            size_mb = random.choice(sizes_mb)
+            size_bytes = size_mb * 1024 * 1024
+            file_path = folder_path / f"test_file_{i+1}_{size_mb}MB.bin"
+            
+            logger.info(f"Creating {file_path} ({size_mb} MB)...")
+            
+            with open(file_path, "wb") as f:
+                remaining = size_bytes
+                while remaining > 0:
+                    chunk_size = min(self.config.default_chunk_size, remaining)
+                    f.write(os.urandom(chunk_size))
+                    remaining -= chunk_size
+        
+        logger.info(f"Generated {num_files} test files in {folder}")
+    
+    def calculate_checksum(self, file_path: Path) -> Optional[str]:
+        """Calculate MD5 checksum of file."""
+        if not self.config.verify_checksums:
+            return None
+        
+        logger.debug(f"Calculating checksum for {file_path}")
+        return ManifestGenerator._calculate_checksum(file_path)
+    
+    def calculate_sha256(self, file_path: Path) -> Optional[str]:
+        """Calculate the SHA-256 content address of a file."""
+        if not self.config.content_addressed:
+            return None
+        
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    
+    def build_init_payload(self, file_info: EnhancedFileInfo, session_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the ``/multipart/init`` request body for a file."""
+        # Use adaptive chunk size
+        optimal_chunk_size = self.calculate_optimal_chunk_size(file_info.total_size)
+        
+        payload = {
+            "filename": file_info.filename,
+            "total_size": file_info.total_size,
+            "content_type": file_info.content_type,
+            "tos_accept": True,
+            "upload_token": "enhanced-client-v4",
+            "meta": {
+                "client_version": self.config.user_agent,
+                "adaptive_chunk_size": optimal_chunk_size,
+                "session_stats": session_stats
+            }
+        }
+        
+        if file_info.checksum:
+            payload["meta"]["checksum"] = file_info.checksum
+        if file_info.sha256:
+            payload["meta"]["sha256"] = file_info.sha256
+        if file_info.relative_path:
+            payload["meta"]["relative_path"] = file_info.relative_path
+        
+        return payload
+    
+    def part_layout(self, session: UploadSession, total_size: int) -> List[Tuple[int, int, int, str]]:
+        """Return ``(part_number, offset, size, url)`` tuples, largest offsets first."""
+        # Dynamic load balancing - prioritize larger parts first
+        parts_by_size = sorted(session.parts, 
+                              key=lambda p: -((p["part_number"] - 1) * session.part_size))
+        layout = []
+        for part_info in parts_by_size:
+            part_number = part_info["part_number"]
+            offset = (part_number - 1) * session.part_size
+            size = min(session.part_size, total_size - offset)
+            layout.append((part_number, offset, size, part_info["url"]))
+        return layout
+    
+    def _validate_presigned_urls(self, session: UploadSession):
+        """Validate presigned URLs for expiration and correctness."""
+        current_time = int(time.time())
+        min_expires = None
+        
+        for part in session.parts:
+            try:
+                parsed = urlparse(part["url"])
+                query_params = parse_qs(parsed.query)
+                
+                # Check required parameters
+                required = ['uploadId', 'partNumber', 'AWSAccessKeyId', 'Signature']
+                missing = [p for p in required if p not in query_params]
+                if missing:
+                    raise ValueError(f"Part {part['part_number']} missing URL params: {missing}")
+                
+                # Check expiration
+                if 'Expires' in query_params:
+                    expires = int(query_params['Expires'][0])
+                    if min_expires is None or expires < min_expires:
+                        min_expires = expires
+                        
+                    if current_time >= expires:
+                        raise ValueError(f"Part {part['part_number']} URL expired")
+                
+            except Exception as e:
+                logger.error(f"URL validation failed for part {part['part_number']}: {e}")
+                raise
+        
+        if min_expires:
+            time_left = min_expires - current_time
+            logger.info(f"URLs expire in {time_left} seconds")
+            if time_left < 300:  # 5 minutes
+                logger.warning("URLs expire soon - upload may fail!")
+
+
+class EnhancedMultipartUploader(UploadPlanner):
+    """Enhanced multipart file uploader with optimized HTTP session management."""
+    
+    def __init__(self, config: OptimizedUploadConfig):
+        self.config = config
+        self.session_manager = SessionManager(config)
+        self.upload_lock = Lock()
+        self.progress_tracker = ProgressTracker(config)
+        self.part_reporter = PartCompletionReporter(
+            self._send_part_reports,
+            batch_size=config.report_batch_size,
+            flush_interval=config.report_flush_interval
+        )
+        self._bulk_reporting = True
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.part_reporter.close()
+        self.session_manager.close()
+        self.progress_tracker.stop()
+        
+        # Print session statistics
+        if self.config.debug:
+            stats = self.session_manager.get_stats()
+            logger.info("=== SESSION STATISTICS ===")
+            for key, value in stats.items():
+                logger.info(f"{key}: {value}")
+    
     def _log_request(self, method: str, url: str, **kwargs):
         """Log request details for debugging."""
         if not self.config.debug:
@@ -832,220 +1106,18 @@ class EnhancedMultipartUploader:
         
         raise last_exception
     
-    def generate_test_files(self, folder: str = "test_files", num_files: int = 3):
-        """Generate test files for upload testing."""
-        folder_path = Path(folder)
-        folder_path.mkdir(exist_ok=True)
-        
-        sizes_mb = [1, 5, 10, 20, 50]
-        for i in range(num_files):
-            size_mb = random.choice(sizes_mb)
-            size_bytes = size_mb * 1024 * 1024
-            file_path = folder_path / f"test_file_{i+1}_{size_mb}MB.bin"
-            
-            logger.info(f"Creating {file_path} ({size_mb} MB)...")
-            
-            with open(file_path, "wb") as f:
-                remaining = size_bytes
-                while remaining > 0:
-                    chunk_size = min(self.config.default_chunk_size, remaining)
-                    f.write(os.urandom(chunk_size))
-                    remaining -= chunk_size
-        
-        logger.info(f"Generated {num_files} test files in {folder}")
-    
-    def calculate_checksum(self, file_path: Path) -> Optional[str]:
-        """Calculate MD5 checksum of file."""
-        if not self.config.verify_checksums:
-            return None
-        
-        logger.debug(f"Calculating checksum for {file_path}")
-        return ManifestGenerator._calculate_checksum(file_path)
-    
     def init_upload(self, file_info: EnhancedFileInfo) -> UploadSession:
         """Initialize multipart upload for a single file."""
         logger.info(f"Initializing upload: {file_info.filename} ({file_info.total_size:,} bytes)")
         
-        # Use adaptive chunk size
-        optimal_chunk_size = self.calculate_optimal_chunk_size(file_info.total_size)
-        
-        payload = {
-            "filename": file_info.filename,
-            "total_size": file_info.total_size,
-            "content_type": file_info.content_type,
-            "tos_accept": True,
-            "upload_token": "enhanced-client-v4",
-            "meta": {
-                "client_version": self.config.user_agent,
-                "adaptive_chunk_size": optimal_chunk_size,
-                "session_stats": self.session_manager.get_stats()
-            }
-        }
-        
-        if file_info.checksum:
-            payload["meta"]["checksum"] = file_info.checksum
-        if file_info.relative_path:
-            payload["meta"]["relative_path"] = file_info.relative_path
+        payload = self.build_init_payload(file_info, self.session_manager.get_stats())
         
         response = self._make_request("POST", f"{self.config.api_base}/multipart/init", json=payload)
         data = response.json()
         
-        session = UploadSession(
-            filename=data["filename"],
-            file_id=data["file_id"],
-            upload_id=data["upload_id"],
-            part_size=data["part_size"],
-            parts=data["parts"],
-            upload_token=data.get("upload_token")
-        )
+        session = UploadSession.from_response(data)
         
-        logger.info(f"Upload config: {args.workers} workers, {args.timeout}s timeout, "
-               f"streaming threshold: {format_bytes(streaming_threshold)}")
-    
-    try:
-        with EnhancedMultipartUploader(config) as uploader:
-            
-            # Test connection
-            if args.test_connection:
-                logger.info("Testing API connection...")
-                try:
-                    response = uploader._make_request("GET", f"{config.api_base}/../health")
-                    logger.info("API connection successful")
-                    return
-                except Exception as e:
-                    logger.error(f"API connection failed: {e}")
-                    sys.exit(1)
-            
-            # Generate test files
-            if args.generate_test_files:
-                uploader.generate_test_files(num_files=args.generate_test_files)
-                return
-            
-            # Validate path argument
-            if not args.path:
-                parser.error("path is required unless using --generate-test-files or --test-connection")
-            
-            # Setup progress callback
-            tqdm = create_progress_bar()
-            progress_bar = None
-            
-            if tqdm and not args.quiet:
-                def progress_callback(stats: UploadStats):
-                    if progress_bar:
-                        progress_bar.set_description(
-                            f"Files: {stats.completed_files}/{stats.total_files}"
-                        )
-                        progress_bar.set_postfix(
-                            speed=stats.format_speed(),
-                            refresh=False
-                        )
-                        progress_bar.n = stats.uploaded_bytes
-                        progress_bar.refresh()
-                
-                uploader.progress_tracker.add_callback(progress_callback)
-            
-            # Start upload
-            start_time = time.time()
-            
-            try:
-                logger.info(f"Starting upload of: {args.path}")
-                
-                # Perform upload - progress tracking is handled in upload_path
-                results = uploader.upload_path(args.path, use_batch=args.batch)
-                
-                # Close progress bar
-                if progress_bar:
-                    progress_bar.close()
-                    progress_bar = None
-                
-                # Print summary
-                if not args.quiet:
-                    print_upload_summary(uploader.progress_tracker.stats)
-                
-                logger.info(f"Upload completed! {len(results)} files processed")
-                
-                # Print session statistics
-                if args.debug:
-                    session_stats = uploader.session_manager.get_stats()
-                    logger.info("=== SESSION STATISTICS ===")
-                    logger.info(f"Total requests: {session_stats['requests_made']}")
-                    logger.info(f"Connection reuses: {session_stats['connection_reuses']}")
-                    logger.info(f"Connection errors: {session_stats['connection_errors']}")
-                    logger.info(f"Session recreations: {session_stats['session_recreations']}")
-                    logger.info(f"Total bytes uploaded: {format_bytes(session_stats['total_bytes_uploaded'])}")
-                    logger.info(f"Authentication type: {session_stats['auth_type']}")
-                    
-                    if session_stats['requests_made'] > 0:
-                        reuse_ratio = session_stats['connection_reuses'] / session_stats['requests_made'] * 100
-                        logger.info(f"Connection reuse ratio: {reuse_ratio:.1f}%")
-                
-                # Save results to file
-                results_file = f"upload_results_{int(time.time())}.json"
-                with open(results_file, "w") as f:
-                    json.dump({
-                        "timestamp": datetime.now().isoformat(),
-                        "config": {
-                            "api_base": config.api_base,
-                            "workers": config.max_workers,
-                            "batch_mode": args.batch,
-                            "checksums": config.verify_checksums,
-                            "streaming_threshold": config.streaming_threshold,
-                            "adaptive_workers": config.adaptive_workers,
-                            "manifest_enabled": config.generate_manifest,
-                            "authentication": {
-                                "type": config.auth_config.auth_type,
-                                "has_token": bool(config.auth_config.token),
-                                "has_api_key": bool(config.auth_config.api_key)
-                            },
-                            "session_config": {
-                                "pool_connections": config.session_config.pool_connections,
-                                "pool_maxsize": config.session_config.pool_maxsize,
-                                "keep_alive_timeout": config.session_config.keep_alive_timeout
-                            }
-                        },
-                        "stats": {
-                            "total_files": len(results),
-                            "total_time": time.time() - start_time,
-                            "average_speed": uploader.progress_tracker.stats.format_speed()
-                        },
-                        "session_stats": uploader.session_manager.get_stats(),
-                        "results": results
-                    }, f, indent=2, default=str)
-                
-                logger.info(f"Results saved to {results_file}")
-                
-            except Exception as e:
-                if progress_bar:
-                    progress_bar.close()
-                raise
-    
-    except KeyboardInterrupt:
-        logger.info("Upload cancelled by user")
-        sys.exit(130)
-    
-    except FileNotFoundError as e:
-        logger.error(f"File not found: {e}")
-        sys.exit(2)
-    
-    except PermissionError as e:
-        logger.error(f"Permission denied: {e}")
-        sys.exit(13)
-    
-    except requests.exceptions.ConnectionError:
-        logger.error(f"Failed to connect to API at {config.api_base}")
-        logger.error("Please check that the server is running and accessible")
-        sys.exit(3)
-    
-    except Exception as e:
-        logger.error(f"Upload failed: {e}")
-        if args.debug:
-            import traceback
-            logger.error(f"Traceback:\n{traceback.format_exc()}")
-        sys.exit(1)
-
-
-if __name__ == "__main__":
-    main()d initialized: {session.total_parts} parts of {session.part_size:,} bytes each")
+        logger.info(f"Upload initialized: {session.total_parts} parts of {session.part_size:,} bytes each")
         
         # Validate URLs aren't expired
         self._validate_presigned_urls(session)
@@ -1070,14 +1142,7 @@ if __name__ == "__main__":
         
         sessions = {}
         for session_data in data["sessions"]:
-            session = UploadSession(
-                filename=session_data["filename"],
-                file_id=session_data["file_id"],
-                upload_id=session_data["upload_id"],
-                part_size=session_data["part_size"],
-                parts=session_data["parts"],
-                upload_token=session_data.get("upload_token")
-            )
+            session = UploadSession.from_response(session_data)
             sessions[session.filename] = session
         
         logger.info(f"Batch upload initialized for {len(sessions)} files")
@@ -1098,41 +1163,6 @@ if __name__ == "__main__":
             self.progress_tracker.stats.failed_files = 0
             self.progress_tracker._bytes_updates = []
     
-    def _validate_presigned_urls(self, session: UploadSession):
-        """Validate presigned URLs for expiration and correctness."""
-        current_time = int(time.time())
-        min_expires = None
-        
-        for part in session.parts:
-            try:
-                parsed = urlparse(part["url"])
-                query_params = parse_qs(parsed.query)
-                
-                # Check required parameters
-                required = ['uploadId', 'partNumber', 'AWSAccessKeyId', 'Signature']
-                missing = [p for p in required if p not in query_params]
-                if missing:
-                    raise ValueError(f"Part {part['part_number']} missing URL params: {missing}")
-                
-                # Check expiration
-                if 'Expires' in query_params:
-                    expires = int(query_params['Expires'][0])
-                    if min_expires is None or expires < min_expires:
-                        min_expires = expires
-                        
-                    if current_time >= expires:
-                        raise ValueError(f"Part {part['part_number']} URL expired")
-                
-            except Exception as e:
-                logger.error(f"URL validation failed for part {part['part_number']}: {e}")
-                raise
-        
-        if min_expires:
-            time_left = min_expires - current_time
-            logger.info(f"URLs expire in {time_left} seconds")
-            if time_left < 300:  # 5 minutes
-                logger.warning("URLs expire soon - upload may fail!")
-    
     def upload_part_streaming(self, file_path: Path, part_number: int, offset: int, 
                              size: int, upload_url: str, session: UploadSession) -> Tuple[int, str]:
         """Upload a single part using optimized session management."""
@@ -1238,12 +1268,37 @@ if __name__ == "__main__":
                 "size": size
             }
             
-            response = self._make_request("POST", f"{self.config.api_base}/report-part", json=payload)
+            self._make_request("POST", f"{self.config.api_base}/report-part", json=payload)
             logger.debug(f"Reported part {part_number} completion")
             
         except Exception as e:
             logger.warning(f"Failed to report part {part_number}: {e}")
     
+    def _send_part_reports(self, reports: List[Dict[str, Any]]):
+        """Send a batch of part completions via ``/report-parts``.
+        
+        Falls back to one ``/report-part`` call per part against servers that
+        predate the bulk endpoint.
+        """
+        if self._bulk_reporting:
+            try:
+                response = self._make_request("POST", f"{self.config.api_base}/report-parts",
+                                              json={"parts": reports})
+                unknown = response.json().get("unknown_uploads") or []
+                if unknown:
+                    logger.debug(f"Backend does not know uploads: {unknown}")
+                logger.debug(f"Reported {len(reports)} part completions")
+                return
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code not in (404, 405):
+                    raise
+                logger.info("Bulk part reporting unavailable, falling back to /report-part")
+                self._bulk_reporting = False
+        
+        for report in reports:
+            self._report_part_completion(report["upload_id"], report["part_number"],
+                                         report["etag"], report["size"])
+    
     def get_upload_progress(self, upload_id: str) -> Optional[Dict[str, Any]]:
         """Get upload progress from backend."""
         try:
@@ -1258,6 +1313,10 @@ if __name__ == "__main__":
         logger.info(f"Starting optimized upload: {file_path.name}")
         
         total_size = file_path.stat().st_size
+        if session.deduplicated:
+            logger.info(f"Server already has {file_path.name}, skipping transfer")
+            self.progress_tracker.update_bytes(total_size)
+            return {"file_id": session.file_id, "status": "deduplicated"}
         optimal_workers = self.calculate_optimal_workers(total_size, session.total_parts)
         
         logger.info(f"Using {optimal_workers} workers for {session.total_parts} parts")
@@ -1266,78 +1325,48 @@ if __name__ == "__main__":
         uploaded_parts = []
         failed_parts = []
         
-        # Dynamic load balancing - prioritize larger parts first
-        parts_by_size = sorted(session.parts, 
-                              key=lambda p: -((p["part_number"] - 1) * session.part_size))
-        
-        # Progress tracking thread
-        progress_thread = None
-        stop_progress = Event()
-        
-        def track_upload_progress():
-            """Background thread to track individual upload progress."""
-            while not stop_progress.wait(10):
-                progress_data = self.get_upload_progress(session.upload_id)
-                if progress_data:
-                    logger.info(f"Backend progress: {progress_data.get('progress', 0):.1f}% "
-                               f"({progress_data.get('parts_done', 0)}/{progress_data.get('parts_total', 0)} parts)")
-        
-        if self.config.progress_tracking and session.total_parts > 1:
-            progress_thread = threading.Thread(target=track_upload_progress, daemon=True)
-            progress_thread.start()
-        
-        try:
-            # Upload parts with controlled concurrency
-            with ThreadPoolExecutor(max_workers=optimal_workers) as executor:
-                futures = {}
-                
-                for part_info in parts_by_size:
-                    part_number = part_info["part_number"]
-                    offset = (part_number - 1) * session.part_size
-                    size = min(session.part_size, total_size - offset)
+        # Upload parts with controlled concurrency
+        with ThreadPoolExecutor(max_workers=optimal_workers) as executor:
+            futures = {}
+            
+            for part_number, offset, size, url in self.part_layout(session, total_size):
+                future = executor.submit(
+                    self.upload_part_streaming,
+                    file_path,
+                    part_number,
+                    offset,
+                    size,
+                    url,
+                    session
+                )
+                futures[future] = part_number
+            
+            # Collect results with progress updates
+            for future in as_completed(futures):
+                part_number = futures[future]
+                try:
+                    part_num, etag = future.result()
+                    uploaded_parts.append({
+                        "part_number": part_num,
+                        "etag": etag
+                    })
+                    logger.debug(f"Completed part {part_num}")
                     
-                    future = executor.submit(
-                        self.upload_part_streaming,
-                        file_path,
-                        part_number,
-                        offset,
-                        size,
-                        part_info["url"],
-                        session
-                    )
-                    futures[future] = part_number
-                
-                # Collect results with progress updates
-                for future in as_completed(futures):
-                    part_number = futures[future]
-                    try:
-                        part_num, etag = future.result()
-                        uploaded_parts.append({
-                            "part_number": part_num,
-                            "etag": etag
-                        })
-                        logger.debug(f"Completed part {part_num}")
-                        
-                        # Report to backend for progress tracking
-                        if self.config.progress_tracking:
-                            self._report_part_completion(session.upload_id, part_num, etag, 
-                                                       min(session.part_size, total_size - ((part_num - 1) * session.part_size)))
-                        
-                    except Exception as e:
-                        logger.error(f"Part {part_number} failed: {e}")
-                        failed_parts.append(part_number)
-                        
-                        # Cancel remaining on critical errors
-                        if "403" in str(e) or "expired" in str(e).lower():
-                            for f in futures:
-                                if not f.done():
-                                    f.cancel()
-                            break
-        
-        finally:
-            if progress_thread:
-                stop_progress.set()
-                progress_thread.join(timeout=2)
+                    # Queue for batched backend progress reporting (never blocks)
+                    if self.config.progress_tracking:
+                        self.part_reporter.submit(session.upload_id, part_num, etag, 
+                                                  min(session.part_size, total_size - ((part_num - 1) * session.part_size)))
+                    
+                except Exception as e:
+                    logger.error(f"Part {part_number} failed: {e}")
+                    failed_parts.append(part_number)
+                    
+                    # Cancel remaining on critical errors
+                    if "403" in str(e) or "expired" in str(e).lower():
+                        for f in futures:
+                            if not f.done():
+                                f.cancel()
+                        break
         
         # Check upload success
         if failed_parts:
@@ -1346,6 +1375,10 @@ if __name__ == "__main__":
         if len(uploaded_parts) != session.total_parts:
             raise Exception(f"Expected {session.total_parts} parts, got {len(uploaded_parts)}")
         
+        # Make sure the backend has every part report before completing
+        if self.config.progress_tracking:
+            self.part_reporter.flush()
+        
         # Complete the upload
         return self._complete_upload(session, uploaded_parts)
     
@@ -1391,7 +1424,8 @@ if __name__ == "__main__":
             filename=file_path.name,
             total_size=file_path.stat().st_size,
             content_type=mimetypes.guess_type(str(file_path))[0] or "application/octet-stream",
-            checksum=self.calculate_checksum(file_path)
+            checksum=self.calculate_checksum(file_path),
+            sha256=self.calculate_sha256(file_path)
         )
         
         # Initialize upload
@@ -1430,6 +1464,7 @@ if __name__ == "__main__":
                     filename=file_path.name,
                     total_size=file_size,
                     content_type=mimetypes.guess_type(str(file_path))[0] or "application/octet-stream",
+                    sha256=self.calculate_sha256(file_path),
                     relative_path=relative_path
                 )
                 
@@ -1549,7 +1584,7 @@ if __name__ == "__main__":
                 result = self.upload_single_file(path_obj)
                 self.progress_tracker.file_completed()
                 return [result]
-            except Exception as e:
+            except Exception:
                 self.progress_tracker.file_failed()
                 raise
             finally:
@@ -1631,8 +1666,21 @@ def print_upload_summary(stats: UploadStats):
     print("="*60)
 
 
-def main():
-    """Enhanced command line interface with comprehensive options."""
+def parse_size(size_str: str) -> int:
+    """Parse size string like '50MB' into bytes."""
+    size_str = size_str.upper()
+    if size_str.endswith('KB'):
+        return int(size_str[:-2]) * 1024
+    elif size_str.endswith('MB'):
+        return int(size_str[:-2]) * 1024 * 1024
+    elif size_str.endswith('GB'):
+        return int(size_str[:-2]) * 1024 * 1024 * 1024
+    else:
+        return int(size_str)
+
+
+def build_arg_parser(default_engine: str = "threads") -> argparse.ArgumentParser:
+    """Build the CLI parser shared by the thread-pool and asyncio engines."""
     parser = argparse.ArgumentParser(
         description="Enhanced Multipart File Uploader v4.0 with Optimized HTTP Session Management",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -1644,6 +1692,7 @@ Examples:
   %(prog)s --generate-test-files 5            # Generate test files
   %(prog)s folder --debug --no-manifest      # Debug mode, no manifest
   %(prog)s folder --streaming-threshold 25MB # Custom streaming threshold
+  %(prog)s folder --engine asyncio            # Single-threaded asyncio engine
 
 Authentication Examples:
   %(prog)s file.zip --auth-type bearer --token "your_token_here"
@@ -1699,6 +1748,8 @@ Environment Variables:
                        help="Use batch upload initialization for directories")
     parser.add_argument("--checksums", action="store_true",
                        help="Enable file checksum verification")
+    parser.add_argument("--content-addressed", action="store_true",
+                       help="Send SHA-256 hashes so files the server already has are skipped")
     parser.add_argument("--no-manifest", action="store_true",
                        help="Disable directory manifest generation")
     
@@ -1716,26 +1767,108 @@ Environment Variables:
     parser.add_argument("--quiet", "-q", action="store_true",
                        help="Suppress console output (log file only)")
     
+    # Engine selection
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default=default_engine,
+                       help="Upload engine: thread pool (requests) or asyncio (aiohttp)")
+    parser.add_argument("--max-inflight", type=int, default=64,
+                       help="Maximum concurrent part uploads across all files (asyncio engine)")
+    
     # Utility functions
     parser.add_argument("--generate-test-files", type=int, metavar="N",
                        help="Generate N test files and exit")
     parser.add_argument("--test-connection", action="store_true",
                        help="Test API connection and exit")
     
-    args = parser.parse_args()
+    return parser
+
+
+def build_config(args: argparse.Namespace) -> OptimizedUploadConfig:
+    """Create an upload configuration from parsed CLI arguments."""
+    # Setup authentication
+    auth_config = AuthConfig(
+        auth_type=args.auth_type,
+        token=args.token,
+        api_key=args.api_key,
+        header_name=args.auth_header,
+        param_name=args.auth_param
+    )
     
-    # Parse streaming threshold
-    def parse_size(size_str):
-        """Parse size string like '50MB' into bytes."""
-        size_str = size_str.upper()
-        if size_str.endswith('KB'):
-            return int(size_str[:-2]) * 1024
-        elif size_str.endswith('MB'):
-            return int(size_str[:-2]) * 1024 * 1024
-        elif size_str.endswith('GB'):
-            return int(size_str[:-2]) * 1024 * 1024 * 1024
-        else:
-            return int(size_str)
+    session_config = SessionConfig(
+        pool_connections=args.pool_connections,
+        pool_maxsize=args.pool_maxsize
+    )
+    
+    return OptimizedUploadConfig(
+        api_base=args.api_base,
+        auth_config=auth_config,
+        session_config=session_config,
+        max_workers=args.workers,
+        max_retries=args.retries,
+        timeout=args.timeout,
+        streaming_threshold=parse_size(args.streaming_threshold),
+        verify_checksums=args.checksums,
+        content_addressed=args.content_addressed,
+        progress_tracking=not args.progress_off,
+        progress_interval=args.progress_interval,
+        debug=args.debug,
+        generate_manifest=not args.no_manifest,
+        adaptive_workers=args.adaptive_workers,
+        adaptive_chunk_size=args.adaptive_chunks
+    )
+
+
+def save_upload_results(args: argparse.Namespace, config: OptimizedUploadConfig,
+                        results: List[Dict[str, Any]], start_time: float,
+                        stats: UploadStats, session_stats: Dict[str, Any]) -> str:
+    """Write the JSON results file for a CLI run and return its path."""
+    results_file = f"upload_results_{int(time.time())}.json"
+    with open(results_file, "w") as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "config": {
+                "api_base": config.api_base,
+                "workers": config.max_workers,
+                "batch_mode": args.batch,
+                "checksums": config.verify_checksums,
+                "streaming_threshold": config.streaming_threshold,
+                "adaptive_workers": config.adaptive_workers,
+                "manifest_enabled": config.generate_manifest,
+                "engine": args.engine,
+                "session_config": {
+                    "pool_connections": config.session_config.pool_connections,
+                    "pool_maxsize": config.session_config.pool_maxsize,
+                    "keep_alive_timeout": config.session_config.keep_alive_timeout
+                }
+            },
+            "stats": {
+                "total_files": len(results),
+                "total_time": time.time() - start_time,
+                "average_speed": stats.format_speed()
+            },
+            "session_stats": session_stats,
+            "results": results
+        }, f, indent=2, default=str)
+    return results_file
+
+
+def log_session_stats(session_stats: Dict[str, Any]):
+    """Log HTTP session statistics collected by either engine."""
+    logger.info("=== SESSION STATISTICS ===")
+    logger.info(f"Total requests: {session_stats['requests_made']}")
+    logger.info(f"Connection reuses: {session_stats['connection_reuses']}")
+    logger.info(f"Connection errors: {session_stats['connection_errors']}")
+    logger.info(f"Session recreations: {session_stats['session_recreations']}")
+    logger.info(f"Total bytes uploaded: {format_bytes(session_stats['total_bytes_uploaded'])}")
+    
+    if session_stats['requests_made'] > 0:
+        reuse_ratio = session_stats['connection_reuses'] / session_stats['requests_made'] * 100
+        logger.info(f"Connection reuse ratio: {reuse_ratio:.1f}%")
+
+
+def main(default_engine: str = "threads"):
+    """Enhanced command line interface with comprehensive options."""
+    parser = build_arg_parser(default_engine)
+    args = parser.parse_args()
     
     streaming_threshold = parse_size(args.streaming_threshold)
     
@@ -1751,47 +1884,20 @@ Environment Variables:
     
     # Create configuration
     try:
-        # Setup authentication
-        auth_config = AuthConfig(
-            auth_type=args.auth_type,
-            token=args.token,
-            api_key=args.api_key,
-            header_name=args.auth_header,
-            param_name=args.auth_param
-        )
-        
-        session_config = SessionConfig(
-            pool_connections=args.pool_connections,
-            pool_maxsize=args.pool_maxsize
-        )
-        
-        config = OptimizedUploadConfig(
-            api_base=args.api_base,
-            auth_config=auth_config,
-            session_config=session_config,
-            max_workers=args.workers,
-            max_retries=args.retries,
-            timeout=args.timeout,
-            streaming_threshold=streaming_threshold,
-            verify_checksums=args.checksums,
-            progress_tracking=not args.progress_off,
-            progress_interval=args.progress_interval,
-            debug=args.debug,
-            generate_manifest=not args.no_manifest,
-            adaptive_workers=args.adaptive_workers,
-            adaptive_chunk_size=args.adaptive_chunks
-        )
+        config = build_config(args)
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
         sys.exit(1)
     
-    logger.info(f"Starting Enhanced Multipart Uploader v4.0")
-    logger.info(f"Authentication: {auth_config.auth_type}")
+    logger.info(f"Starting Enhanced Multipart Uploader v4.0 ({args.engine} engine)")
+    logger.info(f"Authentication: {config.auth_config.auth_type}")
     logger.info(f"Session config: {args.pool_connections} pool connections, {args.pool_maxsize} max pool size")
     logger.info(f"Upload config: {args.workers} workers, {args.timeout}s timeout, "
-               f"streaming threshold: {format_bytes(streaming_threshold)}"
                f"streaming threshold: {format_bytes(streaming_threshold)}")
     
+    if args.engine == "asyncio":
+        from uploader_async import run_cli
+        return run_cli(args, config, parser)
     
     try:
         with EnhancedMultipartUploader(config) as uploader:
@@ -1800,7 +1906,7 @@ Environment Variables:
             if args.test_connection:
                 logger.info("Testing API connection...")
                 try:
-                    response = uploader._make_request("GET", f"{config.api_base}/../health")
+                    uploader._make_request("GET", f"{config.api_base}/../health")
                     logger.info("API connection successful")
                     return
                 except Exception as e:
@@ -1857,49 +1963,18 @@ Environment Variables:
                 
                 # Print session statistics
                 if args.debug:
-                    session_stats = uploader.session_manager.get_stats()
-                    logger.info("=== SESSION STATISTICS ===")
-                    logger.info(f"Total requests: {session_stats['requests_made']}")
-                    logger.info(f"Connection reuses: {session_stats['connection_reuses']}")
-                    logger.info(f"Connection errors: {session_stats['connection_errors']}")
-                    logger.info(f"Session recreations: {session_stats['session_recreations']}")
-                    logger.info(f"Total bytes uploaded: {format_bytes(session_stats['total_bytes_uploaded'])}")
-                    
-                    if session_stats['requests_made'] > 0:
-                        reuse_ratio = session_stats['connection_reuses'] / session_stats['requests_made'] * 100
-                        logger.info(f"Connection reuse ratio: {reuse_ratio:.1f}%")
+                    log_session_stats(uploader.session_manager.get_stats())
                 
                 # Save results to file
-                results_file = f"upload_results_{int(time.time())}.json"
-                with open(results_file, "w") as f:
-                    json.dump({
-                        "timestamp": datetime.now().isoformat(),
-                        "config": {
-                            "api_base": config.api_base,
-                            "workers": config.max_workers,
-                            "batch_mode": args.batch,
-                            "checksums": config.verify_checksums,
-                            "streaming_threshold": config.streaming_threshold,
-                            "adaptive_workers": config.adaptive_workers,
-                            "manifest_enabled": config.generate_manifest,
-                            "session_config": {
-                                "pool_connections": config.session_config.pool_connections,
-                                "pool_maxsize": config.session_config.pool_maxsize,
-                                "keep_alive_timeout": config.session_config.keep_alive_timeout
-                            }
-                        },
-                        "stats": {
-                            "total_files": len(results),
-                            "total_time": time.time() - start_time,
-                            "average_speed": uploader.progress_tracker.stats.format_speed()
-                        },
-                        "session_stats": uploader.session_manager.get_stats(),
-                        "results": results
-                    }, f, indent=2, default=str)
+                results_file = save_upload_results(
+                    args, config, results, start_time,
+                    uploader.progress_tracker.stats,
+                    uploader.session_manager.get_stats()
+                )
                 
                 logger.info(f"Results saved to {results_file}")
                 
-            except Exception as e:
+            except Exception:
                 if progress_bar:
                     progress_bar.close()
                 raise
@@ -0,0 +1,714 @@
+#!/usr/bin/env python3
+"""
+Asyncio Multipart File Uploader
+===============================
+
+An ``asyncio`` engine for the multipart upload API, built on ``aiohttp``:
+- One event loop drives every part of every file (no thread per part/file)
+- HTTP/1.1 keep-alive connection pooling through a shared ``TCPConnector``
+- Global in-flight part limit instead of a thread pool per file
+- Parts are streamed from disk in bounded chunks, so memory stays flat
+  regardless of part size
+- Usable as a library (``AsyncMultipartUploader`` / ``upload_path_async``)
+  or from the same CLI as ``uploader.py`` (``--engine asyncio``)
+
+Planning decisions (chunk sizes, URL validation, init payloads) come from
+``uploader.UploadPlanner`` so both engines behave identically server-side.
+"""
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from yarl import URL
+
+from uploader import (
+    EnhancedFileInfo,
+    ManifestGenerator,
+    OptimizedUploadConfig,
+    ProgressTracker,
+    UploadPlanner,
+    UploadSession,
+    build_auth_headers,
+    build_auth_params,
+    log_session_stats,
+    print_upload_summary,
+    save_upload_results,
+)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_READ_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class AsyncPartCompletionReporter:
+    """Asyncio counterpart of ``uploader.PartCompletionReporter``.
+    
+    Part tasks enqueue without awaiting the network; one sender task coalesces
+    up to ``batch_size`` reports (or whatever arrives within ``flush_interval``)
+    per ``send_batch`` call.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+                 batch_size: int = 200, flush_interval: float = 1.0):
+        self.send_batch = send_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.flush_requested = False
+        self.stats = {'parts_reported': 0, 'batches_sent': 0, 'batches_failed': 0}
+
+    def submit(self, upload_id: str, part_number: int, etag: str, size: int):
+        """Queue a completed part; returns immediately."""
+        if self.worker is None or self.worker.done():
+            if self.queue is None:
+                self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run())
+        self.queue.put_nowait({
+            "upload_id": upload_id,
+            "part_number": part_number,
+            "etag": etag,
+            "size": size
+        })
+
+    async def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until everything queued so far has been sent."""
+        if self.queue is None:
+            return True
+        self.flush_requested = True
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.flush_requested = False
+
+    async def close(self, timeout: float = 30.0):
+        """Flush pending reports and stop the sender task."""
+        if self.worker is None:
+            return
+        if not await self.flush(timeout):
+            logger.warning(f"Dropping {self.queue.qsize()} unsent part reports")
+        self.worker.cancel()
+        await asyncio.gather(self.worker, return_exceptions=True)
+        self.worker = None
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.flush_requested:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), min(remaining, 0.05)))
+            except asyncio.TimeoutError:
+                continue
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.send_batch(batch)
+                self.stats['batches_sent'] += 1
+                self.stats['parts_reported'] += len(batch)
+            except Exception as e:
+                self.stats['batches_failed'] += 1
+                logger.warning(f"Failed to report {len(batch)} parts: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+class AsyncMultipartUploader(UploadPlanner):
+    """Multipart uploader running every part on a single asyncio event loop."""
+
+    def __init__(self, config: OptimizedUploadConfig, max_inflight: int = 64):
+        if max_inflight < 1:
+            raise ValueError("max_inflight must be at least 1")
+
+        self.config = config
+        self.max_inflight = max_inflight
+        self.progress_tracker = ProgressTracker(config)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._active_parts = 0
+        self._bulk_reporting = True
+        self.part_reporter = AsyncPartCompletionReporter(
+            self._send_part_reports,
+            batch_size=config.report_batch_size,
+            flush_interval=config.report_flush_interval
+        )
+        self.stats = {
+            'requests_made': 0,
+            'connection_reuses': 0,
+            'connections_created': 0,
+            'connection_errors': 0,
+            'session_recreations': 0,
+            'total_bytes_uploaded': 0,
+            'peak_inflight_parts': 0
+        }
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        self.progress_tracker.stop()
+
+        if self.config.debug:
+            log_session_stats(self.get_stats())
+
+    async def start(self):
+        """Open the pooled HTTP session (idempotent)."""
+        if self._session and not self._session.closed:
+            return
+
+        session_config = self.config.session_config
+        connector = aiohttp.TCPConnector(
+            limit=max(session_config.pool_maxsize, self.max_inflight),
+            limit_per_host=max(session_config.pool_connections, self.max_inflight),
+            keepalive_timeout=session_config.keep_alive_timeout,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.timeout,
+            sock_connect=session_config.connect_timeout,
+            sock_read=session_config.read_timeout
+        )
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[trace_config],
+            headers={
+                'User-Agent': self.config.user_agent,
+                'Accept': 'application/json',
+            }
+        )
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        self.stats['session_recreations'] += 1
+        logger.debug(f"Created aiohttp session (pool limit {connector.limit})")
+
+    async def close(self):
+        """Close the HTTP session and its pooled connections."""
+        await self.part_reporter.close()
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def _on_connection_created(self, session, ctx, params):
+        self.stats['connections_created'] += 1
+
+    async def _on_connection_reused(self, session, ctx, params):
+        self.stats['connection_reuses'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get session statistics (same keys as ``SessionManager.get_stats``)."""
+        stats = self.stats.copy()
+        stats['auth_type'] = self.config.auth_config.auth_type
+        return stats
+
+    async def _api_request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        """Call the upload API with auth, retries and backoff; return the JSON body."""
+        headers = kwargs.pop('headers', {}) or {}
+        headers.update(build_auth_headers(self.config.auth_config))
+        params = build_auth_params(self.config.auth_config, kwargs.pop('params', None))
+
+        last_exception = None
+
+        for attempt in range(self.config.max_retries + 1):
+            self.stats['requests_made'] += 1
+            try:
+                async with self._session.request(method, url, headers=headers,
+                                                 params=params or None, **kwargs) as response:
+                    if 400 <= response.status < 500:
+                        body = await response.text()
+                        logger.error(f"Client error {response.status}: {body}")
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+            except aiohttp.ClientResponseError as e:
+                last_exception = e
+                # Don't retry 4xx errors
+                if 400 <= e.status < 500:
+                    raise
+                logger.warning(f"HTTP error on attempt {attempt + 1}: {e}")
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                last_exception = e
+                self.stats['connection_errors'] += 1
+                logger.warning(f"Connection error on attempt {attempt + 1}: {e}")
+
+            if attempt < self.config.max_retries:
+                wait_time = min((2 ** attempt) + random.uniform(0, 1), 30)
+                logger.info(f"Retrying in {wait_time:.1f}s...")
+                await asyncio.sleep(wait_time)
+
+        raise last_exception
+
+    async def init_upload(self, file_info: EnhancedFileInfo) -> UploadSession:
+        """Initialize multipart upload for a single file."""
+        logger.info(f"Initializing upload: {file_info.filename} ({file_info.total_size:,} bytes)")
+
+        payload = self.build_init_payload(file_info, self.get_stats())
+        data = await self._api_request("POST", f"{self.config.api_base}/multipart/init", json=payload)
+        session = UploadSession.from_response(data)
+
+        logger.info(f"Upload initialized: {session.total_parts} parts of {session.part_size:,} bytes each")
+        self._validate_presigned_urls(session)
+        return session
+
+    async def init_batch_upload(self, files: List[EnhancedFileInfo]) -> Dict[str, UploadSession]:
+        """Initialize batch multipart upload."""
+        logger.info(f"Initializing batch upload for {len(files)} files")
+
+        payload = {
+            "files": [f.to_dict() for f in files],
+            "tos_accept": True,
+            "upload_token": "enhanced-client-v4"
+        }
+        data = await self._api_request("POST", f"{self.config.api_base}/multipart/init-batch", json=payload)
+
+        sessions = {}
+        for session_data in data["sessions"]:
+            session = UploadSession.from_response(session_data)
+            self._validate_presigned_urls(session)
+            sessions[session.filename] = session
+
+        logger.info(f"Batch upload initialized for {len(sessions)} files")
+        return sessions
+
+    async def _read_part_chunks(self, file_path: Path, offset: int, size: int) -> AsyncIterator[bytes]:
+        """Yield a part from disk chunk by chunk."""
+        loop = asyncio.get_running_loop()
+        # Bigger reads than the thread engine: each read is an executor hop
+        read_size = max(self.config.read_chunk_size, ASYNC_READ_CHUNK_SIZE)
+        f = await loop.run_in_executor(None, open, file_path, "rb")
+        try:
+            await loop.run_in_executor(None, f.seek, offset)
+            remaining = size
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, f.read, min(read_size, remaining))
+                if not chunk:
+                    raise ValueError(f"Unexpected EOF in {file_path} at offset {offset + size - remaining}")
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def _part_md5(self, file_path: Path, offset: int, size: int) -> str:
+        """MD5 of a part, used as the ETag when the storage response has none."""
+        digest = hashlib.md5()
+        async for chunk in self._read_part_chunks(file_path, offset, size):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    async def upload_part(self, file_path: Path, part_number: int, offset: int,
+                          size: int, upload_url: str) -> Tuple[int, str]:
+        """Upload one part, retrying with backoff; returns ``(part_number, etag)``."""
+        async with self._inflight:
+            self._active_parts += 1
+            self.stats['peak_inflight_parts'] = max(self.stats['peak_inflight_parts'], self._active_parts)
+            try:
+                return await self._upload_part_with_retries(file_path, part_number, offset, size, upload_url)
+            finally:
+                self._active_parts -= 1
+
+    async def _upload_part_with_retries(self, file_path: Path, part_number: int, offset: int,
+                                        size: int, upload_url: str) -> Tuple[int, str]:
+        logger.debug(f"Uploading part {part_number}: offset={offset:,}, size={size:,}")
+        # Presigned URLs are already encoded; re-quoting them breaks the signature
+        url = URL(upload_url, encoded=True)
+
+        for attempt in range(self.config.max_retries + 1):
+            start_time = time.time()
+            try:
+                self.stats['requests_made'] += 1
+                async with self._session.put(
+                    url,
+                    data=self._read_part_chunks(file_path, offset, size),
+                    headers={
+                        'Content-Type': 'application/octet-stream',
+                        'Content-Length': str(size)
+                    }
+                ) as response:
+                    response.raise_for_status()
+                    etag = response.headers.get("ETag", "").strip('"')
+                    await response.read()
+
+                if not etag:
+                    etag = await self._part_md5(file_path, offset, size)
+
+                self.stats['total_bytes_uploaded'] += size
+                self.progress_tracker.update_bytes(size)
+
+                upload_time = time.time() - start_time
+                speed = size / upload_time if upload_time > 0 else 0
+                logger.debug(f"Part {part_number} completed in {upload_time:.1f}s "
+                            f"({speed/1024/1024:.1f} MB/s), ETag: {etag}")
+                return part_number, etag
+
+            except Exception as e:
+                logger.error(f"Part {part_number} attempt {attempt + 1} failed: {e}")
+
+                if isinstance(e, aiohttp.ClientConnectionError):
+                    self.stats['connection_errors'] += 1
+                # Don't retry 403 errors
+                if isinstance(e, aiohttp.ClientResponseError) and e.status == 403:
+                    raise
+                if attempt == self.config.max_retries:
+                    raise
+
+                wait_time = min((2 ** attempt) + random.uniform(0, 1), 60)
+                logger.info(f"Retrying part {part_number} in {wait_time:.1f}s...")
+                await asyncio.sleep(wait_time)
+
+    async def _report_part_completion(self, upload_id: str, part_number: int, etag: str, size: int):
+        """Report part completion to backend."""
+        try:
+            payload = {
+                "upload_id": upload_id,
+                "part_number": part_number,
+                "etag": etag,
+                "size": size
+            }
+            await self._api_request("POST", f"{self.config.api_base}/report-part", json=payload)
+            logger.debug(f"Reported part {part_number} completion")
+        except Exception as e:
+            logger.warning(f"Failed to report part {part_number}: {e}")
+
+    async def _send_part_reports(self, reports: List[Dict[str, Any]]):
+        """Send a batch of part completions, falling back to ``/report-part``."""
+        if self._bulk_reporting:
+            try:
+                await self._api_request("POST", f"{self.config.api_base}/report-parts", json={"parts": reports})
+                logger.debug(f"Reported {len(reports)} part completions")
+                return
+            except aiohttp.ClientResponseError as e:
+                if e.status not in (404, 405):
+                    raise
+                logger.info("Bulk part reporting unavailable, falling back to /report-part")
+                self._bulk_reporting = False
+
+        for report in reports:
+            await self._report_part_completion(report["upload_id"], report["part_number"],
+                                               report["etag"], report["size"])
+
+    async def _upload_and_report(self, file_path: Path, session: UploadSession,
+                                 part_number: int, offset: int, size: int, url: str) -> Dict[str, Any]:
+        part_num, etag = await self.upload_part(file_path, part_number, offset, size, url)
+        if self.config.progress_tracking:
+            self.part_reporter.submit(session.upload_id, part_num, etag, size)
+        return {"part_number": part_num, "etag": etag}
+
+    async def upload_file(self, file_path: Path, session: UploadSession) -> Dict[str, Any]:
+        """Upload every part of a file concurrently, then complete the upload."""
+        total_size = file_path.stat().st_size
+        if session.deduplicated:
+            logger.info(f"Server already has {file_path.name}, skipping transfer")
+            self.progress_tracker.update_bytes(total_size)
+            return {"file_id": session.file_id, "status": "deduplicated"}
+        logger.info(f"Starting async upload: {file_path.name} "
+                   f"({session.total_parts} parts, {total_size:,} bytes)")
+
+        tasks = [
+            asyncio.create_task(self._upload_and_report(file_path, session, part_number, offset, size, url))
+            for part_number, offset, size, url in self.part_layout(session, total_size)
+        ]
+
+        uploaded_parts = []
+        failed_parts = []
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    uploaded_parts.append(await task)
+                except Exception as e:
+                    failed_parts.append(str(e))
+                    # Cancel remaining on critical errors
+                    if "403" in str(e) or "expired" in str(e).lower():
+                        break
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if failed_parts:
+            raise Exception(f"Failed to upload {len(failed_parts)} parts of {file_path.name}: {failed_parts[0]}")
+
+        if len(uploaded_parts) != session.total_parts:
+            raise Exception(f"Expected {session.total_parts} parts, got {len(uploaded_parts)}")
+
+        if self.config.progress_tracking:
+            await self.part_reporter.flush()
+
+        return await self._complete_upload(session, uploaded_parts)
+
+    async def _complete_upload(self, session: UploadSession, parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Complete the multipart upload."""
+        logger.info(f"Completing upload: {session.filename}")
+
+        payload = {
+            "file_id": session.file_id,
+            "upload_id": session.upload_id,
+            "filename": session.filename,
+            "parts": sorted(parts, key=lambda p: p["part_number"])
+        }
+        result = await self._api_request("POST", f"{self.config.api_base}/multipart/complete", json=payload)
+
+        logger.info(f"Upload completed: {session.filename}")
+        if "download_url" in result:
+            logger.info(f"Download URL: {result['download_url']}")
+        return result
+
+    def _file_info(self, file_path: Path, relative_path: Optional[str] = None) -> EnhancedFileInfo:
+        return EnhancedFileInfo(
+            filename=file_path.name,
+            total_size=file_path.stat().st_size,
+            content_type=mimetypes.guess_type(str(file_path))[0] or "application/octet-stream",
+            relative_path=relative_path
+        )
+
+    async def upload_single_file(self, file_path: Path) -> Dict[str, Any]:
+        """Upload a single file."""
+        if not file_path.exists():
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        file_info = self._file_info(file_path)
+        loop = asyncio.get_running_loop()
+        if self.config.verify_checksums:
+            file_info.checksum = await loop.run_in_executor(None, self.calculate_checksum, file_path)
+        if self.config.content_addressed:
+            file_info.sha256 = await loop.run_in_executor(None, self.calculate_sha256, file_path)
+
+        session = await self.init_upload(file_info)
+        return await self.upload_file(file_path, session)
+
+    async def _upload_tracked(self, file_path: Path, session: Optional[UploadSession] = None) -> Optional[Dict[str, Any]]:
+        try:
+            if session is None:
+                result = await self.upload_single_file(file_path)
+            else:
+                result = await self.upload_file(file_path, session)
+            self.progress_tracker.file_completed()
+            logger.info(f"Completed {file_path.name}")
+            return result
+        except Exception as e:
+            logger.error(f"Failed to upload {file_path.name}: {e}")
+            self.progress_tracker.file_failed()
+            return None
+
+    async def upload_directory_with_manifest(self, dir_path: Path,
+                                             include_manifest: bool = True,
+                                             use_batch: bool = True) -> Dict[str, Any]:
+        """Upload a directory; all files share the event loop and in-flight limit."""
+        if not dir_path.exists():
+            raise FileNotFoundError(f"Directory not found: {dir_path}")
+
+        files = [p for p in dir_path.rglob("*") if p.is_file()]
+        file_infos = [self._file_info(p, str(p.relative_to(dir_path))) for p in files]
+        if self.config.content_addressed:
+            loop = asyncio.get_running_loop()
+            hashes = await asyncio.gather(*(loop.run_in_executor(None, self.calculate_sha256, p) for p in files))
+            for file_info, sha256 in zip(file_infos, hashes):
+                file_info.sha256 = sha256
+        actual_total_size = sum(f.total_size for f in file_infos)
+
+        logger.info(f"Directory analysis complete: {len(files)} files, {actual_total_size:,} bytes total")
+
+        manifest = None
+        if include_manifest:
+            logger.info("Generating directory manifest...")
+            manifest = await asyncio.get_running_loop().run_in_executor(
+                None, ManifestGenerator.create_manifest, dir_path, self.config.verify_checksums
+            )
+            entries = {entry.relative_path: entry for entry in manifest.files}
+            for file_info in file_infos:
+                manifest_entry = entries.get(file_info.relative_path)
+                if manifest_entry:
+                    file_info.checksum = manifest_entry.checksum
+                    file_info.manifest_entry = manifest_entry
+
+        results = []
+
+        if manifest:
+            manifest_path = dir_path / ".upload_manifest.json"
+            try:
+                manifest_path.write_text(manifest.to_json())
+                logger.info("Uploading directory manifest...")
+                results.append(await self.upload_single_file(manifest_path))
+            except Exception as e:
+                logger.warning(f"Failed to upload manifest: {e}")
+            finally:
+                if manifest_path.exists():
+                    manifest_path.unlink()
+
+        sessions: Dict[str, UploadSession] = {}
+        if use_batch and len(files) > 1:
+            logger.info("Using batch upload mode")
+            try:
+                sessions = await self.init_batch_upload(file_infos)
+            except Exception as e:
+                logger.error(f"Batch initialization failed: {e}")
+                logger.info("Falling back to individual uploads")
+                use_batch = False
+
+        uploads = await asyncio.gather(*(
+            self._upload_tracked(file_path, sessions.get(file_info.filename) if use_batch else None)
+            for file_path, file_info in zip(files, file_infos)
+        ))
+        results.extend(r for r in uploads if r is not None)
+
+        return {
+            "manifest": manifest.to_dict() if manifest else None,
+            "upload_results": results,
+            "summary": {
+                "total_files": len(results),
+                "total_bytes": actual_total_size,
+                "manifest_included": include_manifest,
+                "upload_mode": "batch" if use_batch else "individual"
+            }
+        }
+
+    async def upload_path(self, path: str, use_batch: bool = True) -> List[Dict[str, Any]]:
+        """Upload a file or directory."""
+        path_obj = Path(path)
+
+        if not path_obj.exists():
+            raise FileNotFoundError(f"Path not found: {path}")
+
+        if path_obj.is_file():
+            self.progress_tracker.start(path_obj.stat().st_size, 1)
+            try:
+                result = await self.upload_single_file(path_obj)
+                self.progress_tracker.file_completed()
+                return [result]
+            except Exception:
+                self.progress_tracker.file_failed()
+                raise
+            finally:
+                self.progress_tracker.stop()
+
+        elif path_obj.is_dir():
+            files = [f for f in path_obj.rglob("*") if f.is_file()]
+            self.progress_tracker.start(sum(f.stat().st_size for f in files), len(files))
+            try:
+                result = await self.upload_directory_with_manifest(path_obj, self.config.generate_manifest, use_batch)
+                return result["upload_results"]
+            finally:
+                self.progress_tracker.stop()
+        else:
+            raise ValueError(f"Invalid path type: {path}")
+
+
+async def upload_path_async(path: str, config: Optional[OptimizedUploadConfig] = None,
+                            use_batch: bool = True, max_inflight: int = 64) -> List[Dict[str, Any]]:
+    """Library entry point: upload ``path`` from inside an existing event loop."""
+    async with AsyncMultipartUploader(config or OptimizedUploadConfig(), max_inflight) as uploader:
+        return await uploader.upload_path(path, use_batch=use_batch)
+
+
+async def _check_connection(uploader: AsyncMultipartUploader):
+    async with uploader:
+        await uploader._api_request("GET", f"{uploader.config.api_base}/../health")
+
+
+async def _run_upload(uploader: AsyncMultipartUploader, path: str, use_batch: bool) -> List[Dict[str, Any]]:
+    async with uploader:
+        return await uploader.upload_path(path, use_batch=use_batch)
+
+
+def run_cli(args, config: OptimizedUploadConfig, parser) -> None:
+    """Run a parsed ``uploader.py`` command line on the asyncio engine."""
+    uploader = AsyncMultipartUploader(config, max_inflight=args.max_inflight)
+
+    if args.test_connection:
+        logger.info("Testing API connection...")
+        try:
+            asyncio.run(_check_connection(uploader))
+            logger.info("API connection successful")
+            return
+        except Exception as e:
+            logger.error(f"API connection failed: {e}")
+            sys.exit(1)
+
+    if args.generate_test_files:
+        uploader.generate_test_files(num_files=args.generate_test_files)
+        return
+
+    if not args.path:
+        parser.error("path is required unless using --generate-test-files or --test-connection")
+
+    start_time = time.time()
+    try:
+        logger.info(f"Starting upload of: {args.path}")
+        results = asyncio.run(_run_upload(uploader, args.path, args.batch))
+
+        if not args.quiet:
+            print_upload_summary(uploader.progress_tracker.stats)
+
+        logger.info(f"Upload completed! {len(results)} files processed")
+
+        if args.debug:
+            log_session_stats(uploader.get_stats())
+
+        results_file = save_upload_results(
+            args, config, results, start_time,
+            uploader.progress_tracker.stats,
+            uploader.get_stats()
+        )
+        logger.info(f"Results saved to {results_file}")
+
+    except KeyboardInterrupt:
+        logger.info("Upload cancelled by user")
+        sys.exit(130)
+
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {e}")
+        sys.exit(2)
+
+    except PermissionError as e:
+        logger.error(f"Permission denied: {e}")
+        sys.exit(13)
+
+    except aiohttp.ClientConnectionError:
+        logger.error(f"Failed to connect to API at {config.api_base}")
+        logger.error("Please check that the server is running and accessible")
+        sys.exit(3)
+
+    except Exception as e:
+        logger.error(f"Upload failed: {e}")
+        if args.debug:
+            import traceback
+            logger.error(f"Traceback:\n{traceback.format_exc()}")
+        sys.exit(1)
+
+
+def main():
+    """Same command line as ``uploader.py``, defaulting to the asyncio engine."""
+    from uploader import main as uploader_main
+    uploader_main(default_engine="asyncio")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Uploader Engine Benchmark
+=========================
+
+Compares the thread-pool engine (``uploader.EnhancedMultipartUploader``) with
+the asyncio engine (``uploader_async.AsyncMultipartUploader``) against a local
+fake of the ``/uploads`` multipart API, so it runs without MinIO or Mongo.
+
+Each engine runs in its own child process and reports:
+- wall time and throughput (MB/s)
+- CPU time (user + system) of the client process
+- peak RSS of the client process
+- peak number of OS threads while uploading
+
+Usage:
+  python uploader_benchmark.py --files 4 --size 64MB --part-size 5MB --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict
+
+from aiohttp import web
+
+from uploader import parse_size, format_bytes
+
+
+def create_fake_upload_api(part_size: int, latency: float) -> web.Application:
+    """Minimal stand-in for ``routes/uploads.py`` plus a presigned PUT target."""
+    app = web.Application(client_max_size=1024 ** 3)
+    uploads: Dict[str, Dict[str, Any]] = {}
+
+    def _session(request: web.Request, spec: Dict[str, Any]) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        total_size = spec["total_size"]
+        part_count = max(1, (total_size + part_size - 1) // part_size)
+        expires = int(time.time()) + 3600
+        base = f"{request.scheme}://{request.host}/store/{upload_id}"
+        parts = [
+            {
+                "part_number": n,
+                "url": f"{base}/{n}?uploadId={upload_id}&partNumber={n}"
+                       f"&AWSAccessKeyId=bench&Signature=sig&Expires={expires}"
+            }
+            for n in range(1, part_count + 1)
+        ]
+        uploads[upload_id] = {"completed_parts": 0, "parts_total": part_count, "total_size": total_size}
+        return {
+            "filename": spec["filename"],
+            "file_id": uuid.uuid4().hex,
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "parts": parts,
+            "upload_token": "bench"
+        }
+
+    async def init(request):
+        return web.json_response(_session(request, await request.json()))
+
+    async def init_batch(request):
+        body = await request.json()
+        return web.json_response({"sessions": [_session(request, f) for f in body["files"]], "simple_uploads": []})
+
+    async def put_part(request):
+        digest = hashlib.md5()
+        async for chunk in request.content.iter_chunked(256 * 1024):
+            digest.update(chunk)
+        if latency:
+            await asyncio.sleep(latency)
+        return web.Response(headers={"ETag": f'"{digest.hexdigest()}"'})
+
+    async def report_part(request):
+        body = await request.json()
+        upload = uploads.get(body["upload_id"])
+        if upload:
+            upload["completed_parts"] += 1
+        return web.json_response({"status": "ok", "upload_id": body["upload_id"]})
+
+    async def report_parts(request):
+        body = await request.json()
+        for part in body["parts"]:
+            upload = uploads.get(part["upload_id"])
+            if upload:
+                upload["completed_parts"] += 1
+        return web.json_response({"status": "ok", "accepted": len(body["parts"]), "unknown_uploads": []})
+
+    async def progress(request):
+        upload = uploads.get(request.match_info["upload_id"], {})
+        done, total = upload.get("completed_parts", 0), upload.get("parts_total", 0)
+        return web.json_response({
+            "progress": (done / total * 100) if total else 0,
+            "parts_done": done,
+            "parts_total": total
+        })
+
+    async def complete(request):
+        body = await request.json()
+        return web.json_response({"file_id": body["file_id"], "status": "completed"})
+
+    async def health(request):
+        return web.json_response({"status": "ok"})
+
+    app.router.add_post("/uploads/multipart/init", init)
+    app.router.add_post("/uploads/multipart/init-batch", init_batch)
+    app.router.add_post("/uploads/multipart/complete", complete)
+    app.router.add_post("/uploads/report-part", report_part)
+    app.router.add_post("/uploads/report-parts", report_parts)
+    app.router.add_get("/uploads/progress/{upload_id}", progress)
+    app.router.add_put("/store/{upload_id}/{part_number}", put_part)
+    app.router.add_get("/health", health)
+    return app
+
+
+def start_fake_server(part_size: int, latency: float) -> int:
+    """Run the fake API on a background thread; return its port."""
+    ready = threading.Event()
+    state: Dict[str, int] = {}
+
+    def _serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(create_fake_upload_api(part_size, latency), access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0, backlog=4096)
+        loop.run_until_complete(site.start())
+        state["port"] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=_serve, daemon=True).start()
+    ready.wait(10)
+    return state["port"]
+
+
+def _run_engine(engine: str, api_base: str, data_dir: str, workers: int,
+                max_inflight: int, result_queue) -> None:
+    """Child process body: upload ``data_dir`` with one engine and report usage."""
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    from uploader import OptimizedUploadConfig, EnhancedMultipartUploader
+
+    config = OptimizedUploadConfig(
+        api_base=api_base,
+        max_workers=workers,
+        generate_manifest=False,
+        progress_interval=3600
+    )
+
+    peak_threads = threading.active_count()
+    stop = threading.Event()
+
+    def _sample_threads():
+        nonlocal peak_threads
+        while not stop.wait(0.01):
+            peak_threads = max(peak_threads, threading.active_count())
+
+    sampler = threading.Thread(target=_sample_threads, daemon=True)
+    sampler.start()
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    if engine == "threads":
+        with EnhancedMultipartUploader(config) as uploader:
+            results = uploader.upload_path(data_dir, use_batch=True)
+            uploaded = uploader.progress_tracker.stats.uploaded_bytes
+    else:
+        from uploader_async import AsyncMultipartUploader
+
+        async def _upload():
+            async with AsyncMultipartUploader(config, max_inflight=max_inflight) as uploader:
+                found = await uploader.upload_path(data_dir, use_batch=True)
+                return found, uploader.progress_tracker.stats.uploaded_bytes
+
+        results, uploaded = asyncio.run(_upload())
+
+    elapsed = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    stop.set()
+    sampler.join()
+
+    result_queue.put({
+        "engine": engine,
+        "files": len(results),
+        "bytes": uploaded,
+        "seconds": elapsed,
+        "throughput_mb_s": uploaded / elapsed / (1024 * 1024) if elapsed else 0,
+        "cpu_seconds": (usage_after.ru_utime - usage_before.ru_utime)
+                       + (usage_after.ru_stime - usage_before.ru_stime),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": usage_after.ru_maxrss / 1024,
+        # Minus the sampler thread itself
+        "peak_threads": peak_threads - 1
+    })
+
+
+def run_benchmark(files: int, size: int, part_size: int, latency_ms: float,
+                  workers: int, max_inflight: int) -> Dict[str, Dict[str, Any]]:
+    port = start_fake_server(part_size, latency_ms / 1000)
+    api_base = f"http://127.0.0.1:{port}/uploads"
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="uploader-bench-") as data_dir:
+        for i in range(files):
+            with open(Path(data_dir) / f"bench_{i}.bin", "wb") as f:
+                remaining = size
+                while remaining > 0:
+                    chunk = min(8 * 1024 * 1024, remaining)
+                    f.write(os.urandom(chunk))
+                    remaining -= chunk
+
+        ctx = multiprocessing.get_context("spawn")
+        for engine in ("threads", "asyncio"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_engine,
+                               args=(engine, api_base, data_dir, workers, max_inflight, queue))
+            proc.start()
+            results[engine] = queue.get()
+            proc.join()
+
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    print("\n" + "=" * 72)
+    print(f"{'engine':<10}{'files':>7}{'data':>12}{'time s':>9}{'MB/s':>9}"
+          f"{'cpu s':>8}{'rss MB':>9}{'threads':>9}")
+    print("-" * 72)
+    for r in results.values():
+        print(f"{r['engine']:<10}{r['files']:>7}{format_bytes(r['bytes']):>12}{r['seconds']:>9.2f}"
+              f"{r['throughput_mb_s']:>9.1f}{r['cpu_seconds']:>8.2f}{r['peak_rss_mb']:>9.1f}"
+              f"{r['peak_threads']:>9}")
+    print("=" * 72)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thread-pool vs asyncio uploader engines")
+    parser.add_argument("--files", type=int, default=4, help="Number of files to upload")
+    parser.add_argument("--size", default="64MB", help="Size of each file")
+    parser.add_argument("--part-size", default="5MB", help="Part size handed out by the fake API")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Simulated per-part server latency")
+    parser.add_argument("--workers", type=int, default=6, help="--workers for the thread-pool engine")
+    parser.add_argument("--max-inflight", type=int, default=64, help="--max-inflight for the asyncio engine")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.files, parse_size(args.size), parse_size(args.part_size),
+                            args.latency_ms, args.workers, args.max_inflight)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A continuation token is an opaque, URL-safe wrapper around the last row's
+``(sort_key, _id)``. The next page is every row strictly after that pair in
+the sort order, which an index on ``(sort_key, _id)`` answers directly:
+no ``skip``, and rows inserted meanwhile do not shift later pages.
+
+    query = with_keyset(query, "date_issued", -1, cursor)
+    docs = await coll.find(query).sort(keyset_sort("date_issued", -1)).limit(limit + 1).to_list(None)
+    docs, next_token = page_of(docs, "date_issued", limit)
+
+``paginate`` / ``paginate_sync`` do those three steps on a Motor or pymongo
+collection. ``stream_ndjson`` / ``iter_ndjson`` turn a cursor over the same
+sort into newline-delimited JSON for exports that are too large to page
+through, one document in memory at a time.
+"""
+import base64
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from bson import json_util
+
+from core.MongoORJSONResponse import normalize_bson
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EXPORT_BATCH_SIZE = 500
+
+
+def encode_cursor(sort_value: Any, last_id: Any) -> str:
+    raw = json_util.dumps([sort_value, last_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[Any, Any]:
+    """``(sort_value, _id)`` of a token; ``ValueError`` if it is not one of ours."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        sort_value, last_id = json_util.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return sort_value, last_id
+
+
+def keyset_sort(sort_field: str, direction: int = -1) -> List[Tuple[str, int]]:
+    """Sort spec with ``_id`` as the tie-breaker, in the same direction."""
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def keyset_filter(sort_field: str, direction: int, token: str) -> Dict:
+    """Rows after the token's ``(sort_key, _id)`` in ``direction`` order."""
+    sort_value, last_id = decode_cursor(token)
+    op = "$lt" if direction < 0 else "$gt"
+    # null and missing keys sort before every value: they close a descending
+    # walk and open an ascending one, and range operators never match them
+    if sort_value is None:
+        after = [{sort_field: None, "_id": {op: last_id}}]
+        if direction > 0:
+            after.append({sort_field: {"$ne": None}})
+    else:
+        after = [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "_id": {op: last_id}},
+        ]
+        if direction < 0:
+            after.append({sort_field: None})
+    return {"$or": after}
+
+
+def with_keyset(query: Dict, sort_field: str, direction: int, token: Optional[str]) -> Dict:
+    """``query`` narrowed to the rows after ``token`` (unchanged without one)."""
+    if not token:
+        return query
+    after = keyset_filter(sort_field, direction, token)
+    return {"$and": [query, after]} if query else after
+
+
+def page_of(docs: List[Dict], sort_field: str, limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """Trim a ``limit + 1`` fetch to ``limit`` rows and the token for the next page."""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last.get(sort_field), last["_id"])
+
+
+async def paginate(collection, query: Dict, sort_field: str, direction: int = -1,
+                   limit: int = 20, token: Optional[str] = None,
+                   projection: Optional[Dict] = None) -> Tuple[List[Dict], Optional[str]]:
+    """One keyset page of a Motor collection; ``ValueError`` on a bad token."""
+    find = collection.find(with_keyset(query, sort_field, direction, token), projection)
+    docs = await find.sort(keyset_sort(sort_field, direction)).limit(limit + 1).to_list(length=limit + 1)
+    return page_of(docs, sort_field, limit)
+
+
+def paginate_sync(collection, query: Dict, sort_field: str, direction: int = -1,
+                  limit: int = 20, token: Optional[str] = None,
+                  projection: Optional[Dict] = None) -> Tuple[List[Dict], Optional[str]]:
+    """``paginate`` for a synchronous pymongo collection."""
+    find = collection.find(with_keyset(query, sort_field, direction, token), projection)
+    docs = list(find.sort(keyset_sort(sort_field, direction)).limit(limit + 1))
+    return page_of(docs, sort_field, limit)
+
+
+def export_cursor(collection, query: Dict, sort_field: str, direction: int = -1,
+                  token: Optional[str] = None, projection: Optional[Dict] = None):
+    """Cursor over every row after ``token`` in keyset order, fetched in batches."""
+    find = collection.find(with_keyset(query, sort_field, direction, token), projection)
+    return find.sort(keyset_sort(sort_field, direction)).batch_size(EXPORT_BATCH_SIZE)
+
+
+def _ndjson_line(doc: Any, transform: Optional[Callable]) -> bytes:
+    return orjson.dumps(normalize_bson(transform(doc) if transform else doc)) + b"\n"
+
+
+async def stream_ndjson(cursor, transform: Optional[Callable] = None) -> AsyncIterator[bytes]:
+    """NDJSON lines for each document of an async cursor."""
+    async for doc in cursor:
+        yield _ndjson_line(doc, transform)
+
+
+def iter_ndjson(cursor, transform: Optional[Callable] = None) -> Iterator[bytes]:
+    """NDJSON lines for each document of a synchronous cursor."""
+    for doc in cursor:
+        yield _ndjson_line(doc, transform)
@@ -1,12 +1,17 @@
 import dramatiq
 from dramatiq.brokers.rabbitmq import RabbitmqBroker
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
 import redis
 from minio import Minio
 import os
-import tempfile
 import asyncio
 
+from workers.validation import validate_object_stream, file_filter, record_worker_metrics
+from services.bucket_events import BucketEventIngestor, parse_notifications
+from services.blob_store import BlobStore, CAS_ENABLED
+from core.scheduler_decorators import run_every_hour
+from datetime import datetime, timezone
+
 # ---------------------------------------------------
 # Setup connections (in real use, config via ENV)
 # ---------------------------------------------------
@@ -17,8 +22,9 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
 
-# MongoDB client (sync here, workers usually avoid async overhead)
-mongo_client = AsyncIOMotorClient(MONGO_URI)
+# MongoDB client (sync and pooled: one client per worker process, shared by
+# every actor thread instead of an event loop per message)
+mongo_client = MongoClient(MONGO_URI, maxPoolSize=int(os.getenv("WORKER_MONGO_POOL_SIZE", "20")))
 db = mongo_client.get_database()
 
 # Redis client
@@ -68,67 +74,48 @@ def hello_task(name: str):
 @dramatiq.actor(max_retries=2)
 def validate_file(bucket: str, object_name: str, file_id: str):
     """
-    Downloads a file from MinIO, validates size & mime, updates MongoDB.
+    Streams a file from MinIO, validates size & magic bytes, updates MongoDB.
     """
     print(f"🔍 Validating file: {bucket}/{object_name}")
-    # run_redis("incr","validated_files")
     redis_client.incr("validated_files")
-    tmp_path=None
+    query = file_filter(file_id)
 
     try:
-        # Download file temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            minio_client.fget_object(bucket, object_name, tmp.name)
-            tmp_path = tmp.name
-
-        file_size = os.path.getsize(tmp_path)
-        print(f"📦 File size = {file_size} bytes")
-
-        # Example validation rule: reject > 10MB
-        if file_size > 10:
-            async def do_update():
-                await db.files.update_one(
-                {"_id": file_id},
-                {"$set": {"status": "failed", "rejected_reason": "File too large"}}
-               )
-            asyncio.run(do_update())
-            redis_client.set("val_err",f"too large {file_size}")
-            
-            # run_redis("incr","validated_files_rejected")
-            redis_client.incr("validated_files_rejected")
-            print("❌ File rejected (too large)")
-        else:
-            
-            async def do_update():
-                db.files.update_one(
-                {"_id": file_id},
-                {"$set": {"status": "valid"}}
-            )
-            asyncio.run(do_update())
-            
-            
-            # redis_client.incr("")
+        declared = db.files.find_one(query, {"meta.mime_type": 1, "blob_id": 1}) or {}
+        declared_mime = declared.get("meta", {}).get("mime_type")
+
+        result = validate_object_stream(minio_client, bucket, object_name, declared_mime=declared_mime)
+        print(f"📦 File size = {result.size} bytes, type = {result.sniffed_mime} "
+              f"({result.throughput_bytes_per_second / (1024 * 1024):.1f} MB/s)")
+
+        update = {"status": result.status, "validation": result.to_dict()}
+        if result.sha256:
+            update["sha256"] = result.sha256
+        if result.rejected_reason:
+            update["rejected_reason"] = result.rejected_reason
+        db.files.update_one(query, {"$set": update})
+        record_worker_metrics(redis_client, result)
+
+        if CAS_ENABLED and result.status == "valid" and not declared.get("blob_id"):
+            blob = BlobStore(db, minio_client).adopt(query, result.sha256, result.size, bucket, object_name)
+            if blob and blob["object_name"] != object_name:
+                redis_client.incr("deduplicated_files")
+                print(f"♻️ Duplicate of blob {result.sha256[:12]}, dropped {object_name}")
+
+        if result.status == "valid":
             redis_client.incr("validated_files_accepted")
             print("✅ File validated successfully")
-
-       
+        else:
+            redis_client.set("val_err", f"{result.rejected_reason} {result.size}")
+            redis_client.incr("validated_files_rejected")
+            print(f"❌ File rejected ({result.rejected_reason})")
 
     except Exception as e:
         print(f"⚠️ Validation failed: {e}")
-        # run_redis("set","validated_files_error",str(e))
-        redis_client.set("validated_files_error",str(e))
-        async def do_update():
-               db.files.update_one(
-                    {"_id": file_id},
-                    {"$set": {"status": "failed", "rejected_reason": str(e)}}
-                )
-            
-        asyncio.run(do_update())
-        
+        redis_client.set("validated_files_error", str(e))
+        record_worker_metrics(redis_client, None, error=True)
+        db.files.update_one(query, {"$set": {"status": "failed", "rejected_reason": str(e)}})
         raise
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
 
 
 @dramatiq.actor(max_retries=2)
@@ -143,3 +130,54 @@ def transcribe_audio(bucket: str, object_name: str, file_id: str):
     
     redis_client.incr("transcribed_files")
     print("✅ Transcript stored in MongoDB")
+
+
+@dramatiq.actor(max_retries=5)
+def ingest_bucket_events(payloads: list):
+    """
+    Fans MinIO ObjectCreated notifications (batched by minio-worker) out to
+    validate_file / transcribe_audio and marks the files as stored.
+    """
+    ingestor = BucketEventIngestor(
+        db.files,
+        redis_client,
+        enqueue_validate=validate_file.send,
+        enqueue_transcribe=transcribe_audio.send,
+    )
+    summary = ingestor.ingest(parse_notifications(payloads))
+    redis_client.incrby("bucket_events_received", summary["received"])
+    redis_client.incrby("bucket_events_duplicates", summary["duplicates"])
+    print(f"📥 Bucket events: {summary['received']} received, {summary['duplicates']} duplicate, "
+          f"{summary['stored']} stored, {summary['validations_queued']} validations queued")
+    if summary["unknown_objects"]:
+        print(f"⚠️ No file record yet for: {', '.join(summary['unknown_objects'])}")
+
+
+@run_every_hour
+@dramatiq.actor(max_retries=1)
+def expire_blob_files(batch_size: int = 500):
+    """
+    Expires content-addressed files past their expiry_date, dropping one blob
+    reference each; the blob's object is deleted with its last reference.
+    """
+    store = BlobStore(db, minio_client)
+    expired = deleted = 0
+    while True:
+        docs = list(db.files.find(
+            {"blob_id": {"$exists": True}, "safe_status": {"$ne": "expired"},
+             "expiry_date": {"$lt": datetime.now(timezone.utc)}},
+            {"_id": 1, "blob_id": 1}
+        ).limit(batch_size))
+        if not docs:
+            break
+        for doc in docs:
+            # Claim the file first so a concurrent run cannot release twice
+            claimed = db.files.update_one(
+                {"_id": doc["_id"], "safe_status": {"$ne": "expired"}},
+                {"$set": {"safe_status": "expired", "expired_at": datetime.now(timezone.utc)}}
+            )
+            if claimed.modified_count:
+                expired += 1
+                deleted += store.release(doc["blob_id"])
+    if expired:
+        print(f"🗑️ Expired {expired} files, deleted {deleted} unreferenced blobs")
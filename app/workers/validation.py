@@ -0,0 +1,212 @@
+# app/workers/validation.py
+"""
+Streaming object validation for Dramatiq workers.
+
+Objects are read from MinIO as a single ranged HTTP stream and processed
+chunk by chunk: the first chunk is sniffed for magic bytes / MIME type and
+every chunk feeds the size counter and hashes. Nothing touches local disk,
+and reading stops as soon as the object exceeds the size limit.
+"""
+import hashlib
+import os
+import socket
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+from minio.error import S3Error
+
+SNIFF_BYTES = 1024
+STREAM_CHUNK_SIZE = int(os.getenv("VALIDATION_CHUNK_SIZE", str(1024 * 1024)))
+MAX_FILE_SIZE = int(os.getenv("VALIDATION_MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+METRICS_KEY = "validation:metrics:{worker}"
+
+# (offset, signature, mime type, label) - checked in order, first match wins
+MAGIC_SIGNATURES = [
+    (0, b"%PDF-", "application/pdf", "pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (0, b"\xff\xd8\xff", "image/jpeg", "jpeg"),
+    (0, b"GIF87a", "image/gif", "gif"),
+    (0, b"GIF89a", "image/gif", "gif"),
+    (0, b"BM", "image/bmp", "bmp"),
+    (0, b"II*\x00", "image/tiff", "tiff"),
+    (0, b"MM\x00*", "image/tiff", "tiff"),
+    (0, b"PK\x03\x04", "application/zip", "zip"),
+    (0, b"PK\x05\x06", "application/zip", "zip"),
+    (0, b"Rar!\x1a\x07", "application/vnd.rar", "rar"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed", "7z"),
+    (0, b"\x1f\x8b", "application/gzip", "gzip"),
+    (0, b"BZh", "application/x-bzip2", "bzip2"),
+    (0, b"\xfd7zXZ\x00", "application/x-xz", "xz"),
+    (257, b"ustar", "application/x-tar", "tar"),
+    (0, b"ID3", "audio/mpeg", "mp3"),
+    (0, b"\xff\xfb", "audio/mpeg", "mp3"),
+    (0, b"\xff\xf3", "audio/mpeg", "mp3"),
+    (0, b"fLaC", "audio/flac", "flac"),
+    (0, b"OggS", "audio/ogg", "ogg"),
+    (0, b"\x1aE\xdf\xa3", "video/webm", "mkv/webm"),
+    (0, b"MZ", "application/x-msdownload", "exe"),
+    (0, b"\x7fELF", "application/x-executable", "elf"),
+    (0, b"\xca\xfe\xba\xbe", "application/x-mach-binary", "mach-o"),
+    (0, b"\xcf\xfa\xed\xfe", "application/x-mach-binary", "mach-o"),
+    (0, b"SQLite format 3\x00", "application/vnd.sqlite3", "sqlite"),
+]
+
+
+def sniff_mime(head: bytes) -> Tuple[str, str]:
+    """Return ``(mime_type, label)`` for the first bytes of an object."""
+    for offset, signature, mime, label in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mime, label
+
+    # RIFF and ISO-BMFF containers carry their subtype a few bytes in
+    if head[:4] == b"RIFF" and len(head) >= 12:
+        subtype = head[8:12]
+        if subtype == b"WAVE":
+            return "audio/wav", "wav"
+        if subtype == b"AVI ":
+            return "video/x-msvideo", "avi"
+        if subtype == b"WEBP":
+            return "image/webp", "webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"M4A ", b"M4B "):
+            return "audio/mp4", "m4a"
+        if brand == b"qt  ":
+            return "video/quicktime", "mov"
+        return "video/mp4", "mp4"
+
+    if not head:
+        return "application/x-empty", "empty"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte sequence cut off at the sniff boundary is still text
+        if e.start < len(head) - 4:
+            return "application/octet-stream", "binary"
+    return "text/plain", "text"
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of streaming one object through the validator."""
+    status: str                      # "valid" | "failed"
+    size: int
+    sha256: Optional[str]
+    md5: Optional[str]
+    sniffed_mime: str
+    magic: str
+    declared_mime: Optional[str] = None
+    rejected_reason: Optional[str] = None
+    duration_seconds: float = 0.0
+    worker: str = WORKER_ID
+    validated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @property
+    def throughput_bytes_per_second(self) -> float:
+        return self.size / self.duration_seconds if self.duration_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["throughput_bytes_per_second"] = self.throughput_bytes_per_second
+        return data
+
+
+def validate_object_stream(minio_client, bucket: str, object_name: str,
+                           max_size: int = MAX_FILE_SIZE,
+                           declared_mime: Optional[str] = None,
+                           chunk_size: int = STREAM_CHUNK_SIZE) -> ValidationResult:
+    """
+    Stream ``bucket/object_name`` once and validate it.
+
+    Requests the range ``[0, max_size]`` so an oversize object costs at most
+    ``max_size + 1`` bytes of transfer before it is rejected. Zero-byte
+    objects, whose ranged GET fails with ``InvalidRange``, validate as empty.
+    """
+    start = time.perf_counter()
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    head = b""
+    size = 0
+
+    try:
+        response = minio_client.get_object(bucket, object_name, offset=0, length=max_size + 1)
+    except S3Error as e:
+        # a ranged GET on a zero-byte object is rejected; validate it as empty
+        if e.code != "InvalidRange":
+            raise
+        response = None
+
+    if response is not None:
+        try:
+            for chunk in response.stream(chunk_size):
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                size += len(chunk)
+                if size > max_size:
+                    break
+                sha256.update(chunk)
+                md5.update(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+
+    mime, magic = sniff_mime(head)
+    duration = time.perf_counter() - start
+
+    if size > max_size:
+        return ValidationResult(
+            status="failed", size=size, sha256=None, md5=None,
+            sniffed_mime=mime, magic=magic, declared_mime=declared_mime,
+            rejected_reason=f"File too large (> {max_size} bytes)",
+            duration_seconds=duration
+        )
+
+    return ValidationResult(
+        status="valid", size=size, sha256=sha256.hexdigest(), md5=md5.hexdigest(),
+        sniffed_mime=mime, magic=magic, declared_mime=declared_mime,
+        duration_seconds=duration
+    )
+
+
+def file_filter(file_id: str) -> Dict:
+    """Match a ``files`` document by ObjectId or by the upload ``meta.file_id``."""
+    if ObjectId.is_valid(file_id):
+        return {"_id": ObjectId(file_id)}
+    return {"meta.file_id": file_id}
+
+
+def record_worker_metrics(redis_client, result: Optional[ValidationResult], error: bool = False):
+    """Accumulate per-worker throughput counters in one Redis round trip."""
+    key = METRICS_KEY.format(worker=WORKER_ID)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hincrby(key, "files", 1)
+    if error or result is None:
+        pipe.hincrby(key, "errors", 1)
+    else:
+        pipe.hincrby(key, "bytes", result.size)
+        pipe.hincrbyfloat(key, "seconds", result.duration_seconds)
+        pipe.hincrby(key, "accepted" if result.status == "valid" else "rejected", 1)
+    pipe.hset(key, "last_seen", datetime.now(timezone.utc).isoformat())
+    pipe.expire(key, 7 * 24 * 3600)
+    pipe.execute()
+
+
+def worker_metrics(redis_client) -> Dict[str, Dict[str, float]]:
+    """Read every worker's counters with derived MB/s, keyed by worker id."""
+    metrics = {}
+    for key in redis_client.scan_iter(match=METRICS_KEY.format(worker="*")):
+        key = key.decode() if isinstance(key, bytes) else key
+        raw = redis_client.hgetall(key)
+        values = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw.items()
+        }
+        seconds = float(values.get("seconds", 0) or 0)
+        total_bytes = int(values.get("bytes", 0) or 0)
+        values["mb_per_second"] = (total_bytes / seconds / (1024 * 1024)) if seconds else 0.0
+        metrics[key.split(":", 2)[-1]] = values
+    return metrics